@@ -29,6 +29,9 @@ class Admision(models.Model):
         verbose_name = "Admisión"
         verbose_name_plural = "Admisiones"
         ordering = ['-fecha_admision']
+        indexes = [
+            models.Index(fields=['-fecha_admision']),
+        ]
     
     def __str__(self):
         return f"Admisión - {self.persona.Nombre} {self.persona.Apellido_Paterno}"
\ No newline at end of file
@@ -16,7 +16,7 @@ class AdmisionSerializer(serializers.ModelSerializer):
             'id',
             'persona',
             'persona_id',
-            'previsión',
+            'Previcion',
             'estado',
             'fecha_admision',
             'fecha_actualizacion',
@@ -12,11 +12,12 @@ from core.serializers import PersonaSerializer
 # Descripción: API para gestionar Admisiones
 ################
 class AdmisionViewSet(viewsets.ModelViewSet):
-    queryset = Admision.objects.all()
+    queryset = Admision.objects.select_related('persona')
     serializer_class = AdmisionSerializer
     permission_classes = [IsAuthenticated]
     search_fields = ['persona__rut', 'persona__nombre']
     ordering_fields = ['fecha_admision']
+    orden_keyset = '-fecha_admision'
     
     ################
     # Acción: crear_persona_admision
@@ -2,4 +2,7 @@ from django.apps import AppConfig
 
 class AuthenticationConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'authentication'
\ No newline at end of file
+    name = 'authentication'
+
+    def ready(self):
+        from authentication import signals  # noqa: F401
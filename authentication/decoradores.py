@@ -0,0 +1,24 @@
+################
+# DECORADORES: Autenticación de vistas async de la API
+# Descripción: Las vistas async de la API no pasan por DRF; api_autenticada
+#              replica IsAuthenticated + SessionAuthentication (403 en JSON,
+#              sin redirigir al login) usando request.auser().
+################
+
+from functools import wraps
+
+from django.http import JsonResponse
+
+
+MENSAJE_SIN_CREDENCIALES = 'Las credenciales de autenticación no se proveyeron.'
+
+
+def api_autenticada(vista):
+    """Para vistas async: exige un usuario con sesión iniciada."""
+    @wraps(vista)
+    async def envoltura(request, *args, **kwargs):
+        usuario = await request.auser()
+        if not usuario.is_authenticated:
+            return JsonResponse({'detail': MENSAJE_SIN_CREDENCIALES}, status=403)
+        return await vista(request, *args, **kwargs)
+    return envoltura
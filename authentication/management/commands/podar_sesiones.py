@@ -0,0 +1,33 @@
+################
+# COMANDO: podar_sesiones
+# Descripción: Borra de django_session las sesiones vencidas por lotes
+#              pequeños (authentication.sesiones.podar_sesiones), sin un
+#              DELETE largo que bloquee la tabla. Programar cada hora.
+# Uso: python manage.py podar_sesiones [--lote 1000] [--pausa 0.1]
+################
+
+from django.core.management.base import BaseCommand
+
+from authentication.sesiones import LOTE_PODA, PAUSA_PODA, podar_sesiones
+
+
+class Command(BaseCommand):
+    help = 'Borra las sesiones vencidas por lotes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=LOTE_PODA,
+            help=f'Sesiones por DELETE (por defecto {LOTE_PODA})'
+        )
+        parser.add_argument(
+            '--pausa',
+            type=float,
+            default=PAUSA_PODA,
+            help=f'Segundos entre lotes (por defecto {PAUSA_PODA})'
+        )
+
+    def handle(self, *args, **options):
+        borradas = podar_sesiones(lote=options['lote'], pausa=options['pausa'])
+        self.stdout.write(self.style.SUCCESS(f'✅ Sesiones vencidas borradas: {borradas}'))
@@ -0,0 +1,28 @@
+################
+# MIDDLEWARE: Rol del usuario
+# Descripción: Expone request.rol_usuario (authentication.roles.RolUsuario).
+#              Es perezoso: solo se resuelve (desde caché) si una vista lo usa.
+#              Las vistas async no deben usarlo (resolver_rol es síncrono).
+################
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.utils.functional import SimpleLazyObject
+
+from authentication.roles import resolver_rol
+
+
+class RolUsuarioMiddleware:
+    """Debe ir después de AuthenticationMiddleware."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        request.rol_usuario = SimpleLazyObject(lambda: resolver_rol(request.user))
+        # En modo async get_response devuelve la corrutina y Django la espera
+        return self.get_response(request)
@@ -0,0 +1,128 @@
+################
+# ROLES: Resolución de rol y permisos
+# Descripción: Calcula una sola vez el rol efectivo y los permisos de un
+#              usuario y los guarda en caché. Las señales de authentication
+#              invalidan la entrada cuando cambian el Perfil o los grupos.
+################
+
+from django.core.cache import cache
+
+from core.cache import obtener_o_calcular
+from core.replicas import en_primaria
+from personal.models import PERMISOS_POR_ACCION, Perfil
+
+
+TIEMPO_CACHE = 60 * 60
+VERSION_CLAVE = 1
+
+# Grupos de Django -> rol del dashboard (en orden de prioridad)
+ROLES_POR_GRUPO = [
+    ('ADMINISTRADOR', ('Administrativo', 'ADMINISTRADOR')),
+    ('MEDICO', ('Medico', 'MÉDICO')),
+    ('MATRONA', ('Matrona', 'MATRONA')),
+    ('TENS', ('TENS', 'Tens')),
+]
+
+# Rol de Perfil -> rol del dashboard (si el usuario no tiene grupos)
+ROLES_POR_PERFIL = {
+    'administrativo': 'ADMINISTRADOR',
+    'medico': 'MEDICO',
+    'matrona': 'MATRONA',
+    'tens': 'TENS',
+}
+
+ROL_POR_DEFECTO = 'USUARIO'
+
+
+class RolUsuario:
+    """
+    Rol efectivo de un usuario.
+
+    Atributos:
+        rol: rol del dashboard ('ADMINISTRADOR', 'MEDICO', ..., 'USUARIO')
+        rol_perfil: rol de personal.Perfil ('matrona', ...) o None sin perfil
+        permisos: frozenset de acciones de PERMISOS_POR_ACCION
+    """
+
+    __slots__ = ('rol', 'rol_perfil', 'permisos')
+
+    def __init__(self, rol, rol_perfil=None, permisos=()):
+        self.rol = rol
+        self.rol_perfil = rol_perfil
+        self.permisos = frozenset(permisos)
+
+    def tiene_permiso(self, accion):
+        return accion in self.permisos
+
+    def como_dict(self):
+        return {'rol': self.rol, 'rol_perfil': self.rol_perfil, 'permisos': sorted(self.permisos)}
+
+    def __repr__(self):
+        return f'RolUsuario({self.rol!r}, rol_perfil={self.rol_perfil!r})'
+
+
+ANONIMO = RolUsuario(ROL_POR_DEFECTO)
+
+
+def clave_cache(usuario_id):
+    return f'roles:usuario:{usuario_id}:v{VERSION_CLAVE}'
+
+
+def calcular_rol(usuario):
+    """
+    Calcula el rol sin caché: una consulta para grupos y otra para el perfil.
+    Se lee de la primaria: el resultado se guarda en la caché compartida.
+
+    Returns:
+        RolUsuario
+    """
+    with en_primaria():
+        grupos = set(usuario.groups.values_list('name', flat=True))
+        perfil = Perfil.objects.filter(usuario_id=usuario.pk).values_list('rol', flat=True).first()
+
+    if usuario.is_superuser:
+        rol = 'ADMINISTRADOR'
+    else:
+        rol = next(
+            (nombre for nombre, alias in ROLES_POR_GRUPO if grupos.intersection(alias)),
+            ROLES_POR_PERFIL.get(perfil, ROL_POR_DEFECTO)
+        )
+
+    if usuario.is_superuser:
+        permisos = PERMISOS_POR_ACCION.keys()
+    else:
+        permisos = [accion for accion, roles in PERMISOS_POR_ACCION.items() if perfil in roles]
+
+    return RolUsuario(rol, perfil, permisos)
+
+
+def resolver_rol(usuario):
+    """
+    Rol efectivo del usuario, desde caché cuando está disponible.
+
+    Args:
+        usuario (User): usuario autenticado o anónimo
+
+    Returns:
+        RolUsuario
+    """
+    if not getattr(usuario, 'is_authenticated', False):
+        return ANONIMO
+
+    # Memo por instancia: varias consultas en el mismo request no tocan la caché
+    resuelto = getattr(usuario, '_rol_usuario', None)
+    if resuelto is not None:
+        return resuelto
+
+    datos = obtener_o_calcular(
+        clave_cache(usuario.pk), lambda: calcular_rol(usuario).como_dict(), TIEMPO_CACHE
+    )
+    resuelto = RolUsuario(datos['rol'], datos['rol_perfil'], datos['permisos'])
+
+    usuario._rol_usuario = resuelto
+    return resuelto
+
+
+def invalidar_roles(usuarios_ids):
+    """Borra de la caché el rol de los usuarios indicados."""
+    cache.delete_many([clave_cache(usuario_id) for usuario_id in usuarios_ids])
@@ -0,0 +1,151 @@
+################
+# SESIONES: Sesiones en caché con escritura diferida a la base de datos
+# Descripción: SESSION_ENGINE = 'authentication.sesiones'. Los requests leen
+#              la sesión desde la caché compartida (Redis), no desde
+#              django_session. La tabla se escribe solo cuando hace falta:
+#                - siempre en el request que crea la sesión o cambia su
+#                  clave (login)
+#                - si los datos cambiaron y la última escritura tiene más de
+#                  ESCRITURA_DIFERIDA segundos
+#              Guardar una sesión sin cambios no escribe nada.
+#              Si la caché pierde una sesión se recupera desde la tabla, con
+#              a lo más ESCRITURA_DIFERIDA segundos de cambios menos.
+#              Borrar una sesión (logout, cambio de clave) exige que Redis
+#              confirme el borrado: si no responde, la fila tampoco se borra
+#              y el logout falla con error, en vez de dejar en Redis una
+#              copia que volvería a valer al recuperarse.
+# Poda: python manage.py podar_sesiones (o clearsessions)
+################
+
+import hashlib
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import router, transaction
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+from django.utils import timezone
+
+
+ESCRITURA_DIFERIDA = 60
+LOTE_PODA = 1000
+PAUSA_PODA = 0.1
+
+
+class SessionStore(CachedDBStore):
+    """
+    Entrada en caché: {'datos': dict de la sesión, 'db': time.time() de la
+    última escritura en django_session}.
+    """
+
+    cache_key_prefix = 'sesiones:'
+
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        self._huella = None
+        self._escrita_db = None
+        # Creada (o con clave nueva) en este request: todo se escribe en la tabla
+        self._nueva = False
+
+    def _huella_de(self, datos):
+        return hashlib.blake2b(self.serializer().dumps(datos), digest_size=16).hexdigest()
+
+    def load(self):
+        try:
+            entrada = self._cache.get(self.cache_key)
+        except Exception:
+            # Clave inválida para el backend: se trata como sesión inexistente
+            entrada = None
+
+        if entrada is None:
+            sesion = self._get_session_from_db()
+            if sesion is None:
+                return {}
+            # Recién leída: la tabla está al día
+            entrada = {'datos': self.decode(sesion.session_data), 'db': time.time()}
+            self._cache.set(self.cache_key, entrada, self.get_expiry_age(expiry=sesion.expire_date))
+
+        self._huella = self._huella_de(entrada['datos'])
+        self._escrita_db = entrada['db']
+        return entrada['datos']
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+        datos = self._get_session(no_load=must_create)
+        huella = self._huella_de(datos)
+        ahora = time.time()
+
+        vencida = self._escrita_db is None or ahora - self._escrita_db >= ESCRITURA_DIFERIDA
+        if huella == self._huella and not must_create:
+            # Sin cambios: solo SESSION_SAVE_EVERY_REQUEST renueva el vencimiento (diferido)
+            if not (settings.SESSION_SAVE_EVERY_REQUEST and vencida):
+                return
+
+        self._nueva = self._nueva or must_create
+        if self._nueva or vencida:
+            DBStore.save(self, must_create)
+            self._escrita_db = ahora
+        self._cache.set(self.cache_key, {'datos': datos, 'db': self._escrita_db}, self.get_expiry_age())
+        self._huella = huella
+
+    def delete(self, session_key=None):
+        if session_key is None:
+            if self.session_key is None:
+                return
+            session_key = self.session_key
+        borrar = getattr(self._cache, 'borrar_confirmado', self._cache.delete)
+        # Si Redis no confirma, la fila vuelve atrás: tabla y caché siguen de acuerdo
+        with transaction.atomic(using=router.db_for_write(self.model)):
+            DBStore.delete(self, session_key)
+            borrar(self.cache_key_prefix + session_key)
+
+    # Las vistas async usan la misma lógica (la caché y el ORM son síncronos)
+    async def aload(self):
+        return await sync_to_async(self.load)()
+
+    async def asave(self, must_create=False):
+        return await sync_to_async(self.save)(must_create)
+
+    async def adelete(self, session_key=None):
+        return await sync_to_async(self.delete)(session_key)
+
+    @classmethod
+    def clear_expired(cls):
+        podar_sesiones()
+
+
+def podar_sesiones(lote=LOTE_PODA, pausa=PAUSA_PODA, margen=ESCRITURA_DIFERIDA):
+    """
+    Borra las sesiones vencidas por lotes pequeños, cada uno en su propia
+    transacción, para no bloquear django_session con un único DELETE largo.
+
+    Args:
+        lote (int): sesiones por DELETE
+        pausa (float): segundos entre lotes
+        margen (int): segundos extra de vencimiento (una sesión puede seguir
+                      viva en caché hasta ESCRITURA_DIFERIDA después del
+                      vencimiento guardado en la tabla)
+
+    Returns:
+        int: sesiones borradas
+    """
+    modelo = SessionStore.get_model_class()
+    limite = timezone.now() - timedelta(seconds=margen)
+    borradas = 0
+
+    while True:
+        # Lectura por el índice de expire_date; el DELETE va por clave primaria
+        claves = list(
+            modelo.objects.filter(expire_date__lt=limite)
+            .order_by('expire_date')
+            .values_list('session_key', flat=True)[:lote]
+        )
+        if not claves:
+            return borradas
+        borradas += modelo.objects.filter(session_key__in=claves).delete()[0]
+        if len(claves) < lote:
+            return borradas
+        time.sleep(pausa)
@@ -0,0 +1,60 @@
+################
+# SEÑALES: Authentication
+# Descripción: Invalida la caché de roles (authentication.roles) cuando
+#              cambian el Perfil, los grupos o los flags del usuario
+################
+
+from django.contrib.auth.models import Group, User
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from authentication.roles import invalidar_roles
+from personal.models import Perfil
+
+
+def _invalidar_al_confirmar(usuarios_ids):
+    """Invalida ahora y al confirmar: evita que una lectura concurrente reponga el valor viejo."""
+    usuarios_ids = list(usuarios_ids)
+    if not usuarios_ids:
+        return
+    invalidar_roles(usuarios_ids)
+    transaction.on_commit(lambda: invalidar_roles(usuarios_ids))
+
+
+@receiver(post_save, sender=Perfil)
+@receiver(post_delete, sender=Perfil)
+def perfil_modificado(sender, instance, **kwargs):
+    _invalidar_al_confirmar([instance.usuario_id])
+
+
+@receiver(post_save, sender=User)
+def usuario_modificado(sender, instance, created, update_fields=None, **kwargs):
+    # is_superuser forma parte del rol efectivo; el login solo toca last_login
+    if created or update_fields == frozenset(['last_login']):
+        return
+    _invalidar_al_confirmar([instance.pk])
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def grupos_modificados(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    user.groups.add(...)  -> instance es el usuario
+    group.user_set.add(...) -> instance es el grupo (reverse=True)
+    """
+    if action == 'pre_clear' and reverse:
+        # Después del clear ya no se sabe qué usuarios tenía el grupo
+        _invalidar_al_confirmar(instance.user_set.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        if not reverse:
+            _invalidar_al_confirmar([instance.pk])
+        elif pk_set:
+            _invalidar_al_confirmar(pk_set)
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def grupo_modificado(sender, instance, **kwargs):
+    # Renombrar o borrar un grupo cambia el rol de todos sus usuarios
+    if instance.pk:
+        _invalidar_al_confirmar(instance.user_set.values_list('pk', flat=True))
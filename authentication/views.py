@@ -4,6 +4,9 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.views.decorators.http import require_http_methods
 
+from authentication.roles import resolver_rol
+from core.contadores import leer_contadores
+
 ################
 # VISTA: Login
 ################
@@ -58,8 +61,8 @@ def dashboard(request):
     """
     user = request.user
     
-    # Obtener el rol del usuario (desde groups de Django o custom field)
-    rol = get_user_role(user)
+    # Rol del usuario (RolUsuarioMiddleware, resuelto desde caché)
+    rol = request.rol_usuario.rol
     
     # Determinar qué template mostrar según el rol
     templates_por_rol = {
@@ -75,6 +78,7 @@ def dashboard(request):
         'user': user,
         'rol': rol,
         'modulos': get_modulos_por_rol(rol),
+        'estadisticas': leer_contadores(),
     }
     
     return render(request, template, context)
@@ -87,25 +91,10 @@ def dashboard(request):
 def get_user_role(user):
     """
     Obtiene el rol del usuario
-    Busca en groups de Django (recomendado)
+    Grupos de Django primero, luego el Perfil (ver authentication.roles).
+    Se resuelve desde caché: sin consultas en requests posteriores.
     """
-    if user.is_superuser:
-        return 'ADMINISTRADOR'
-    
-    # Si tiene groups de Django
-    groups = user.groups.values_list('name', flat=True)
-    
-    if 'Administrativo' in groups or 'ADMINISTRADOR' in groups:
-        return 'ADMINISTRADOR'
-    elif 'Medico' in groups or 'MÉDICO' in groups:
-        return 'MEDICO'
-    elif 'Matrona' in groups or 'MATRONA' in groups:
-        return 'MATRONA'
-    elif 'TENS' in groups or 'Tens' in groups:
-        return 'TENS'
-    
-    # Por defecto
-    return 'USUARIO'
+    return resolver_rol(user).rol
 
 
 def get_modulos_por_rol(rol):
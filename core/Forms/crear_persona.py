@@ -5,7 +5,7 @@
 
 from django import forms
 from core.models import Persona
-from utilities.validadores import validar_rut_chileno, validar_edad, validar_telefono
+from utilidades.validadores import normalizar_rut, validar_rut_chileno, validar_edad, validar_telefono
 
 
 class Form_crear_persona(forms.ModelForm):
@@ -72,14 +72,12 @@ class Form_crear_persona(forms.ModelForm):
         if not es_valido:
             raise forms.ValidationError(mensaje)
         
-        # Normalizar RUT (sin puntos ni guión)
-        rut_normalizado = rut.replace('.', '').replace('-', '')
-        
-        # Verificar que no esté duplicado
-        if Persona.objects.filter(rut=rut_normalizado).exists():
+        # Verificar que no esté duplicado (cualquier formato, vía rut_numero)
+        if Persona.objects.by_rut(rut).exists():
             raise forms.ValidationError('Este RUT ya está registrado en el sistema')
         
-        return rut_normalizado
+        # Normalizado igual que en la validación (sin puntos, guión ni espacios)
+        return normalizar_rut(rut)
     
     def clean_nombre(self):
         """Valida nombre"""
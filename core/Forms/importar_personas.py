@@ -0,0 +1,34 @@
+################
+# FORMULARIO: Importar Personas
+# Ubicación: apps/core/Forms/importar_personas.py
+################
+
+from django import forms
+from django.core.validators import FileExtensionValidator
+
+from core.importacion import TAMANO_BLOQUE
+
+
+class Form_importar_personas(forms.Form):
+    """
+    Formulario de carga masiva (admin de Personas).
+    Usado por: Administrativo
+    """
+    
+    archivo = forms.FileField(
+        label='Archivo',
+        help_text='CSV (separado por , o ;) o Excel .xlsx con encabezados: '
+                  'rut, nombre, apellido, edad, direccion, contacto',
+        validators=[FileExtensionValidator(allowed_extensions=['csv', 'xlsx', 'xlsm'])]
+    )
+    crear_pacientes = forms.BooleanField(
+        label='Crear ficha de paciente',
+        required=False,
+        help_text='Requiere columnas estado_civil y prevision (numero_ficha es opcional)'
+    )
+    tamano_bloque = forms.IntegerField(
+        label='Filas por bloque',
+        initial=TAMANO_BLOQUE,
+        min_value=100,
+        max_value=20000
+    )
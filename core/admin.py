@@ -1,5 +1,14 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.shortcuts import redirect, render
+from django.urls import path
+from django.utils import timezone
+import io
+
 from .models import Persona
+from .Forms.importar_personas import Form_importar_personas
+from .importacion import ImportadorPersonas, leer_archivo
 
 ################
 # Admin: Persona
@@ -7,19 +16,69 @@ from .models import Persona
 ################
 @admin.register(Persona)
 class PersonaAdmin(admin.ModelAdmin):
-    list_display = ('Rut', 'Nombre', 'Apellido_Paterno', 'Email', 'Activo')
-    search_fields = ('Rut', 'Nombre', 'Apellido_Paterno')
-    list_filter = ('Activo', 'fecha_creacion')
-    readonly_fields = ('fecha_creacion', 'fecha_actualizacion')
+    list_display = ('rut', 'nombre', 'apellido', 'contacto', 'estado')
+    search_fields = ('rut', 'nombre', 'apellido')
+    list_filter = ('estado', 'created_at')
+    readonly_fields = ('created_at', 'modified_at')
+    change_list_template = 'admin/core/persona/change_list.html'
     fieldsets = (
         ('Datos Personales', {
-            'fields': ('Rut', 'Nombre', 'Apellido_Paterno', 'Apellido_Materno', 'Sexo')
+            'fields': ('rut', 'nombre', 'apellido', 'edad')
         }),
         ('Contacto', {
-            'fields': ('Telefono', 'Direccion', 'Email')
+            'fields': ('contacto', 'direccion')
         }),
         ('Sistema', {
-            'fields': ('Activo', 'fecha_creacion', 'fecha_actualizacion'),
+            'fields': ('estado', 'created_at', 'modified_at'),
             'classes': ('collapse',)
         }),
-    )
\ No newline at end of file
+    )
+    
+    def get_urls(self):
+        urls = [
+            path(
+                'importar/',
+                self.admin_site.admin_view(self.importar_view),
+                name='core_persona_importar'
+            ),
+        ]
+        return urls + super().get_urls()
+    
+    ################
+    # Vista: importar_view
+    # Descripción: Carga masiva desde CSV/Excel (ver core.importacion)
+    ################
+    def importar_view(self, request):
+        if not self.has_add_permission(request):
+            messages.error(request, 'No tiene permiso para importar personas.')
+            return redirect('admin:core_persona_changelist')
+        
+        form = Form_importar_personas(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            archivo = form.cleaned_data['archivo']
+            errores = io.StringIO()
+            importador = ImportadorPersonas(
+                request.user,
+                tamano_bloque=form.cleaned_data['tamano_bloque'],
+                crear_pacientes=form.cleaned_data['crear_pacientes'],
+                errores=errores,
+            )
+            resultado = importador.importar(leer_archivo(archivo, archivo.name))
+            
+            messages.success(request, f'✅ Importación terminada: {resultado}')
+            if resultado.rechazadas:
+                nombre = f'importaciones/errores_{timezone.now():%Y%m%d_%H%M%S}.csv'
+                nombre = default_storage.save(nombre, ContentFile(errores.getvalue().encode('utf-8')))
+                messages.warning(
+                    request,
+                    f'⚠️ {resultado.rechazadas} filas rechazadas. Detalle: {default_storage.url(nombre)}'
+                )
+            return redirect('admin:core_persona_changelist')
+        
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Importar personas',
+            'form': form,
+        }
+        return render(request, 'admin/core/persona/importar.html', context)
\ No newline at end of file
@@ -0,0 +1,424 @@
+################
+# ALMACENAMIENTO: Archivos clínicos deduplicados por contenido
+# Descripción: Las imágenes de MODELOS_CON_IMAGEN (core.imagenes) se guardan
+#              con AlmacenamientoDeduplicado: el archivo se nombra con el
+#              SHA-256 de su contenido (calculado por bloques, sin cargarlo
+#              entero en memoria) y se escribe una sola vez aunque se anexe
+#              a varias observaciones, patologías, procedimientos o perfiles.
+#              upload_to solo aporta la extensión.
+#              ArchivoAlmacenado lleva cuántas filas referencian cada blob
+#              (señales al guardar y borrar, en la misma transacción). Los
+#              blobs sin referencias no se borran al instante sino en lote
+#              con recolectar_archivos, después de un período de gracia.
+# Uso: imagen = models.ImageField(upload_to=..., storage=almacenamiento_clinico)
+#      python manage.py recolectar_archivos [--reconciliar] [--migrar]
+################
+
+import hashlib
+import logging
+import os
+import posixpath
+from collections import Counter
+from datetime import timedelta
+
+from django.apps import apps
+from django.core.cache import cache
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, pre_save
+from django.utils import timezone
+
+from core.imagenes import CAMPO_IMAGEN, MODELOS_CON_IMAGEN
+
+
+logger = logging.getLogger(__name__)
+
+CARPETA = 'blobs'
+# Un blob sin referencias se conserva este tiempo (subidas cuya fila aún no se confirma)
+GRACIA = timedelta(hours=24)
+TAMANO_BLOQUE = 500
+
+
+def es_blob(nombre):
+    return bool(nombre) and nombre.startswith(f'{CARPETA}/')
+
+
+def nombre_blob(resumen, nombre_original):
+    """blobs/ab/cd/<sha256>.<ext>: dos niveles para no llenar un solo directorio."""
+    extension = os.path.splitext(nombre_original)[1].lower()[:10]
+    return f'{CARPETA}/{resumen[:2]}/{resumen[2:4]}/{resumen}{extension}'
+
+
+def resumen_contenido(contenido):
+    """
+    Returns:
+        tuple: (sha256 hex, tamaño en bytes), leyendo por bloques
+    """
+    resumen = hashlib.sha256()
+    tamano = 0
+    for bloque in contenido.chunks():
+        resumen.update(bloque)
+        tamano += len(bloque)
+    contenido.seek(0)
+    return resumen.hexdigest(), tamano
+
+
+# ====================================================================
+# STORAGE
+# ====================================================================
+
+class AlmacenamientoDeduplicado(FileSystemStorage):
+    """
+    FileSystemStorage (por defecto en MEDIA_ROOT/MEDIA_URL, junto al resto
+    de los archivos) que guarda cada contenido una sola vez.
+
+    delete() no borra blobs: otras filas pueden referenciarlos. Se eliminan
+    con recolectar_huerfanos().
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+
+        resumen, tamano = resumen_contenido(content)
+        nombre = nombre_blob(resumen, name)
+        if max_length is not None and len(nombre) > max_length:
+            raise ValueError(f'El nombre {nombre} supera {max_length} caracteres')
+
+        if _tocar(nombre) and self.exists(nombre):
+            return nombre
+        if self.exists(nombre):
+            # El mtime protege al archivo del barrido de disco de recolectar_huerfanos
+            os.utime(self.path(nombre))
+        else:
+            guardado = self._save(nombre, content)
+            if guardado != nombre:
+                # Otro proceso escribió el mismo contenido entre exists() y _save()
+                super().delete(guardado)
+        _registrar(nombre, tamano)
+        return nombre
+
+    def delete(self, name):
+        if not es_blob(name):
+            super().delete(name)
+
+    def eliminar_blob(self, name):
+        super().delete(name)
+
+
+almacenamiento = AlmacenamientoDeduplicado()
+
+
+def almacenamiento_clinico():
+    """Storage de los ImageField clínicos (callable: no se evalúa al importar settings)."""
+    return almacenamiento
+
+
+# ====================================================================
+# REFERENCIAS
+# ====================================================================
+
+def _tocar(nombre):
+    """Renueva modified_at del blob; False si aún no tiene fila."""
+    from core.models import ArchivoAlmacenado
+
+    return bool(ArchivoAlmacenado.objects.filter(nombre=nombre).update(modified_at=timezone.now()))
+
+
+def _registrar(nombre, tamano, referencias=0):
+    from core.models import ArchivoAlmacenado
+
+    try:
+        with transaction.atomic():
+            return ArchivoAlmacenado.objects.create(nombre=nombre, tamano=tamano, referencias=referencias)
+    except IntegrityError:
+        # Otro proceso lo registró primero
+        ArchivoAlmacenado.objects.filter(nombre=nombre).update(
+            referencias=F('referencias') + referencias, modified_at=timezone.now()
+        )
+        return None
+
+
+def ajustar_referencias(nombre, delta):
+    """Suma `delta` a las referencias del blob (en la transacción en curso)."""
+    from core.models import ArchivoAlmacenado
+
+    if not es_blob(nombre) or not delta:
+        return
+    actualizados = ArchivoAlmacenado.objects.filter(nombre=nombre).update(
+        referencias=F('referencias') + delta, modified_at=timezone.now()
+    )
+    if not actualizados:
+        tamano = almacenamiento.size(nombre) if almacenamiento.exists(nombre) else 0
+        _registrar(nombre, tamano, max(delta, 0))
+
+
+# ====================================================================
+# SEÑALES
+# ====================================================================
+# Igual que core.contadores: post_init recuerda el blob con que se cargó la
+# fila y post_save/post_delete ajustan la diferencia. Las operaciones
+# masivas no emiten señales: las corrige reconciliar_referencias().
+
+def _blob(valor):
+    nombre = getattr(valor, 'name', valor) or ''
+    return nombre if es_blob(nombre) else ''
+
+
+def _al_iniciar(sender, instance, **kwargs):
+    # None: campo diferido, se lee de la base antes de guardar o borrar
+    if CAMPO_IMAGEN in instance.__dict__:
+        instance._blob_previo = _blob(instance.__dict__[CAMPO_IMAGEN])
+    else:
+        instance._blob_previo = None
+
+
+def _leer_previo(sender, instance):
+    """Blob guardado en la base, para instancias cargadas con .only()/.defer()."""
+    previo = sender._base_manager.filter(pk=instance.pk).values_list(CAMPO_IMAGEN, flat=True).first()
+    instance._blob_previo = _blob(previo)
+
+
+def _antes_de_guardar(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding or getattr(instance, '_blob_previo', None) is not None:
+        return
+    _leer_previo(sender, instance)
+
+
+def _al_guardar(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previo = '' if created else (getattr(instance, '_blob_previo', None) or '')
+    actual = _blob(getattr(instance, CAMPO_IMAGEN))
+    if actual != previo:
+        ajustar_referencias(previo, -1)
+        ajustar_referencias(actual, 1)
+    instance._blob_previo = actual
+
+
+def _antes_de_borrar(sender, instance, **kwargs):
+    if getattr(instance, '_blob_previo', None) is None:
+        _leer_previo(sender, instance)
+
+
+def _al_borrar(sender, instance, **kwargs):
+    ajustar_referencias(instance._blob_previo, -1)
+
+
+def conectar_senales():
+    """Lleva las referencias de los blobs de MODELOS_CON_IMAGEN (CoreConfig.ready)."""
+    for etiqueta in MODELOS_CON_IMAGEN:
+        modelo = apps.get_model(etiqueta)
+        post_init.connect(_al_iniciar, sender=modelo, dispatch_uid=f'almacenamiento_init_{etiqueta}')
+        pre_save.connect(_antes_de_guardar, sender=modelo, dispatch_uid=f'almacenamiento_pre_{etiqueta}')
+        post_save.connect(_al_guardar, sender=modelo, dispatch_uid=f'almacenamiento_save_{etiqueta}')
+        pre_delete.connect(_antes_de_borrar, sender=modelo, dispatch_uid=f'almacenamiento_pre_delete_{etiqueta}')
+        post_delete.connect(_al_borrar, sender=modelo, dispatch_uid=f'almacenamiento_delete_{etiqueta}')
+
+
+# ====================================================================
+# TAREAS EN LOTE
+# ====================================================================
+
+def contar_referencias(nombres=None):
+    """
+    Referencias reales de cada blob en MODELOS_CON_IMAGEN (una consulta
+    agrupada por modelo).
+
+    Args:
+        nombres (iterable): limita el conteo a estos blobs (por defecto todos)
+
+    Returns:
+        Counter: blob -> filas que lo referencian
+    """
+    referencias = Counter()
+    for etiqueta in MODELOS_CON_IMAGEN:
+        filas = apps.get_model(etiqueta).objects.filter(**{f'{CAMPO_IMAGEN}__startswith': f'{CARPETA}/'})
+        if nombres is not None:
+            filas = filas.filter(**{f'{CAMPO_IMAGEN}__in': list(nombres)})
+        for nombre, total in filas.values_list(CAMPO_IMAGEN).annotate(total=Count('pk')).order_by():
+            referencias[nombre] += total
+    return referencias
+
+
+def reconciliar_referencias():
+    """
+    Recalcula las referencias de todos los blobs desde las tablas.
+
+    Returns:
+        list: (blob, referencias_anteriores, referencias_reales) de los que cambiaron
+    """
+    from core.models import ArchivoAlmacenado
+
+    reales = contar_referencias()
+    cambios = []
+    with transaction.atomic():
+        for archivo in ArchivoAlmacenado.objects.select_for_update().iterator(chunk_size=TAMANO_BLOQUE):
+            real = reales.pop(archivo.nombre, 0)
+            if archivo.referencias != real:
+                cambios.append((archivo.nombre, archivo.referencias, real))
+                ArchivoAlmacenado.objects.filter(pk=archivo.pk).update(referencias=real)
+        # Blobs referenciados sin fila (fila perdida en un rollback)
+        for nombre, real in reales.items():
+            tamano = almacenamiento.size(nombre) if almacenamiento.exists(nombre) else 0
+            _registrar(nombre, tamano, real)
+            cambios.append((nombre, None, real))
+    return cambios
+
+
+def _blobs_en_disco():
+    """Nombres de todos los archivos bajo CARPETA (dos niveles de directorios)."""
+    if not almacenamiento.exists(CARPETA):
+        return
+    for primero in almacenamiento.listdir(CARPETA)[0]:
+        for segundo in almacenamiento.listdir(f'{CARPETA}/{primero}')[0]:
+            directorio = f'{CARPETA}/{primero}/{segundo}'
+            for archivo in almacenamiento.listdir(directorio)[1]:
+                yield f'{directorio}/{archivo}'
+
+
+def _borrar_derivadas(nombres):
+    """Borra las ImagenDerivada de los blobs eliminados y sus archivos sin otro uso."""
+    from core.imagenes import _clave
+    from core.models import ImagenDerivada
+
+    derivadas = ImagenDerivada.objects.filter(original__in=nombres)
+    archivos = set(derivadas.values_list('archivo', flat=True))
+    derivadas.delete()
+    compartidos = set(ImagenDerivada.objects.filter(archivo__in=archivos).values_list('archivo', flat=True))
+    for archivo in archivos - compartidos:
+        default_storage.delete(archivo)
+    cache.delete_many([_clave(nombre) for nombre in nombres])
+
+
+def recolectar_huerfanos(gracia=GRACIA, simular=False, ahora=None):
+    """
+    Borra los blobs sin referencias más antiguos que `gracia`: los de
+    ArchivoAlmacenado con referencias <= 0 (verificadas contra las tablas) y
+    los archivos de CARPETA sin fila. También borra sus derivadas.
+
+    Returns:
+        dict: blobs borrados, bytes liberados y referencias corregidas
+    """
+    from core.models import ArchivoAlmacenado
+
+    limite = (ahora or timezone.now()) - gracia
+    resultado = {'borrados': 0, 'bytes': 0, 'corregidos': 0}
+
+    candidatos = list(
+        ArchivoAlmacenado.objects.filter(referencias__lte=0, modified_at__lt=limite)
+        .values_list('pk', flat=True)
+    )
+    for inicio in range(0, len(candidatos), TAMANO_BLOQUE):
+        with transaction.atomic():
+            # skip_locked: una subida en curso que toca el blob lo tiene bloqueado
+            archivos = list(
+                ArchivoAlmacenado.objects.select_for_update(skip_locked=True)
+                .filter(pk__in=candidatos[inicio:inicio + TAMANO_BLOQUE], referencias__lte=0, modified_at__lt=limite)
+            )
+            reales = contar_referencias(archivo.nombre for archivo in archivos)
+            huerfanos = []
+            for archivo in archivos:
+                if reales[archivo.nombre]:
+                    # Referenciado por una operación masiva que no emitió señales
+                    ArchivoAlmacenado.objects.filter(pk=archivo.pk).update(referencias=reales[archivo.nombre])
+                    resultado['corregidos'] += 1
+                else:
+                    huerfanos.append(archivo)
+            resultado['borrados'] += len(huerfanos)
+            resultado['bytes'] += sum(archivo.tamano for archivo in huerfanos)
+            if simular or not huerfanos:
+                continue
+            # Archivo antes que fila: una subida que espera el bloqueo ve que ya no existe
+            for archivo in huerfanos:
+                almacenamiento.eliminar_blob(archivo.nombre)
+            nombres = [archivo.nombre for archivo in huerfanos]
+            _borrar_derivadas(nombres)
+            ArchivoAlmacenado.objects.filter(pk__in=[archivo.pk for archivo in huerfanos]).delete()
+
+    # Archivos escritos cuya fila se perdió (la transacción de la subida falló)
+    sin_fila = []
+    for nombre in _blobs_en_disco():
+        if almacenamiento.get_modified_time(nombre) < limite:
+            sin_fila.append(nombre)
+        if len(sin_fila) >= TAMANO_BLOQUE:
+            _borrar_sin_fila(sin_fila, resultado, simular)
+            sin_fila = []
+    _borrar_sin_fila(sin_fila, resultado, simular)
+    return resultado
+
+
+def _borrar_sin_fila(nombres, resultado, simular):
+    from core.models import ArchivoAlmacenado
+
+    if not nombres:
+        return
+    registrados = set(ArchivoAlmacenado.objects.filter(nombre__in=nombres).values_list('nombre', flat=True))
+    referenciados = contar_referencias(nombres)
+    for nombre in nombres:
+        if nombre in registrados:
+            continue
+        if referenciados[nombre]:
+            _registrar(nombre, almacenamiento.size(nombre), referenciados[nombre])
+            resultado['corregidos'] += 1
+            continue
+        resultado['borrados'] += 1
+        resultado['bytes'] += almacenamiento.size(nombre)
+        if not simular:
+            almacenamiento.eliminar_blob(nombre)
+            _borrar_derivadas([nombre])
+
+
+def migrar_existentes(salida=None):
+    """
+    Mueve las imágenes subidas antes de la deduplicación (observaciones/AAAA/MM/DD/...)
+    a blobs: guarda cada archivo en el storage deduplicado, actualiza las filas
+    que lo usan y borra el archivo anterior. Idempotente.
+
+    Returns:
+        dict: archivos migrados y faltantes (la fila apunta a un archivo que no existe)
+    """
+    from core.models import ImagenDerivada
+
+    salida = salida or (lambda mensaje: None)
+    resultado = {'migrados': 0, 'faltantes': 0}
+    anteriores = set()
+    for etiqueta in MODELOS_CON_IMAGEN:
+        modelo = apps.get_model(etiqueta)
+        anteriores.update(
+            modelo.objects.exclude(**{f'{CAMPO_IMAGEN}__startswith': f'{CARPETA}/'})
+            .exclude(**{CAMPO_IMAGEN: ''}).exclude(**{f'{CAMPO_IMAGEN}__isnull': True})
+            .values_list(CAMPO_IMAGEN, flat=True).distinct()
+        )
+
+    for indice, anterior in enumerate(sorted(anteriores), start=1):
+        if not default_storage.exists(anterior):
+            resultado['faltantes'] += 1
+            logger.warning('No existe el archivo %s; se deja la fila sin migrar', anterior)
+            continue
+        with transaction.atomic():
+            with default_storage.open(anterior, 'rb') as archivo:
+                nombre = almacenamiento.save(posixpath.basename(anterior), archivo)
+            for etiqueta in MODELOS_CON_IMAGEN:
+                apps.get_model(etiqueta).objects.filter(**{CAMPO_IMAGEN: anterior}).update(**{CAMPO_IMAGEN: nombre})
+            ajustar_referencias(nombre, contar_referencias([nombre])[nombre] - _referencias_de(nombre))
+            if ImagenDerivada.objects.filter(original=nombre).exists():
+                _borrar_derivadas([anterior])
+            else:
+                ImagenDerivada.objects.filter(original=anterior).update(original=nombre)
+        default_storage.delete(anterior)
+        resultado['migrados'] += 1
+        if indice % 100 == 0:
+            salida(f'  {indice} archivos migrados')
+
+    return resultado
+
+
+def _referencias_de(nombre):
+    from core.models import ArchivoAlmacenado
+
+    return ArchivoAlmacenado.objects.filter(nombre=nombre).values_list('referencias', flat=True).first() or 0
@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from core import signals  # noqa: F401
+        from core import almacenamiento, auditoria, contadores, imagenes
+
+        almacenamiento.conectar_senales()
+        auditoria.conectar_senales()
+        contadores.conectar_senales()
+        imagenes.conectar_senales()
@@ -0,0 +1,356 @@
+################
+# AUDITORÍA: Historial de cambios campo a campo de los registros clínicos
+# Descripción: Cada alta, modificación o baja de MODELOS_AUDITADOS genera un
+#              RegistroAuditoria con los campos que cambiaron ({campo:
+#              [antes, después]}), el usuario y el id del request. Los
+#              registros se acumulan en memoria durante la transacción y se
+#              insertan con un solo bulk_create al confirmarla
+#              (transaction.on_commit): si se revierte, no queda rastro de
+#              cambios que no ocurrieron. La tabla es de solo inserción.
+#              Las operaciones masivas (update, bulk_create) no emiten
+#              señales: quien las use llama a registrar_creados() o
+#              registrar_cambio().
+# Uso: GET /app/core/auditoria/<app.Modelo>/<id>/?limite=50&cursor=...
+################
+
+import base64
+import json
+import weakref
+from datetime import datetime
+
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.db import connections, models, router, transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.utils import timezone
+
+from core.logs import request_actual, usuario_request
+
+
+MODELOS_AUDITADOS = [
+    'core.Persona',
+    'pacientes.Paciente',
+    'pacientes.ControlPrenatal',
+    'pacientes.AntecedentesClinico',
+    'registros.Observacion',
+    'registros.Patologia',
+    'registros.Procedimiento',
+    'registros.Medicamento',
+    'registros.Alerta',
+]
+
+TAMANO_LOTE = 500
+LIMITE_POR_DEFECTO = 50
+LIMITE_MAXIMO = 200
+
+CREADO = 'creado'
+MODIFICADO = 'modificado'
+ELIMINADO = 'eliminado'
+
+
+# ====================================================================
+# CAMPOS
+# ====================================================================
+
+_campos_por_modelo = {}
+
+
+def campos_auditados(modelo):
+    """
+    attname de los campos que se comparan (sin la pk ni las fechas
+    automáticas) y, aparte, los de archivo.
+
+    Returns:
+        tuple: (tuple de attname, frozenset de attname de FileField)
+    """
+    campos = _campos_por_modelo.get(modelo)
+    if campos is None:
+        concretos = [
+            campo for campo in modelo._meta.concrete_fields
+            if not campo.primary_key and not getattr(campo, 'auto_now', False)
+            and not getattr(campo, 'auto_now_add', False)
+        ]
+        campos = (
+            tuple(campo.attname for campo in concretos),
+            frozenset(campo.attname for campo in concretos if isinstance(campo, models.FileField)),
+        )
+        _campos_por_modelo[modelo] = campos
+    return campos
+
+
+def _valor(valor):
+    # FieldFile -> nombre del archivo
+    if isinstance(valor, models.fields.files.FieldFile):
+        return valor.name or None
+    return valor
+
+
+def _instantanea(instance):
+    """Copia de los valores cargados (FieldFile se guarda por nombre: se modifica en su lugar)."""
+    valores = instance.__dict__.copy()
+    valores.pop('_auditoria_previo', None)
+    for attname in campos_auditados(type(instance))[1]:
+        if attname in valores:
+            valores[attname] = _valor(valores[attname])
+    return valores
+
+
+def diferencias(modelo, previos, actuales, limitar_a=None):
+    """
+    Returns:
+        dict: attname -> [antes, después] de los campos que cambiaron
+    """
+    cambios = {}
+    for attname in campos_auditados(modelo)[0]:
+        if limitar_a is not None and attname not in limitar_a:
+            continue
+        if attname not in actuales:
+            continue
+        antes, despues = _valor(previos.get(attname)), _valor(actuales[attname])
+        if antes != despues:
+            cambios[attname] = [antes, despues]
+    return cambios
+
+
+# ====================================================================
+# LOTE POR TRANSACCIÓN
+# ====================================================================
+# Cada llamada a agregar() registra su propio on_commit. Si el savepoint en
+# que se registró se revierte, Django descarta ese callback (comportamiento
+# documentado de on_commit); el lote solo guarda una referencia débil a él,
+# así que un callback descartado deja de estar vivo en ese momento (conteo
+# de referencias de CPython). Al confirmar, el primer callback que corre
+# inserta en un solo bulk_create los registros de los callbacks vivos, que
+# son justo los que Django va a ejecutar; los demás ya no hacen nada.
+
+class _Lote:
+    __slots__ = ('alias', 'pendientes', 'volcado')
+
+    def __init__(self, alias):
+        self.alias = alias
+        self.pendientes = []  # (weakref del callback, registros)
+        self.volcado = False
+
+    def vigente(self):
+        """True si el lote es de la transacción en curso y aún no se insertó."""
+        # Al final quedan los de savepoints revertidos: se descartan aquí
+        while self.pendientes and self.pendientes[-1][0]() is None:
+            self.pendientes.pop()
+        return not self.volcado and bool(self.pendientes)
+
+    def volcar(self):
+        from core.models import RegistroAuditoria
+
+        if self.volcado:
+            return
+        self.volcado = True
+        registros = [
+            registro for callback, lote in self.pendientes if callback() is not None for registro in lote
+        ]
+        self.pendientes = []
+        RegistroAuditoria.objects.using(self.alias).bulk_create(registros, batch_size=TAMANO_LOTE)
+
+
+# Conexión -> lote de su transacción en curso (cada hilo tiene sus conexiones)
+_lotes = weakref.WeakKeyDictionary()
+
+
+def agregar(registros, using='default'):
+    """Encola RegistroAuditoria para insertarlos al confirmar la transacción en curso."""
+    from core.models import RegistroAuditoria
+
+    if not registros:
+        return
+    conexion = connections[using]
+    if not conexion.in_atomic_block:
+        RegistroAuditoria.objects.using(using).bulk_create(registros, batch_size=TAMANO_LOTE)
+        return
+
+    lote = _lotes.get(conexion)
+    if lote is None or not lote.vigente():
+        lote = _lotes[conexion] = _Lote(using)
+
+    def confirmar():
+        lote.volcar()
+
+    lote.pendientes.append((weakref.ref(confirmar), list(registros)))
+    transaction.on_commit(confirmar, using=using)
+
+
+def valores_iniciales(modelo, valores):
+    """Cambios de un alta: los campos con valor, como [None, valor]."""
+    return {
+        attname: cambio for attname, cambio in diferencias(modelo, {}, valores).items()
+        if cambio[1] not in (None, '')
+    }
+
+
+def _usuario_de(instance):
+    usuario = usuario_request()
+    if usuario is not None:
+        return usuario
+    return getattr(instance, 'modified_by_id', None) or getattr(instance, 'created_by_id', None)
+
+
+def _request_id():
+    actual = request_actual()
+    return getattr(actual, 'id_request', '') if actual is not None else ''
+
+
+def nuevo_registro(modelo, objeto_id, accion, cambios, usuario_id=None):
+    from core.models import RegistroAuditoria
+
+    return RegistroAuditoria(
+        modelo=modelo._meta.label,
+        objeto_id=objeto_id,
+        accion=accion,
+        cambios=cambios,
+        usuario_id=usuario_id,
+        request_id=_request_id(),
+        ts=timezone.now(),
+    )
+
+
+def registrar_cambio(instance, accion, cambios, using=None):
+    """Registra un cambio hecho sin señales (ej: después de queryset.update())."""
+    if cambios:
+        agregar(
+            [nuevo_registro(type(instance), instance.pk, accion, cambios, _usuario_de(instance))],
+            using or router.db_for_write(type(instance)),
+        )
+
+
+def registrar_creados(objetos, using=None):
+    """Registra como creados objetos insertados con bulk_create (con pk asignada)."""
+    objetos = [objeto for objeto in objetos if objeto.pk is not None]
+    if not objetos:
+        return
+    modelo = type(objetos[0])
+    agregar([
+        nuevo_registro(modelo, objeto.pk, CREADO, valores_iniciales(modelo, objeto.__dict__), _usuario_de(objeto))
+        for objeto in objetos
+    ], using or router.db_for_write(modelo))
+    for objeto in objetos:
+        objeto._auditoria_previo = _instantanea(objeto)
+
+
+# ====================================================================
+# SEÑALES
+# ====================================================================
+# post_init guarda los valores con que se cargó la fila (una copia del
+# __dict__, sin consultas); post_save compara y post_delete guarda el
+# último estado completo.
+
+def _al_iniciar(sender, instance, **kwargs):
+    instance._auditoria_previo = _instantanea(instance)
+
+
+def _antes_de_guardar(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding:
+        return
+    previo = instance.__dict__.get('_auditoria_previo')
+    if previo is None:
+        previo = instance._auditoria_previo = {}
+    # Campos diferidos al cargar y asignados después: el valor anterior está en la base
+    faltan = [
+        attname for attname in campos_auditados(sender)[0]
+        if attname not in previo and attname in instance.__dict__
+    ]
+    if faltan:
+        previo.update(sender._base_manager.filter(pk=instance.pk).values(*faltan).first() or {})
+
+
+def _al_guardar(sender, instance, created, raw=False, update_fields=None, using=None, **kwargs):
+    if raw:
+        return
+    if created:
+        cambios = valores_iniciales(sender, instance.__dict__)
+    else:
+        cambios = diferencias(sender, instance.__dict__.get('_auditoria_previo', {}), instance.__dict__, update_fields)
+    if cambios or created:
+        agregar(
+            [nuevo_registro(sender, instance.pk, CREADO if created else MODIFICADO, cambios, _usuario_de(instance))],
+            using,
+        )
+    instance._auditoria_previo = _instantanea(instance)
+
+
+def _al_borrar(sender, instance, using=None, **kwargs):
+    ultimo = diferencias(sender, {}, instance.__dict__)
+    cambios = {attname: [valores[1], None] for attname, valores in ultimo.items()}
+    agregar([nuevo_registro(sender, instance.pk, ELIMINADO, cambios, _usuario_de(instance))], using)
+
+
+def conectar_senales():
+    """Audita los MODELOS_AUDITADOS (CoreConfig.ready)."""
+    for etiqueta in MODELOS_AUDITADOS:
+        modelo = apps.get_model(etiqueta)
+        post_init.connect(_al_iniciar, sender=modelo, dispatch_uid=f'auditoria_init_{etiqueta}')
+        pre_save.connect(_antes_de_guardar, sender=modelo, dispatch_uid=f'auditoria_pre_{etiqueta}')
+        post_save.connect(_al_guardar, sender=modelo, dispatch_uid=f'auditoria_save_{etiqueta}')
+        post_delete.connect(_al_borrar, sender=modelo, dispatch_uid=f'auditoria_delete_{etiqueta}')
+
+
+# ====================================================================
+# HISTORIAL
+# ====================================================================
+
+def codificar_cursor(registro):
+    return base64.urlsafe_b64encode(json.dumps([registro.ts.isoformat(), registro.pk]).encode()).decode()
+
+
+def decodificar_cursor(cursor):
+    """
+    Returns:
+        tuple: (datetime, pk) o None si el cursor es inválido
+    """
+    try:
+        momento, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(momento), int(pk)
+    except (ValueError, TypeError):
+        return None
+
+
+def historial(etiqueta, objeto_id, cursor=None, limite=LIMITE_POR_DEFECTO):
+    """
+    Cambios de un registro, del más reciente al más antiguo. Usa el índice
+    (modelo, objeto_id, ts): una consulta por página y una para los nombres
+    de los usuarios.
+
+    Args:
+        etiqueta (str): 'app.Modelo' de MODELOS_AUDITADOS
+        objeto_id (int): pk del registro
+        cursor (str): cursor opaco retornado por una llamada anterior
+        limite (int): registros por página
+
+    Returns:
+        tuple: (registros: list[dict], siguiente_cursor: str | None)
+    """
+    from core.models import RegistroAuditoria
+
+    filas = RegistroAuditoria.objects.filter(modelo=etiqueta, objeto_id=objeto_id)
+    if cursor:
+        posicion = decodificar_cursor(cursor)
+        if posicion is None:
+            raise ValueError('Cursor inválido')
+        momento, pk = posicion
+        filas = filas.filter(Q(ts__lt=momento) | Q(ts=momento, pk__lt=pk))
+    filas = list(filas.order_by('-ts', '-pk')[:limite + 1])
+
+    siguiente = codificar_cursor(filas[limite - 1]) if len(filas) > limite else None
+    filas = filas[:limite]
+    usuarios = User.objects.in_bulk({fila.usuario_id for fila in filas if fila.usuario_id})
+    return [
+        {
+            'id': fila.pk,
+            'ts': fila.ts.isoformat(),
+            'accion': fila.accion,
+            'usuario_id': fila.usuario_id,
+            'usuario': usuarios[fila.usuario_id].get_full_name() or usuarios[fila.usuario_id].username
+            if fila.usuario_id in usuarios else None,
+            'request_id': fila.request_id,
+            'cambios': fila.cambios,
+        }
+        for fila in filas
+    ], siguiente
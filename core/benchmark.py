@@ -0,0 +1,297 @@
+################
+# BENCHMARK: Escenarios cronometrados sobre los caminos críticos
+# Descripción: Cada escenario (registrado con @escenario) se ejecuta varias
+#              veces contra la base configurada (idealmente cargada con
+#              generar_datos_sinteticos). Se mide el tiempo de pared y las
+#              consultas SQL de cada repetición (PerfilRequest) y el
+#              resultado se guarda como JSON para compararlo con una
+#              corrida anterior y detectar regresiones.
+# Uso: python manage.py benchmark --salida resultados.json [--comparar anterior.json]
+################
+
+import json
+import os
+import platform
+import subprocess
+import time
+from contextlib import ExitStack
+
+import numpy as np
+from django.conf import settings
+from django.core.signals import request_finished, request_started
+from django.db import connections, transaction
+from django.test import Client
+from django.utils import timezone
+
+from core.perfil_consultas import PerfilRequest
+
+
+REPETICIONES = 20
+CALENTAMIENTO = 2
+SEMILLA = 7
+# Una corrida es regresión si su mediana supera en este factor a la anterior
+FACTOR_REGRESION = 1.2
+FILAS_IMPORTACION = 1000
+
+ESCENARIOS = {}
+
+
+def escenario(nombre):
+    """Registra una función `f(contexto)` que ejecuta una repetición del escenario."""
+    def registrar(funcion):
+        ESCENARIOS[nombre] = funcion
+        return funcion
+    return registrar
+
+
+class ContextoBenchmark:
+    """
+    Datos compartidos por los escenarios: una muestra de pacientes y
+    términos de búsqueda, el usuario y un cliente HTTP autenticado.
+    """
+
+    def __init__(self, usuario, semilla=SEMILLA):
+        from core.models import Persona
+        from pacientes.models import Paciente
+
+        self.usuario = usuario
+        self.rng = np.random.default_rng(semilla)
+        self.pacientes = np.array(Paciente.objects.values_list('pk', flat=True), dtype=np.int64)
+        muestra = Persona.objects.values_list('apellido', 'rut_numero')[:500]
+        self.terminos = [apellido.split()[0] for apellido, _ in muestra if apellido]
+        self.terminos += [str(numero) for _, numero in muestra if numero][:100]
+        self.cliente = Client()
+        self.cliente.force_login(usuario)
+        self._importaciones = 0
+
+    def paciente(self):
+        return int(self.rng.choice(self.pacientes))
+
+    def termino(self):
+        return self.terminos[self.rng.integers(len(self.terminos))]
+
+    def get(self, ruta, **parametros):
+        respuesta = self.cliente.get(ruta, parametros)
+        if respuesta.status_code != 200:
+            raise RuntimeError(f'{ruta} respondió {respuesta.status_code}')
+        return respuesta
+
+
+# ====================================================================
+# ESCENARIOS
+# ====================================================================
+
+@escenario('busqueda_personas')
+def _busqueda_personas(contexto):
+    from core.busqueda import buscar_personas
+
+    buscar_personas(contexto.termino())
+
+
+@escenario('linea_tiempo')
+def _linea_tiempo(contexto):
+    from registros.linea_tiempo import linea_tiempo_paciente
+
+    linea_tiempo_paciente(contexto.paciente())
+
+
+@escenario('contadores_dashboard')
+def _contadores_dashboard(contexto):
+    from core.contadores import leer_contadores
+
+    leer_contadores()
+
+
+@escenario('conexion_por_request')
+def _conexion_por_request(contexto):
+    """
+    Ciclo de conexión de un request: abrirla (o tomarla del pool), una
+    consulta y cerrarla (o devolverla) al terminar. El cliente de pruebas
+    desactiva ese cierre, así que los escenarios api_* no lo incluyen.
+    Comparar DB_POOL=0 contra el pool con --comparar.
+    """
+    from core.models import Persona
+
+    request_started.send(sender=ContextoBenchmark)
+    Persona.objects.filter(pk=0).exists()
+    request_finished.send(sender=ContextoBenchmark)
+
+
+@escenario('api_pacientes')
+def _api_pacientes(contexto):
+    contexto.get('/api/pacientes/')
+
+
+@escenario('api_controles')
+def _api_controles(contexto):
+    contexto.get('/api/controles/', paciente_id=contexto.paciente())
+
+
+@escenario('api_medicamentos')
+def _api_medicamentos(contexto):
+    contexto.get('/api/medicamentos/')
+
+
+@escenario('api_tendencias')
+def _api_tendencias(contexto):
+    contexto.get(f'/api/pacientes/{contexto.paciente()}/tendencias/')
+
+
+class _Deshacer(Exception):
+    pass
+
+
+@escenario('importacion_personas')
+def _importacion_personas(contexto):
+    """Importa FILAS_IMPORTACION personas con ficha y deshace la transacción."""
+    from core.importacion import ImportadorPersonas
+    from core.sinteticos import RUT_HASTA, ruts_sinteticos
+
+    # RUT fuera del rango sintético y distintos en cada repetición
+    contexto._importaciones += 1
+    desde = RUT_HASTA + contexto._importaciones * FILAS_IMPORTACION * 10
+    numeros, verificadores = ruts_sinteticos(
+        FILAS_IMPORTACION, desde, desde + FILAS_IMPORTACION * 10, contexto.rng
+    )
+    filas = [
+        (linea, {
+            'rut': f'{numero}-{verificador}', 'nombre': 'Carla', 'apellido': 'Benchmark Rojas',
+            'edad': '29', 'direccion': '', 'contacto': '+56912345678',
+            'estado_civil': 'soltera', 'prevision': 'fonasa', 'numero_ficha': '',
+        })
+        for linea, (numero, verificador) in enumerate(zip(numeros.tolist(), verificadores.tolist()), start=2)
+    ]
+    try:
+        with transaction.atomic():
+            ImportadorPersonas(contexto.usuario, crear_pacientes=True).importar(filas)
+            raise _Deshacer
+    except _Deshacer:
+        pass
+
+
+# ====================================================================
+# MEDICIÓN
+# ====================================================================
+
+def medir(funcion, contexto, repeticiones=REPETICIONES, calentamiento=CALENTAMIENTO):
+    """
+    Returns:
+        dict: tiempos en ms (min, mediana, p95, max) y consultas por repetición
+    """
+    for _ in range(calentamiento):
+        funcion(contexto)
+
+    tiempos = []
+    consultas = []
+    for _ in range(repeticiones):
+        perfil = PerfilRequest()
+        with ExitStack() as pila:
+            for conexion in connections.all():
+                pila.enter_context(conexion.execute_wrapper(perfil))
+            inicio = time.perf_counter()
+            funcion(contexto)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        consultas.append(perfil.consultas)
+
+    tiempos = np.array(tiempos)
+    return {
+        'repeticiones': repeticiones,
+        'min_ms': round(float(tiempos.min()), 2),
+        'mediana_ms': round(float(np.median(tiempos)), 2),
+        'p95_ms': round(float(np.percentile(tiempos, 95)), 2),
+        'max_ms': round(float(tiempos.max()), 2),
+        'consultas': int(np.median(consultas)),
+    }
+
+
+def version_codigo():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, timeout=5, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def volumenes_actuales():
+    from core.models import Persona
+    from pacientes.models import ControlPrenatal, Paciente
+    from registros.models import Medicamento, Observacion, Patologia, Procedimiento
+
+    modelos = {
+        'personas': Persona, 'pacientes': Paciente, 'controles': ControlPrenatal,
+        'observaciones': Observacion, 'patologias': Patologia,
+        'procedimientos': Procedimiento, 'medicamentos': Medicamento,
+    }
+    return {tabla: modelo.objects.count() for tabla, modelo in modelos.items()}
+
+
+def ejecutar(usuario, nombres=None, repeticiones=REPETICIONES, salida=None):
+    """
+    Ejecuta los escenarios `nombres` (por defecto todos).
+
+    Returns:
+        dict: resultado serializable a JSON
+    """
+    salida = salida or (lambda mensaje: None)
+    nombres = nombres or list(ESCENARIOS)
+    desconocidos = set(nombres) - set(ESCENARIOS)
+    if desconocidos:
+        raise ValueError(f'Escenarios desconocidos: {", ".join(sorted(desconocidos))}')
+
+    contexto = ContextoBenchmark(usuario)
+    if not len(contexto.pacientes):
+        raise ValueError('No hay pacientes: cargue datos con generar_datos_sinteticos')
+
+    escenarios = {}
+    for nombre in nombres:
+        escenarios[nombre] = medir(ESCENARIOS[nombre], contexto, repeticiones)
+        salida(f'  {nombre}: mediana {escenarios[nombre]["mediana_ms"]} ms, '
+               f'{escenarios[nombre]["consultas"]} consultas')
+
+    return {
+        'fecha': timezone.now().isoformat(),
+        'version': version_codigo(),
+        'base_datos': connections['default'].vendor,
+        'python': platform.python_version(),
+        'proceso': os.getpid(),
+        'volumenes': volumenes_actuales(),
+        'escenarios': escenarios,
+    }
+
+
+def comparar(actual, anterior, factor=FACTOR_REGRESION):
+    """
+    Escenarios cuya mediana (o número de consultas) empeoró respecto de `anterior`.
+
+    Returns:
+        list: dicts con escenario, mediana anterior/actual, razón y consultas
+    """
+    regresiones = []
+    for nombre, medicion in actual['escenarios'].items():
+        previa = anterior.get('escenarios', {}).get(nombre)
+        if not previa:
+            continue
+        # Con mediana anterior 0 (escenario vacío o bajo la resolución) no hay razón que comparar
+        razon = medicion['mediana_ms'] / previa['mediana_ms'] if previa['mediana_ms'] else None
+        if (razon is not None and razon > factor) or medicion['consultas'] > previa['consultas']:
+            regresiones.append({
+                'escenario': nombre,
+                'mediana_anterior_ms': previa['mediana_ms'],
+                'mediana_actual_ms': medicion['mediana_ms'],
+                'razon': round(razon, 2) if razon is not None else None,
+                'consultas_anterior': previa['consultas'],
+                'consultas_actual': medicion['consultas'],
+            })
+    return regresiones
+
+
+def guardar(resultado, ruta):
+    with open(ruta, 'w', encoding='utf-8') as archivo:
+        json.dump(resultado, archivo, ensure_ascii=False, indent=2)
+
+
+def cargar(ruta):
+    with open(ruta, encoding='utf-8') as archivo:
+        return json.load(archivo)
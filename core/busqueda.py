@@ -0,0 +1,480 @@
+################
+# BÚSQUEDA: Personas
+# Descripción: Motor de búsqueda de personas con tokens normalizados
+# Backends intercambiables vía settings.BUSQUEDA_PERSONAS['BACKEND']
+# Los trigramas presentes en más de MAXIMO_POR_TRIGRAMA personas no se usan
+# en la búsqueda difusa: así el costo no crece con el tamaño del registro.
+################
+
+import bisect
+import threading
+import unicodedata
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Case, Count, IntegerField, Q, Sum, Value, When
+from django.utils.module_loading import import_string
+
+from utilidades.validadores import normalizar_rut
+
+
+# Pesos de ranking
+PESO_RUT_EXACTO = 100
+PESO_EXACTO = 10
+PESO_PREFIJO = 5
+PESO_TRIGRAMA = 1
+
+# Fracción mínima de trigramas coincidentes para aceptar un resultado difuso
+UMBRAL_TRIGRAMAS = 0.5
+
+# Trigramas más comunes que esto no discriminan: se omiten de la búsqueda
+MAXIMO_POR_TRIGRAMA = 2000
+# Segundos que se reutiliza la frecuencia calculada de un trigrama
+TIEMPO_FRECUENCIAS = 3600
+
+LIMITE_POR_DEFECTO = 50
+
+
+# ====================================================================
+# NORMALIZACIÓN
+# ====================================================================
+
+def plegar_texto(texto):
+    """
+    Quita tildes, pasa a minúsculas y deja solo letras, dígitos y espacios.
+
+    Ejemplos:
+        >>> plegar_texto('María José Núñez')
+        'maria jose nunez'
+    """
+    if not texto:
+        return ''
+
+    descompuesto = unicodedata.normalize('NFKD', texto)
+    sin_tildes = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    limpio = ''.join(c if c.isalnum() else ' ' for c in sin_tildes.lower())
+    return ' '.join(limpio.split())
+
+
+def solo_digitos(texto):
+    """Retorna solo los dígitos de un texto."""
+    return ''.join(c for c in (texto or '') if c.isdigit())
+
+
+def trigramas(palabra):
+    """
+    Trigramas de una palabra con relleno (estilo pg_trgm).
+
+    Ejemplos:
+        >>> sorted(trigramas('ana'))
+        ['  a', ' an', 'ana', 'na ']
+    """
+    relleno = f'  {palabra} '
+    return {relleno[i:i + 3] for i in range(len(relleno) - 2)}
+
+
+def es_termino_numerico(termino):
+    """True si el término parece RUT o teléfono (dígitos, con K final opcional)."""
+    return bool(termino) and (termino.isdigit() or (termino[:-1].isdigit() and termino[-1] == 'k'))
+
+
+def tokens_persona(persona):
+    """
+    Genera los tokens de búsqueda de una Persona.
+
+    Returns:
+        set: tuplas (tipo, token)
+    """
+    tokens = set()
+
+    for palabra in plegar_texto(f'{persona.nombre} {persona.apellido}').split():
+        tokens.add(('nombre', palabra[:64]))
+        for tri in trigramas(palabra):
+            tokens.add(('trigrama', tri))
+
+    rut = normalizar_rut(persona.rut or '').lower()
+    if rut:
+        tokens.add(('rut', rut))
+
+    digitos = solo_digitos(persona.contacto)
+    if digitos:
+        tokens.add(('telefono', digitos))
+        # Sin código de país, tal como se suele digitar
+        if len(digitos) > 9:
+            tokens.add(('telefono', digitos[-9:]))
+
+    return tokens
+
+
+def documento_persona(persona):
+    """Documento de texto plegado para índices FULLTEXT."""
+    partes = [
+        plegar_texto(f'{persona.nombre} {persona.apellido}'),
+        normalizar_rut(persona.rut or '').lower(),
+        solo_digitos(persona.contacto),
+    ]
+    return ' '.join(p for p in partes if p)
+
+
+def terminos_consulta(consulta):
+    """
+    Divide la consulta en términos plegados.
+    Un RUT con puntos y guion ('12.345.678-5') se mantiene como un solo término.
+    """
+    terminos = []
+    for palabra in (consulta or '').split():
+        compacto = normalizar_rut(palabra).lower()
+        if es_termino_numerico(compacto):
+            terminos.append(compacto[:64])
+        else:
+            terminos.extend(t[:64] for t in plegar_texto(palabra).split())
+    return terminos
+
+
+def trigramas_selectivos(frecuencias):
+    """
+    Trigramas presentes en a lo más MAXIMO_POR_TRIGRAMA personas.
+
+    Args:
+        frecuencias (dict): trigrama -> personas que lo tienen
+    """
+    return {tri for tri, personas in frecuencias.items() if personas <= MAXIMO_POR_TRIGRAMA}
+
+
+# ====================================================================
+# BACKENDS
+# ====================================================================
+
+class BackendBusqueda:
+    """
+    Interfaz de backend de búsqueda.
+    Cada backend mantiene su propio almacenamiento del índice.
+    """
+
+    def indexar(self, persona):
+        raise NotImplementedError
+
+    def indexar_lote(self, personas):
+        for persona in personas:
+            self.indexar(persona)
+
+    def eliminar(self, persona_id):
+        raise NotImplementedError
+
+    def buscar(self, consulta, limite=LIMITE_POR_DEFECTO, estado=None):
+        """
+        Retorna lista de IDs de Persona ordenados por relevancia; con
+        `estado`, solo personas en ese estado (antes de aplicar el límite).
+        """
+        raise NotImplementedError
+
+
+class BackendTokens(BackendBusqueda):
+    """
+    Backend por defecto: tabla PersonaToken con índice (tipo, token).
+    Funciona en SQLite y MySQL; el ranking se calcula en una sola consulta.
+    """
+
+    def indexar(self, persona):
+        self.indexar_lote([persona])
+
+    def indexar_lote(self, personas):
+        from core.models import PersonaToken
+
+        personas = list(personas)
+        if not personas:
+            return
+
+        filas = [
+            (persona.pk, tipo, token)
+            for persona in personas
+            for tipo, token in tokens_persona(persona)
+        ]
+        # INSERT directo con executemany: ~30 tokens por persona, instanciar
+        # cada PersonaToken domina el costo en cargas masivas
+        tabla = connection.ops.quote_name(PersonaToken._meta.db_table)
+        sql = f'INSERT INTO {tabla} (persona_id, tipo, token) VALUES (%s, %s, %s)'
+        with transaction.atomic():
+            PersonaToken.objects.filter(persona_id__in=[p.pk for p in personas]).delete()
+            with connection.cursor() as cursor:
+                cursor.executemany(sql, filas)
+
+    def eliminar(self, persona_id):
+        from core.models import PersonaToken
+        PersonaToken.objects.filter(persona_id=persona_id).delete()
+
+    def buscar(self, consulta, limite=LIMITE_POR_DEFECTO, estado=None):
+        from core.models import PersonaToken
+
+        terminos = terminos_consulta(consulta)
+        if not terminos:
+            return []
+
+        filtro = Q()
+        exacto = Q()
+        prefijo = Q()
+        rut_exacto = Q()
+        tris = set()
+
+        for termino in terminos:
+            if es_termino_numerico(termino):
+                q_prefijo = Q(tipo__in=['rut', 'telefono'], token__startswith=termino)
+                rut_exacto |= Q(tipo='rut', token=termino)
+            else:
+                q_prefijo = Q(tipo='nombre', token__startswith=termino)
+                exacto |= Q(tipo='nombre', token=termino)
+                tris |= trigramas(termino)
+            prefijo |= q_prefijo
+            filtro |= q_prefijo
+
+        tris = trigramas_selectivos(self._frecuencias(tris))
+        if tris:
+            filtro |= Q(tipo='trigrama', token__in=tris)
+
+        ramas = []
+        if rut_exacto:
+            ramas.append(When(rut_exacto, then=Value(PESO_RUT_EXACTO)))
+        if exacto:
+            ramas.append(When(exacto, then=Value(PESO_EXACTO)))
+        ramas.append(When(prefijo, then=Value(PESO_PREFIJO)))
+
+        tokens = PersonaToken.objects.filter(filtro)
+        if estado is not None:
+            tokens = tokens.filter(persona__estado=estado)
+        resultados = (
+            tokens
+            .values('persona_id')
+            .annotate(
+                puntaje=Sum(Case(*ramas, default=Value(PESO_TRIGRAMA), output_field=IntegerField())),
+                coincidencias_trigrama=Count('id', filter=Q(tipo='trigrama')),
+                coincidencias_directas=Count('id', filter=prefijo),
+            )
+            .filter(
+                Q(coincidencias_directas__gt=0)
+                | Q(coincidencias_trigrama__gte=max(1, int(len(tris) * UMBRAL_TRIGRAMAS)))
+            )
+            .order_by('-puntaje', 'persona_id')
+            .values_list('persona_id', flat=True)[:limite]
+        )
+        return list(resultados)
+
+    @staticmethod
+    def _frecuencias(tris):
+        """
+        Personas por trigrama, desde la caché. Los que falten se cuentan
+        leyendo a lo más MAXIMO_POR_TRIGRAMA + 1 entradas del índice.
+        """
+        from core.models import PersonaToken
+
+        claves = {tri: f'busqueda:trigrama:{tri.replace(" ", "_")}' for tri in tris}
+        guardadas = cache.get_many(claves.values())
+        frecuencias = {tri: guardadas[clave] for tri, clave in claves.items() if clave in guardadas}
+        nuevas = {
+            tri: PersonaToken.objects.filter(tipo='trigrama', token=tri)[:MAXIMO_POR_TRIGRAMA + 1].count()
+            for tri in tris - frecuencias.keys()
+        }
+        if nuevas:
+            cache.set_many({claves[tri]: personas for tri, personas in nuevas.items()}, TIEMPO_FRECUENCIAS)
+        return {**frecuencias, **nuevas}
+
+
+class BackendMySQLFulltext(BackendBusqueda):
+    """
+    Backend para producción (MySQL): documento plegado en PersonaIndice
+    con índice FULLTEXT (parser ngram). Crear el índice con:
+        python manage.py reindexar_personas --crear-fulltext
+    """
+
+    def indexar(self, persona):
+        from core.models import PersonaIndice
+        PersonaIndice.objects.update_or_create(
+            persona_id=persona.pk,
+            defaults={'documento': documento_persona(persona)}
+        )
+
+    def indexar_lote(self, personas):
+        from core.models import PersonaIndice
+
+        filas = [
+            PersonaIndice(persona_id=persona.pk, documento=documento_persona(persona))
+            for persona in personas
+        ]
+        PersonaIndice.objects.bulk_create(
+            filas,
+            batch_size=1000,
+            update_conflicts=True,
+            update_fields=['documento'],
+            unique_fields=['persona'],
+        )
+
+    def eliminar(self, persona_id):
+        from core.models import PersonaIndice
+        PersonaIndice.objects.filter(persona_id=persona_id).delete()
+
+    def buscar(self, consulta, limite=LIMITE_POR_DEFECTO, estado=None):
+        from core.models import Persona, PersonaIndice
+
+        terminos = terminos_consulta(consulta)
+        if not terminos:
+            return []
+
+        booleana = ' '.join(f'+{termino}*' for termino in terminos)
+        tabla = PersonaIndice._meta.db_table
+        parametros = [booleana, booleana]
+        union = condicion_estado = ''
+        if estado is not None:
+            personas = Persona._meta.db_table
+            union = f'JOIN {personas} ON {personas}.id = {tabla}.persona_id '
+            condicion_estado = f'AND {personas}.estado = %s '
+            parametros.append(estado)
+        sql = (
+            f'SELECT persona_id, MATCH(documento) AGAINST (%s IN BOOLEAN MODE) AS puntaje '
+            f'FROM {tabla} {union}WHERE MATCH(documento) AGAINST (%s IN BOOLEAN MODE) '
+            f'{condicion_estado}ORDER BY puntaje DESC, persona_id LIMIT %s'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [*parametros, limite])
+            return [fila[0] for fila in cursor.fetchall()]
+
+    @staticmethod
+    def crear_indice_fulltext():
+        """Crea el índice FULLTEXT (ngram) sobre PersonaIndice.documento."""
+        from core.models import PersonaIndice
+
+        tabla = PersonaIndice._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'ALTER TABLE {tabla} ADD FULLTEXT INDEX {tabla}_documento_ft (documento) WITH PARSER ngram'
+            )
+
+
+class BackendMemoria(BackendBusqueda):
+    """
+    Índice invertido en memoria del proceso (tests y desarrollo).
+    Mismo ranking que BackendTokens, sin tocar la base de datos.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tokens_por_persona = {}
+        self._indice = defaultdict(lambda: defaultdict(set))
+        self._ordenados = {}
+        self._estados = {}
+
+    def indexar(self, persona):
+        with self._lock:
+            self._quitar(persona.pk)
+            tokens = tokens_persona(persona)
+            self._tokens_por_persona[persona.pk] = tokens
+            self._estados[persona.pk] = getattr(persona, 'estado', None)
+            for tipo, token in tokens:
+                self._indice[tipo][token].add(persona.pk)
+                self._ordenados.pop(tipo, None)
+
+    def eliminar(self, persona_id):
+        with self._lock:
+            self._quitar(persona_id)
+
+    def _quitar(self, persona_id):
+        self._estados.pop(persona_id, None)
+        for tipo, token in self._tokens_por_persona.pop(persona_id, ()):
+            ids = self._indice[tipo][token]
+            ids.discard(persona_id)
+            if not ids:
+                del self._indice[tipo][token]
+            self._ordenados.pop(tipo, None)
+
+    def _con_prefijo(self, tipo, prefijo):
+        ordenados = self._ordenados.get(tipo)
+        if ordenados is None:
+            ordenados = self._ordenados[tipo] = sorted(self._indice[tipo])
+        inicio = bisect.bisect_left(ordenados, prefijo)
+        for token in ordenados[inicio:]:
+            if not token.startswith(prefijo):
+                break
+            yield token
+
+    def buscar(self, consulta, limite=LIMITE_POR_DEFECTO, estado=None):
+        terminos = terminos_consulta(consulta)
+        if not terminos:
+            return []
+
+        puntajes = defaultdict(int)
+        directas = defaultdict(int)
+        tri_coincidencias = defaultdict(int)
+        tris = set()
+
+        with self._lock:
+            for termino in terminos:
+                tipos = ['rut', 'telefono'] if es_termino_numerico(termino) else ['nombre']
+                if 'nombre' in tipos:
+                    tris |= trigramas(termino)
+                for tipo in tipos:
+                    for token in self._con_prefijo(tipo, termino):
+                        if tipo == 'rut' and token == termino:
+                            peso = PESO_RUT_EXACTO
+                        elif tipo == 'nombre' and token == termino:
+                            peso = PESO_EXACTO
+                        else:
+                            peso = PESO_PREFIJO
+                        for persona_id in self._indice[tipo][token]:
+                            puntajes[persona_id] += peso
+                            directas[persona_id] += 1
+
+            tris = trigramas_selectivos({tri: len(self._indice['trigrama'].get(tri, ())) for tri in tris})
+            for tri in tris:
+                for persona_id in self._indice['trigrama'].get(tri, ()):
+                    puntajes[persona_id] += PESO_TRIGRAMA
+                    tri_coincidencias[persona_id] += 1
+
+        minimo = max(1, int(len(tris) * UMBRAL_TRIGRAMAS))
+        candidatos = [
+            persona_id for persona_id in puntajes
+            if (directas[persona_id] > 0 or tri_coincidencias[persona_id] >= minimo)
+            and (estado is None or self._estados.get(persona_id) == estado)
+        ]
+        candidatos.sort(key=lambda persona_id: (-puntajes[persona_id], persona_id))
+        return candidatos[:limite]
+
+
+# ====================================================================
+# API PÚBLICA
+# ====================================================================
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """Retorna la instancia (única por proceso) del backend configurado."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                config = getattr(settings, 'BUSQUEDA_PERSONAS', {})
+                ruta = config.get('BACKEND', 'core.busqueda.BackendTokens')
+                _backend = import_string(ruta)()
+    return _backend
+
+
+def reiniciar_backend():
+    """Descarta el backend actual (útil en tests con override_settings)."""
+    global _backend
+    with _backend_lock:
+        _backend = None
+
+
+def buscar_personas(consulta, limite=LIMITE_POR_DEFECTO, estado=None):
+    """
+    Busca personas por nombre, apellido, RUT o teléfono.
+
+    Args:
+        estado (str): solo personas en este estado ('activo'); el filtro se
+                      aplica antes del límite
+
+    Returns:
+        list: IDs de Persona ordenados por relevancia
+    """
+    return get_backend().buscar(consulta, limite=limite, estado=estado)
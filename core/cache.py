@@ -0,0 +1,399 @@
+################
+# CACHÉ: Caché compartida de dos niveles
+# Descripción: Backend de caché para settings.CACHES. El nivel compartido es
+#              Redis (todos los workers ven los mismos datos); delante de él
+#              cada proceso guarda una copia cercana de vida corta
+#              (TIEMPO_LOCAL) para no ir a Redis en cada lectura repetida.
+#              Sin LOCATION, o mientras Redis no responde, el proceso
+#              trabaja solo con su caché local.
+# Uso: obtener_o_calcular(clave, calcular, timeout) calcula un valor faltante
+#      una sola vez aunque lo pidan muchos requests a la vez
+#      (aobtener_o_calcular en vistas async).
+################
+
+import asyncio
+import logging
+import os
+import threading
+import time
+import weakref
+from importlib import import_module
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.redis import RedisCache
+
+
+logger = logging.getLogger(__name__)
+
+TIEMPO_LOCAL = 5
+MAX_ENTRADAS_LOCAL = 1000
+# Segundos sin intentar Redis después de un error de conexión
+REINTENTO_COMPARTIDA = 30
+# Borrados que deben llegar a Redis (ver borrar_confirmado)
+INTENTOS_BORRADO = 3
+PAUSA_BORRADO = 0.1
+# Espera máxima por un valor que otro proceso está calculando
+ESPERA_CALCULO = 10
+INTERVALO_ESPERA = 0.05
+
+_FALTA = object()
+
+
+def _clave_tal_cual(clave, prefijo, version):
+    # Las claves llegan ya armadas por CacheDosNiveles
+    return clave
+
+
+# ====================================================================
+# MÉTRICAS (por proceso)
+# ====================================================================
+
+class MetricasCache:
+    """Contadores de aciertos y fallos de este proceso."""
+
+    NOMBRES = (
+        'aciertos_local', 'aciertos_compartida', 'fallos',
+        'calculos', 'esperas', 'esperas_vencidas', 'errores_compartida',
+    )
+
+    def __init__(self):
+        self._candado = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self):
+        with self._candado:
+            self._valores = dict.fromkeys(self.NOMBRES, 0)
+
+    def sumar(self, nombre, cantidad=1):
+        with self._candado:
+            self._valores[nombre] += cantidad
+
+    def como_dict(self):
+        with self._candado:
+            valores = dict(self._valores)
+        lecturas = valores['aciertos_local'] + valores['aciertos_compartida'] + valores['fallos']
+        aciertos = valores['aciertos_local'] + valores['aciertos_compartida']
+        valores['tasa_aciertos'] = round(aciertos / lecturas, 4) if lecturas else None
+        return valores
+
+
+metricas = MetricasCache()
+
+
+# ====================================================================
+# BACKEND
+# ====================================================================
+
+class CacheDosNiveles(BaseCache):
+    """
+    Caché local del proceso delante de una caché Redis compartida.
+
+    LOCATION: URL de Redis (ej: redis://127.0.0.1:6379/1); vacía = solo local.
+    OPTIONS:
+        TIEMPO_LOCAL (int): segundos máximos de una copia local; acota cuánto
+                            tarda un worker en ver un cambio hecho por otro
+                            (0 = sin copia local mientras haya Redis)
+        MAX_ENTRADAS_LOCAL (int): entradas de la caché local
+        REINTENTO (int): segundos sin usar Redis tras un error de conexión
+        REDIS (dict): OPTIONS para django.core.cache.backends.redis.RedisCache
+    """
+
+    def __init__(self, server, params):
+        super().__init__(params)
+        opciones = params.get('OPTIONS', {})
+        self.tiempo_local = opciones.get('TIEMPO_LOCAL', TIEMPO_LOCAL)
+        self.reintento = opciones.get('REINTENTO', REINTENTO_COMPARTIDA)
+
+        self._local = LocMemCache(f'dos-niveles-{id(self)}', {
+            'TIMEOUT': self.default_timeout,
+            'OPTIONS': {'MAX_ENTRIES': opciones.get('MAX_ENTRADAS_LOCAL', MAX_ENTRADAS_LOCAL)},
+            'KEY_FUNCTION': _clave_tal_cual,
+        })
+        self._compartida = None
+        self._errores = (OSError,)
+        if server:
+            self._errores = (OSError, import_module('redis').RedisError)
+            self._compartida = RedisCache(server, {
+                'TIMEOUT': self.default_timeout,
+                'OPTIONS': opciones.get('REDIS', {}),
+                'KEY_FUNCTION': _clave_tal_cual,
+            })
+        self._caida_hasta = 0
+
+    @property
+    def compartida(self):
+        """True si hay nivel compartido configurado y disponible."""
+        return self._compartida is not None and time.monotonic() >= self._caida_hasta
+
+    def _en_compartida(self, operacion, *args, fallo=None):
+        """Ejecuta `operacion` en Redis; si no responde, devuelve `fallo`."""
+        try:
+            return getattr(self._compartida, operacion)(*args)
+        except self._errores as error:
+            self._caida_hasta = time.monotonic() + self.reintento
+            metricas.sumar('errores_compartida')
+            logger.warning(
+                'Caché compartida no disponible (%s); solo caché local por %s s', error, self.reintento
+            )
+            return fallo
+
+    def _segundos(self, timeout):
+        return self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+
+    def _tiempo_local(self, timeout):
+        """Vida de la copia local: la de la clave, acotada por TIEMPO_LOCAL si hay Redis."""
+        timeout = self._segundos(timeout)
+        if self._compartida is None:
+            return timeout
+        if timeout is None:
+            return self.tiempo_local
+        return min(timeout, self.tiempo_local)
+
+    # ----------------------------------------------------------------
+    # Lectura
+    # ----------------------------------------------------------------
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        valor = self._local.get(key, _FALTA)
+        if valor is not _FALTA:
+            metricas.sumar('aciertos_local')
+            return valor
+
+        if self.compartida:
+            valor = self._en_compartida('get', key, _FALTA, fallo=_FALTA)
+            if valor is not _FALTA:
+                metricas.sumar('aciertos_compartida')
+                if self.tiempo_local:
+                    self._local.set(key, valor, self.tiempo_local)
+                return valor
+
+        metricas.sumar('fallos')
+        return default
+
+    def get_many(self, keys, version=None):
+        claves = {self.make_and_validate_key(key, version=version): key for key in keys}
+        encontrados = self._local.get_many(claves)
+        metricas.sumar('aciertos_local', len(encontrados))
+
+        faltan = [clave for clave in claves if clave not in encontrados]
+        if faltan and self.compartida:
+            compartidos = self._en_compartida('get_many', faltan, fallo={})
+            metricas.sumar('aciertos_compartida', len(compartidos))
+            if compartidos and self.tiempo_local:
+                self._local.set_many(compartidos, self.tiempo_local)
+            encontrados.update(compartidos)
+
+        metricas.sumar('fallos', len(claves) - len(encontrados))
+        return {claves[clave]: valor for clave, valor in encontrados.items()}
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        if self._local.has_key(key):
+            return True
+        return bool(self.compartida and self._en_compartida('has_key', key, fallo=False))
+
+    # ----------------------------------------------------------------
+    # Escritura
+    # ----------------------------------------------------------------
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._local.set(key, value, self._tiempo_local(timeout))
+        if self.compartida:
+            self._en_compartida('set', key, value, self._segundos(timeout))
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        datos = {self.make_and_validate_key(key, version=version): value for key, value in data.items()}
+        self._local.set_many(datos, self._tiempo_local(timeout))
+        if datos and self.compartida:
+            self._en_compartida('set_many', datos, self._segundos(timeout))
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        """
+        Con Redis, `add` es atómico entre procesos (SET NX); se decide allá y
+        no se guarda copia local para que la próxima lectura vea al ganador.
+        """
+        key = self.make_and_validate_key(key, version=version)
+        if self._compartida is None:
+            return self._local.add(key, value, timeout)
+        self._local.delete(key)
+        if self.compartida:
+            agregado = self._en_compartida('add', key, value, self._segundos(timeout), fallo=None)
+            if agregado is not None:
+                return agregado
+        return self._local.add(key, value, self._tiempo_local(timeout))
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        tocado = self._local.touch(key, self._tiempo_local(timeout))
+        if self.compartida:
+            tocado = self._en_compartida('touch', key, self._segundos(timeout), fallo=tocado)
+        return tocado
+
+    def incr(self, key, delta=1, version=None):
+        """En Redis (INCRBY, atómico entre procesos); la copia local se descarta."""
+        key = self.make_and_validate_key(key, version=version)
+        if self.compartida:
+            self._local.delete(key)
+            valor = self._en_compartida('incr', key, delta, fallo=_FALTA)
+            if valor is not _FALTA:
+                return valor
+        return self._local.incr(key, delta)
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        borrado = self._local.delete(key)
+        if self.compartida:
+            borrado = self._en_compartida('delete', key, fallo=False) or borrado
+        return borrado
+
+    def borrar_confirmado(self, key, version=None, intentos=INTENTOS_BORRADO):
+        """
+        delete() que no tolera una caída de Redis: lo intenta aunque el
+        nivel compartido figure caído, reintenta y si no lo logra lanza la
+        excepción. Para claves cuya copia en Redis no puede sobrevivir al
+        borrado (sesiones cerradas: volverían a valer al volver Redis).
+        """
+        key = self.make_and_validate_key(key, version=version)
+        self._local.delete(key)
+        if self._compartida is None:
+            return
+        for intento in range(1, intentos + 1):
+            try:
+                self._compartida.delete(key)
+                return
+            except self._errores:
+                metricas.sumar('errores_compartida')
+                if intento == intentos:
+                    self._caida_hasta = time.monotonic() + self.reintento
+                    raise
+                time.sleep(PAUSA_BORRADO)
+
+    def delete_many(self, keys, version=None):
+        claves = [self.make_and_validate_key(key, version=version) for key in keys]
+        self._local.delete_many(claves)
+        if claves and self.compartida:
+            self._en_compartida('delete_many', claves)
+
+    def clear(self):
+        self._local.clear()
+        if self.compartida:
+            self._en_compartida('clear')
+
+
+# ====================================================================
+# CÁLCULO DE UN SOLO VUELO
+# ====================================================================
+
+class _Vuelo:
+    """Candado de una clave en este proceso (referenciable con weakref)."""
+
+    __slots__ = ('candado', '__weakref__')
+
+    def __init__(self):
+        self.candado = threading.Lock()
+
+
+_vuelos = weakref.WeakValueDictionary()
+_candado_vuelos = threading.Lock()
+
+
+def _vuelo(clave):
+    with _candado_vuelos:
+        vuelo = _vuelos.get(clave)
+        if vuelo is None:
+            vuelo = _vuelos[clave] = _Vuelo()
+        return vuelo
+
+
+def obtener_o_calcular(clave, calcular, timeout=DEFAULT_TIMEOUT, cache=None, espera=ESPERA_CALCULO):
+    """
+    Valor de `clave`; si falta lo calcula un solo hilo de un solo proceso
+    y el resto espera ese resultado en vez de repetir el cálculo.
+
+    Dentro del proceso los hilos hacen fila en un candado por clave; entre
+    procesos gana quien logra cache.add('<clave>:calculando'). Si el cálculo
+    ajeno tarda más que `espera`, se calcula igual (nunca se bloquea para siempre).
+
+    Args:
+        calcular (callable): sin argumentos; no debe devolver None
+        cache: backend de caché (por defecto caches['default'])
+
+    Returns:
+        el valor guardado o recién calculado
+    """
+    cache = cache or caches['default']
+    valor = cache.get(clave, _FALTA)
+    if valor is not _FALTA:
+        return valor
+
+    vuelo = _vuelo(clave)
+    with vuelo.candado:
+        valor = cache.get(clave, _FALTA)
+        if valor is not _FALTA:
+            # Otro hilo de este proceso lo calculó mientras esperábamos
+            metricas.sumar('esperas')
+            return valor
+
+        clave_calculo = f'{clave}:calculando'
+        if not cache.add(clave_calculo, os.getpid(), espera):
+            metricas.sumar('esperas')
+            valor = _esperar(cache, clave, espera)
+            if valor is not _FALTA:
+                return valor
+            metricas.sumar('esperas_vencidas')
+
+        try:
+            valor = calcular()
+            metricas.sumar('calculos')
+            cache.set(clave, valor, timeout)
+        finally:
+            cache.delete(clave_calculo)
+        return valor
+
+
+def _esperar(cache, clave, espera):
+    limite = time.monotonic() + espera
+    while time.monotonic() < limite:
+        time.sleep(INTERVALO_ESPERA)
+        valor = cache.get(clave, _FALTA)
+        if valor is not _FALTA:
+            return valor
+    return _FALTA
+
+
+async def aobtener_o_calcular(clave, calcular, timeout=DEFAULT_TIMEOUT, cache=None, espera=ESPERA_CALCULO):
+    """
+    obtener_o_calcular para vistas async: `calcular` es una función async.
+
+    No hay candado por proceso (las corrutinas pueden vivir en distintos
+    event loops); todas compiten por cache.add('<clave>:calculando') y las
+    que pierden esperan con asyncio.sleep sin ocupar un hilo.
+    """
+    cache = cache or caches['default']
+    valor = await cache.aget(clave, _FALTA)
+    if valor is not _FALTA:
+        return valor
+
+    clave_calculo = f'{clave}:calculando'
+    if not await cache.aadd(clave_calculo, os.getpid(), espera):
+        metricas.sumar('esperas')
+        limite = time.monotonic() + espera
+        while time.monotonic() < limite:
+            await asyncio.sleep(INTERVALO_ESPERA)
+            valor = await cache.aget(clave, _FALTA)
+            if valor is not _FALTA:
+                return valor
+        metricas.sumar('esperas_vencidas')
+
+    try:
+        valor = await calcular()
+        metricas.sumar('calculos')
+        await cache.aset(clave, valor, timeout)
+    finally:
+        await cache.adelete(clave_calculo)
+    return valor
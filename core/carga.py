@@ -0,0 +1,194 @@
+################
+# CARGA: Prueba de carga HTTP contra un servidor en ejecución
+# Descripción: Lanza clientes concurrentes (un hilo y una conexión
+#              keep-alive por cliente) que piden las rutas de lectura
+#              críticas durante un tiempo fijo, con una sesión real del
+#              usuario indicado. Mide throughput (requests/s) y latencias
+#              por ruta. Corriendo la misma prueba contra el despliegue WSGI
+#              (gunicorn) y el ASGI (uvicorn) sobre la misma base se
+#              comparan ambos.
+# Uso: python manage.py prueba_carga --url http://127.0.0.1:8000 --etiqueta asgi --comparar wsgi.json
+################
+
+import http.client
+import random
+import threading
+import time
+from importlib import import_module
+from urllib.parse import urlsplit
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.utils import timezone
+
+
+CONCURRENCIA = 50
+DURACION = 30
+CALENTAMIENTO = 2
+TIEMPO_ESPERA = 30
+MUESTRA = 1000
+SEMILLA = 11
+
+# Nombre -> ruta con {rut}, {ficha} y {paciente} de la muestra
+RUTAS = {
+    'dashboard': '/app/core/estadisticas/',
+    'identificar_rut': '/api/consulta/identificar/?rut={rut}',
+    'identificar_ficha': '/api/consulta/identificar/?ficha={ficha}',
+    'linea_tiempo': '/api/consulta/pacientes/{paciente}/linea_tiempo/',
+    # Misma lectura por la vista síncrona de DRF, como referencia
+    'linea_tiempo_drf': '/api/pacientes/{paciente}/linea_tiempo/',
+}
+
+
+def crear_sesion(usuario):
+    """
+    Sesión iniciada de `usuario` en el SESSION_ENGINE configurado (la misma
+    base/caché que lee el servidor).
+
+    Returns:
+        SessionBase: sesión guardada; su session_key va en la cookie
+    """
+    sesion = import_module(settings.SESSION_ENGINE).SessionStore()
+    sesion[SESSION_KEY] = str(usuario.pk)
+    sesion[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+    sesion[HASH_SESSION_KEY] = usuario.get_session_auth_hash()
+    sesion.create()
+    return sesion
+
+
+def muestra_pacientes(cantidad=MUESTRA):
+    """(paciente_id, numero_ficha, rut) de hasta `cantidad` fichas."""
+    from pacientes.models import Paciente
+
+    return list(Paciente.objects.values_list('pk', 'numero_ficha', 'persona__rut')[:cantidad])
+
+
+def resumen_latencias(latencias, segundos):
+    latencias = np.asarray(latencias, dtype=np.float64)
+    if not len(latencias):
+        return {'requests': 0, 'requests_s': 0.0}
+    return {
+        'requests': len(latencias),
+        'requests_s': round(len(latencias) / segundos, 1),
+        'p50_ms': round(float(np.percentile(latencias, 50)), 2),
+        'p95_ms': round(float(np.percentile(latencias, 95)), 2),
+        'p99_ms': round(float(np.percentile(latencias, 99)), 2),
+        'max_ms': round(float(latencias.max()), 2),
+    }
+
+
+class PruebaCarga:
+    """
+    Args:
+        url (str): base del servidor (http://host:puerto)
+        cookie (str): cabecera Cookie con la sesión
+        rutas (dict): nombre -> plantilla de RUTAS
+        muestra (list): filas de muestra_pacientes()
+        concurrencia (int): clientes simultáneos
+        duracion (float): segundos medidos
+        calentamiento (float): segundos iniciales que no se miden
+    """
+
+    def __init__(self, url, cookie, rutas, muestra, concurrencia=CONCURRENCIA, duracion=DURACION,
+                 calentamiento=CALENTAMIENTO, semilla=SEMILLA):
+        partes = urlsplit(url)
+        self.clase_conexion = http.client.HTTPSConnection if partes.scheme == 'https' else http.client.HTTPConnection
+        self.servidor = partes.netloc
+        self.cookie = cookie
+        self.rutas = rutas
+        self.muestra = muestra
+        self.concurrencia = concurrencia
+        self.duracion = duracion
+        self.calentamiento = calentamiento
+        self.semilla = semilla
+
+    def ejecutar(self):
+        """
+        Returns:
+            dict: totales y resumen por ruta (serializable a JSON)
+        """
+        resultados = [[] for _ in range(self.concurrencia)]
+        inicio = time.monotonic() + self.calentamiento
+        fin = inicio + self.duracion
+        hilos = [
+            threading.Thread(target=self._cliente, args=(indice, inicio, fin, resultados[indice]), daemon=True)
+            for indice in range(self.concurrencia)
+        ]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        por_ruta = {nombre: [] for nombre in self.rutas}
+        errores = {nombre: 0 for nombre in self.rutas}
+        for mediciones in resultados:
+            for nombre, milisegundos, estado in mediciones:
+                por_ruta[nombre].append(milisegundos)
+                errores[nombre] += estado != 200
+
+        todas = [milisegundos for latencias in por_ruta.values() for milisegundos in latencias]
+        return {
+            'fecha': timezone.now().isoformat(),
+            'url': self.servidor,
+            'concurrencia': self.concurrencia,
+            'duracion_s': self.duracion,
+            'total': {**resumen_latencias(todas, self.duracion), 'errores': sum(errores.values())},
+            'rutas': {
+                nombre: {**resumen_latencias(latencias, self.duracion), 'errores': errores[nombre]}
+                for nombre, latencias in por_ruta.items()
+            },
+        }
+
+    def _ruta(self, aleatorio):
+        nombre = aleatorio.choice(list(self.rutas))
+        paciente, ficha, rut = aleatorio.choice(self.muestra)
+        return nombre, self.rutas[nombre].format(paciente=paciente, ficha=ficha, rut=rut)
+
+    def _cliente(self, indice, inicio, fin, mediciones):
+        aleatorio = random.Random(self.semilla + indice)
+        cabeceras = {'Cookie': self.cookie, 'Accept': 'application/json'}
+        conexion = self.clase_conexion(self.servidor, timeout=TIEMPO_ESPERA)
+        try:
+            while True:
+                antes = time.monotonic()
+                if antes >= fin:
+                    return
+                nombre, ruta = self._ruta(aleatorio)
+                try:
+                    conexion.request('GET', ruta, headers=cabeceras)
+                    respuesta = conexion.getresponse()
+                    respuesta.read()
+                    estado = respuesta.status
+                except (OSError, http.client.HTTPException):
+                    estado = 0
+                    conexion.close()
+                    conexion = self.clase_conexion(self.servidor, timeout=TIEMPO_ESPERA)
+                if antes >= inicio:
+                    mediciones.append((nombre, (time.monotonic() - antes) * 1000, estado))
+        finally:
+            conexion.close()
+
+
+def comparar(actual, anterior):
+    """
+    Razón actual/anterior de throughput y p95 por ruta (ej: ASGI contra WSGI).
+
+    Returns:
+        list: dicts con ruta, requests_s y p95_ms de ambas corridas y sus razones
+    """
+    filas = []
+    for nombre, medicion in {'total': actual['total'], **actual['rutas']}.items():
+        previa = anterior['total'] if nombre == 'total' else anterior.get('rutas', {}).get(nombre)
+        if not previa or not previa.get('requests') or not medicion.get('requests'):
+            continue
+        filas.append({
+            'ruta': nombre,
+            'requests_s_anterior': previa['requests_s'],
+            'requests_s_actual': medicion['requests_s'],
+            'razon_throughput': round(medicion['requests_s'] / previa['requests_s'], 2),
+            'p95_ms_anterior': previa['p95_ms'],
+            'p95_ms_actual': medicion['p95_ms'],
+            'razon_p95': round(medicion['p95_ms'] / previa['p95_ms'], 2) if previa['p95_ms'] else None,
+        })
+    return filas
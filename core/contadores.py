@@ -0,0 +1,361 @@
+################
+# CONTADORES: Estadísticas precalculadas para los dashboards
+# Descripción: Cada contador es una fila de core.Contador que se ajusta en
+#              +1/-1 desde señales al guardar o borrar registros. Leer todos
+#              los contadores del día es una sola consulta, sin COUNT(*).
+#              Cada ajuste confirmado es un único INSERT ... ON CONFLICT que
+#              crea o incrementa la fila: commits simultáneos no se pisan.
+#              Una fila que no existe vale 0 (reconciliar no guarda ceros).
+# Reconciliación: python manage.py reconciliar_contadores (también tras
+#                 instalar sobre datos existentes)
+################
+
+from datetime import timedelta
+
+from django.apps import apps
+from django.db import connections, models, router, transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import TruncDate
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, pre_save
+from django.utils import timezone
+
+from core.models import Contador
+
+
+# Un paciente activo sin control prenatal en esta ventana tiene control pendiente
+VENTANA_CONTROL_DIAS = 28
+
+
+class DefinicionContador:
+    """
+    Contador de filas de un modelo que cumplen `filtro` (solo igualdades).
+
+    Args:
+        clave (str): nombre del contador (ej: 'medicamentos_pendientes')
+        modelo (str): 'app.Modelo'
+        filtro (dict): campo -> valor que deben cumplir las filas contadas
+        campo_fecha (str): si se indica, el contador es diario (un periodo por fecha local)
+    """
+
+    __slots__ = ('clave', 'modelo', 'filtro', 'campo_fecha')
+
+    def __init__(self, clave, modelo, filtro=None, campo_fecha=None):
+        self.clave = clave
+        self.modelo = modelo
+        self.filtro = filtro or {}
+        self.campo_fecha = campo_fecha
+
+    @property
+    def campos(self):
+        campos = list(self.filtro)
+        if self.campo_fecha:
+            campos.append(self.campo_fecha)
+        return campos
+
+    def get_model(self):
+        return apps.get_model(self.modelo)
+
+    def periodo_de(self, valores):
+        """
+        Periodo al que aporta una fila, o None si no se cuenta.
+
+        Args:
+            valores (dict): campo -> valor de la fila
+        """
+        if any(valores.get(campo) != esperado for campo, esperado in self.filtro.items()):
+            return None
+        if not self.campo_fecha:
+            return ''
+        fecha = valores.get(self.campo_fecha)
+        if fecha is None:
+            return None
+        return _fecha_local(fecha).isoformat()
+
+    def contar(self, periodo=''):
+        """Valor exacto (COUNT) para un periodo."""
+        queryset = self.get_model().objects.filter(**self.filtro)
+        if self.campo_fecha:
+            queryset = queryset.filter(**{_lookup_fecha(self.get_model(), self.campo_fecha): periodo})
+        return queryset.count()
+
+    def contar_por_dia(self, desde):
+        """dict periodo -> valor desde la fecha indicada (una consulta agrupada)."""
+        modelo = self.get_model()
+        campo = modelo._meta.get_field(self.campo_fecha)
+        dia = F(self.campo_fecha) if not isinstance(campo, models.DateTimeField) else TruncDate(self.campo_fecha)
+        filas = (
+            modelo.objects.filter(**self.filtro)
+            .filter(**{f'{_lookup_fecha(modelo, self.campo_fecha)}__gte': desde})
+            .annotate(dia=dia)
+            .values('dia')
+            .annotate(total=Count('pk'))
+        )
+        return {fila['dia'].isoformat(): fila['total'] for fila in filas}
+
+
+def _fecha_local(valor):
+    if hasattr(valor, 'hour'):
+        return timezone.localdate(valor)
+    return valor
+
+
+def _lookup_fecha(modelo, campo):
+    if isinstance(modelo._meta.get_field(campo), models.DateTimeField):
+        return f'{campo}__date'
+    return campo
+
+
+DEFINICIONES = [
+    DefinicionContador('medicamentos_pendientes', 'registros.Medicamento', {'estado': 'prescrito'}),
+    DefinicionContador('procedimientos_programados', 'registros.Procedimiento', {'estado': 'programado'}),
+    DefinicionContador('procedimientos_hoy', 'registros.Procedimiento', campo_fecha='fecha_procedimiento'),
+    DefinicionContador('patologias_activas', 'registros.Patologia', {'estado': 'activa'}),
+    DefinicionContador('pacientes_activos', 'pacientes.Paciente', {'estado': 'activo'}),
+    DefinicionContador('ingresos_hoy', 'pacientes.Paciente', campo_fecha='created_at'),
+    DefinicionContador('controles_hoy', 'pacientes.ControlPrenatal', campo_fecha='fecha_control'),
+    DefinicionContador('admisiones_hoy', 'admision.Admision', campo_fecha='fecha_admision'),
+]
+
+# Contadores que no dependen de una sola fila: se mantienen con
+# señales propias (ver pacientes.signals) y se recalculan aquí
+CONTADORES_ESPECIALES = {
+    'controles_pendientes': lambda periodo='': contar_controles_pendientes(),
+}
+
+
+def registrar_contador(definicion):
+    """Agrega una definición (para apps que se conectan después). Idempotente por clave."""
+    if any(existente.clave == definicion.clave for existente in DEFINICIONES):
+        return
+    DEFINICIONES.append(definicion)
+    conectar_modelo(definicion.get_model())
+
+
+def definiciones_de(modelo):
+    etiqueta = modelo._meta.label
+    return [definicion for definicion in DEFINICIONES if definicion.modelo == etiqueta]
+
+
+def contar_controles_pendientes(hoy=None):
+    """Pacientes activos sin control prenatal en los últimos VENTANA_CONTROL_DIAS días."""
+    Paciente = apps.get_model('pacientes.Paciente')
+    limite = (hoy or timezone.localdate()) - timedelta(days=VENTANA_CONTROL_DIAS)
+    return (
+        Paciente.objects.filter(estado='activo')
+        .exclude(controles_prenatales__fecha_control__gte=limite)
+        .count()
+    )
+
+
+# ====================================================================
+# LECTURA
+# ====================================================================
+
+def leer_contadores(hoy=None):
+    """
+    Valores actuales de todos los contadores (una consulta).
+
+    Returns:
+        dict: clave -> valor. Los diarios corresponden a `hoy`. Incluye
+              'registros_pendientes' (medicamentos + procedimientos por hacer)
+              y 'alertas_activas' (0 si no hay contador).
+    """
+    return _completar_contadores(_filas_contadores(hoy))
+
+
+async def aleer_contadores(hoy=None):
+    """leer_contadores para vistas async (ORM async, misma única consulta)."""
+    return _completar_contadores([fila async for fila in _filas_contadores(hoy)])
+
+
+def _filas_contadores(hoy):
+    hoy = (hoy or timezone.localdate()).isoformat()
+    return Contador.objects.filter(Q(periodo='') | Q(periodo=hoy)).values_list('clave', 'valor')
+
+
+def _completar_contadores(filas):
+    valores = {definicion.clave: 0 for definicion in DEFINICIONES}
+    valores.update({clave: 0 for clave in CONTADORES_ESPECIALES})
+    valores.setdefault('alertas_activas', 0)
+    valores.update(filas)
+
+    valores['registros_pendientes'] = (
+        valores['medicamentos_pendientes'] + valores['procedimientos_programados']
+    )
+    return valores
+
+
+# ====================================================================
+# ESCRITURA INCREMENTAL
+# ====================================================================
+
+def ajustar(clave, delta, periodo=''):
+    """Suma `delta` al contador al confirmar la transacción en curso."""
+    if delta:
+        transaction.on_commit(lambda: _aplicar(clave, periodo, delta))
+
+
+def _aplicar(clave, periodo, delta):
+    """Crea la fila con `delta` o se lo suma, en una sola sentencia atómica."""
+    conexion = connections[router.db_for_write(Contador)]
+    nombre = conexion.ops.quote_name
+    tabla = nombre(Contador._meta.db_table)
+    valor, actualizado = nombre('valor'), nombre('actualizado')
+
+    if conexion.vendor == 'mysql':
+        conflicto = (
+            f'ON DUPLICATE KEY UPDATE {valor} = {valor} + VALUES({valor}), '
+            f'{actualizado} = VALUES({actualizado})'
+        )
+    else:
+        conflicto = (
+            f'ON CONFLICT ({nombre("clave")}, {nombre("periodo")}) DO UPDATE SET '
+            f'{valor} = {tabla}.{valor} + excluded.{valor}, {actualizado} = excluded.{actualizado}'
+        )
+    with conexion.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {tabla} ({nombre("clave")}, {nombre("periodo")}, {valor}, {actualizado}) '
+            f'VALUES (%s, %s, %s, %s) {conflicto}',
+            [clave, periodo, delta, conexion.ops.adapt_datetimefield_value(timezone.now())]
+        )
+
+
+def _pertenencias(definiciones, valores):
+    """Conjunto de (clave, periodo) a los que aporta una fila."""
+    resultado = set()
+    for definicion in definiciones:
+        periodo = definicion.periodo_de(valores)
+        if periodo is not None:
+            resultado.add((definicion.clave, periodo))
+    return resultado
+
+
+def _campos(definiciones):
+    return {campo for definicion in definiciones for campo in definicion.campos}
+
+
+def _valores(instance, campos):
+    """Valores ya cargados de la instancia, o None si alguno está diferido."""
+    if not campos.issubset(instance.__dict__):
+        return None
+    return {campo: instance.__dict__[campo] for campo in campos}
+
+
+# ====================================================================
+# SEÑALES
+# ====================================================================
+# post_init guarda a qué contadores aportaba la fila al cargarla (sin
+# consultas). post_save/post_delete comparan y ajustan la diferencia.
+# Las operaciones masivas (update, bulk_create) no emiten señales: se
+# corrigen con reconciliar_contadores o llamando a ajustar().
+
+def _al_iniciar(sender, instance, **kwargs):
+    definiciones = definiciones_de(sender)
+    valores = _valores(instance, _campos(definiciones))
+    instance._contadores_previos = None if valores is None else _pertenencias(definiciones, valores)
+
+
+def _leer_previos(sender, instance):
+    """Estado guardado en la base, para instancias cargadas con .only()/.defer()."""
+    definiciones = definiciones_de(sender)
+    previos = sender._base_manager.filter(pk=instance.pk).values(*_campos(definiciones)).first()
+    instance._contadores_previos = _pertenencias(definiciones, previos) if previos else set()
+
+
+def _antes_de_guardar(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding or getattr(instance, '_contadores_previos', None) is not None:
+        return
+    _leer_previos(sender, instance)
+
+
+def _antes_de_borrar(sender, instance, **kwargs):
+    if getattr(instance, '_contadores_previos', None) is None:
+        _leer_previos(sender, instance)
+
+
+def _al_guardar(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    definiciones = definiciones_de(sender)
+    previos = set() if created else (getattr(instance, '_contadores_previos', None) or set())
+    actuales = _pertenencias(definiciones, {campo: getattr(instance, campo) for campo in _campos(definiciones)})
+
+    for clave, periodo in previos - actuales:
+        ajustar(clave, -1, periodo)
+    for clave, periodo in actuales - previos:
+        ajustar(clave, 1, periodo)
+    instance._contadores_previos = actuales
+
+
+def _al_borrar(sender, instance, **kwargs):
+    for clave, periodo in instance._contadores_previos:
+        ajustar(clave, -1, periodo)
+
+
+def conectar_modelo(modelo):
+    etiqueta = modelo._meta.label
+    post_init.connect(_al_iniciar, sender=modelo, dispatch_uid=f'contadores_init_{etiqueta}')
+    pre_save.connect(_antes_de_guardar, sender=modelo, dispatch_uid=f'contadores_pre_{etiqueta}')
+    post_save.connect(_al_guardar, sender=modelo, dispatch_uid=f'contadores_save_{etiqueta}')
+    pre_delete.connect(_antes_de_borrar, sender=modelo, dispatch_uid=f'contadores_pre_delete_{etiqueta}')
+    post_delete.connect(_al_borrar, sender=modelo, dispatch_uid=f'contadores_delete_{etiqueta}')
+
+
+def conectar_senales():
+    """Conecta las señales de todos los modelos con contadores (CoreConfig.ready)."""
+    for etiqueta in {definicion.modelo for definicion in DEFINICIONES}:
+        conectar_modelo(apps.get_model(etiqueta))
+
+
+# ====================================================================
+# RECONCILIACIÓN
+# ====================================================================
+
+def reconciliar(dias=7, hoy=None):
+    """
+    Recalcula todos los contadores globales y los diarios de los últimos `dias`.
+
+    Returns:
+        list: (clave, periodo, valor_anterior, valor_nuevo) de los que cambiaron
+    """
+    hoy = hoy or timezone.localdate()
+    desde = hoy - timedelta(days=dias - 1)
+
+    exactos = {}
+    for definicion in DEFINICIONES:
+        if definicion.campo_fecha:
+            por_dia = definicion.contar_por_dia(desde)
+            for offset in range(dias):
+                periodo = (desde + timedelta(days=offset)).isoformat()
+                exactos[(definicion.clave, periodo)] = por_dia.get(periodo, 0)
+        else:
+            exactos[(definicion.clave, '')] = definicion.contar()
+    for clave, calcular in CONTADORES_ESPECIALES.items():
+        exactos[(clave, '')] = calcular()
+
+    actuales = {
+        (fila.clave, fila.periodo): fila
+        for fila in Contador.objects.filter(clave__in={clave for clave, _ in exactos})
+        .filter(Q(periodo='') | Q(periodo__gte=desde.isoformat()))
+    }
+
+    cambios = []
+    with transaction.atomic():
+        for (clave, periodo), valor in exactos.items():
+            fila = actuales.get((clave, periodo))
+            if fila is None:
+                if valor:
+                    Contador.objects.create(clave=clave, periodo=periodo, valor=valor)
+                    cambios.append((clave, periodo, None, valor))
+            elif fila.valor != valor:
+                cambios.append((clave, periodo, fila.valor, valor))
+                fila.valor = valor
+                fila.save(update_fields=['valor', 'actualizado'])
+    return cambios
+
+
+def podar(conservar_dias=90, hoy=None):
+    """Borra contadores diarios más antiguos que `conservar_dias`."""
+    limite = ((hoy or timezone.localdate()) - timedelta(days=conservar_dias)).isoformat()
+    borrados, _ = Contador.objects.exclude(periodo='').filter(periodo__lt=limite).delete()
+    return borrados
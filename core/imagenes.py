@@ -0,0 +1,272 @@
+################
+# IMÁGENES: Miniaturas y variantes web de las imágenes clínicas
+# Descripción: Al subir una imagen (Observacion, Patologia, Procedimiento,
+#              Perfil) se encola, al confirmar la transacción, la generación
+#              de sus derivadas en un pool de hilos del proceso: el request
+#              no espera el redimensionado. Cada derivada se guarda con un
+#              nombre que es el hash de su contenido (inmutable: se puede
+#              servir con caché de larga duración y se deduplica sola).
+#              ImagenDerivada relaciona el archivo original con sus
+#              derivadas; las URL se resuelven desde la caché.
+#              Lo que no alcance a procesarse (reinicio del proceso) lo
+#              completa el comando generar_derivadas.
+# Uso: url_derivada(observacion.imagen, 'miniatura')
+#      {% load imagenes %} {{ observacion.imagen|miniatura }}
+################
+
+import hashlib
+import io
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import apps
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import Count
+from django.db.models.signals import post_save
+from PIL import Image, ImageOps, features
+
+
+logger = logging.getLogger(__name__)
+
+# Modelos con un ImageField llamado `imagen`
+MODELOS_CON_IMAGEN = [
+    'registros.Observacion',
+    'registros.Patologia',
+    'registros.Procedimiento',
+    'personal.Perfil',
+]
+CAMPO_IMAGEN = 'imagen'
+
+# Nombre -> (caja máxima en px, calidad)
+VARIANTES = {
+    'miniatura': ((320, 320), 70),
+    'web': ((1600, 1600), 80),
+}
+FORMATO = 'WEBP' if features.check('webp') else 'JPEG'
+EXTENSION = {'WEBP': 'webp', 'JPEG': 'jpg'}[FORMATO]
+CARPETA = 'derivadas'
+
+HILOS = 2
+TIEMPO_CACHE = 60 * 60 * 24
+# Una imagen aún sin derivadas se vuelve a consultar tras este tiempo
+TIEMPO_PENDIENTE = 60
+
+
+def _clave(nombre):
+    return f'imagenes:{hashlib.blake2b(nombre.encode(), digest_size=16).hexdigest()}'
+
+
+# ====================================================================
+# GENERACIÓN
+# ====================================================================
+
+def _preparar(imagen, caja):
+    """Decodifica la imagen al menor tamaño útil para `caja` y la deja en un modo guardable."""
+    # JPEG: decodifica directamente a 1/2, 1/4 u 1/8 (mucho más rápido que reducir después)
+    imagen.draft('RGB', caja)
+    imagen = ImageOps.exif_transpose(imagen)
+    if imagen.mode not in ('RGB', 'RGBA', 'L'):
+        transparente = imagen.mode in ('LA', 'PA') or 'transparency' in imagen.info
+        imagen = imagen.convert('RGBA' if transparente else 'RGB')
+    return imagen
+
+
+def _reducir(imagen, caja, calidad):
+    """
+    Returns:
+        tuple: (bytes codificados, ancho, alto)
+    """
+    copia = imagen.copy()
+    copia.thumbnail(caja, Image.Resampling.LANCZOS)
+    if FORMATO == 'JPEG' and copia.mode == 'RGBA':
+        copia = copia.convert('RGB')
+    salida = io.BytesIO()
+    copia.save(salida, FORMATO, quality=calidad, optimize=True)
+    return salida.getvalue(), copia.width, copia.height
+
+
+def generar_derivadas(nombre, storage=None):
+    """
+    Genera las variantes que le falten a la imagen `nombre` (idempotente).
+
+    Args:
+        nombre (str): nombre del archivo original en el storage
+        storage: storage de los archivos (por defecto default_storage)
+
+    Returns:
+        dict: variante -> ImagenDerivada ({} si la imagen no se pudo leer)
+    """
+    from core.models import ImagenDerivada
+
+    storage = storage or default_storage
+    derivadas = {derivada.variante: derivada for derivada in ImagenDerivada.objects.filter(original=nombre)}
+    faltan = [variante for variante in VARIANTES if variante not in derivadas]
+    if not faltan:
+        return derivadas
+
+    mayor = max((VARIANTES[variante][0] for variante in faltan), key=lambda caja: caja[0] * caja[1])
+    try:
+        with storage.open(nombre, 'rb') as archivo, Image.open(archivo) as original:
+            imagen = _preparar(original, mayor)
+            for variante in faltan:
+                caja, calidad = VARIANTES[variante]
+                contenido, ancho, alto = _reducir(imagen, caja, calidad)
+                resumen = hashlib.blake2b(contenido, digest_size=16).hexdigest()
+                archivo_derivado = f'{CARPETA}/{resumen[:2]}/{resumen}.{EXTENSION}'
+                if not storage.exists(archivo_derivado):
+                    archivo_derivado = storage.save(archivo_derivado, ContentFile(contenido))
+                derivadas[variante] = _registrar(ImagenDerivada, nombre, variante, {
+                    'archivo': archivo_derivado, 'ancho': ancho, 'alto': alto, 'tamano': len(contenido),
+                })
+    except (OSError, ValueError, Image.DecompressionBombError) as error:
+        logger.warning('No se pudieron generar derivadas de %s: %s', nombre, error)
+        return {}
+
+    cache.set(_clave(nombre), _urls(derivadas, storage), TIEMPO_CACHE)
+    return derivadas
+
+
+def _registrar(modelo, nombre, variante, datos):
+    try:
+        with transaction.atomic():
+            return modelo.objects.create(original=nombre, variante=variante, **datos)
+    except IntegrityError:
+        # Otro hilo o proceso la generó primero
+        return modelo.objects.get(original=nombre, variante=variante)
+
+
+# ====================================================================
+# COLA EN SEGUNDO PLANO
+# ====================================================================
+
+_ejecutor = None
+_candado_ejecutor = threading.Lock()
+
+
+def _pool():
+    global _ejecutor
+    with _candado_ejecutor:
+        if _ejecutor is None:
+            _ejecutor = ThreadPoolExecutor(max_workers=HILOS, thread_name_prefix='derivadas')
+        return _ejecutor
+
+
+def _procesar(nombre):
+    try:
+        generar_derivadas(nombre)
+    except Exception:
+        logger.exception('Error generando derivadas de %s', nombre)
+    finally:
+        # Los hilos del pool no pasan por request_finished
+        close_old_connections()
+
+
+def encolar(nombre):
+    """Genera las derivadas de `nombre` en segundo plano al confirmar la transacción."""
+    transaction.on_commit(lambda: _pool().submit(_procesar, nombre))
+
+
+def _al_guardar(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and CAMPO_IMAGEN not in update_fields:
+        return
+    imagen = getattr(instance, CAMPO_IMAGEN)
+    if not imagen:
+        return
+    urls = cache.get(_clave(imagen.name))
+    if urls and len(urls) == len(VARIANTES):
+        return
+    encolar(imagen.name)
+
+
+def conectar_senales():
+    """Encola las imágenes nuevas de MODELOS_CON_IMAGEN (CoreConfig.ready)."""
+    for etiqueta in MODELOS_CON_IMAGEN:
+        post_save.connect(_al_guardar, sender=apps.get_model(etiqueta), dispatch_uid=f'imagenes_{etiqueta}')
+
+
+def imagenes_pendientes():
+    """
+    Nombres de las imágenes de MODELOS_CON_IMAGEN a las que les falta alguna
+    variante (subidas antes de este módulo o no procesadas por un reinicio).
+
+    Returns:
+        list: nombres de archivo, sin repetir
+    """
+    from core.models import ImagenDerivada
+
+    completas = set(
+        ImagenDerivada.objects.filter(variante__in=VARIANTES)
+        .values('original').annotate(total=Count('id')).filter(total=len(VARIANTES))
+        .values_list('original', flat=True)
+    )
+    nombres = set()
+    for etiqueta in MODELOS_CON_IMAGEN:
+        modelo = apps.get_model(etiqueta)
+        nombres.update(
+            modelo.objects.exclude(**{CAMPO_IMAGEN: ''}).exclude(**{f'{CAMPO_IMAGEN}__isnull': True})
+            .values_list(CAMPO_IMAGEN, flat=True).distinct()
+        )
+    return sorted(nombres - completas)
+
+
+# ====================================================================
+# URL
+# ====================================================================
+
+def _urls(derivadas, storage=None):
+    storage = storage or default_storage
+    return {variante: storage.url(derivada.archivo) for variante, derivada in derivadas.items()}
+
+
+def _leer_urls(nombres):
+    """URL de las derivadas de cada nombre: caché y, para los que falten, una consulta."""
+    from core.models import ImagenDerivada
+
+    claves = {_clave(nombre): nombre for nombre in nombres}
+    encontrados = cache.get_many(claves)
+    urls = {claves[clave]: valor for clave, valor in encontrados.items()}
+
+    faltan = [nombre for nombre in nombres if nombre not in urls]
+    if faltan:
+        for nombre in faltan:
+            urls[nombre] = {}
+        for derivada in ImagenDerivada.objects.filter(original__in=faltan):
+            urls[derivada.original][derivada.variante] = default_storage.url(derivada.archivo)
+        completas = {_clave(nombre): urls[nombre] for nombre in faltan if urls[nombre]}
+        pendientes = {_clave(nombre): {} for nombre in faltan if not urls[nombre]}
+        cache.set_many(completas, TIEMPO_CACHE)
+        cache.set_many(pendientes, TIEMPO_PENDIENTE)
+    return urls
+
+
+def precargar_derivadas(imagenes):
+    """
+    Deja en caché las URL de derivadas de varias imágenes (FieldFile) con una
+    lectura de caché y a lo más una consulta; las llamadas siguientes a
+    url_derivada de esas imágenes no consultan la base.
+    """
+    nombres = list({imagen.name for imagen in imagenes if imagen})
+    if nombres:
+        _leer_urls(nombres)
+
+
+def url_derivada(imagen, variante):
+    """
+    URL de la variante de una imagen; la del original mientras la derivada
+    no exista (recién subida) y None si no hay imagen.
+    """
+    if not imagen:
+        return None
+    return _leer_urls([imagen.name])[imagen.name].get(variante) or imagen.url
+
+
+def urls_imagen(imagen):
+    """{'original': url, '<variante>': url, ...} o None si no hay imagen."""
+    if not imagen:
+        return None
+    urls = _leer_urls([imagen.name])[imagen.name]
+    return {'original': imagen.url, **{variante: urls.get(variante) or imagen.url for variante in VARIANTES}}
@@ -0,0 +1,387 @@
+################
+# IMPORTACIÓN: Personas y Pacientes desde CSV / Excel
+# Descripción: Carga masiva por bloques. Cada bloque se valida en lote
+#              (validar_ruts), detecta RUT duplicados con una consulta, y se
+#              escribe con bulk_create dentro de un savepoint. Las filas
+#              rechazadas se reportan en un archivo CSV aparte.
+# Uso: python manage.py importar_personas archivo.csv [--pacientes]
+#      Admin: Personas → Importar
+################
+
+import csv
+import io
+import time
+from itertools import islice
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from core.auditoria import registrar_creados
+from core.busqueda import get_backend
+from core.contadores import ajustar
+from core.models import Persona
+from utilidades.validadores import (
+    RUT_ERROR_DIGITO,
+    normalizar_telefono,
+    validar_edad,
+    validar_ruts,
+)
+
+
+TAMANO_BLOQUE = 2000
+
+COLUMNAS_PERSONA = ['rut', 'nombre', 'apellido', 'edad', 'direccion', 'contacto']
+COLUMNAS_PACIENTE = [
+    'numero_ficha', 'estado_civil', 'prevision',
+    'embarazos_previos', 'partos_previos', 'abortos_previos',
+]
+
+# Encabezados alternativos aceptados en el archivo
+ALIAS_COLUMNAS = {
+    'telefono': 'contacto',
+    'teléfono': 'contacto',
+    'dirección': 'direccion',
+    'ficha': 'numero_ficha',
+    'previsión': 'prevision',
+}
+
+COLUMNAS_ERRORES = ['linea', 'rut', 'nombre', 'apellido', 'errores']
+
+
+# ====================================================================
+# LECTURA EN STREAMING
+# ====================================================================
+
+def _normalizar_encabezado(nombre):
+    nombre = (nombre or '').strip().lower()
+    return ALIAS_COLUMNAS.get(nombre, nombre)
+
+
+def leer_csv(archivo):
+    """
+    Genera (linea, fila) desde un CSV (',' o ';'), sin cargarlo completo.
+
+    Args:
+        archivo: archivo abierto en modo texto o binario
+    """
+    if isinstance(archivo.read(0), bytes):
+        archivo = io.TextIOWrapper(archivo, encoding='utf-8-sig', newline='')
+
+    muestra = archivo.readline()
+    delimitador = ';' if muestra.count(';') > muestra.count(',') else ','
+    encabezado = [_normalizar_encabezado(nombre) for nombre in next(csv.reader([muestra], delimiter=delimitador))]
+
+    for linea, valores in enumerate(csv.reader(archivo, delimiter=delimitador), start=2):
+        if any(valores):
+            yield linea, dict(zip(encabezado, valores))
+
+
+def leer_excel(archivo):
+    """
+    Genera (linea, fila) desde la primera hoja de un .xlsx (openpyxl en
+    modo read_only: las filas se leen a medida que se consumen).
+    """
+    from openpyxl import load_workbook
+
+    libro = load_workbook(archivo, read_only=True, data_only=True)
+    try:
+        filas = libro.worksheets[0].iter_rows(values_only=True)
+        encabezado = [_normalizar_encabezado(str(nombre or '')) for nombre in next(filas, ())]
+        for linea, valores in enumerate(filas, start=2):
+            if any(valor not in (None, '') for valor in valores):
+                yield linea, {
+                    columna: _texto_celda(valor)
+                    for columna, valor in zip(encabezado, valores)
+                }
+    finally:
+        libro.close()
+
+
+def _texto_celda(valor):
+    if valor is None:
+        return ''
+    # Excel guarda los enteros como float (25 -> 25.0)
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return str(valor)
+
+
+def leer_archivo(archivo, nombre):
+    """Elige el lector según la extensión del nombre del archivo."""
+    if nombre.lower().endswith(('.xlsx', '.xlsm')):
+        return leer_excel(archivo)
+    return leer_csv(archivo)
+
+
+def en_bloques(filas, tamano):
+    filas = iter(filas)
+    while True:
+        bloque = list(islice(filas, tamano))
+        if not bloque:
+            return
+        yield bloque
+
+
+# ====================================================================
+# RESULTADO
+# ====================================================================
+
+class ResultadoImportacion:
+    """Totales de una importación."""
+
+    __slots__ = ('leidas', 'personas', 'pacientes', 'rechazadas', 'segundos')
+
+    def __init__(self):
+        self.leidas = 0
+        self.personas = 0
+        self.pacientes = 0
+        self.rechazadas = 0
+        self.segundos = 0.0
+
+    def __str__(self):
+        return (
+            f'{self.leidas} filas leídas, {self.personas} personas y '
+            f'{self.pacientes} pacientes creados, {self.rechazadas} rechazadas '
+            f'({self.segundos:.1f} s)'
+        )
+
+
+# ====================================================================
+# IMPORTADOR
+# ====================================================================
+
+class ImportadorPersonas:
+    """
+    Importa Personas (y opcionalmente su ficha de Paciente) por bloques.
+
+    Args:
+        usuario (User): queda como created_by de los registros
+        tamano_bloque (int): filas validadas y escritas por savepoint
+        crear_pacientes (bool): crea también un Paciente por persona
+        errores (file): archivo de texto donde se escribe el CSV de filas rechazadas
+    """
+
+    def __init__(self, usuario, tamano_bloque=TAMANO_BLOQUE, crear_pacientes=False, errores=None):
+        self.usuario = usuario
+        self.tamano_bloque = tamano_bloque
+        self.crear_pacientes = crear_pacientes
+        self.resultado = ResultadoImportacion()
+        self._ruts_vistos = set()
+        self._fichas_vistas = set()
+        self._escritor_errores = None
+        if errores is not None:
+            self._escritor_errores = csv.writer(errores)
+            self._escritor_errores.writerow(COLUMNAS_ERRORES)
+
+    def importar(self, filas):
+        """
+        Args:
+            filas (iterable): pares (linea, dict) de leer_archivo()
+
+        Returns:
+            ResultadoImportacion
+        """
+        inicio = time.perf_counter()
+        for bloque in en_bloques(filas, self.tamano_bloque):
+            self.resultado.leidas += len(bloque)
+            self._procesar_bloque(bloque)
+        self.resultado.segundos = time.perf_counter() - inicio
+        return self.resultado
+
+    ################
+    # Validación
+    ################
+    def _procesar_bloque(self, bloque):
+        ruts = validar_ruts([fila.get('rut') for _, fila in bloque])
+        normalizados = ruts.normalizados()
+
+        # Un solo SELECT por bloque para RUT ya registrados
+        existentes = set(
+            Persona.objects.filter(rut_numero__in=ruts.numeros[ruts.validos].tolist())
+            .values_list('rut_numero', flat=True)
+        )
+
+        candidatos = []
+        for indice, (linea, fila) in enumerate(bloque):
+            errores = self._validar_persona(fila)
+            if not ruts.validos[indice]:
+                errores.insert(0, 'Dígito verificador inválido' if ruts.errores[indice] == RUT_ERROR_DIGITO
+                               else 'Formato de RUT inválido')
+            else:
+                numero = int(ruts.numeros[indice])
+                if numero in existentes:
+                    errores.insert(0, 'RUT ya registrado')
+                elif numero in self._ruts_vistos:
+                    errores.insert(0, 'RUT repetido en el archivo')
+            if self.crear_pacientes:
+                errores.extend(self._validar_paciente(fila))
+
+            if errores:
+                self._rechazar(linea, fila, errores)
+                continue
+
+            self._ruts_vistos.add(numero)
+            persona = Persona(
+                rut=str(normalizados[indice]),
+                rut_numero=numero,
+                rut_dv=str(ruts.verificadores[indice]),
+                nombre=fila['nombre'].strip(),
+                apellido=fila['apellido'].strip(),
+                edad=int(fila['edad']),
+                direccion=(fila.get('direccion') or '').strip(),
+                contacto=normalizar_telefono(fila['contacto']),
+                created_by=self.usuario,
+            )
+            candidatos.append((linea, fila, persona))
+
+        if self.crear_pacientes:
+            candidatos = self._descartar_fichas_existentes(candidatos)
+        if candidatos:
+            self._escribir(candidatos)
+
+    def _validar_persona(self, fila):
+        errores = []
+        for campo in ('nombre', 'apellido'):
+            if len((fila.get(campo) or '').strip()) < 2:
+                errores.append(f'{campo}: mínimo 2 caracteres')
+        es_valida, mensaje = validar_edad(fila.get('edad'))
+        if not es_valida:
+            errores.append(f'edad: {mensaje}')
+        if normalizar_telefono(fila.get('contacto') or '') is None:
+            errores.append('contacto: teléfono inválido')
+        return errores
+
+    def _validar_paciente(self, fila):
+        from pacientes.models import Paciente
+
+        errores = []
+        for campo, opciones in (
+            ('estado_civil', Paciente.ESTADO_CIVIL_CHOICES),
+            ('prevision', Paciente.PREVISION_CHOICES),
+        ):
+            valor = (fila.get(campo) or '').strip().lower()
+            if valor not in dict(opciones):
+                errores.append(f'{campo}: valor inválido ({valor or "vacío"})')
+            fila[campo] = valor
+        for campo in ('embarazos_previos', 'partos_previos', 'abortos_previos'):
+            valor = (fila.get(campo) or '0').strip() or '0'
+            if not valor.isdigit():
+                errores.append(f'{campo}: debe ser un número')
+            fila[campo] = valor
+        ficha = (fila.get('numero_ficha') or '').strip()
+        if ficha and ficha in self._fichas_vistas:
+            errores.append('numero_ficha repetido en el archivo')
+        fila['numero_ficha'] = ficha
+        return errores
+
+    def _descartar_fichas_existentes(self, candidatos):
+        from pacientes.models import Paciente
+
+        fichas = [fila['numero_ficha'] for _, fila, _ in candidatos if fila['numero_ficha']]
+        existentes = set(Paciente.objects.filter(numero_ficha__in=fichas).values_list('numero_ficha', flat=True))
+
+        aceptados = []
+        for linea, fila, persona in candidatos:
+            if fila['numero_ficha'] in existentes:
+                self._ruts_vistos.discard(persona.rut_numero)
+                self._rechazar(linea, fila, ['numero_ficha ya registrado'])
+                continue
+            if fila['numero_ficha']:
+                self._fichas_vistas.add(fila['numero_ficha'])
+            aceptados.append((linea, fila, persona))
+        return aceptados
+
+    def _rechazar(self, linea, fila, errores):
+        self.resultado.rechazadas += 1
+        if self._escritor_errores is not None:
+            self._escritor_errores.writerow([
+                linea, fila.get('rut', ''), fila.get('nombre', ''), fila.get('apellido', ''),
+                '; '.join(errores),
+            ])
+
+    ################
+    # Escritura
+    ################
+    def _escribir(self, candidatos):
+        """
+        bulk_create en un savepoint. Si otro proceso insertó un RUT o ficha
+        entre la validación y la escritura, el savepoint se revierte y el
+        bloque se reintenta fila a fila para aislar los conflictos. Los
+        totales se suman solo cuando el savepoint se confirma.
+        """
+        personas = [persona for _, _, persona in candidatos]
+        try:
+            with transaction.atomic():
+                pacientes = self._guardar(personas, [fila for _, fila, _ in candidatos])
+        except IntegrityError:
+            for linea, fila, persona in candidatos:
+                persona.pk = None
+                try:
+                    with transaction.atomic():
+                        pacientes = self._guardar([persona], [fila])
+                except IntegrityError as error:
+                    self._rechazar(linea, fila, [f'Conflicto al guardar: {error}'])
+                else:
+                    self.resultado.personas += 1
+                    self.resultado.pacientes += pacientes
+        else:
+            self.resultado.personas += len(personas)
+            self.resultado.pacientes += pacientes
+
+    def _guardar(self, personas, filas):
+        """Returns: int, pacientes creados."""
+        # bulk_create no llama a save() ni emite señales: rut_numero/rut_dv
+        # ya vienen completos y el índice, los contadores y la auditoría se actualizan aquí
+        Persona.objects.bulk_create(personas, batch_size=self.tamano_bloque)
+        if personas[0].pk is None:
+            # MySQL no retorna las pk de bulk_create
+            pks = dict(
+                Persona.objects.filter(rut_numero__in=[persona.rut_numero for persona in personas])
+                .values_list('rut_numero', 'pk')
+            )
+            for persona in personas:
+                persona.pk = pks[persona.rut_numero]
+
+        get_backend().indexar_lote(personas)
+        registrar_creados(personas)
+
+        if not self.crear_pacientes:
+            return 0
+        return self._guardar_pacientes(personas, filas)
+
+    def _guardar_pacientes(self, personas, filas):
+        from pacientes.fichas import siguientes_numeros_ficha
+        from pacientes.models import Paciente
+
+        sin_ficha = sum(1 for fila in filas if not fila['numero_ficha'])
+        fichas = iter(siguientes_numeros_ficha(sin_ficha))
+
+        pacientes = [
+            Paciente(
+                persona_id=persona.pk,
+                numero_ficha=fila['numero_ficha'] or next(fichas),
+                edad=persona.edad,
+                estado_civil=fila['estado_civil'],
+                prevision=fila['prevision'],
+                embarazos_previos=int(fila['embarazos_previos']),
+                partos_previos=int(fila['partos_previos']),
+                abortos_previos=int(fila['abortos_previos']),
+                created_by=self.usuario,
+            )
+            for persona, fila in zip(personas, filas)
+        ]
+        Paciente.objects.bulk_create(pacientes, batch_size=self.tamano_bloque)
+        if pacientes[0].pk is None:
+            pks = dict(
+                Paciente.objects.filter(numero_ficha__in=[paciente.numero_ficha for paciente in pacientes])
+                .values_list('numero_ficha', 'pk')
+            )
+            for paciente in pacientes:
+                paciente.pk = pks[paciente.numero_ficha]
+        registrar_creados(pacientes)
+
+        # Pacientes nuevos: activos, ingresados hoy y sin controles
+        ajustar('pacientes_activos', len(pacientes))
+        ajustar('ingresos_hoy', len(pacientes), timezone.localdate().isoformat())
+        ajustar('controles_pendientes', len(pacientes))
+        return len(pacientes)
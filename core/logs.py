@@ -0,0 +1,375 @@
+################
+# LOGS: Registro estructurado sin bloquear el request
+# Descripción: ManejadorCola deja cada registro en una cola en memoria y un
+#              hilo escritor lo formatea y lo escribe: el request no espera
+#              el disco. Si la cola se llena los registros se descartan (y
+#              se informa cuántos) en vez de frenar la atención.
+#              Con varios procesos (gunicorn) la rotación es externa
+#              (logrotate): cada worker escribe con ArchivoVigilado, que
+#              reabre el archivo cuando logrotate lo mueve.
+#              ArchivoRotativoComprimido rota por tamaño y a medianoche y
+#              comprime con gzip; solo sirve con un único proceso escribiendo
+#              (runserver), porque cada worker rotaría por su cuenta el
+#              archivo que los demás siguen escribiendo.
+#              FormatoJSON escribe una línea JSON por registro con el id de
+#              request, el usuario y su rol (FiltroContexto) y los campos de
+#              `extra`. ContextoLogMiddleware asigna el id (o respeta el
+#              X-Request-ID recibido) y registra cada request con su
+#              latencia en el logger 'core.accesos'.
+#              MuestreoDebug deja pasar solo una fracción de los requests
+#              con registros DEBUG (todos los del request o ninguno).
+# Uso: settings.LOGGING (handlers 'file', 'consultas' y 'accesos')
+################
+
+import copy
+import gzip
+import json
+import logging
+import os
+import queue
+import random
+import re
+import shutil
+import threading
+import time
+import uuid
+import weakref
+import zlib
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone as tz
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, WatchedFileHandler
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.utils.functional import empty
+
+
+logger_accesos = logging.getLogger('core.accesos')
+
+CAPACIDAD_COLA = 10000
+MAX_BYTES = 50 * 1024 * 1024
+RESPALDOS = 14
+TASA_MUESTREO = 0.01
+CABECERA_ID = 'X-Request-ID'
+_RE_ID = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+# Atributos propios de LogRecord: el resto son `extra`
+_ATRIBUTOS_REGISTRO = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'taskName'}
+
+# (request, id) del request en curso; contextvars sigue al request en hilos y corrutinas
+_request_actual = ContextVar('request_actual', default=None)
+
+
+def id_request_actual():
+    actual = _request_actual.get()
+    return actual[1] if actual else None
+
+
+def request_actual():
+    actual = _request_actual.get()
+    return actual[0] if actual else None
+
+
+# ====================================================================
+# CONTEXTO DEL REQUEST
+# ====================================================================
+
+def _usuario_resuelto(request):
+    """Usuario del request solo si ya se cargó (un log no debe consultar la base)."""
+    usuario = request.__dict__.get('_cached_user') or request.__dict__.get('_acached_user')
+    if usuario is None:
+        perezoso = request.__dict__.get('user')
+        usuario = getattr(perezoso, '_wrapped', empty)
+        if usuario is empty:
+            return None
+    return usuario
+
+
+def datos_contexto(request):
+    """
+    Returns:
+        dict: usuario_id y rol (el resuelto durante el request por
+              authentication.roles, sin consultar la caché)
+    """
+    usuario = _usuario_resuelto(request)
+    if usuario is None or not getattr(usuario, 'is_authenticated', False):
+        return {'usuario_id': None, 'rol': None}
+    rol = getattr(usuario, '_rol_usuario', None)
+    return {'usuario_id': usuario.pk, 'rol': rol.rol if rol is not None else None}
+
+
+def usuario_request():
+    """id del usuario autenticado del request en curso (si ya se cargó) o None."""
+    request = request_actual()
+    return datos_contexto(request)['usuario_id'] if request is not None else None
+
+
+class FiltroContexto(logging.Filter):
+    """Agrega request_id, usuario_id y rol a cada registro emitido dentro de un request."""
+
+    def filter(self, record):
+        actual = _request_actual.get()
+        if actual is None:
+            # django.request registra los 4xx/5xx después de que el middleware
+            # terminó: el request viene en el propio registro
+            request = getattr(record, 'request', None)
+            id_request = getattr(request, 'id_request', None)
+            if id_request is None:
+                record.request_id = None
+                return True
+            actual = (request, id_request)
+        request, id_request = actual
+        record.request_id = id_request
+        if not hasattr(record, 'rol'):
+            record.__dict__.update(datos_contexto(request))
+        return True
+
+
+class MuestreoDebug(logging.Filter):
+    """
+    Deja pasar todos los registros INFO o superiores y los DEBUG de una
+    fracción `tasa` de los requests (decidida por el id: un request
+    muestreado conserva todos sus DEBUG). Fuera de un request, al azar.
+    """
+
+    def __init__(self, tasa=TASA_MUESTREO):
+        super().__init__()
+        self.tasa = float(tasa)
+
+    def filter(self, record):
+        if record.levelno >= logging.INFO:
+            return True
+        id_request = id_request_actual()
+        if id_request is None:
+            return random.random() < self.tasa
+        return zlib.crc32(id_request.encode()) % 10000 < self.tasa * 10000
+
+
+class ContextoLogMiddleware:
+    """
+    Debe ir primero en MIDDLEWARE: la latencia incluye todo el resto.
+    Devuelve el id en la cabecera X-Request-ID.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.asincrono = iscoroutinefunction(get_response)
+        if self.asincrono:
+            markcoroutinefunction(self)
+
+    def _iniciar(self, request):
+        recibido = request.headers.get(CABECERA_ID, '')
+        request.id_request = recibido if _RE_ID.match(recibido) else uuid.uuid4().hex
+        return _request_actual.set((request, request.id_request))
+
+    def _terminar(self, request, respuesta, inicio, token):
+        latencia_ms = round((time.perf_counter() - inicio) * 1000, 2)
+        respuesta[CABECERA_ID] = request.id_request
+        logger_accesos.info(
+            '%s %s %s %.1f ms', request.method, request.path, respuesta.status_code, latencia_ms,
+            extra={
+                'metodo': request.method,
+                'ruta': request.path,
+                'estado': respuesta.status_code,
+                'latencia_ms': latencia_ms,
+            },
+        )
+        _request_actual.reset(token)
+        return respuesta
+
+    def __call__(self, request):
+        if self.asincrono:
+            return self.__acall__(request)
+        inicio = time.perf_counter()
+        token = self._iniciar(request)
+        return self._terminar(request, self.get_response(request), inicio, token)
+
+    async def __acall__(self, request):
+        inicio = time.perf_counter()
+        token = self._iniciar(request)
+        return self._terminar(request, await self.get_response(request), inicio, token)
+
+
+# ====================================================================
+# FORMATO
+# ====================================================================
+
+class FormatoJSON(logging.Formatter):
+    """Una línea JSON por registro; los campos de `extra` van como claves propias."""
+
+    def format(self, record):
+        datos = {
+            'ts': datetime.fromtimestamp(record.created, tz.utc).isoformat(timespec='milliseconds'),
+            'nivel': record.levelname,
+            'logger': record.name,
+            'mensaje': record.getMessage(),
+            'modulo': record.module,
+            'linea': record.lineno,
+            'proceso': record.process,
+            'hilo': record.threadName,
+        }
+        for clave, valor in record.__dict__.items():
+            if clave not in _ATRIBUTOS_REGISTRO and not clave.startswith('_'):
+                datos[clave] = valor
+        if record.exc_info:
+            datos['excepcion'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            datos['excepcion'] = record.exc_text
+        if record.stack_info:
+            datos['pila'] = self.formatStack(record.stack_info)
+        return json.dumps(datos, ensure_ascii=False, default=str)
+
+
+# ====================================================================
+# ESCRITURA
+# ====================================================================
+
+def _proxima_medianoche(ahora=None):
+    ahora = ahora or datetime.now()
+    return (ahora.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)).timestamp()
+
+
+class ArchivoVigilado(WatchedFileHandler):
+    """
+    Agrega al final sin rotar; si el archivo fue movido o borrado (logrotate)
+    lo reabre. Varios procesos pueden escribir el mismo archivo.
+    """
+
+    def __init__(self, archivo):
+        os.makedirs(os.path.dirname(os.path.abspath(archivo)), exist_ok=True)
+        super().__init__(archivo, encoding='utf-8', delay=True)
+
+
+class ArchivoRotativoComprimido(RotatingFileHandler):
+    """
+    Rota al superar `max_bytes` o al pasar la medianoche (hora local) y
+    comprime el archivo rotado (django.log.1.gz, ..., hasta `respaldos`).
+    Lo usa el hilo escritor: comprimir no bloquea ningún request.
+    Solo para un proceso: con varios, usar ArchivoVigilado y logrotate.
+    """
+
+    def __init__(self, archivo, max_bytes=MAX_BYTES, respaldos=RESPALDOS, diario=True, comprimir=True):
+        os.makedirs(os.path.dirname(os.path.abspath(archivo)), exist_ok=True)
+        super().__init__(archivo, maxBytes=max_bytes, backupCount=respaldos, encoding='utf-8', delay=True)
+        self.diario = diario
+        self.proximo_corte = _proxima_medianoche()
+        if comprimir:
+            self.namer = lambda nombre: f'{nombre}.gz'
+            self.rotator = self._comprimir
+
+    @staticmethod
+    def _comprimir(origen, destino):
+        with open(origen, 'rb') as entrada, gzip.open(destino, 'wb') as salida:
+            shutil.copyfileobj(entrada, salida)
+        os.remove(origen)
+
+    def shouldRollover(self, record):
+        if self.diario and time.time() >= self.proximo_corte:
+            return os.path.exists(self.baseFilename) and os.path.getsize(self.baseFilename) > 0
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        self.proximo_corte = _proxima_medianoche()
+
+
+class _Escritor(QueueListener):
+
+    def enqueue_sentinel(self):
+        # Con la cola llena put_nowait fallaría: se espera a que el hilo la vacíe
+        self.queue.put(self._sentinel, timeout=5)
+
+
+_activos = weakref.WeakSet()
+
+
+class ManejadorCola(QueueHandler):
+    """
+    Handler para LOGGING: encola y un hilo propio escribe en un
+    ArchivoRotativoComprimido (o en un ArchivoVigilado si `rotar` es False).
+    El formatter configurado se aplica en el hilo escritor; en el del
+    request solo se arma el mensaje.
+
+    Args:
+        archivo (str): ruta del log
+        max_bytes, respaldos, diario, comprimir: ver ArchivoRotativoComprimido
+        capacidad (int): registros en cola antes de empezar a descartar
+        rotar (bool): False si rota logrotate (varios workers)
+    """
+
+    def __init__(self, archivo, max_bytes=MAX_BYTES, respaldos=RESPALDOS, diario=True, comprimir=True,
+                 capacidad=CAPACIDAD_COLA, rotar=True):
+        super().__init__(queue.Queue(capacidad))
+        self.capacidad = capacidad
+        if rotar:
+            self.destino = ArchivoRotativoComprimido(archivo, max_bytes, respaldos, diario, comprimir)
+        else:
+            self.destino = ArchivoVigilado(archivo)
+        self.descartados = 0
+        self._candado_descartados = threading.Lock()
+        self._iniciar_escritor()
+        _activos.add(self)
+
+    def _iniciar_escritor(self):
+        self.escritor = _Escritor(self.queue, self.destino)
+        self.escritor.start()
+
+    def setFormatter(self, fmt):
+        super().setFormatter(fmt)
+        self.destino.setFormatter(fmt)
+
+    def prepare(self, record):
+        """Copia sin referencias a objetos del request; el formato queda para el escritor."""
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        # django.request adjunta el HttpRequest
+        record.__dict__.pop('request', None)
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._candado_descartados:
+                self.descartados += 1
+            return
+        if self.descartados:
+            with self._candado_descartados:
+                descartados, self.descartados = self.descartados, 0
+            aviso = logging.makeLogRecord({
+                'name': __name__, 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                'msg': f'{descartados} registros descartados: cola de logs llena',
+            })
+            try:
+                self.queue.put_nowait(aviso)
+            except queue.Full:
+                pass
+
+    def close(self):
+        """Vacía la cola, escribe lo pendiente y cierra el archivo (logging.shutdown al salir)."""
+        if self.escritor is not None:
+            try:
+                self.escritor.stop()
+            except queue.Full:
+                pass
+            self.escritor = None
+        self.destino.close()
+        _activos.discard(self)
+        super().close()
+
+
+def _reiniciar_en_hijo():
+    # Tras un fork (gunicorn --preload) el hilo escritor no existe en el hijo
+    for manejador in list(_activos):
+        manejador.queue = queue.Queue(manejador.capacidad)
+        manejador._iniciar_escritor()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reiniciar_en_hijo)
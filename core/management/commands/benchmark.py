@@ -0,0 +1,71 @@
+################
+# COMANDO: benchmark
+# Descripción: Ejecuta los escenarios de core/benchmark.py, escribe los
+#              tiempos y consultas como JSON y, con --comparar, marca los
+#              escenarios más lentos que en una corrida anterior.
+# Uso: python manage.py benchmark [--escenario linea_tiempo ...] [--repeticiones 20]
+#                                 [--salida resultados.json] [--comparar anterior.json]
+################
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import benchmark
+from core.sinteticos import usuario_sintetico
+
+
+class Command(BaseCommand):
+    help = 'Mide los caminos críticos y compara con una corrida anterior'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--escenario',
+            action='append',
+            choices=sorted(benchmark.ESCENARIOS),
+            help='Escenario a ejecutar (repetible; por defecto todos)'
+        )
+        parser.add_argument(
+            '--repeticiones',
+            type=int,
+            default=benchmark.REPETICIONES,
+            help=f'Repeticiones medidas por escenario (por defecto {benchmark.REPETICIONES})'
+        )
+        parser.add_argument(
+            '--salida',
+            help='Archivo JSON donde guardar el resultado (por defecto se imprime)'
+        )
+        parser.add_argument(
+            '--comparar',
+            help='JSON de una corrida anterior; termina con error si hay regresiones'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            resultado = benchmark.ejecutar(
+                usuario_sintetico(),
+                nombres=options['escenario'],
+                repeticiones=options['repeticiones'],
+                salida=self.stdout.write,
+            )
+        except ValueError as error:
+            raise CommandError(str(error))
+
+        if options['salida']:
+            benchmark.guardar(resultado, options['salida'])
+            self.stdout.write(f'Resultado guardado en {options["salida"]}')
+        else:
+            self.stdout.write(json.dumps(resultado, ensure_ascii=False, indent=2))
+
+        if options['comparar']:
+            regresiones = benchmark.comparar(resultado, benchmark.cargar(options['comparar']))
+            for regresion in regresiones:
+                self.stdout.write(self.style.WARNING(
+                    f'  {regresion["escenario"]}: {regresion["mediana_anterior_ms"]} → '
+                    f'{regresion["mediana_actual_ms"]} ms (x{regresion["razon"]}), '
+                    f'consultas {regresion["consultas_anterior"]} → {regresion["consultas_actual"]}'
+                ))
+            if regresiones:
+                raise CommandError(f'{len(regresiones)} escenarios con regresión')
+
+        self.stdout.write(self.style.SUCCESS('✅ Benchmark completado'))
@@ -0,0 +1,79 @@
+################
+# COMANDO: completar_rut_normalizado
+# Descripción: Completa rut_numero/rut_dv en personas existentes, por bloques
+# Uso: python manage.py completar_rut_normalizado [--bloque 5000]
+################
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import Persona
+from utilidades.validadores import descomponer_rut
+
+
+class Command(BaseCommand):
+    help = 'Completa el RUT canónico (rut_numero, rut_dv) de las personas existentes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--bloque',
+            type=int,
+            default=5000,
+            help='Cantidad de personas por bloque (por defecto 5000)'
+        )
+
+    def handle(self, *args, **options):
+        bloque = options['bloque']
+        ultimo_id = 0
+        actualizadas = 0
+        invalidas = []
+        duplicadas = []
+
+        while True:
+            personas = list(
+                Persona.objects.filter(pk__gt=ultimo_id, rut_numero__isnull=True)
+                .order_by('pk')
+                .only('id', 'rut')[:bloque]
+            )
+            if not personas:
+                break
+            ultimo_id = personas[-1].pk
+
+            # Descomponer y detectar duplicados dentro del bloque
+            por_numero = {}
+            for persona in personas:
+                partes = descomponer_rut(persona.rut)
+                if partes is None:
+                    invalidas.append(persona)
+                    continue
+                if partes[0] in por_numero:
+                    duplicadas.append(persona)
+                    continue
+                persona.rut_numero, persona.rut_dv = partes
+                por_numero[partes[0]] = persona
+
+            # Duplicados contra filas ya normalizadas: una consulta por bloque
+            existentes = set(
+                Persona.objects.filter(rut_numero__in=list(por_numero))
+                .values_list('rut_numero', flat=True)
+            )
+            for numero in existentes:
+                duplicadas.append(por_numero.pop(numero))
+
+            with transaction.atomic():
+                Persona.objects.bulk_update(
+                    list(por_numero.values()),
+                    ['rut_numero', 'rut_dv'],
+                    batch_size=1000
+                )
+            actualizadas += len(por_numero)
+            self.stdout.write(f'  {actualizadas} personas actualizadas')
+
+        for persona in invalidas:
+            self.stdout.write(self.style.WARNING(f'RUT inválido: id={persona.pk} rut={persona.rut}'))
+        for persona in duplicadas:
+            self.stdout.write(self.style.WARNING(f'RUT duplicado: id={persona.pk} rut={persona.rut}'))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {actualizadas} actualizadas, {len(invalidas)} inválidas, {len(duplicadas)} duplicadas'
+        ))
@@ -0,0 +1,81 @@
+################
+# COMANDO: generar_datos_sinteticos
+# Descripción: Carga un conjunto obstétrico sintético y determinista para
+#              benchmarks (200k personas, 150k fichas, 2M controles y 1M
+#              registros clínicos con --escala 1). Todo queda a nombre del
+#              usuario 'sintetico'; --borrar lo elimina. Los RUT generados
+#              pueden coincidir con los de personas reales: sin DEBUG no
+#              genera salvo con --permitir-base-real.
+# Uso: python manage.py generar_datos_sinteticos [--escala 0.01] [--semilla N] [--borrar]
+################
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Persona
+from core.sinteticos import (
+    SEMILLA, TAMANO_BLOQUE, USUARIO_SINTETICO, GeneradorSintetico, borrar_sinteticos, volumenes_para,
+)
+
+
+class Command(BaseCommand):
+    help = 'Genera datos obstétricos sintéticos para benchmarks'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--escala',
+            type=float,
+            default=1.0,
+            help='Fracción de los volúmenes de producción (por defecto 1.0)'
+        )
+        parser.add_argument(
+            '--semilla',
+            type=int,
+            default=SEMILLA,
+            help=f'Semilla del generador (por defecto {SEMILLA})'
+        )
+        parser.add_argument(
+            '--bloque',
+            type=int,
+            default=TAMANO_BLOQUE,
+            help=f'Filas por INSERT masivo (por defecto {TAMANO_BLOQUE})'
+        )
+        parser.add_argument(
+            '--borrar',
+            action='store_true',
+            help='Borra los datos sintéticos existentes (sin generar si no se indica --escala)'
+        )
+        parser.add_argument(
+            '--permitir-base-real',
+            action='store_true',
+            help='Genera aunque DEBUG esté desactivado (solo en bases de prueba sin datos reales)'
+        )
+
+    def handle(self, *args, **options):
+        if options['escala'] <= 0:
+            raise CommandError('--escala debe ser mayor que 0')
+
+        if options['borrar']:
+            borradas = borrar_sinteticos()
+            self.stdout.write(self.style.SUCCESS(f'✅ {borradas} personas sintéticas borradas'))
+            return
+
+        if not (settings.DEBUG or options['permitir_base_real']):
+            raise CommandError(
+                'Los RUT sintéticos pueden coincidir con los de personas reales y DEBUG está '
+                'desactivado: use una base de pruebas o indique --permitir-base-real'
+            )
+
+        if Persona.objects.filter(created_by__username=USUARIO_SINTETICO).exists():
+            raise CommandError('Ya hay datos sintéticos: use --borrar antes de generar otra vez')
+
+        self.stdout.write(f'Generando: {volumenes_para(options["escala"])}')
+        generador = GeneradorSintetico(
+            escala=options['escala'],
+            semilla=options['semilla'],
+            tamano_bloque=options['bloque'],
+            salida=self.stdout.write,
+        )
+        resultado = generador.generar()
+
+        self.stdout.write(self.style.SUCCESS(f'✅ Datos sintéticos generados: {resultado}'))
@@ -0,0 +1,40 @@
+################
+# COMANDO: generar_derivadas
+# Descripción: Genera en primer plano las miniaturas y variantes web que
+#              falten (imágenes anteriores a core.imagenes o que el pool en
+#              segundo plano no alcanzó a procesar). Idempotente.
+# Uso: python manage.py generar_derivadas [--limite 500]
+################
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.imagenes import generar_derivadas, imagenes_pendientes
+
+
+class Command(BaseCommand):
+    help = 'Genera las miniaturas y variantes web pendientes de las imágenes clínicas'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limite',
+            type=int,
+            help='Máximo de imágenes a procesar en esta corrida (por defecto todas)'
+        )
+
+    def handle(self, *args, **options):
+        if options['limite'] is not None and options['limite'] < 1:
+            raise CommandError('--limite debe ser mayor que 0')
+
+        pendientes = imagenes_pendientes()[:options['limite']]
+        self.stdout.write(f'{len(pendientes)} imágenes con derivadas pendientes')
+
+        errores = 0
+        for indice, nombre in enumerate(pendientes, start=1):
+            if not generar_derivadas(nombre):
+                errores += 1
+            if indice % 100 == 0:
+                self.stdout.write(f'  {indice} procesadas')
+
+        if errores:
+            self.stdout.write(self.style.WARNING(f'⚠️  {errores} imágenes no se pudieron leer'))
+        self.stdout.write(self.style.SUCCESS(f'✅ {len(pendientes) - errores} imágenes procesadas'))
@@ -0,0 +1,67 @@
+################
+# COMANDO: importar_personas
+# Descripción: Carga masiva de personas (y fichas de paciente) desde CSV o Excel
+# Uso: python manage.py importar_personas archivo.csv --usuario admin
+#          [--pacientes] [--bloque 2000] [--errores errores.csv]
+# Cada bloque se confirma por separado: si el proceso se interrumpe, basta
+# volver a ejecutarlo (los RUT ya cargados se reportan como registrados).
+################
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from core.importacion import TAMANO_BLOQUE, ImportadorPersonas, leer_archivo
+
+
+class Command(BaseCommand):
+    help = 'Importa personas (y opcionalmente pacientes) desde un archivo CSV o Excel'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del archivo .csv o .xlsx')
+        parser.add_argument(
+            '--usuario',
+            required=True,
+            help='Usuario que queda registrado como creador'
+        )
+        parser.add_argument(
+            '--pacientes',
+            action='store_true',
+            help='Crea también la ficha de Paciente de cada persona'
+        )
+        parser.add_argument(
+            '--bloque',
+            type=int,
+            default=TAMANO_BLOQUE,
+            help=f'Filas por bloque (por defecto {TAMANO_BLOQUE})'
+        )
+        parser.add_argument(
+            '--errores',
+            help='Archivo CSV de filas rechazadas (por defecto <archivo>.errores.csv)'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            usuario = User.objects.get(username=options['usuario'])
+        except User.DoesNotExist:
+            raise CommandError(f'No existe el usuario {options["usuario"]}')
+
+        ruta = options['archivo']
+        ruta_errores = options['errores'] or f'{ruta}.errores.csv'
+
+        try:
+            origen = open(ruta, 'rb')
+        except OSError as error:
+            raise CommandError(f'No se pudo abrir {ruta}: {error}')
+
+        with origen, open(ruta_errores, 'w', encoding='utf-8', newline='') as errores:
+            importador = ImportadorPersonas(
+                usuario,
+                tamano_bloque=options['bloque'],
+                crear_pacientes=options['pacientes'],
+                errores=errores,
+            )
+            resultado = importador.importar(leer_archivo(origen, ruta))
+
+        self.stdout.write(self.style.SUCCESS(f'✅ Importación terminada: {resultado}'))
+        if resultado.rechazadas:
+            self.stdout.write(self.style.WARNING(f'⚠️ Filas rechazadas en {ruta_errores}'))
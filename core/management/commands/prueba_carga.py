@@ -0,0 +1,134 @@
+################
+# COMANDO: prueba_carga
+# Descripción: Prueba de carga contra un servidor ya levantado (ver
+#              core/carga.py). Crea una sesión del usuario en la misma base
+#              que usa el servidor, mide throughput y latencias por ruta y,
+#              con --comparar, muestra la razón contra otra corrida
+#              (ej: ASGI contra WSGI).
+# Uso: python manage.py prueba_carga --url http://127.0.0.1:8000 [--concurrencia 50]
+#                                    [--duracion 30] [--etiqueta asgi]
+#                                    [--salida asgi.json] [--comparar wsgi.json]
+################
+
+import json
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from core import carga
+from core.benchmark import cargar, guardar
+from core.sinteticos import usuario_sintetico
+
+
+class Command(BaseCommand):
+    help = 'Prueba de carga HTTP sobre las rutas de lectura críticas'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url',
+            default='http://127.0.0.1:8000',
+            help='Servidor a probar (por defecto http://127.0.0.1:8000)'
+        )
+        parser.add_argument(
+            '--concurrencia',
+            type=int,
+            default=carga.CONCURRENCIA,
+            help=f'Clientes simultáneos (por defecto {carga.CONCURRENCIA})'
+        )
+        parser.add_argument(
+            '--duracion',
+            type=float,
+            default=carga.DURACION,
+            help=f'Segundos medidos (por defecto {carga.DURACION})'
+        )
+        parser.add_argument(
+            '--calentamiento',
+            type=float,
+            default=carga.CALENTAMIENTO,
+            help=f'Segundos iniciales sin medir (por defecto {carga.CALENTAMIENTO})'
+        )
+        parser.add_argument(
+            '--ruta',
+            action='append',
+            choices=sorted(carga.RUTAS),
+            help='Ruta a incluir (repetible; por defecto todas)'
+        )
+        parser.add_argument(
+            '--usuario',
+            help='Usuario de la sesión (por defecto el usuario sintético)'
+        )
+        parser.add_argument(
+            '--etiqueta',
+            default='',
+            help='Nombre del despliegue probado (ej: wsgi, asgi)'
+        )
+        parser.add_argument(
+            '--salida',
+            help='Archivo JSON donde guardar el resultado (por defecto se imprime)'
+        )
+        parser.add_argument(
+            '--comparar',
+            help='JSON de otra corrida para comparar throughput y p95'
+        )
+
+    def handle(self, *args, **options):
+        if options['concurrencia'] < 1 or options['duracion'] <= 0:
+            raise CommandError('--concurrencia y --duracion deben ser mayores que 0')
+
+        if options['usuario']:
+            usuario = User.objects.filter(username=options['usuario']).first()
+            if usuario is None:
+                raise CommandError(f'No existe el usuario {options["usuario"]}')
+        else:
+            usuario = usuario_sintetico()
+
+        muestra = carga.muestra_pacientes()
+        if not muestra:
+            raise CommandError('No hay pacientes: cargue datos con generar_datos_sinteticos')
+
+        rutas = {nombre: carga.RUTAS[nombre] for nombre in options['ruta'] or carga.RUTAS}
+        sesion = carga.crear_sesion(usuario)
+        try:
+            self.stdout.write(
+                f'{options["concurrencia"]} clientes durante {options["duracion"]} s contra {options["url"]}...'
+            )
+            resultado = carga.PruebaCarga(
+                options['url'],
+                f'{settings.SESSION_COOKIE_NAME}={sesion.session_key}',
+                rutas,
+                muestra,
+                concurrencia=options['concurrencia'],
+                duracion=options['duracion'],
+                calentamiento=options['calentamiento'],
+            ).ejecutar()
+        finally:
+            sesion.delete()
+        resultado['etiqueta'] = options['etiqueta']
+
+        for nombre, medicion in {'total': resultado['total'], **resultado['rutas']}.items():
+            if medicion['requests']:
+                self.stdout.write(
+                    f'  {nombre}: {medicion["requests_s"]} req/s, p50 {medicion["p50_ms"]} ms, '
+                    f'p95 {medicion["p95_ms"]} ms, {medicion["errores"]} errores'
+                )
+
+        if options['salida']:
+            guardar(resultado, options['salida'])
+            self.stdout.write(f'Resultado guardado en {options["salida"]}')
+        else:
+            self.stdout.write(json.dumps(resultado, ensure_ascii=False, indent=2))
+
+        if options['comparar']:
+            anterior = cargar(options['comparar'])
+            self.stdout.write(f'Contra {anterior.get("etiqueta") or options["comparar"]}:')
+            for fila in carga.comparar(resultado, anterior):
+                self.stdout.write(
+                    f'  {fila["ruta"]}: throughput x{fila["razon_throughput"]} '
+                    f'({fila["requests_s_anterior"]} → {fila["requests_s_actual"]} req/s), '
+                    f'p95 x{fila["razon_p95"]}'
+                )
+
+        if resultado['total']['errores']:
+            self.stdout.write(self.style.WARNING(f'⚠️  {resultado["total"]["errores"]} requests con error'))
+        self.stdout.write(self.style.SUCCESS('✅ Prueba de carga completada'))
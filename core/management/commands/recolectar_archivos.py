@@ -0,0 +1,70 @@
+################
+# COMANDO: recolectar_archivos
+# Descripción: Borra los blobs del storage deduplicado que ninguna fila
+#              referencia (y sus derivadas), pasado el período de gracia.
+#              --reconciliar recalcula antes todas las referencias y
+#              --migrar mueve a blobs las imágenes subidas antes de la
+#              deduplicación (ver core/almacenamiento.py)
+# Uso: python manage.py recolectar_archivos [--gracia-horas 24] [--reconciliar] [--migrar] [--simular]
+# Programar periódicamente (ej: cron diario fuera de horario)
+################
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.almacenamiento import GRACIA, migrar_existentes, recolectar_huerfanos, reconciliar_referencias
+
+
+class Command(BaseCommand):
+    help = 'Borra los archivos clínicos sin referencias del storage deduplicado'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--gracia-horas',
+            type=float,
+            default=GRACIA.total_seconds() / 3600,
+            help=f'Antigüedad mínima de un blob sin referencias para borrarlo (por defecto {GRACIA.total_seconds() / 3600:g})'
+        )
+        parser.add_argument(
+            '--reconciliar',
+            action='store_true',
+            help='Recalcula las referencias de todos los blobs desde las tablas'
+        )
+        parser.add_argument(
+            '--migrar',
+            action='store_true',
+            help='Mueve a blobs las imágenes subidas antes de la deduplicación'
+        )
+        parser.add_argument(
+            '--simular',
+            action='store_true',
+            help='Informa qué se borraría sin borrar nada'
+        )
+
+    def handle(self, *args, **options):
+        if options['gracia_horas'] < 0:
+            raise CommandError('--gracia-horas no puede ser negativo')
+
+        if options['migrar']:
+            if options['simular']:
+                raise CommandError('--migrar no se puede simular')
+            migracion = migrar_existentes(salida=self.stdout.write)
+            self.stdout.write(
+                f'{migracion["migrados"]} archivos migrados a blobs, {migracion["faltantes"]} no encontrados'
+            )
+
+        if options['reconciliar']:
+            cambios = reconciliar_referencias()
+            for nombre, anterior, real in cambios:
+                self.stdout.write(f'  {nombre}: {anterior if anterior is not None else "sin fila"} → {real}')
+            self.stdout.write(f'{len(cambios)} referencias corregidas')
+
+        resultado = recolectar_huerfanos(
+            gracia=timedelta(hours=options['gracia_horas']), simular=options['simular']
+        )
+        accion = 'se borrarían' if options['simular'] else 'borrados'
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {resultado["borrados"]} blobs {accion} ({resultado["bytes"] / 1024 / 1024:.1f} MB), '
+            f'{resultado["corregidos"]} referencias corregidas'
+        ))
@@ -0,0 +1,40 @@
+################
+# COMANDO: reconciliar_contadores
+# Descripción: Recalcula los contadores de los dashboards desde las tablas
+#              (corrige deriva por operaciones masivas y el paso del tiempo)
+# Uso: python manage.py reconciliar_contadores [--dias 7] [--conservar-dias 90]
+# Programar periódicamente (ej: cron cada 15 minutos)
+################
+
+from django.core.management.base import BaseCommand
+
+from core.contadores import podar, reconciliar
+
+
+class Command(BaseCommand):
+    help = 'Recalcula los contadores precalculados de los dashboards'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias',
+            type=int,
+            default=7,
+            help='Días hacia atrás a recalcular en los contadores diarios (por defecto 7)'
+        )
+        parser.add_argument(
+            '--conservar-dias',
+            type=int,
+            default=90,
+            help='Borra contadores diarios más antiguos (por defecto 90)'
+        )
+
+    def handle(self, *args, **options):
+        cambios = reconciliar(dias=options['dias'])
+        borrados = podar(conservar_dias=options['conservar_dias'])
+
+        for clave, periodo, anterior, nuevo in cambios:
+            self.stdout.write(f'  {clave}[{periodo or "total"}]: {anterior} → {nuevo}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Contadores reconciliados ({len(cambios)} corregidos, {borrados} diarios podados)'
+        ))
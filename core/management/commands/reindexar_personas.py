@@ -0,0 +1,57 @@
+################
+# COMANDO: reindexar_personas
+# Descripción: Reconstruye el índice de búsqueda de personas por bloques
+# Uso: python manage.py reindexar_personas [--bloque 2000] [--crear-fulltext]
+################
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.busqueda import BackendMySQLFulltext, get_backend
+from core.models import Persona
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el índice de búsqueda de personas por bloques'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--bloque',
+            type=int,
+            default=2000,
+            help='Cantidad de personas por bloque (por defecto 2000)'
+        )
+        parser.add_argument(
+            '--crear-fulltext',
+            action='store_true',
+            help='Crea el índice FULLTEXT (solo backend MySQL) antes de indexar'
+        )
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        bloque = options['bloque']
+
+        if options['crear_fulltext']:
+            if not isinstance(backend, BackendMySQLFulltext):
+                raise CommandError('--crear-fulltext requiere el backend BackendMySQLFulltext')
+            backend.crear_indice_fulltext()
+            self.stdout.write('Índice FULLTEXT creado')
+
+        ultimo_id = 0
+        total = 0
+        campos = ['id', 'rut', 'nombre', 'apellido', 'contacto']
+
+        while True:
+            personas = list(
+                Persona.objects.filter(pk__gt=ultimo_id)
+                .order_by('pk')
+                .only(*campos)[:bloque]
+            )
+            if not personas:
+                break
+
+            backend.indexar_lote(personas)
+            ultimo_id = personas[-1].pk
+            total += len(personas)
+            self.stdout.write(f'  {total} personas indexadas')
+
+        self.stdout.write(self.style.SUCCESS(f'✅ Índice reconstruido: {total} personas'))
@@ -4,9 +4,27 @@
 # v0.2: Agregados campos de auditoría
 ################
 
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.contrib.auth.models import User
 
+from utilidades.validadores import descomponer_rut
+
+
+class PersonaQuerySet(models.QuerySet):
+    """QuerySet de Persona con búsqueda por RUT normalizado."""
+    
+    def by_rut(self, rut):
+        """
+        Filtra por RUT en cualquier formato ('12.345.678-5', '123456785', ...).
+        Usa el índice único de rut_numero (una sola búsqueda por índice).
+        """
+        partes = descomponer_rut(rut)
+        if partes is None:
+            return self.none()
+        numero, verificador = partes
+        return self.filter(rut_numero=numero, rut_dv=verificador)
+
 
 class Persona(models.Model):
     """
@@ -20,6 +38,20 @@ class Persona(models.Model):
         verbose_name="RUT",
         help_text="Formato: XX.XXX.XXX-X"
     )
+    # RUT canónico (v0.3): se completa en save() desde `rut`
+    rut_numero = models.PositiveIntegerField(
+        unique=True,
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name="RUT (cuerpo)"
+    )
+    rut_dv = models.CharField(
+        max_length=1,
+        blank=True,
+        editable=False,
+        verbose_name="RUT (dígito verificador)"
+    )
     nombre = models.CharField(
         max_length=255,
         verbose_name="Nombre"
@@ -76,6 +108,8 @@ class Persona(models.Model):
         verbose_name="Estado"
     )
     
+    objects = PersonaQuerySet.as_manager()
+    
     class Meta:
         verbose_name = "Persona"
         verbose_name_plural = "Personas"
@@ -88,6 +122,318 @@ class Persona(models.Model):
     def __str__(self):
         return f"{self.nombre} {self.apellido} ({self.rut})"
     
+    def save(self, *args, **kwargs):
+        self.sincronizar_rut()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'rut' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'rut_numero', 'rut_dv'}
+        super().save(*args, **kwargs)
+    
+    def sincronizar_rut(self):
+        """Completa rut_numero y rut_dv a partir de `rut`"""
+        partes = descomponer_rut(self.rut)
+        if partes is None:
+            self.rut_numero, self.rut_dv = None, ''
+        else:
+            self.rut_numero, self.rut_dv = partes
+    
     def get_full_name(self):
         """Retorna nombre completo"""
-        return f"{self.nombre} {self.apellido}"
\ No newline at end of file
+        return f"{self.nombre} {self.apellido}"
+
+################
+# MODELO: PersonaToken
+# Descripción: Índice de búsqueda de personas (tokens normalizados)
+# Se mantiene sincronizado desde core.signals vía core.busqueda
+################
+
+class PersonaToken(models.Model):
+    """
+    Token normalizado de búsqueda asociado a una Persona.
+    Nombres sin tildes, RUT normalizado, dígitos del teléfono y trigramas
+    de los nombres. Las búsquedas son lecturas por índice (tipo, token).
+    """
+    
+    TIPO_CHOICES = [
+        ('nombre', 'Nombre'),
+        ('rut', 'RUT'),
+        ('telefono', 'Teléfono'),
+        ('trigrama', 'Trigrama'),
+    ]
+    
+    persona = models.ForeignKey(
+        Persona,
+        on_delete=models.CASCADE,
+        related_name='tokens_busqueda',
+        verbose_name="Persona"
+    )
+    tipo = models.CharField(
+        max_length=10,
+        choices=TIPO_CHOICES,
+        verbose_name="Tipo"
+    )
+    token = models.CharField(
+        max_length=64,
+        verbose_name="Token"
+    )
+    
+    class Meta:
+        verbose_name = "Token de Búsqueda"
+        verbose_name_plural = "Tokens de Búsqueda"
+        indexes = [
+            models.Index(fields=['tipo', 'token']),
+        ]
+    
+    def __str__(self):
+        return f"{self.tipo}:{self.token}"
+
+
+################
+# MODELO: PersonaIndice
+# Descripción: Documento de búsqueda por persona (MySQL FULLTEXT)
+################
+
+class PersonaIndice(models.Model):
+    """
+    Documento de texto plegado por persona.
+    Usado por el backend FULLTEXT de MySQL (ver core.busqueda).
+    """
+    
+    persona = models.OneToOneField(
+        Persona,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='indice_busqueda',
+        verbose_name="Persona"
+    )
+    documento = models.TextField(
+        verbose_name="Documento"
+    )
+    
+    class Meta:
+        verbose_name = "Índice de Búsqueda"
+        verbose_name_plural = "Índices de Búsqueda"
+    
+    def __str__(self):
+        return f"Índice {self.persona_id}"
+
+
+################
+# MODELO: Contador
+# Descripción: Contadores desnormalizados para los dashboards
+# Se mantienen incrementalmente desde core.contadores (señales) y se
+# reconcilian con el comando reconciliar_contadores
+################
+
+class Contador(models.Model):
+    """
+    Valor precalculado de una estadística.
+    Los contadores globales usan periodo '' y los diarios 'AAAA-MM-DD'.
+    """
+    
+    clave = models.CharField(
+        max_length=50,
+        verbose_name="Clave"
+    )
+    periodo = models.CharField(
+        max_length=10,
+        blank=True,
+        default='',
+        verbose_name="Periodo"
+    )
+    valor = models.BigIntegerField(
+        default=0,
+        verbose_name="Valor"
+    )
+    actualizado = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Actualizado"
+    )
+    
+    class Meta:
+        verbose_name = "Contador"
+        verbose_name_plural = "Contadores"
+        constraints = [
+            models.UniqueConstraint(fields=['clave', 'periodo'], name='contador_clave_periodo_unico'),
+        ]
+        indexes = [
+            models.Index(fields=['periodo']),
+        ]
+    
+    def __str__(self):
+        return f"{self.clave}[{self.periodo or 'total'}] = {self.valor}"
+
+
+################
+# MODELO: ImagenDerivada
+# Descripción: Miniatura o variante web de una imagen subida (core.imagenes)
+# El archivo se nombra con el hash de su contenido
+################
+
+class ImagenDerivada(models.Model):
+    """
+    Variante redimensionada de un archivo de imagen.
+    `original` es el nombre del archivo subido en el storage.
+    """
+    
+    original = models.CharField(
+        max_length=255,
+        verbose_name="Archivo original"
+    )
+    variante = models.CharField(
+        max_length=20,
+        verbose_name="Variante"
+    )
+    archivo = models.CharField(
+        max_length=255,
+        verbose_name="Archivo derivado"
+    )
+    ancho = models.PositiveIntegerField(
+        verbose_name="Ancho (px)"
+    )
+    alto = models.PositiveIntegerField(
+        verbose_name="Alto (px)"
+    )
+    tamano = models.PositiveIntegerField(
+        verbose_name="Tamaño (bytes)"
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Fecha de Creación"
+    )
+    
+    class Meta:
+        verbose_name = "Imagen Derivada"
+        verbose_name_plural = "Imágenes Derivadas"
+        constraints = [
+            models.UniqueConstraint(fields=['original', 'variante'], name='imagen_derivada_unica'),
+        ]
+    
+    def __str__(self):
+        return f"{self.original} [{self.variante}]"
+
+
+################
+# MODELO: ArchivoAlmacenado
+# Descripción: Blob del storage deduplicado (core.almacenamiento) y cuántas
+# filas lo referencian. Los que quedan en 0 los borra recolectar_archivos
+################
+
+class ArchivoAlmacenado(models.Model):
+    """
+    Archivo guardado una sola vez por contenido.
+    `nombre` es blobs/ab/cd/<sha256>.<ext> en el storage.
+    """
+    
+    nombre = models.CharField(
+        max_length=255,
+        unique=True,
+        verbose_name="Nombre"
+    )
+    tamano = models.BigIntegerField(
+        verbose_name="Tamaño (bytes)"
+    )
+    referencias = models.IntegerField(
+        default=0,
+        verbose_name="Referencias"
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Fecha de Creación"
+    )
+    modified_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Última Modificación"
+    )
+    
+    class Meta:
+        verbose_name = "Archivo Almacenado"
+        verbose_name_plural = "Archivos Almacenados"
+        indexes = [
+            models.Index(fields=['referencias', 'modified_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.nombre} ({self.referencias} referencias)"
+
+
+################
+# MODELO: RegistroAuditoria
+# Descripción: Historial de cambios de los registros clínicos (core.auditoria)
+# Tabla de solo inserción, sin claves foráneas ni únicos además de la pk:
+# se puede particionar por rango de `ts` y archivar particiones antiguas
+################
+
+class RegistroAuditoriaQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        raise TypeError("La auditoría es de solo inserción")
+    
+    def delete(self):
+        raise TypeError("La auditoría es de solo inserción")
+
+
+class RegistroAuditoria(models.Model):
+    """
+    Un alta, modificación o baja de un registro clínico.
+    `cambios` es {campo: [antes, después]}.
+    """
+    
+    ACCION_CHOICES = [
+        ('creado', 'Creado'),
+        ('modificado', 'Modificado'),
+        ('eliminado', 'Eliminado'),
+    ]
+    
+    id = models.BigAutoField(primary_key=True)
+    modelo = models.CharField(
+        max_length=60,
+        verbose_name="Modelo"
+    )
+    objeto_id = models.BigIntegerField(
+        verbose_name="Id del registro"
+    )
+    accion = models.CharField(
+        max_length=10,
+        choices=ACCION_CHOICES,
+        verbose_name="Acción"
+    )
+    cambios = models.JSONField(
+        encoder=DjangoJSONEncoder,
+        verbose_name="Cambios"
+    )
+    # Sin ForeignKey: la tabla no depende de auth_user para particionarse ni archivarse
+    usuario_id = models.IntegerField(
+        null=True,
+        blank=True,
+        verbose_name="Usuario"
+    )
+    request_id = models.CharField(
+        max_length=64,
+        blank=True,
+        default='',
+        verbose_name="Id del request"
+    )
+    ts = models.DateTimeField(
+        verbose_name="Fecha del cambio"
+    )
+    
+    objects = RegistroAuditoriaQuerySet.as_manager()
+    
+    class Meta:
+        verbose_name = "Registro de Auditoría"
+        verbose_name_plural = "Registros de Auditoría"
+        indexes = [
+            models.Index(fields=['modelo', 'objeto_id', 'ts'], name='auditoria_objeto_ts'),
+            models.Index(fields=['ts'], name='auditoria_ts'),
+        ]
+    
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise TypeError("La auditoría es de solo inserción")
+        super().save(*args, **kwargs)
+    
+    def delete(self, *args, **kwargs):
+        raise TypeError("La auditoría es de solo inserción")
+    
+    def __str__(self):
+        return f"{self.modelo}#{self.objeto_id} {self.accion} ({self.ts:%Y-%m-%d %H:%M})"
@@ -0,0 +1,256 @@
+################
+# PAGINACIÓN: Keyset (cursor)
+# Descripción: Paginación por clave compuesta (campo de orden, pk) para la API.
+#              Cada página es una búsqueda por índice: la página N cuesta lo
+#              mismo que la página 1 y no se ejecuta COUNT(*) salvo que se pida.
+################
+
+import base64
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+# Sobre este límite el conteo aproximado se reporta como "al menos N"
+LIMITE_CONTEO = 1000
+
+
+# ====================================================================
+# CONTEO APROXIMADO
+# ====================================================================
+
+def contar_aproximado(queryset, limite=LIMITE_CONTEO):
+    """
+    Conteo barato de un queryset.
+
+    - Tabla completa en MySQL: estadística de InnoDB (information_schema),
+      sin recorrer la tabla.
+    - Con filtros u otros motores: COUNT acotado a `limite` filas.
+
+    Returns:
+        tuple: (total: int, exacto: bool)
+    """
+    conexion = connections[queryset.db]
+    modelo = queryset.model
+
+    if conexion.vendor == 'mysql' and not queryset.query.where:
+        with conexion.cursor() as cursor:
+            cursor.execute(
+                'SELECT TABLE_ROWS FROM information_schema.TABLES '
+                'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s',
+                [modelo._meta.db_table]
+            )
+            fila = cursor.fetchone()
+        if fila and fila[0] is not None:
+            return int(fila[0]), False
+
+    total = queryset.order_by()[:limite + 1].count()
+    if total > limite:
+        return limite, False
+    return total, True
+
+
+# ====================================================================
+# PAGINADOR
+# ====================================================================
+
+class PaginacionKeyset(BasePagination):
+    """
+    Paginación por cursor sobre (campo, pk).
+
+    El campo de orden se toma, en este orden, de:
+        1. `?ordering=` si la vista usa OrderingFilter y el campo está permitido
+        2. el atributo `orden_keyset` de la vista (ej: '-fecha_control')
+        3. el primer campo de Meta.ordering del modelo
+
+    La pk se agrega como desempate, así el cursor es único aunque muchas
+    filas compartan fecha. En InnoDB los índices secundarios ya incluyen la
+    pk, por lo que un índice (paciente, -fecha_control) cubre el orden
+    (fecha_control, pk) al filtrar por paciente.
+
+    Parámetros de consulta:
+        cursor: posición opaca retornada en `next` / `previous`
+        page_size: tamaño de página (máx `max_page_size`)
+        incluir_total: si es 1/true agrega `count` aproximado a la respuesta
+    """
+
+    page_size = api_settings.PAGE_SIZE or 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    total_query_param = 'incluir_total'
+    orden_por_defecto = '-pk'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.limite = self.get_page_size(request)
+        self.campo, self.descendente = self.get_ordering(request, queryset, view)
+
+        completo = queryset
+        posicion = self.decode_cursor(request)
+        if posicion is None:
+            hacia_atras = False
+        else:
+            valor, pk, hacia_atras = posicion
+            valor = self._valor_cursor(queryset.model, valor)
+            queryset = queryset.filter(self._filtro_posterior(valor, pk, hacia_atras))
+
+        # Hacia atrás se recorre con el orden invertido y luego se da vuelta
+        descendente = self.descendente != hacia_atras
+        signo = '-' if descendente else ''
+        filas = list(queryset.order_by(f'{signo}{self.campo}', f'{signo}pk')[:self.limite + 1])
+
+        hay_mas = len(filas) > self.limite
+        filas = filas[:self.limite]
+        if hacia_atras:
+            filas.reverse()
+
+        self.total = None
+        if self._pide_total(request):
+            self.total = contar_aproximado(completo)
+
+        self.primera, self.ultima = (filas[0], filas[-1]) if filas else (None, None)
+        if hacia_atras:
+            self.hay_siguiente, self.hay_anterior = True, hay_mas
+        else:
+            self.hay_siguiente, self.hay_anterior = hay_mas, posicion is not None
+        return filas
+
+    def get_paginated_response(self, data):
+        contenido = OrderedDict()
+        if self.total is not None:
+            total, exacto = self.total
+            contenido['count'] = total
+            contenido['count_exacto'] = exacto
+        contenido['next'] = self.get_next_link()
+        contenido['previous'] = self.get_previous_link()
+        contenido['results'] = data
+        return Response(contenido)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'count': {'type': 'integer', 'nullable': True},
+                'count_exacto': {'type': 'boolean', 'nullable': True},
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    ################
+    # Orden
+    ################
+    def get_ordering(self, request, queryset, view):
+        """
+        Returns:
+            tuple: (nombre_campo, descendente)
+        """
+        orden = None
+
+        filtros = getattr(view, 'filter_backends', None) or []
+        if any(issubclass(filtro, OrderingFilter) for filtro in filtros):
+            solicitado = OrderingFilter().get_ordering(request, queryset, view)
+            # Sin ?ordering= OrderingFilter cae al `ordering` de la vista: solo
+            # se respeta si el cliente lo pidió explícitamente
+            if solicitado and request.query_params.get(api_settings.ORDERING_PARAM):
+                # El cursor guarda el valor de un campo propio del modelo
+                if '__' not in solicitado[0]:
+                    orden = solicitado[0]
+
+        if orden is None:
+            orden = getattr(view, 'orden_keyset', None)
+        if orden is None:
+            orden = next(iter(queryset.model._meta.ordering or []), self.orden_por_defecto)
+
+        return orden.lstrip('-'), orden.startswith('-')
+
+    def _filtro_posterior(self, valor, pk, hacia_atras):
+        """Filas estrictamente después de (valor, pk) en el sentido del recorrido."""
+        menor = self.descendente != hacia_atras
+        comparador = 'lt' if menor else 'gt'
+        return (
+            Q(**{f'{self.campo}__{comparador}': valor})
+            | Q(**{self.campo: valor, f'pk__{comparador}': pk})
+        )
+
+    ################
+    # Parámetros
+    ################
+    def get_page_size(self, request):
+        try:
+            tamano = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if tamano <= 0:
+            return self.page_size
+        return min(tamano, self.max_page_size)
+
+    def _pide_total(self, request):
+        return request.query_params.get(self.total_query_param, '').lower() in ('1', 'true', 'si', 'sí')
+
+    ################
+    # Cursor
+    ################
+    def decode_cursor(self, request):
+        """
+        Returns:
+            tuple: (valor, pk, hacia_atras) o None en la primera página
+        """
+        codificado = request.query_params.get(self.cursor_query_param)
+        if not codificado:
+            return None
+        try:
+            valor, pk, hacia_atras = json.loads(base64.urlsafe_b64decode(codificado.encode()))
+            pk = int(pk)
+        except (ValueError, TypeError):
+            raise NotFound('Cursor inválido')
+        # Fuera del rango de una pk la base de datos fallaría al comparar
+        if not 0 <= pk < 2 ** 63:
+            raise NotFound('Cursor inválido')
+        return valor, pk, bool(hacia_atras)
+
+    def _valor_cursor(self, modelo, valor):
+        """Valor del cursor convertido al tipo del campo de orden."""
+        try:
+            valor = modelo._meta.get_field(self.campo).to_python(valor)
+        except (ValidationError, ValueError, TypeError):
+            raise NotFound('Cursor inválido')
+        if valor is None:
+            raise NotFound('Cursor inválido')
+        return valor
+
+    def encode_cursor(self, fila, hacia_atras):
+        valor = getattr(fila, self.campo)
+        if hasattr(valor, 'isoformat'):
+            valor = valor.isoformat()
+        texto = json.dumps([valor, fila.pk, hacia_atras])
+        return base64.urlsafe_b64encode(texto.encode()).decode()
+
+    def get_next_link(self):
+        if not self.hay_siguiente or self.ultima is None:
+            return None
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, self.encode_cursor(self.ultima, False)
+        )
+
+    def get_previous_link(self):
+        if not self.hay_anterior:
+            return None
+        if self.primera is None:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, self.encode_cursor(self.primera, True)
+        )
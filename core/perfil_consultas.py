@@ -0,0 +1,305 @@
+################
+# PERFIL DE CONSULTAS: Consultas SQL por request y detector de N+1
+# Descripción: PerfilConsultasMiddleware cuenta las consultas y el tiempo de
+#              base de datos de cada request (connection.execute_wrapper, no
+#              depende de DEBUG) y agrupa las consultas por huella (SQL sin
+#              valores). Una huella que se repite es un N+1: se guarda el
+#              archivo y la línea del proyecto que la ejecuta.
+#              Los requests sobre los umbrales de settings.PERFIL_CONSULTAS
+#              se registran como JSON en el logger 'perfil_consultas'.
+#              Los totales por endpoint se acumulan en cada proceso y se
+#              publican en la caché compartida para el endpoint de staff.
+#              Funciona igual bajo WSGI y ASGI (vistas async incluidas).
+# Uso: GET /app/core/perfil/consultas/  (solo staff)
+################
+
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils import timezone
+
+
+logger = logging.getLogger('perfil_consultas')
+
+POR_DEFECTO = {
+    'ACTIVO': True,
+    # Umbrales para registrar un request en el log
+    'MAX_CONSULTAS': 30,
+    'MAX_TIEMPO_MS': 300,
+    # Veces que una misma huella puede repetirse antes de considerarse N+1
+    'MAX_REPETICIONES': 5,
+}
+
+# Cada cuántos segundos un proceso publica sus totales en la caché
+INTERVALO_PUBLICACION = 30
+TIEMPO_CACHE = 60 * 60
+CLAVE_PROCESOS = 'perfil_consultas:procesos'
+MAX_SQL = 300
+
+_RE_LISTA_IN = re.compile(r'IN \((?:%s, )*%s\)')
+_RE_CADENA = re.compile(r"'(?:[^']|'')*'")
+_RE_NUMERO = re.compile(r'\b\d+(?:\.\d+)?\b')
+_RE_ESPACIOS = re.compile(r'\s+')
+
+_ESTE_ARCHIVO = os.path.abspath(__file__)
+
+
+def configuracion():
+    return {**POR_DEFECTO, **getattr(settings, 'PERFIL_CONSULTAS', {})}
+
+
+def huella_sql(sql):
+    """
+    SQL sin valores: dos consultas con la misma huella solo difieren en los
+    parámetros (ej: el mismo SELECT por cada fila de un listado).
+    """
+    sql = _RE_LISTA_IN.sub('IN (...)', sql)
+    sql = _RE_CADENA.sub('?', sql)
+    sql = _RE_NUMERO.sub('?', sql)
+    return _RE_ESPACIOS.sub(' ', sql).strip()
+
+
+def origen_llamada():
+    """
+    'archivo.py:línea en función' del primer marco de la pila que es código
+    del proyecto (ni Django ni librerías instaladas).
+    """
+    base = str(settings.BASE_DIR)
+    marco = sys._getframe(1)
+    while marco is not None:
+        archivo = marco.f_code.co_filename
+        if (archivo.startswith(base) and archivo != _ESTE_ARCHIVO
+                and 'site-packages' not in archivo):
+            return f'{os.path.relpath(archivo, base)}:{marco.f_lineno} en {marco.f_code.co_name}'
+        marco = marco.f_back
+    return None
+
+
+# ====================================================================
+# PERFIL DE UN REQUEST
+# ====================================================================
+
+class PerfilRequest:
+    """
+    Envoltorio de connection.execute_wrapper que mide un request.
+
+    Atributos:
+        consultas (int): consultas ejecutadas
+        tiempo (float): segundos en la base de datos
+        huellas (dict): huella -> [veces, sql de ejemplo, origen de la primera repetición]
+    """
+
+    __slots__ = ('consultas', 'tiempo', 'huellas')
+
+    def __init__(self):
+        self.consultas = 0
+        self.tiempo = 0.0
+        self.huellas = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.tiempo += time.perf_counter() - inicio
+            self.consultas += 1
+            huella = huella_sql(sql)
+            entrada = self.huellas.get(huella)
+            if entrada is None:
+                self.huellas[huella] = [1, sql, None]
+            else:
+                entrada[0] += 1
+                # La pila solo se recorre en la primera repetición
+                if entrada[2] is None:
+                    entrada[2] = origen_llamada()
+
+    @property
+    def tiempo_ms(self):
+        return round(self.tiempo * 1000, 2)
+
+    def repetidas(self, minimo):
+        """Huellas ejecutadas `minimo` veces o más, de más a menos repetida."""
+        return sorted(
+            (
+                {'veces': veces, 'sql': sql[:MAX_SQL], 'origen': origen}
+                for veces, sql, origen in self.huellas.values() if veces >= minimo
+            ),
+            key=lambda repetida: -repetida['veces']
+        )
+
+    @property
+    def duplicadas(self):
+        """Consultas que repiten una huella ya ejecutada en el request."""
+        return sum(veces - 1 for veces, _, _ in self.huellas.values())
+
+
+# ====================================================================
+# TOTALES POR ENDPOINT
+# ====================================================================
+
+class EstadisticasEndpoints:
+    """Totales de este proceso por endpoint ('GET app:vista')."""
+
+    CAMPOS = ('requests', 'consultas', 'duplicadas', 'tiempo_ms', 'max_consultas', 'lentos', 'n_mas_uno')
+
+    def __init__(self):
+        self._candado = threading.Lock()
+        self._endpoints = {}
+        self._publicado = 0
+
+    def registrar(self, endpoint, perfil, lento, n_mas_uno):
+        with self._candado:
+            totales = self._endpoints.setdefault(endpoint, dict.fromkeys(self.CAMPOS, 0))
+            totales['requests'] += 1
+            totales['consultas'] += perfil.consultas
+            totales['duplicadas'] += perfil.duplicadas
+            totales['tiempo_ms'] += perfil.tiempo_ms
+            totales['max_consultas'] = max(totales['max_consultas'], perfil.consultas)
+            totales['lentos'] += lento
+            totales['n_mas_uno'] += n_mas_uno
+
+    def copia(self):
+        with self._candado:
+            return {endpoint: dict(totales) for endpoint, totales in self._endpoints.items()}
+
+    def reiniciar(self):
+        with self._candado:
+            self._endpoints.clear()
+
+    def publicar(self, forzar=False):
+        """Deja los totales de este proceso en la caché compartida (cada INTERVALO_PUBLICACION)."""
+        ahora = time.monotonic()
+        if not forzar and ahora - self._publicado < INTERVALO_PUBLICACION:
+            return
+        self._publicado = ahora
+        pid = os.getpid()
+        cache.set(f'perfil_consultas:proceso:{pid}', self.copia(), TIEMPO_CACHE)
+        procesos = cache.get(CLAVE_PROCESOS) or set()
+        if pid not in procesos:
+            cache.set(CLAVE_PROCESOS, procesos | {pid}, TIEMPO_CACHE)
+
+
+estadisticas = EstadisticasEndpoints()
+
+
+def estadisticas_globales():
+    """
+    Suma de los totales publicados por todos los procesos.
+
+    Returns:
+        list: un dict por endpoint, de más a menos consultas totales
+    """
+    estadisticas.publicar(forzar=True)
+    procesos = cache.get(CLAVE_PROCESOS) or set()
+    publicados = cache.get_many([f'perfil_consultas:proceso:{pid}' for pid in procesos])
+
+    suma = {}
+    for totales_proceso in publicados.values():
+        for endpoint, totales in totales_proceso.items():
+            acumulado = suma.setdefault(endpoint, dict.fromkeys(EstadisticasEndpoints.CAMPOS, 0))
+            for campo, valor in totales.items():
+                if campo == 'max_consultas':
+                    acumulado[campo] = max(acumulado[campo], valor)
+                else:
+                    acumulado[campo] += valor
+
+    resultado = []
+    for endpoint, totales in suma.items():
+        totales['tiempo_ms'] = round(totales['tiempo_ms'], 2)
+        totales['promedio_consultas'] = round(totales['consultas'] / totales['requests'], 2)
+        totales['promedio_tiempo_ms'] = round(totales['tiempo_ms'] / totales['requests'], 2)
+        resultado.append({'endpoint': endpoint, **totales})
+    return sorted(resultado, key=lambda fila: -fila['consultas'])
+
+
+# ====================================================================
+# MIDDLEWARE
+# ====================================================================
+
+def nombre_endpoint(request):
+    coincidencia = getattr(request, 'resolver_match', None)
+    vista = coincidencia.view_name if coincidencia else '<sin ruta>'
+    return f'{request.method} {vista}'
+
+
+def _instalar(pila, perfil):
+    for conexion in connections.all():
+        pila.enter_context(conexion.execute_wrapper(perfil))
+
+
+class PerfilConsultasMiddleware:
+    """
+    Mide las consultas de cada request en todas las bases configuradas.
+    Las respuestas en streaming se miden solo hasta que la vista retorna.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.config = configuracion()
+        if not self.config['ACTIVO']:
+            raise MiddlewareNotUsed
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        perfil = PerfilRequest()
+        with ExitStack() as pila:
+            _instalar(pila, perfil)
+            respuesta = self.get_response(request)
+
+        self.registrar(request, respuesta, perfil)
+        return respuesta
+
+    async def __acall__(self, request):
+        # Las conexiones son por hilo: el ORM async consulta desde el hilo
+        # síncrono del request, así que el envoltorio se instala allí
+        perfil = PerfilRequest()
+        pila = ExitStack()
+        await sync_to_async(_instalar)(pila, perfil)
+        try:
+            respuesta = await self.get_response(request)
+        finally:
+            await sync_to_async(pila.close)()
+
+        await sync_to_async(self.registrar)(request, respuesta, perfil)
+        return respuesta
+
+    def registrar(self, request, respuesta, perfil):
+        repetidas = perfil.repetidas(self.config['MAX_REPETICIONES'])
+        lento = (
+            perfil.consultas > self.config['MAX_CONSULTAS']
+            or perfil.tiempo_ms > self.config['MAX_TIEMPO_MS']
+        )
+        endpoint = nombre_endpoint(request)
+        estadisticas.registrar(endpoint, perfil, lento, bool(repetidas))
+
+        if lento or repetidas:
+            logger.warning(json.dumps({
+                'fecha': timezone.now().isoformat(),
+                'endpoint': endpoint,
+                'ruta': request.path,
+                'estado': respuesta.status_code,
+                'consultas': perfil.consultas,
+                'duplicadas': perfil.duplicadas,
+                'tiempo_ms': perfil.tiempo_ms,
+                'repetidas': repetidas,
+            }, ensure_ascii=False))
+
+        estadisticas.publicar()
@@ -0,0 +1,271 @@
+################
+# POOL DE CONEXIONES: Conexiones a la base reutilizadas entre requests
+# Descripción: Sin pool, cada request abre una conexión a MySQL (TCP,
+#              autenticación, init_command) y la cierra al terminar.
+#              PoolConexiones guarda las conexiones devueltas y las presta
+#              al siguiente request de cualquier hilo del worker: entre
+#              `minimo` y `maximo` conexiones, descarta las que superan
+#              `vida_maxima` o fallan el ping y cierra las inactivas que
+#              sobran. El backend core.pool_mysql lo usa en lugar de abrir
+#              y cerrar conexiones (ver settings.DATABASES, DB_POOL).
+#              Un pool por alias y por proceso (tras un fork se empieza de
+#              cero: las conexiones heredadas son del padre).
+# Uso: pool_de('default', base, configuracion).obtener(crear) / .devolver(conexion)
+################
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+
+logger = logging.getLogger(__name__)
+
+MINIMO = 2
+MAXIMO = 20
+VIDA_MAXIMA = 1800
+INACTIVIDAD_MAXIMA = 300
+# Una conexión libre por más de estos segundos se verifica (ping) antes de prestarla
+VERIFICAR_TRAS = 5
+ESPERA = 5
+
+
+class PoolAgotado(Exception):
+    """Las `maximo` conexiones siguen prestadas después de `espera` segundos."""
+
+
+class _Libre:
+    __slots__ = ('conexion', 'creada', 'devuelta')
+
+    def __init__(self, conexion, creada, devuelta):
+        self.conexion = conexion
+        self.creada = creada
+        self.devuelta = devuelta
+
+
+class PoolConexiones:
+    """
+    Conexiones DB-API de un alias, compartidas por los hilos del proceso.
+
+    Args:
+        minimo (int): conexiones libres que no se cierran por inactividad
+        maximo (int): conexiones abiertas a la vez (prestadas + libres)
+        vida_maxima (float): segundos antes de reemplazar una conexión
+        inactividad_maxima (float): segundos libre antes de cerrar una conexión sobrante
+        verificar_tras (float): segundos libre antes de hacerle ping al prestarla
+        espera (float): segundos que obtener() espera una conexión con el pool lleno
+        verificar (callable): verificar(conexion) lanza una excepción si no sirve
+    """
+
+    def __init__(self, minimo=MINIMO, maximo=MAXIMO, vida_maxima=VIDA_MAXIMA,
+                 inactividad_maxima=INACTIVIDAD_MAXIMA, verificar_tras=VERIFICAR_TRAS,
+                 espera=ESPERA, verificar=None):
+        if not 0 <= minimo <= maximo or maximo < 1:
+            raise ValueError('Se requiere 0 <= minimo <= maximo y maximo >= 1')
+        self.minimo = minimo
+        self.maximo = maximo
+        self.vida_maxima = vida_maxima
+        self.inactividad_maxima = inactividad_maxima
+        self.verificar_tras = verificar_tras
+        self.espera = espera
+        self.verificar = verificar
+        self._condicion = threading.Condition()
+        # Último devuelto al final: se presta primero (LIFO), las frías quedan al inicio
+        self._libres = deque()
+        # id(conexion) -> momento de creación, de las prestadas
+        self._prestadas = {}
+        self._abriendo = 0
+        self.contadores = dict.fromkeys((
+            'creadas', 'reutilizadas', 'cerradas_vida', 'cerradas_inactivas',
+            'fallas_verificacion', 'descartadas', 'esperas', 'agotado',
+        ), 0)
+        self.espera_max_ms = 0.0
+
+    @property
+    def abiertas(self):
+        return len(self._libres) + len(self._prestadas) + self._abriendo
+
+    def obtener(self, crear):
+        """
+        Una conexión para el hilo actual: la última devuelta si sigue sana o
+        una nueva con `crear()`. Hay que devolverla con devolver().
+
+        Returns:
+            tuple: (conexion, reutilizada: bool)
+        """
+        limite = time.monotonic() + self.espera
+        while True:
+            libre = self._tomar(limite)
+            if libre is None:
+                return self._abrir(crear), False
+            if self._sana(libre):
+                return libre.conexion, True
+
+    def _tomar(self, limite):
+        """La conexión libre más reciente (prestada) o None si hay lugar para abrir otra."""
+        inicio = None
+        with self._condicion:
+            while True:
+                ahora = time.monotonic()
+                while self._libres:
+                    libre = self._libres.pop()
+                    if ahora - libre.creada < self.vida_maxima:
+                        self._prestadas[id(libre.conexion)] = libre.creada
+                        self._registrar_espera(inicio, ahora)
+                        return libre
+                    self.contadores['cerradas_vida'] += 1
+                    _cerrar(libre.conexion)
+                if self.abiertas < self.maximo:
+                    self._abriendo += 1
+                    self._registrar_espera(inicio, ahora)
+                    return None
+                if inicio is None:
+                    inicio = ahora
+                    self.contadores['esperas'] += 1
+                if ahora >= limite or not self._condicion.wait(limite - ahora):
+                    if not self._libres and self.abiertas >= self.maximo:
+                        self.contadores['agotado'] += 1
+                        raise PoolAgotado(
+                            f'{self.maximo} conexiones prestadas por más de {self.espera} s'
+                        )
+
+    def _registrar_espera(self, inicio, ahora):
+        if inicio is not None:
+            self.espera_max_ms = max(self.espera_max_ms, (ahora - inicio) * 1000)
+
+    def _abrir(self, crear):
+        try:
+            conexion = crear()
+        except BaseException:
+            with self._condicion:
+                self._abriendo -= 1
+                self._condicion.notify()
+            raise
+        with self._condicion:
+            self._abriendo -= 1
+            self._prestadas[id(conexion)] = time.monotonic()
+            self.contadores['creadas'] += 1
+        return conexion
+
+    def _sana(self, libre):
+        """Ping (fuera del candado) a las conexiones que estuvieron libres un rato."""
+        if self.verificar is not None and time.monotonic() - libre.devuelta >= self.verificar_tras:
+            try:
+                self.verificar(libre.conexion)
+            except Exception:
+                with self._condicion:
+                    self.contadores['fallas_verificacion'] += 1
+                self.descartar(libre.conexion)
+                return False
+        with self._condicion:
+            self.contadores['reutilizadas'] += 1
+        return True
+
+    def devolver(self, conexion):
+        """La conexión vuelve al pool (o se cierra si ya cumplió su vida máxima)."""
+        ahora = time.monotonic()
+        cerrar = [conexion]
+        with self._condicion:
+            creada = self._prestadas.pop(id(conexion), None)
+            if creada is None:
+                # No es del pool (p. ej. prestada antes de un fork)
+                cerrar = []
+            elif ahora - creada < self.vida_maxima:
+                self._libres.append(_Libre(conexion, creada, ahora))
+                cerrar = self._sobrantes(ahora)
+            else:
+                self.contadores['cerradas_vida'] += 1
+            self._condicion.notify()
+        for sobrante in cerrar:
+            _cerrar(sobrante)
+
+    def _sobrantes(self, ahora):
+        # Las más antiguas en devolverse están al inicio
+        sobrantes = []
+        while (len(self._libres) > self.minimo
+               and ahora - self._libres[0].devuelta > self.inactividad_maxima):
+            sobrantes.append(self._libres.popleft().conexion)
+            self.contadores['cerradas_inactivas'] += 1
+        return sobrantes
+
+    def descartar(self, conexion):
+        """Cierra una conexión prestada que no debe volver al pool (rota o a mitad de una transacción)."""
+        with self._condicion:
+            if self._prestadas.pop(id(conexion), None) is not None:
+                self.contadores['descartadas'] += 1
+            self._condicion.notify()
+        _cerrar(conexion)
+
+    def cerrar(self):
+        """Cierra las conexiones libres (las prestadas se cierran al devolverlas)."""
+        with self._condicion:
+            libres, self._libres = list(self._libres), deque()
+            self.vida_maxima = 0
+        for libre in libres:
+            _cerrar(libre.conexion)
+
+    def estadisticas(self):
+        with self._condicion:
+            return {
+                'minimo': self.minimo,
+                'maximo': self.maximo,
+                'libres': len(self._libres),
+                'prestadas': len(self._prestadas),
+                **self.contadores,
+                'espera_max_ms': round(self.espera_max_ms, 2),
+            }
+
+
+def _cerrar(conexion):
+    try:
+        conexion.close()
+    except Exception:
+        logger.debug('Error cerrando una conexión del pool', exc_info=True)
+
+
+# ====================================================================
+# POOLS DEL PROCESO
+# ====================================================================
+
+_pools = {}
+_candado_pools = threading.Lock()
+
+
+def pool_de(alias, base, configuracion=None, verificar=None):
+    """
+    Pool del alias en este proceso; se crea con `configuracion`
+    (claves de PoolConexiones) la primera vez. `base` identifica el
+    destino (servidor y nombre): si cambia, como al crear la base de
+    tests, las conexiones anteriores no se reutilizan.
+    """
+    clave = (alias, base)
+    pool = _pools.get(clave)
+    if pool is None:
+        with _candado_pools:
+            pool = _pools.get(clave)
+            if pool is None:
+                pool = _pools[clave] = PoolConexiones(verificar=verificar, **(configuracion or {}))
+    return pool
+
+
+def estadisticas_pools():
+    """Estado de los pools de este worker (ver core.views.metricas_pool)."""
+    return [
+        {'alias': alias, 'base': base, **pool.estadisticas()}
+        for (alias, base), pool in list(_pools.items())
+    ]
+
+
+def cerrar_pools():
+    for pool in list(_pools.values()):
+        pool.cerrar()
+
+
+def _reiniciar_en_hijo():
+    # Las conexiones heredadas comparten el socket con el padre: no se cierran
+    _pools.clear()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reiniciar_en_hijo)
@@ -0,0 +1,59 @@
+################
+# BACKEND: MySQL con pool de conexiones
+# Descripción: El backend MySQL de Django, pero connect() toma la conexión
+#              de core.pool_conexiones y close() la devuelve: al terminar
+#              cada request (CONN_MAX_AGE = 0) la conexión queda para el
+#              siguiente, de cualquier hilo. Una conexión reutilizada ya
+#              tiene el estado de sesión aplicado (init_command,
+#              SQL_AUTO_IS_NULL, aislamiento, autocommit): no se repite.
+#              Si se cierra a mitad de una transacción o con errores que la
+#              dejaron inservible, se descarta en vez de devolverla.
+# Uso: DATABASES[alias]['ENGINE'] = 'core.pool_mysql' y
+#      DATABASES[alias]['POOL'] = {'minimo': 2, 'maximo': 20, ...}
+#      (claves de core.pool_conexiones.PoolConexiones)
+################
+
+from django.db.backends.mysql import base as mysql
+
+from core.pool_conexiones import pool_de
+
+
+def _ping(conexion):
+    conexion.ping()
+
+
+class DatabaseWrapper(mysql.DatabaseWrapper):
+
+    _reutilizada = False
+    _pool = None
+
+    def _pool_destino(self):
+        configuracion = self.settings_dict
+        base = f"{configuracion['USER']}@{configuracion['HOST']}:{configuracion['PORT']}/{configuracion['NAME']}"
+        return pool_de(self.alias, base, configuracion.get('POOL'), verificar=_ping)
+
+    def get_new_connection(self, conn_params):
+        # La conexión vuelve al pool del que salió aunque después cambie NAME (tests)
+        self._pool = self._pool_destino()
+        conexion, self._reutilizada = self._pool.obtener(
+            lambda: super(DatabaseWrapper, self).get_new_connection(conn_params)
+        )
+        return conexion
+
+    def _set_autocommit(self, autocommit):
+        if self._reutilizada and self.connection.get_autocommit() == autocommit:
+            return
+        super()._set_autocommit(autocommit)
+
+    def init_connection_state(self):
+        if not self._reutilizada:
+            super().init_connection_state()
+
+    def _close(self):
+        if self.connection is None:
+            return
+        # close() en una transacción deja la conexión asignada a este wrapper
+        if self.in_atomic_block or not self.autocommit or (self.errors_occurred and not self.is_usable()):
+            self._pool.descartar(self.connection)
+        else:
+            self._pool.devolver(self.connection)
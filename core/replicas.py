@@ -0,0 +1,232 @@
+################
+# RÉPLICAS: Lecturas en réplicas de MySQL
+# Descripción: RouterReplicas envía a una réplica (settings.REPLICAS_LECTURA,
+#              ver DB_REPLICAS) las lecturas de los requests de solo
+#              lectura: acciones list/retrieve de los ViewSets y las vistas
+#              marcadas con @solo_lectura (reportes, listados, dashboards).
+#              Todo lo demás, y toda escritura, va a 'default'.
+#              Leer lo propio: quien escribe queda fijado a la primaria
+#              REPLICAS_VENTANA_ESCRITURA segundos (cookie), y dentro de un
+#              request, después de la primera escritura se lee de la primaria.
+#              Las lecturas puras se atienden sin la transacción de
+#              ATOMIC_REQUESTS (sin BEGIN/COMMIT en la primaria).
+#              Lo que se calcula para una caché compartida se lee dentro de
+#              en_primaria(): una réplica atrasada dejaría el valor viejo
+#              guardado para todos los workers.
+# Uso: settings.DATABASE_ROUTERS y ReplicasMiddleware al final de MIDDLEWARE
+################
+
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+
+ACCIONES_LECTURA = {'list', 'retrieve'}
+# Siempre de la primaria: una sesión recién creada aún no está en la réplica
+APPS_PRIMARIA = {'sessions'}
+METODOS_LECTURA = {'GET', 'HEAD', 'OPTIONS'}
+COOKIE_PRIMARIA = 'leer_primaria'
+VENTANA_ESCRITURA = 10
+
+# Estado del request en curso (un objeto mutable: lo ven también los hilos
+# de sync_to_async, que trabajan sobre una copia del contexto)
+_estado = ContextVar('estado_replicas', default=None)
+# True dentro de en_primaria()
+_forzar_primaria = ContextVar('forzar_primaria', default=False)
+
+
+class _EstadoRequest:
+    __slots__ = ('replica', 'escribio')
+
+    def __init__(self):
+        self.replica = None
+        self.escribio = False
+
+
+def replicas():
+    return list(getattr(settings, 'REPLICAS_LECTURA', []))
+
+
+def ventana_escritura():
+    return getattr(settings, 'REPLICAS_VENTANA_ESCRITURA', VENTANA_ESCRITURA)
+
+
+def replica_actual():
+    """Alias de la réplica que atiende las lecturas del request en curso o None."""
+    estado = _estado.get()
+    if estado is None or estado.escribio or _forzar_primaria.get():
+        return None
+    return estado.replica
+
+
+@contextmanager
+def en_primaria():
+    """
+    Las lecturas del bloque van a 'default' aunque el request lea de una
+    réplica. Para llenar cachés compartidas: tras invalidar una entrada (un
+    rol recién cambiado, tendencias con un control nuevo), quien la
+    recalcula puede no ser quien escribió y la réplica aún no tiene el cambio.
+    """
+    token = _forzar_primaria.set(True)
+    try:
+        yield
+    finally:
+        _forzar_primaria.reset(token)
+
+
+def solo_lectura(vista):
+    """
+    Marca una vista (función, clase o acción de un ViewSet) que nunca
+    escribe: con GET lee de una réplica y se atiende sin transacción.
+    Solo para vistas que no escriben con ningún método.
+    """
+    vista.solo_lectura = True
+    return transaction.non_atomic_requests(vista)
+
+
+def es_lectura(vista, metodo):
+    """True si el request `metodo` a `vista` (la de la URL resuelta) es de solo lectura."""
+    if metodo not in METODOS_LECTURA:
+        return False
+    # Decoradores con functools.wraps copian el atributo a la envoltura
+    if getattr(vista, 'solo_lectura', False):
+        return True
+    clase = getattr(vista, 'cls', None) or getattr(vista, 'view_class', None)
+    acciones = getattr(vista, 'actions', None)
+    if acciones:
+        accion = acciones.get('get' if metodo == 'HEAD' else metodo.lower())
+        if accion is None:
+            return False
+        return accion in ACCIONES_LECTURA or getattr(getattr(clase, accion, None), 'solo_lectura', False)
+    return getattr(clase, 'solo_lectura', False)
+
+
+def _fijado_a_primaria(request):
+    try:
+        return float(request.COOKIES.get(COOKIE_PRIMARIA, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def _transaccion_por_request(vista):
+    sin_transaccion = getattr(vista, '_non_atomic_requests', set())
+    return any(
+        configuracion.get('ATOMIC_REQUESTS') and alias not in sin_transaccion
+        for alias, configuracion in settings.DATABASES.items()
+    )
+
+
+def _en_contexto(estado, contenido):
+    # El cuerpo de un StreamingHttpResponse se genera después de que el
+    # middleware devolvió la respuesta: cada fragmento vuelve a fijar el estado
+    iterador = iter(contenido)
+    while True:
+        token = _estado.set(estado)
+        try:
+            fragmento = next(iterador)
+        except StopIteration:
+            return
+        finally:
+            _estado.reset(token)
+        yield fragmento
+
+
+# ====================================================================
+# ROUTER
+# ====================================================================
+
+class RouterReplicas:
+    """
+    Lecturas: la réplica elegida para el request (si es de solo lectura y
+    nadie escribió); si no, None (Django usa la base de la instancia o
+    'default'). Escrituras: siempre 'default', también para objetos leídos
+    de una réplica.
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in APPS_PRIMARIA:
+            return None
+        if _forzar_primaria.get():
+            # Explícito: con None, las relaciones de un objeto leído de la réplica irían a ella
+            return DEFAULT_DB_ALIAS
+        return replica_actual()
+
+    def db_for_write(self, model, **hints):
+        estado = _estado.get()
+        if estado is not None:
+            estado.escribio = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Las réplicas tienen los mismos datos que la primaria
+        aliases = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return False if db in replicas() else None
+
+
+# ====================================================================
+# MIDDLEWARE
+# ====================================================================
+
+class ReplicasMiddleware:
+    """
+    Debe ir al final de MIDDLEWARE: su process_view atiende las lecturas
+    puras sin la transacción de ATOMIC_REQUESTS, y los demás process_view
+    (CSRF) ya se ejecutaron.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.asincrono = iscoroutinefunction(get_response)
+        if self.asincrono:
+            markcoroutinefunction(self)
+
+    def process_view(self, request, vista, args, kwargs):
+        estado = _estado.get()
+        if estado is None or not es_lectura(vista, request.method):
+            return None
+        disponibles = replicas()
+        if disponibles and not _fijado_a_primaria(request):
+            estado.replica = random.choice(disponibles)
+        if iscoroutinefunction(vista) or not _transaccion_por_request(vista):
+            return None
+        # Mismo llamado que hace Django, sin envolverlo en transaction.atomic
+        return vista(request, *args, **kwargs)
+
+    def _terminar(self, request, respuesta, estado, token):
+        _estado.reset(token)
+        if estado.escribio or (request.method not in METODOS_LECTURA and respuesta.status_code < 400):
+            ventana = ventana_escritura()
+            respuesta.set_cookie(
+                COOKIE_PRIMARIA, str(int(time.time() + ventana)),
+                max_age=ventana, httponly=True, samesite='Lax',
+            )
+        elif estado.replica and respuesta.streaming and not respuesta.is_async:
+            respuesta.streaming_content = _en_contexto(estado, respuesta.streaming_content)
+        return respuesta
+
+    def __call__(self, request):
+        if self.asincrono:
+            return self.__acall__(request)
+        estado = _EstadoRequest()
+        token = _estado.set(estado)
+        respuesta = self.get_response(request)
+        return self._terminar(request, respuesta, estado, token)
+
+    async def __acall__(self, request):
+        estado = _EstadoRequest()
+        token = _estado.set(estado)
+        respuesta = await self.get_response(request)
+        return self._terminar(request, respuesta, estado, token)
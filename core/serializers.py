@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from .imagenes import CAMPO_IMAGEN, precargar_derivadas, urls_imagen
 from .models import Persona
 
 ################
@@ -15,9 +16,35 @@ class PersonaSerializer(serializers.ModelSerializer):
             'apellido',
             'edad',
             'direccion',
-            'telefono',
-            'email',
-            'fecha_creacion',
-            'fecha_actualizacion',
+            'contacto',
+            'estado',
+            'created_at',
+            'modified_at',
         ]
-        read_only_fields = ['fecha_creacion', 'fecha_actualizacion']
\ No newline at end of file
+        read_only_fields = ['created_at', 'modified_at']
+
+
+################
+# Campo: ImagenesField
+# Descripción: URL del original y de cada variante de un ImageField
+#              ({'original', 'miniatura', 'web'}), ver core.imagenes
+################
+class ImagenesField(serializers.Field):
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+    
+    def to_representation(self, imagen):
+        return urls_imagen(imagen)
+
+
+################
+# Serializer: ListaConImagenes
+# Descripción: list_serializer_class para modelos con imagen; precarga las
+#              derivadas de toda la página (una consulta, no una por fila)
+################
+class ListaConImagenes(serializers.ListSerializer):
+    def to_representation(self, data):
+        objetos = list(data.all() if hasattr(data, 'all') else data)
+        precargar_derivadas([getattr(objeto, CAMPO_IMAGEN) for objeto in objetos])
+        return super().to_representation(objetos)
@@ -0,0 +1,24 @@
+################
+# SEÑALES: Core
+# Descripción: Mantiene sincronizado el índice de búsqueda de personas
+################
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.busqueda import get_backend
+from core.models import Persona
+
+
+@receiver(post_save, sender=Persona)
+def indexar_persona(sender, instance, **kwargs):
+    """Reindexa la persona al confirmar la transacción."""
+    transaction.on_commit(lambda: get_backend().indexar(instance))
+
+
+@receiver(post_delete, sender=Persona)
+def desindexar_persona(sender, instance, **kwargs):
+    """Quita la persona del índice de búsqueda."""
+    persona_id = instance.pk
+    transaction.on_commit(lambda: get_backend().eliminar(persona_id))
@@ -0,0 +1,504 @@
+################
+# SINTÉTICOS: Generador de datos obstétricos para benchmarks
+# Descripción: Crea personas, fichas, controles prenatales y registros
+#              clínicos con volúmenes de producción. Es determinista: la
+#              misma semilla y escala generan los mismos datos. Los valores
+#              se generan por columnas con NumPy y se escriben con
+#              bulk_create por bloques (sin señales); al final se
+#              reconstruyen el índice de búsqueda, los contadores y las
+#              alertas.
+# Uso: python manage.py generar_datos_sinteticos --escala 0.01
+################
+
+import datetime
+import io
+import time
+from collections import defaultdict
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import Persona
+from utilidades.validadores import calcular_digitos_verificadores
+
+
+SEMILLA = 20240601
+TAMANO_BLOQUE = 5000
+USUARIO_SINTETICO = 'sintetico'
+
+# Volúmenes con escala 1.0
+VOLUMENES = {
+    'personas': 200_000,
+    'pacientes': 150_000,
+    'controles': 2_000_000,
+    'registros': 1_000_000,
+}
+
+# Reparto de los registros clínicos por tabla
+PROPORCION_REGISTROS = {
+    'observaciones': 0.3,
+    'patologias': 0.1,
+    'procedimientos': 0.3,
+    'medicamentos': 0.3,
+}
+
+# Los RUT sintéticos ocupan este rango de cuerpos. Incluye los RUT de la
+# mayoría de las personas vivas en Chile: son válidos y pueden coincidir con
+# los de personas reales, así que generar_datos_sinteticos exige DEBUG o
+# --permitir-base-real
+RUT_DESDE = 5_000_000
+RUT_HASTA = 25_000_000
+
+NOMBRES = [
+    'María', 'Camila', 'Valentina', 'Javiera', 'Fernanda', 'Constanza', 'Catalina', 'Daniela',
+    'Francisca', 'Antonia', 'Carolina', 'Paula', 'Bárbara', 'Macarena', 'Josefa', 'Ignacia',
+    'Isidora', 'Florencia', 'Trinidad', 'Sofía', 'Martina', 'Agustina', 'Emilia', 'Renata',
+    'Gabriela', 'Natalia', 'Claudia', 'Andrea', 'Paz', 'Karina',
+]
+APELLIDOS = [
+    'González', 'Muñoz', 'Rojas', 'Díaz', 'Pérez', 'Soto', 'Contreras', 'Silva', 'Martínez',
+    'Sepúlveda', 'Morales', 'Rodríguez', 'López', 'Fuentes', 'Hernández', 'Torres', 'Araya',
+    'Flores', 'Espinoza', 'Valenzuela', 'Castillo', 'Tapia', 'Reyes', 'Gutiérrez', 'Castro',
+    'Pizarro', 'Álvarez', 'Vásquez', 'Sánchez', 'Fernández', 'Ramírez', 'Carrasco', 'Gómez',
+    'Cortés', 'Herrera', 'Núñez', 'Jara', 'Vergara', 'Rivera', 'Figueroa',
+]
+CALLES = [
+    'Av. Libertador Bernardo O\'Higgins', 'Av. Providencia', 'Los Carrera', 'San Martín',
+    'Av. Alemania', 'Prat', 'Colón', 'Av. Pajaritos', 'Las Rosas', 'Los Aromos',
+]
+PATOLOGIAS = [
+    ('Preeclampsia', 'O14.9'),
+    ('Diabetes gestacional', 'O24.4'),
+    ('Anemia del embarazo', 'O99.0'),
+    ('Hipotiroidismo', 'E03.9'),
+    ('Infección urinaria', 'O23.4'),
+    ('Placenta previa', 'O44.0'),
+    ('Hipertensión gestacional', 'O13'),
+    ('Colestasia intrahepática', 'O26.6'),
+]
+MEDICAMENTOS = [
+    ('Ácido fólico', '1 mg', 'oral', 'Cada 24 horas'),
+    ('Sulfato ferroso', '200 mg', 'oral', 'Cada 24 horas'),
+    ('Metildopa', '250 mg', 'oral', 'Cada 8 horas'),
+    ('Insulina NPH', '10 UI', 'subcutanea', 'Cada 12 horas'),
+    ('Betametasona', '12 mg', 'intramuscular', 'Cada 24 horas'),
+    ('Nitrofurantoína', '100 mg', 'oral', 'Cada 12 horas'),
+    ('Levotiroxina', '50 mcg', 'oral', 'Cada 24 horas'),
+]
+TIPOS_PROCEDIMIENTO = ['inyeccion', 'extraccion', 'curacion', 'cateterismo', 'sonda', 'medicacion']
+
+
+def volumenes_para(escala):
+    """Volúmenes de VOLUMENES multiplicados por `escala` (al menos 1; pacientes ≤ personas)."""
+    volumenes = {tabla: max(1, int(cantidad * escala)) for tabla, cantidad in VOLUMENES.items()}
+    volumenes['pacientes'] = min(volumenes['pacientes'], volumenes['personas'])
+    return volumenes
+
+
+def usuario_sintetico():
+    """Usuario dueño de los datos sintéticos (también lo usan los benchmarks)."""
+    usuario, creado = User.objects.get_or_create(
+        username=USUARIO_SINTETICO,
+        defaults={'is_superuser': True, 'is_staff': True, 'first_name': 'Datos', 'last_name': 'Sintéticos'},
+    )
+    if creado:
+        usuario.set_unusable_password()
+        usuario.save(update_fields=['password'])
+    return usuario
+
+
+def ruts_sinteticos(cantidad, desde=RUT_DESDE, hasta=RUT_HASTA, rng=None):
+    """
+    Cuerpos de RUT distintos (uno por tramo del rango) y su verificador.
+
+    Returns:
+        tuple: (numeros int64, verificadores U1)
+    """
+    rng = rng if rng is not None else np.random.default_rng(SEMILLA)
+    paso = max(1, (hasta - desde) // max(cantidad, 1))
+    numeros = desde + np.arange(cantidad, dtype=np.int64) * paso + rng.integers(0, paso, cantidad)
+    return numeros, calcular_digitos_verificadores(numeros)
+
+
+class ResultadoGeneracion:
+    """Filas creadas y segundos por etapa."""
+
+    def __init__(self):
+        self.filas = {}
+        self.segundos = {}
+
+    def __str__(self):
+        filas = ', '.join(f'{cantidad} {tabla}' for tabla, cantidad in self.filas.items())
+        return f'{filas} en {sum(self.segundos.values()):.1f} s'
+
+
+# ====================================================================
+# GENERADOR
+# ====================================================================
+
+class GeneradorSintetico:
+    """
+    Args:
+        escala (float): fracción de VOLUMENES a generar
+        semilla (int): semilla del generador aleatorio
+        tamano_bloque (int): filas por bulk_create
+        hoy (date): fecha de referencia (por defecto hoy)
+        salida (callable): recibe mensajes de avance
+    """
+
+    def __init__(self, escala=1.0, semilla=SEMILLA, tamano_bloque=TAMANO_BLOQUE, hoy=None, salida=None):
+        self.volumenes = volumenes_para(escala)
+        self.rng = np.random.default_rng(semilla)
+        self.tamano_bloque = tamano_bloque
+        self.hoy = hoy or timezone.localdate()
+        self.salida = salida or (lambda mensaje: None)
+        self.resultado = ResultadoGeneracion()
+        self.usuario = None
+        # Columnas por paciente que usan las etapas siguientes
+        self._pacientes = None
+        self._inicios = None
+        self._finales = None
+
+    def generar(self, reconstruir=True):
+        """
+        Returns:
+            ResultadoGeneracion
+        """
+        self.usuario = usuario_sintetico()
+        personas = self._etapa('personas', self._crear_personas)
+        self._etapa('pacientes', lambda: self._crear_pacientes(personas[:self.volumenes['pacientes']]))
+        self._etapa('controles', self._crear_controles)
+        self._etapa('registros', self._crear_registros)
+        if reconstruir:
+            self._etapa('derivados', reconstruir_derivados)
+        return self.resultado
+
+    def _etapa(self, nombre, funcion):
+        inicio = time.perf_counter()
+        valor = funcion()
+        self.resultado.segundos[nombre] = round(time.perf_counter() - inicio, 2)
+        self.salida(f'  {nombre}: {self.resultado.segundos[nombre]} s')
+        return valor
+
+    def _bloques(self, cantidad):
+        for desde in range(0, cantidad, self.tamano_bloque):
+            yield desde, min(desde + self.tamano_bloque, cantidad)
+
+    def _elegir(self, opciones, cantidad, pesos=None):
+        indices = self.rng.choice(len(opciones), size=cantidad, p=pesos)
+        return [opciones[indice] for indice in indices]
+
+    ################
+    # Personas
+    ################
+    def _crear_personas(self):
+        cantidad = self.volumenes['personas']
+        numeros, verificadores = ruts_sinteticos(cantidad, rng=self.rng)
+        nombres = self._elegir(NOMBRES, cantidad)
+        apellidos = [
+            f'{primero} {segundo}'
+            for primero, segundo in zip(self._elegir(APELLIDOS, cantidad), self._elegir(APELLIDOS, cantidad))
+        ]
+        edades = self.rng.integers(15, 46, cantidad).tolist()
+        calles = self._elegir(CALLES, cantidad)
+        numeros_calle = self.rng.integers(10, 9999, cantidad).tolist()
+        telefonos = self.rng.integers(10_000_000, 99_999_999, cantidad).tolist()
+
+        ids = np.empty(cantidad, dtype=np.int64)
+        for desde, hasta in self._bloques(cantidad):
+            personas = [
+                Persona(
+                    rut=f'{numeros[i]}{verificadores[i]}',
+                    rut_numero=int(numeros[i]),
+                    rut_dv=str(verificadores[i]),
+                    nombre=nombres[i],
+                    apellido=apellidos[i],
+                    edad=edades[i],
+                    direccion=f'{calles[i]} {numeros_calle[i]}',
+                    contacto=f'+569{telefonos[i]}',
+                    created_by=self.usuario,
+                )
+                for i in range(desde, hasta)
+            ]
+            Persona.objects.bulk_create(personas, batch_size=self.tamano_bloque)
+            # MySQL no devuelve los id de un INSERT masivo: se leen por RUT
+            por_rut = dict(
+                Persona.objects.filter(rut_numero__in=numeros[desde:hasta].tolist()).values_list('rut_numero', 'pk')
+            )
+            ids[desde:hasta] = [por_rut[numero] for numero in numeros[desde:hasta].tolist()]
+
+        self.resultado.filas['personas'] = cantidad
+        return ids
+
+    ################
+    # Pacientes
+    ################
+    def _crear_pacientes(self, personas_ids):
+        from pacientes.fichas import siguientes_numeros_ficha
+        from pacientes.models import Paciente
+
+        cantidad = len(personas_ids)
+        hoy = np.datetime64(self.hoy, 'D')
+        # Inicio de gestación entre 2 y 20 meses atrás: ~40% con embarazo en curso
+        inicios = hoy - self.rng.integers(60, 600, cantidad).astype('timedelta64[D]')
+        finales = np.minimum(inicios + np.timedelta64(287, 'D'), hoy)
+        en_curso = (hoy - inicios) < np.timedelta64(280, 'D')
+        con_ecografia = self.rng.random(cantidad) < 0.3
+        semanas_eco = self.rng.integers(8, 14, cantidad)
+
+        edades = dict(Persona.objects.filter(pk__in=personas_ids.tolist()).values_list('pk', 'edad'))
+        estado_civil = self._elegir([valor for valor, _ in Paciente.ESTADO_CIVIL_CHOICES], cantidad)
+        prevision = self._elegir(['fonasa', 'isapre', 'privado', 'otro'], cantidad, [0.75, 0.18, 0.05, 0.02])
+        embarazos = self.rng.poisson(1.2, cantidad)
+        partos = np.minimum(embarazos, self.rng.poisson(1.0, cantidad))
+        abortos = np.minimum(embarazos - partos, self.rng.poisson(0.2, cantidad))
+        hipertension = self.rng.random(cantidad) < 0.05
+        diabetes = self.rng.random(cantidad) < 0.03
+
+        ids = np.empty(cantidad, dtype=np.int64)
+        for desde, hasta in self._bloques(cantidad):
+            fichas = siguientes_numeros_ficha(hasta - desde, self.hoy.year)
+            pacientes = []
+            for i in range(desde, hasta):
+                inicio = inicios[i].item()
+                fecha_eco = inicio + datetime.timedelta(weeks=int(semanas_eco[i])) if con_ecografia[i] else None
+                pacientes.append(Paciente(
+                    persona_id=int(personas_ids[i]),
+                    numero_ficha=fichas[i - desde],
+                    edad=edades[int(personas_ids[i])],
+                    estado_civil=estado_civil[i],
+                    prevision=prevision[i],
+                    embarazos_previos=int(embarazos[i]),
+                    partos_previos=int(partos[i]),
+                    abortos_previos=int(abortos[i]),
+                    hipertension=bool(hipertension[i]),
+                    diabetes=bool(diabetes[i]),
+                    fecha_ultima_regla=None if con_ecografia[i] else inicio,
+                    fecha_ecografia=fecha_eco,
+                    semanas_ecografia=int(semanas_eco[i]) if con_ecografia[i] else None,
+                    fecha_inicio_gestacion=inicio,
+                    estado='activo' if en_curso[i] else 'alta',
+                    created_by=self.usuario,
+                ))
+            Paciente.objects.bulk_create(pacientes, batch_size=self.tamano_bloque)
+            por_persona = dict(
+                Paciente.objects.filter(persona_id__in=personas_ids[desde:hasta].tolist())
+                .values_list('persona_id', 'pk')
+            )
+            ids[desde:hasta] = [por_persona[persona_id] for persona_id in personas_ids[desde:hasta].tolist()]
+
+        self._pacientes, self._inicios, self._finales = ids, inicios, finales
+        self.resultado.filas['pacientes'] = cantidad
+
+    ################
+    # Controles prenatales
+    ################
+    def _crear_controles(self):
+        from pacientes.models import ControlPrenatal
+
+        total = self.volumenes['controles']
+        # Más controles cuanto más avanzada (o completa) la gestación
+        duracion = (self._finales - self._inicios).astype(np.float64)
+        por_paciente = self.rng.multinomial(total, duracion / duracion.sum())
+
+        fila_paciente = np.repeat(np.arange(len(self._pacientes)), por_paciente)
+        # Índice del control dentro de su paciente (0, 1, 2, ...)
+        primera_fila = np.repeat(np.cumsum(por_paciente) - por_paciente, por_paciente)
+        orden = np.arange(total) - primera_fila
+
+        # Desde la semana 6, repartidos en lo que va de la gestación
+        inicio = self._inicios[fila_paciente]
+        disponible = (self._finales[fila_paciente] - inicio).astype(np.int64) - 42
+        paso = np.maximum(disponible // np.maximum(por_paciente[fila_paciente], 1), 1)
+        dias = 42 + orden * paso + self.rng.integers(0, 4, total)
+        fechas = inicio + dias.astype('timedelta64[D]')
+        semanas = np.clip(dias // 7, 1, 42)
+
+        # Signos vitales: la mayoría en rango, algunos fuera para alertas y tendencias
+        peso = np.round(self.rng.normal(64, 10, total) + 0.3 * semanas, 1)
+        hipertensa = self.rng.random(total) < 0.03
+        sistolica = np.round(self.rng.normal(112, 10, total) + 40 * hipertensa).astype(np.int64)
+        diastolica = np.round(self.rng.normal(70, 8, total) + 25 * hipertensa).astype(np.int64)
+        frecuencia = np.round(self.rng.normal(84, 9, total)).astype(np.int64)
+        glucemia = np.round(self.rng.normal(88, 10, total) + 80 * (self.rng.random(total) < 0.04), 1)
+        sin_glucemia = self.rng.random(total) < 0.6
+
+        pacientes = self._pacientes
+        for desde, hasta in self._bloques(total):
+            controles = [
+                ControlPrenatal(
+                    paciente_id=int(pacientes[fila_paciente[i]]),
+                    fecha_control=fechas[i].item(),
+                    semanas_gestacion=int(semanas[i]),
+                    peso=float(peso[i]),
+                    presion_sistolica=int(sistolica[i]),
+                    presion_diastolica=int(diastolica[i]),
+                    frecuencia_cardiaca=int(frecuencia[i]),
+                    glucemia=None if sin_glucemia[i] else float(glucemia[i]),
+                    realizado_por=self.usuario,
+                    created_by=self.usuario,
+                )
+                for i in range(desde, hasta)
+            ]
+            ControlPrenatal.objects.bulk_create(controles, batch_size=self.tamano_bloque)
+
+        self.resultado.filas['controles'] = total
+
+    ################
+    # Registros clínicos
+    ################
+    def _crear_registros(self):
+        total = self.volumenes['registros']
+        for tabla, proporcion in PROPORCION_REGISTROS.items():
+            cantidad = max(1, int(total * proporcion))
+            filas = self.rng.integers(0, len(self._pacientes), cantidad)
+            inicio = self._inicios[filas]
+            rango = (self._finales[filas] - inicio).astype(np.int64)
+            fechas = inicio + (self.rng.random(cantidad) * rango).astype('timedelta64[D]')
+            getattr(self, f'_crear_{tabla}')(self._pacientes[filas], fechas)
+            self.resultado.filas[tabla] = cantidad
+
+    def _escribir(self, modelo, cantidad, construir):
+        for desde, hasta in self._bloques(cantidad):
+            modelo.objects.bulk_create([construir(i) for i in range(desde, hasta)], batch_size=self.tamano_bloque)
+
+    def _momento(self, fecha, hora):
+        return datetime.datetime.combine(fecha.item(), datetime.time(int(hora)), tzinfo=timezone.get_current_timezone())
+
+    def _crear_observaciones(self, pacientes, fechas):
+        from registros.models import Observacion
+
+        textos = self._elegir([
+            'Paciente refiere buen estado general.',
+            'Se educa sobre signos de alarma.',
+            'Refiere náuseas matinales, se indica dieta fraccionada.',
+            'Movimientos fetales presentes.',
+            'Se solicita control de exámenes.',
+        ], len(pacientes))
+        cantidad = len(pacientes)
+        horas = self.rng.integers(8, 20, cantidad)
+        # created_at es auto_now_add: bulk_create lo deja en "ahora" y se
+        # corrige después, con un UPDATE por momento (fecha y hora)
+        por_momento = defaultdict(list)
+        for desde, hasta in self._bloques(cantidad):
+            Observacion.objects.bulk_create([
+                Observacion(paciente_id=int(pacientes[i]), texto=textos[i], created_by=self.usuario)
+                for i in range(desde, hasta)
+            ], batch_size=self.tamano_bloque)
+            # MySQL no retorna las pk de bulk_create: son las últimas del usuario sintético
+            ids = (
+                Observacion.objects.filter(created_by=self.usuario)
+                .order_by('-pk').values_list('pk', flat=True)[:hasta - desde]
+            )
+            for i, pk in zip(range(hasta - 1, desde - 1, -1), ids):
+                por_momento[(fechas[i], horas[i])].append(pk)
+
+        for (fecha, hora), ids in por_momento.items():
+            momento = self._momento(fecha, hora)
+            for desde in range(0, len(ids), self.tamano_bloque):
+                Observacion.objects.filter(pk__in=ids[desde:desde + self.tamano_bloque]).update(created_at=momento)
+
+    def _crear_patologias(self, pacientes, fechas):
+        from registros.models import Patologia
+
+        cantidad = len(pacientes)
+        patologias = self._elegir(PATOLOGIAS, cantidad)
+        riesgo = self._elegir(['bajo', 'medio', 'alto', 'critico'], cantidad, [0.4, 0.35, 0.2, 0.05])
+        estado = self._elegir(['activa', 'resuelta', 'inactiva'], cantidad, [0.6, 0.3, 0.1])
+        self._escribir(Patologia, cantidad, lambda i: Patologia(
+            paciente_id=int(pacientes[i]),
+            nombre=patologias[i][0],
+            codigo_cie_10=patologias[i][1],
+            nivel_riesgo=riesgo[i],
+            estado=estado[i],
+            fecha_diagnostico=fechas[i].item(),
+            fecha_resolucion=fechas[i].item() if estado[i] == 'resuelta' else None,
+            diagnosticado_por=self.usuario,
+            created_by=self.usuario,
+        ))
+
+    def _crear_procedimientos(self, pacientes, fechas):
+        from registros.models import Procedimiento
+
+        cantidad = len(pacientes)
+        tipos = self._elegir(TIPOS_PROCEDIMIENTO, cantidad)
+        estados = self._elegir(['realizado', 'programado', 'cancelado'], cantidad, [0.85, 0.1, 0.05])
+        horas = self.rng.integers(8, 20, cantidad)
+        self._escribir(Procedimiento, cantidad, lambda i: Procedimiento(
+            paciente_id=int(pacientes[i]),
+            tipo_procedimiento=tipos[i],
+            fecha_procedimiento=self._momento(fechas[i], horas[i]),
+            estado=estados[i],
+            realizado_por=self.usuario,
+            created_by=self.usuario,
+        ))
+
+    def _crear_medicamentos(self, pacientes, fechas):
+        from registros.models import Medicamento
+
+        cantidad = len(pacientes)
+        medicamentos = self._elegir(MEDICAMENTOS, cantidad)
+        estados = self._elegir(['administrado', 'prescrito', 'no_administrado'], cantidad, [0.7, 0.25, 0.05])
+        duracion = self.rng.integers(5, 60, cantidad).tolist()
+        self._escribir(Medicamento, cantidad, lambda i: Medicamento(
+            paciente_id=int(pacientes[i]),
+            nombre_medicamento=medicamentos[i][0],
+            dosis=medicamentos[i][1],
+            via_administracion=medicamentos[i][2],
+            frecuencia=medicamentos[i][3],
+            duracion_dias=duracion[i],
+            fecha_prescripcion=fechas[i].item(),
+            estado=estados[i],
+            prescrito_por=self.usuario,
+            created_by=self.usuario,
+        ))
+
+
+def reconstruir_derivados(stdout=None):
+    """
+    Índice de búsqueda, contadores y alertas de los datos cargados con
+    bulk_create (que no emite las señales que los mantienen).
+
+    Args:
+        stdout: salida de los comandos (por defecto se descarta)
+    """
+    for comando in ('reindexar_personas', 'reconciliar_contadores', 'reevaluar_alertas'):
+        call_command(comando, stdout=stdout or io.StringIO())
+
+
+# ====================================================================
+# BORRADO
+# ====================================================================
+
+def borrar_sinteticos(tamano_bloque=2000):
+    """
+    Borra todo lo creado por el usuario sintético, por bloques de pacientes
+    (los registros y controles caen en cascada).
+
+    Returns:
+        int: personas borradas
+    """
+    from pacientes.models import Paciente
+
+    usuario = User.objects.filter(username=USUARIO_SINTETICO).first()
+    if usuario is None:
+        return 0
+
+    while True:
+        ids = list(Paciente.objects.filter(created_by=usuario).values_list('pk', flat=True)[:tamano_bloque])
+        if not ids:
+            break
+        with transaction.atomic():
+            Paciente.objects.filter(pk__in=ids).delete()
+
+    borradas = 0
+    while True:
+        ids = list(Persona.objects.filter(created_by=usuario).values_list('pk', flat=True)[:tamano_bloque])
+        if not ids:
+            return borradas
+        with transaction.atomic():
+            Persona.objects.filter(pk__in=ids).delete()
+        borradas += len(ids)
@@ -0,0 +1,26 @@
+################
+# FILTROS: Imágenes derivadas en plantillas
+# Descripción: URL de la miniatura o variante web de un ImageField (ver
+#              core.imagenes). En listados, llamar antes a
+#              precargar_derivadas en la vista para no consultar por fila.
+# Uso: {% load imagenes %}
+#      <img src="{{ observacion.imagen|miniatura }}">
+#      <a href="{{ observacion.imagen|derivada:'web' }}">
+################
+
+from django import template
+
+from core.imagenes import url_derivada
+
+
+register = template.Library()
+
+
+@register.filter
+def derivada(imagen, variante):
+    return url_derivada(imagen, variante) or ''
+
+
+@register.filter
+def miniatura(imagen):
+    return url_derivada(imagen, 'miniatura') or ''
@@ -1,3 +1,1712 @@
-from django.test import TestCase
+import base64
+import csv
+import gzip
+import hashlib
+import io
+import json
+import logging
+import os
+import random
+import shutil
+import socketserver
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import Group, User
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.storage import default_storage
+from django.core.management import CommandError, call_command
+from django.http import HttpResponse, StreamingHttpResponse
+from django.db import IntegrityError, connection, connections, router, transaction
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+from authentication import sesiones
+from authentication.roles import resolver_rol
+from core import benchmark
+from core import almacenamiento, auditoria, busqueda, imagenes
+from core import contadores, logs, replicas
+from core.cache import CacheDosNiveles, metricas, obtener_o_calcular
+from core.Forms.crear_persona import Form_crear_persona
+from core.importacion import ImportadorPersonas, leer_archivo
+from core.models import ArchivoAlmacenado, Contador, ImagenDerivada, Persona, RegistroAuditoria
+from core.paginacion import contar_aproximado
+from core.perfil_consultas import PerfilConsultasMiddleware, estadisticas, huella_sql
+from core.pool_conexiones import PoolAgotado, PoolConexiones
+from core.sinteticos import GeneradorSintetico, borrar_sinteticos, ruts_sinteticos
+from personal.models import Perfil
+from PIL import Image
+from registros.views import RolRequiredMixin
+from utilidades.validadores import descomponer_rut, validar_rut_chileno, validar_ruts
+
+
+class ServidorRedisFalso(socketserver.ThreadingTCPServer):
+    """
+    Servidor en memoria que habla el protocolo de Redis (RESP2), con los
+    comandos que usa django.core.cache.backends.redis.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _ManejadorRedis)
+        self.datos = {}
+        self.candado = threading.Lock()
+        self.comandos = 0
+        self._hilo = threading.Thread(target=self.serve_forever, daemon=True)
+        self._hilo.start()
+
+    @property
+    def url(self):
+        return f'redis://127.0.0.1:{self.server_address[1]}/0'
+
+    def detener(self):
+        self.shutdown()
+        self.server_close()
+
+    def vigente(self, clave):
+        valor, expira = self.datos.get(clave, (None, None))
+        if expira is not None and expira <= time.monotonic():
+            del self.datos[clave]
+            return None
+        return valor
+
+    def ejecutar(self, comando, args):
+        self.comandos += 1
+        if comando in ('CLIENT', 'SELECT', 'PING'):
+            return 'OK'
+        if comando == 'GET':
+            return self.vigente(args[0])
+        if comando == 'SET':
+            opciones = [arg.upper() for arg in args[2:]]
+            if b'NX' in opciones and self.vigente(args[0]) is not None:
+                return None
+            expira = None
+            if b'EX' in opciones:
+                expira = time.monotonic() + int(args[2 + opciones.index(b'EX') + 1])
+            self.datos[args[0]] = (args[1], expira)
+            return 'OK'
+        if comando == 'MGET':
+            return [self.vigente(clave) for clave in args]
+        if comando == 'MSET':
+            for clave, valor in zip(args[::2], args[1::2]):
+                self.datos[clave] = (valor, None)
+            return 'OK'
+        if comando == 'DEL':
+            return sum(self.datos.pop(clave, None) is not None for clave in args)
+        if comando == 'EXISTS':
+            return sum(self.vigente(clave) is not None for clave in args)
+        if comando in ('EXPIRE', 'PERSIST'):
+            if self.vigente(args[0]) is None:
+                return 0
+            expira = time.monotonic() + int(args[1]) if comando == 'EXPIRE' else None
+            self.datos[args[0]] = (self.datos[args[0]][0], expira)
+            return 1
+        if comando == 'INCRBY':
+            valor, expira = self.datos.get(args[0], (b'0', None))
+            nuevo = int(valor) + int(args[1])
+            self.datos[args[0]] = (str(nuevo).encode(), expira)
+            return nuevo
+        if comando == 'FLUSHDB':
+            self.datos.clear()
+            return 'OK'
+        return Exception(f'ERR unknown command {comando}')
+
+
+class _ManejadorRedis(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        en_transaccion = None
+        while True:
+            partes = self._leer()
+            if partes is None:
+                return
+            comando, args = partes[0].decode().upper(), partes[1:]
+            if comando == 'MULTI':
+                en_transaccion = []
+                self._responder('OK')
+            elif comando == 'EXEC':
+                with self.server.candado:
+                    respuestas = [self.server.ejecutar(*pendiente) for pendiente in en_transaccion]
+                en_transaccion = None
+                self._responder(respuestas)
+            elif en_transaccion is not None:
+                en_transaccion.append((comando, args))
+                self._responder('QUEUED')
+            else:
+                with self.server.candado:
+                    self._responder(self.server.ejecutar(comando, args))
+
+    def _leer(self):
+        linea = self.rfile.readline()
+        if not linea:
+            return None
+        partes = []
+        for _ in range(int(linea[1:])):
+            largo = int(self.rfile.readline()[1:])
+            partes.append(self.rfile.read(largo + 2)[:-2])
+        return partes
+
+    def _responder(self, valor):
+        self.wfile.write(self._codificar(valor))
+
+    def _codificar(self, valor):
+        if valor is None:
+            return b'$-1\r\n'
+        if isinstance(valor, Exception):
+            return f'-{valor}\r\n'.encode()
+        if isinstance(valor, str):
+            return f'+{valor}\r\n'.encode()
+        if isinstance(valor, int):
+            return f':{valor}\r\n'.encode()
+        if isinstance(valor, list):
+            return f'*{len(valor)}\r\n'.encode() + b''.join(self._codificar(item) for item in valor)
+        return b'$%d\r\n%s\r\n' % (len(valor), valor)
+
+
+def nueva_cache(location, **opciones):
+    """Un CacheDosNiveles propio, como el de un worker."""
+    return CacheDosNiveles(location, {'TIMEOUT': 300, 'OPTIONS': opciones})
+
+
+class CacheDosNivelesTests(SimpleTestCase):
+
+    def setUp(self):
+        self.servidor = ServidorRedisFalso()
+        self.addCleanup(self.servidor.detener)
+        metricas.reiniciar()
+
+    def test_workers_comparten_valores(self):
+        worker_a = nueva_cache(self.servidor.url)
+        worker_b = nueva_cache(self.servidor.url)
+
+        worker_a.set('rol', {'rol': 'MATRONA'}, 60)
+        self.assertEqual(worker_b.get('rol'), {'rol': 'MATRONA'})
+        self.assertEqual(worker_b.get('rol'), {'rol': 'MATRONA'})
+
+        valores = metricas.como_dict()
+        self.assertEqual(valores['aciertos_compartida'], 1)
+        self.assertEqual(valores['aciertos_local'], 1)
+
+    def test_lectura_repetida_no_va_a_redis(self):
+        cache = nueva_cache(self.servidor.url)
+        cache.set('catalogo', [1, 2, 3])
+        comandos = self.servidor.comandos
+        for _ in range(20):
+            cache.get('catalogo')
+        self.assertEqual(self.servidor.comandos, comandos)
+
+    def test_copia_local_dura_a_lo_mas_tiempo_local(self):
+        worker_a = nueva_cache(self.servidor.url, TIEMPO_LOCAL=1)
+        worker_b = nueva_cache(self.servidor.url, TIEMPO_LOCAL=1)
+        worker_a.set('clave', 'antes')
+        worker_b.get('clave')
+        worker_a.set('clave', 'despues')
+
+        self.assertEqual(worker_b.get('clave'), 'antes')
+        time.sleep(1.1)
+        self.assertEqual(worker_b.get('clave'), 'despues')
+
+    def test_ttl_por_clave_y_incr_compartido(self):
+        worker_a = nueva_cache(self.servidor.url)
+        worker_b = nueva_cache(self.servidor.url)
+        worker_a.set('corta', 'x', 1)
+        worker_a.set('generacion', 1, None)
+
+        worker_b.incr('generacion')
+        self.assertEqual(worker_a.incr('generacion'), 3)
+        time.sleep(1.1)
+        self.assertIsNone(worker_a.get('corta'))
+
+    def test_sin_redis_sigue_con_cache_local(self):
+        cache = nueva_cache(self.servidor.url)
+        self.servidor.detener()
+
+        with self.assertLogs('core.cache', 'WARNING'):
+            cache.set('clave', 'valor')
+        self.assertEqual(cache.get('clave'), 'valor')
+        self.assertFalse(cache.compartida)
+        self.assertEqual(metricas.como_dict()['errores_compartida'], 1)
+
+    def test_un_solo_calculo_con_pedidos_concurrentes(self):
+        workers = [nueva_cache(self.servidor.url) for _ in range(2)]
+        calculos = []
+
+        def calcular():
+            calculos.append(1)
+            time.sleep(0.3)
+            return 'costoso'
+
+        resultados = []
+        hilos = [
+            threading.Thread(target=lambda i=i: resultados.append(
+                obtener_o_calcular('tendencias', calcular, 60, cache=workers[i % 2])
+            ))
+            for i in range(8)
+        ]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(len(calculos), 1)
+        self.assertEqual(resultados, ['costoso'] * 8)
+        self.assertEqual(metricas.como_dict()['calculos'], 1)
+
+
+class MetricasCacheViewTests(TestCase):
+
+    def test_solo_staff(self):
+        usuario = User.objects.create_user('operador', password='clave')
+        self.client.force_login(usuario)
+        self.assertEqual(self.client.get(reverse('core:metricas_cache')).status_code, 302)
+
+        usuario.is_staff = True
+        usuario.save()
+        respuesta = self.client.get(reverse('core:metricas_cache'))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIn('tasa_aciertos', respuesta.json()['metricas'])
+
+    def test_metricas_pool_solo_staff(self):
+        usuario = User.objects.create_user('operador', password='clave')
+        self.client.force_login(usuario)
+        self.assertEqual(self.client.get(reverse('core:metricas_pool')).status_code, 302)
+
+        usuario.is_staff = True
+        usuario.save()
+        respuesta = self.client.get(reverse('core:metricas_pool'))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIsInstance(respuesta.json()['pools'], list)
+
+
+class SesionesTests(TestCase):
+
+    def setUp(self):
+        self.sesion = sesiones.SessionStore()
+        self.sesion['paciente_actual'] = 1
+        self.sesion.create()
+        self.sesion.save()
+
+    def abrir(self):
+        sesion = sesiones.SessionStore(self.sesion.session_key)
+        sesion.load()
+        return sesion
+
+    def test_sesion_sin_cambios_no_se_guarda(self):
+        sesion = self.abrir()
+        sesion['paciente_actual'] = 1
+        with self.assertNumQueries(0):
+            sesion.save()
+
+    def test_cambios_se_escriben_a_la_tabla_en_diferido(self):
+        sesion = self.abrir()
+        sesion['paciente_actual'] = 2
+        with self.assertNumQueries(0):
+            sesion.save()
+        self.assertEqual(self.abrir()['paciente_actual'], 2)
+
+        with mock.patch.object(sesiones, 'ESCRITURA_DIFERIDA', 0):
+            sesion = self.abrir()
+            sesion['paciente_actual'] = 3
+            sesion.save()
+        fila = Session.objects.get(session_key=self.sesion.session_key)
+        self.assertEqual(fila.get_decoded()['paciente_actual'], 3)
+
+    def test_se_recupera_desde_la_tabla_si_la_cache_la_pierde(self):
+        self.sesion._cache.delete(self.sesion.cache_key)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.abrir()['paciente_actual'], 1)
+
+    def test_logout_sin_redis_falla_sin_borrar_la_fila(self):
+        servidor = ServidorRedisFalso()
+        self.addCleanup(servidor.detener)
+        sesion = sesiones.SessionStore()
+        sesion._cache = nueva_cache(servidor.url, TIEMPO_LOCAL=0)
+        sesion['usuario'] = 7
+        sesion.create()
+        clave = sesion.session_key
+        servidor.detener()
+
+        # Otro worker, que no alcanza a Redis
+        logout = sesiones.SessionStore(clave)
+        logout._cache = nueva_cache(servidor.url, TIEMPO_LOCAL=0)
+        with mock.patch('core.cache.PAUSA_BORRADO', 0), self.assertRaises(Exception):
+            logout.flush()
+
+        # La sesión sigue completa (tabla y Redis): nada revive al volver Redis
+        self.assertTrue(Session.objects.filter(session_key=clave).exists())
+        self.assertIn(f':1:{sesiones.SessionStore.cache_key_prefix}{clave}'.encode(), servidor.datos)
+
+    def test_logout_borra_tabla_y_cache(self):
+        sesion = self.abrir()
+        sesion.flush()
+        self.assertFalse(Session.objects.filter(session_key=self.sesion.session_key).exists())
+        self.assertIsNone(self.sesion._cache.get(self.sesion.cache_key))
+
+    def test_poda_por_lotes(self):
+        vencida = timezone.now() - timedelta(days=2)
+        Session.objects.bulk_create(
+            Session(session_key=f'vencida{i:03d}', session_data='', expire_date=vencida) for i in range(25)
+        )
+        # Dos consultas por lote (claves + DELETE): lotes de 10, 10 y 5
+        with self.assertNumQueries(6):
+            self.assertEqual(sesiones.podar_sesiones(lote=10, pausa=0), 25)
+        self.assertTrue(Session.objects.filter(session_key=self.sesion.session_key).exists())
+
+
+class PersonaRutTests(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('rut', password='clave-segura-123')
+        self.numeros, self.verificadores = ruts_sinteticos(4)
+
+    def crear(self, rut):
+        return Persona.objects.create(
+            rut=rut, nombre='María', apellido='Soto', edad=30,
+            direccion='Los Aromos 123', contacto='+56912345678', created_by=self.usuario
+        )
+
+    def formateado(self, indice):
+        return f'{self.numeros[indice]:,}'.replace(',', '.') + f'-{self.verificadores[indice]}'
+
+    def canonico(self, indice):
+        return (int(self.numeros[indice]), self.verificadores[indice])
+
+    def test_save_sincroniza_rut_normalizado(self):
+        persona = self.crear(self.formateado(0))
+        persona.refresh_from_db()
+        self.assertEqual((persona.rut_numero, persona.rut_dv), self.canonico(0))
+
+        # update_fields con 'rut' también guarda el RUT normalizado
+        persona.rut = f'{self.numeros[1]}{self.verificadores[1]}'
+        persona.save(update_fields=['rut'])
+        persona.refresh_from_db()
+        self.assertEqual((persona.rut_numero, persona.rut_dv), self.canonico(1))
+
+        persona.rut = '12.345.678-0'
+        persona.save()
+        persona.refresh_from_db()
+        self.assertEqual((persona.rut_numero, persona.rut_dv), (None, ''))
+
+    def test_by_rut_en_cualquier_formato(self):
+        persona = self.crear(f'{self.numeros[0]}-{self.verificadores[0]}')
+        for rut in (self.formateado(0), f'{self.numeros[0]}{self.verificadores[0]}', f' {self.formateado(0)} '):
+            with self.subTest(rut=rut):
+                self.assertEqual(list(Persona.objects.by_rut(rut)), [persona])
+
+        otro_verificador = '0' if self.verificadores[0] != '0' else '1'
+        self.assertFalse(Persona.objects.by_rut(f'{self.numeros[0]}-{otro_verificador}').exists())
+        with self.assertNumQueries(0):
+            self.assertEqual(list(Persona.objects.by_rut('no-es-rut')), [])
+
+    def test_formulario_con_espacios_detecta_duplicado(self):
+        rut = f'{self.numeros[0]:,}'.replace(',', ' ') + f'-{self.verificadores[0]}'
+        datos = {
+            'rut': rut, 'nombre': 'María', 'apellido': 'Soto', 'edad': 30,
+            'direccion': 'Los Aromos 123', 'contacto': '+56912345678',
+        }
+        formulario = Form_crear_persona(data=datos)
+        self.assertTrue(formulario.is_valid(), formulario.errors)
+        persona = formulario.save(commit=False)
+        persona.created_by = self.usuario
+        persona.save()
+        persona.refresh_from_db()
+        self.assertEqual(persona.rut, f'{self.numeros[0]}{self.verificadores[0]}')
+        self.assertEqual((persona.rut_numero, persona.rut_dv), self.canonico(0))
+
+        formulario = Form_crear_persona(data=datos)
+        self.assertFalse(formulario.is_valid())
+        self.assertEqual(formulario.errors['rut'], ['Este RUT ya está registrado en el sistema'])
+
+    def test_comando_completa_por_bloques(self):
+        personas = [self.crear(f'{numero}-{verificador}') for numero, verificador in zip(self.numeros, self.verificadores)]
+        # Filas anteriores a la normalización: update() no pasa por save()
+        Persona.objects.update(rut_numero=None, rut_dv='')
+        Persona.objects.filter(pk=personas[2].pk).update(rut='no-es-rut')
+        Persona.objects.filter(pk=personas[3].pk).update(rut=self.formateado(0))
+
+        salida = io.StringIO()
+        call_command('completar_rut_normalizado', bloque=2, stdout=salida)
+
+        normalizados = dict(Persona.objects.values_list('pk', 'rut_numero'))
+        self.assertEqual(normalizados[personas[0].pk], self.canonico(0)[0])
+        self.assertEqual(normalizados[personas[1].pk], self.canonico(1)[0])
+        # Inválido y duplicado de otro bloque quedan sin completar y se informan
+        self.assertIsNone(normalizados[personas[2].pk])
+        self.assertIsNone(normalizados[personas[3].pk])
+        self.assertIn('2 actualizadas, 1 inválidas, 1 duplicadas', salida.getvalue())
+        self.assertIn(f'RUT duplicado: id={personas[3].pk}', salida.getvalue())
+
+
+class RolesTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.usuario = User.objects.create_user(username='rol', password='clave-segura-123')
+
+    def rol(self):
+        # Instancia nueva, como en otro request: sin el memo, desde la caché
+        return resolver_rol(User.objects.get(pk=self.usuario.pk))
+
+    def test_memo_por_request_y_cache_compartida(self):
+        usuario = User.objects.get(pk=self.usuario.pk)
+        with self.assertNumQueries(2):
+            rol = resolver_rol(usuario)
+        with self.assertNumQueries(0):
+            self.assertIs(resolver_rol(usuario), rol)
+
+        otro = User.objects.get(pk=self.usuario.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(resolver_rol(otro).rol, 'USUARIO')
+        self.assertIsNot(resolver_rol(otro), rol)
+
+    def test_cambios_de_perfil_invalidan(self):
+        self.assertEqual((self.rol().rol, self.rol().rol_perfil), ('USUARIO', None))
+
+        perfil = Perfil.objects.create(usuario=self.usuario, rol='tens')
+        self.assertEqual((self.rol().rol, self.rol().rol_perfil), ('TENS', 'tens'))
+        self.assertFalse(self.rol().tiene_permiso('ver_ficha'))
+
+        perfil.rol = 'matrona'
+        perfil.save()
+        self.assertEqual(self.rol().rol, 'MATRONA')
+        self.assertTrue(self.rol().tiene_permiso('ver_ficha'))
+
+        perfil.delete()
+        self.assertEqual((self.rol().rol, self.rol().permisos), ('USUARIO', frozenset()))
+
+    def test_cambios_de_grupos_invalidan(self):
+        grupo = Group.objects.create(name='Medico')
+        self.usuario.groups.add(grupo)
+        self.assertEqual(self.rol().rol, 'MEDICO')
+
+        grupo.user_set.clear()
+        self.assertEqual(self.rol().rol, 'USUARIO')
+        grupo.user_set.add(self.usuario)
+        self.assertEqual(self.rol().rol, 'MEDICO')
+
+        grupo.name = 'Otro'
+        grupo.save()
+        self.assertEqual(self.rol().rol, 'USUARIO')
+        grupo.name = 'Medico'
+        grupo.save()
+        self.assertEqual(self.rol().rol, 'MEDICO')
+
+        grupo.delete()
+        self.assertEqual(self.rol().rol, 'USUARIO')
+
+    def test_superusuario_y_login(self):
+        self.rol()
+        self.usuario.is_superuser = True
+        self.usuario.save()
+        self.assertEqual(self.rol().rol, 'ADMINISTRADOR')
+
+        # El login solo toca last_login y no invalida
+        with mock.patch('authentication.signals.invalidar_roles') as invalidar:
+            self.usuario.last_login = timezone.now()
+            self.usuario.save(update_fields=['last_login'])
+        invalidar.assert_not_called()
+
+    def test_mixin_usa_rol_perfil(self):
+        # Grupo Matrona (rol del dashboard) con Perfil de médico: el mixin mira el Perfil
+        Perfil.objects.create(usuario=self.usuario, rol='medico')
+        self.usuario.groups.add(Group.objects.create(name='Matrona'))
+        request = RequestFactory().get('/')
+        request.user = User.objects.get(pk=self.usuario.pk)
+        self.assertEqual(resolver_rol(request.user).rol, 'MATRONA')
+
+        for roles_permitidos, permitido in [(['medico'], True), (['matrona'], False)]:
+            vista = RolRequiredMixin()
+            vista.roles_permitidos = roles_permitidos
+            vista.request = request
+            self.assertIs(vista.test_func(), permitido)
+
+
+class PerfilConsultasTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', password='clave', is_staff=True)
+
+    def setUp(self):
+        estadisticas.reiniciar()
+
+    def test_huella_ignora_valores(self):
+        self.assertEqual(
+            huella_sql('SELECT * FROM t WHERE id IN (%s, %s, %s) AND n = 10 LIMIT 21'),
+            huella_sql("SELECT * FROM t WHERE id IN (%s) AND n = 'x'  LIMIT 1"),
+        )
+
+    def vista_n_mas_uno(self, request):
+        for usuario_id in range(8):
+            list(User.objects.filter(pk=usuario_id))
+        Persona.objects.count()
+        return HttpResponse('ok')
+
+    def test_detecta_n_mas_uno_y_registra_origen(self):
+        middleware = PerfilConsultasMiddleware(self.vista_n_mas_uno)
+        with self.assertLogs('perfil_consultas', 'WARNING') as registro:
+            middleware(RequestFactory().get('/listado/'))
+
+        linea = json.loads(registro.records[0].getMessage())
+        self.assertEqual(linea['consultas'], 9)
+        self.assertEqual(linea['duplicadas'], 7)
+        self.assertEqual(linea['repetidas'][0]['veces'], 8)
+        self.assertIn('core/tests.py', linea['repetidas'][0]['origen'])
+        self.assertIn('vista_n_mas_uno', linea['repetidas'][0]['origen'])
+
+    async def test_mide_vistas_async(self):
+        async def vista(request):
+            await User.objects.acount()
+            await Persona.objects.acount()
+            return HttpResponse('ok')
+
+        middleware = PerfilConsultasMiddleware(vista)
+        with mock.patch.object(PerfilConsultasMiddleware, 'registrar') as registrar:
+            respuesta = await middleware(RequestFactory().get('/'))
+
+        self.assertEqual(respuesta.content, b'ok')
+        self.assertEqual(registrar.call_args.args[2].consultas, 2)
+
+    def test_endpoint_de_staff_suma_por_endpoint(self):
+        middleware = PerfilConsultasMiddleware(self.vista_n_mas_uno)
+        with self.assertLogs('perfil_consultas', 'WARNING'):
+            for _ in range(2):
+                middleware(RequestFactory().get('/listado/'))
+
+        self.client.force_login(self.staff)
+        endpoints = self.client.get(reverse('core:perfil_consultas')).json()['endpoints']
+        fila = next(fila for fila in endpoints if fila['endpoint'] == 'GET <sin ruta>')
+        self.assertEqual(fila['requests'], 2)
+        self.assertEqual(fila['consultas'], 18)
+        self.assertEqual(fila['n_mas_uno'], 2)
+
+
+class ValidadoresRutTests(SimpleTestCase):
+
+    def test_lote_y_uno_a_uno_coinciden(self):
+        azar = random.Random(7)
+        alfabeto = '0123456789Kk.- \t\nx\u0663'
+        ruts = [''.join(azar.choices(alfabeto, k=azar.randint(0, 14))) for _ in range(5000)]
+        # RUT válidos con separadores y espacios intercalados
+        numeros, verificadores = ruts_sinteticos(2000)
+        for numero, verificador in zip(numeros.tolist(), verificadores.tolist()):
+            caracteres = list(f'{numero}{verificador}')
+            for _ in range(azar.randint(0, 3)):
+                caracteres.insert(azar.randint(0, len(caracteres)), azar.choice('.- \t'))
+            ruts.append(''.join(caracteres))
+
+        lote = validar_ruts(ruts).validos.tolist()
+        uno_a_uno = [validar_rut_chileno(rut)[0] for rut in ruts]
+        diferencias = [rut for rut, a, b in zip(ruts, lote, uno_a_uno) if a != b]
+        self.assertEqual(diferencias, [])
+        # descomponer_rut (rut_numero, by_rut) acepta exactamente los mismos
+        descompuestos = [descomponer_rut(rut) is not None for rut in ruts]
+        self.assertEqual([rut for rut, a, b in zip(ruts, lote, descompuestos) if a != b], [])
+        self.assertGreater(sum(lote), 2000)
+
+class PaginacionKeysetTests(TestCase):
+
+    def setUp(self):
+        from pacientes.models import ControlPrenatal, Paciente
+
+        self.usuario = User.objects.create_user('paginador', password='clave-segura-123')
+        persona = Persona.objects.create(
+            rut='12.345.678-5', nombre='María', apellido='Soto', edad=30,
+            direccion='Los Aromos 123', contacto='+56912345678', created_by=self.usuario
+        )
+        paciente = Paciente.objects.create(
+            persona=persona, edad=30, estado_civil='casada', prevision='fonasa', created_by=self.usuario
+        )
+        # Fechas repetidas: el desempate por pk mantiene el orden estable
+        fechas = [date(2025, 5, 1)] * 3 + [date(2025, 5, 2)] * 2
+        self.controles = [
+            ControlPrenatal.objects.create(paciente=paciente, fecha_control=fecha, created_by=self.usuario)
+            for fecha in fechas
+        ]
+        self.client.force_login(self.usuario)
+        self.url = reverse('control-prenatal-list')
+
+    def cursor(self, *posicion):
+        return base64.urlsafe_b64encode(json.dumps(posicion).encode()).decode()
+
+    def test_recorre_sin_repetir_y_vuelve(self):
+        vistos, paginas = [], []
+        url, parametros = self.url, {'page_size': 2}
+        while url:
+            pagina = self.client.get(url, parametros).json()
+            paginas.append(pagina)
+            vistos += [fila['id'] for fila in pagina['results']]
+            url, parametros = pagina['next'], None
+
+        esperado = sorted(self.controles, key=lambda control: (control.fecha_control, control.pk), reverse=True)
+        self.assertEqual(vistos, [control.pk for control in esperado])
+        anterior = self.client.get(paginas[2]['previous']).json()
+        self.assertEqual(anterior['results'], paginas[1]['results'])
+
+    def test_cursor_alterado_es_404(self):
+        for cursor in ('x', self.cursor('no-es-fecha', 1, False), self.cursor(None, 1, False),
+                       self.cursor('2025-05-01', 10 ** 30, False), self.cursor(['2025-05-01'], 1, False)):
+            # DRF marca la transacción para revertir al responder el error
+            with self.subTest(cursor=cursor), transaction.atomic():
+                self.assertEqual(self.client.get(self.url, {'cursor': cursor}).status_code, 404)
+
+    def test_conteo_aproximado(self):
+        from pacientes.models import ControlPrenatal
+
+        self.assertEqual(contar_aproximado(ControlPrenatal.objects.all(), limite=3), (3, False))
+        self.assertEqual(contar_aproximado(ControlPrenatal.objects.filter(fecha_control__day=2), limite=3), (2, True))
+        pagina = self.client.get(self.url, {'incluir_total': '1'}).json()
+        self.assertEqual((pagina['count'], pagina['count_exacto']), (5, True))
+
+
+class ContadoresTests(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('contador', password='clave-segura-123')
+        numeros, verificadores = ruts_sinteticos(3)
+        self.ruts = [f'{numero}-{verificador}' for numero, verificador in zip(numeros, verificadores)]
+
+    def crear_paciente(self, indice):
+        from pacientes.models import Paciente
+
+        persona = Persona.objects.create(
+            rut=self.ruts[indice], nombre='María', apellido='Soto', edad=30,
+            direccion='Los Aromos 123', contacto='+56912345678', created_by=self.usuario
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            return Paciente.objects.create(
+                persona=persona, edad=30, estado_civil='casada', prevision='fonasa', created_by=self.usuario
+            )
+
+    def test_ajustar_no_consulta_hasta_confirmar(self):
+        with CaptureQueriesContext(connection) as consultas, self.captureOnCommitCallbacks() as pendientes:
+            contadores.ajustar('pacientes_activos', 1)
+        self.assertEqual(len(consultas), 0)
+        self.assertEqual(len(pendientes), 1)
+
+    def test_commits_sin_fila_suman_ambos(self):
+        # Dos commits que encuentran el contador sin fila: ninguno pierde su ajuste
+        with self.captureOnCommitCallbacks(execute=True):
+            contadores.ajustar('admisiones_hoy', 1, '2025-05-01')
+            contadores.ajustar('admisiones_hoy', 2, '2025-05-01')
+        contadores._aplicar('admisiones_hoy', '2025-05-01', -1)
+        self.assertEqual(Contador.objects.get(clave='admisiones_hoy', periodo='2025-05-01').valor, 2)
+
+    def test_senales_siguen_el_valor_exacto(self):
+        from pacientes.models import ControlPrenatal
+
+        pacientes = [self.crear_paciente(indice) for indice in range(3)]
+        with self.captureOnCommitCallbacks(execute=True):
+            ControlPrenatal.objects.create(
+                paciente=pacientes[0], fecha_control=timezone.localdate(), created_by=self.usuario
+            )
+        with self.captureOnCommitCallbacks(execute=True):
+            pacientes[1].delete()
+
+        valores = contadores.leer_contadores()
+        self.assertEqual(
+            (valores['pacientes_activos'], valores['controles_pendientes'], valores['controles_hoy']), (2, 1, 1)
+        )
+        self.assertEqual(contadores.reconciliar(), [])
+
+    def test_reconciliar_corrige_cambios_masivos(self):
+        from pacientes.models import Paciente
+
+        for indice in range(3):
+            self.crear_paciente(indice)
+        # update() no emite señales: el contador queda desfasado
+        Paciente.objects.update(estado='inactivo')
+        self.assertEqual(contadores.leer_contadores()['pacientes_activos'], 3)
+
+        cambios = contadores.reconciliar()
+        self.assertIn(('pacientes_activos', '', 3, 0), cambios)
+        self.assertEqual(contadores.leer_contadores()['pacientes_activos'], 0)
+        self.assertEqual(contadores.reconciliar(), [])
+
+
+class BusquedaTests(TestCase):
+
+    BACKENDS = ('core.busqueda.BackendTokens', 'core.busqueda.BackendMemoria')
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('buscador', password='clave-segura-123')
+        numeros, verificadores = ruts_sinteticos(6)
+        self.ruts = [f'{numero}-{verificador}' for numero, verificador in zip(numeros, verificadores)]
+        cache.clear()
+        self.addCleanup(busqueda.reiniciar_backend)
+
+    def crear(self, indice, nombre, apellido, **datos):
+        return Persona.objects.create(**{
+            'rut': self.ruts[indice], 'nombre': nombre, 'apellido': apellido, 'edad': 30,
+            'direccion': 'Los Aromos 123', 'contacto': f'+5691234567{indice}', 'created_by': self.usuario,
+            **datos,
+        })
+
+    def en_cada_backend(self, prueba):
+        for ruta in self.BACKENDS:
+            with self.subTest(backend=ruta), override_settings(BUSQUEDA_PERSONAS={'BACKEND': ruta}):
+                busqueda.reiniciar_backend()
+                cache.clear()
+                busqueda.get_backend().indexar_lote(Persona.objects.all())
+                prueba()
+
+    def test_ranking_rut_exacto_prefijo_y_difuso(self):
+        maria = self.crear(0, 'María', 'Núñez')
+        mariana = self.crear(1, 'Mariana', 'Soto')
+        self.crear(2, 'Rosa', 'Díaz')
+        rut = Persona.objects.get(pk=mariana.pk).rut
+
+        def prueba():
+            self.assertEqual(busqueda.buscar_personas(rut), [mariana.pk])
+            self.assertEqual(busqueda.buscar_personas('maria'), [maria.pk, mariana.pk])
+            self.assertEqual(busqueda.buscar_personas('nunes'), [maria.pk])
+            self.assertEqual(busqueda.buscar_personas('xyz'), [])
+        self.en_cada_backend(prueba)
+
+    def test_omite_trigramas_comunes(self):
+        sotos = [self.crear(indice, 'Ana', 'Soto') for indice in range(3)]
+
+        def prueba():
+            self.assertEqual(sorted(busqueda.buscar_personas('sotx')), [persona.pk for persona in sotos])
+            with mock.patch.object(busqueda, 'MAXIMO_POR_TRIGRAMA', 2):
+                cache.clear()
+                self.assertEqual(busqueda.buscar_personas('sotx'), [])
+                # Las coincidencias directas no dependen de los trigramas
+                self.assertEqual(len(busqueda.buscar_personas('soto')), 3)
+        self.en_cada_backend(prueba)
+
+    def test_filtra_estado_antes_del_limite(self):
+        self.crear(0, 'María', 'Núñez', estado='inactivo')
+        activa = self.crear(1, 'María', 'Soto')
+
+        def prueba():
+            self.assertNotEqual(busqueda.buscar_personas('maria', limite=1), [activa.pk])
+            self.assertEqual(busqueda.buscar_personas('maria', limite=1, estado='activo'), [activa.pk])
+        self.en_cada_backend(prueba)
+
+
+class ImportacionTests(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('importador', password='clave-segura-123')
+        numeros, verificadores = ruts_sinteticos(3)
+        self.ruts = [f'{numero}-{verificador}' for numero, verificador in zip(numeros, verificadores)]
+
+    def archivo(self, filas):
+        lineas = ['rut;nombre;apellido;edad;telefono;estado_civil;prevision;ficha']
+        lineas += [';'.join(fila) for fila in filas]
+        return io.BytesIO('\n'.join(lineas).encode())
+
+    def importar(self, filas):
+        errores = io.StringIO()
+        importador = ImportadorPersonas(self.usuario, crear_pacientes=True, errores=errores)
+        resultado = importador.importar(leer_archivo(self.archivo(filas), 'personas.csv'))
+        return resultado, list(csv.reader(io.StringIO(errores.getvalue())))[1:]
+
+    def test_importa_validos_y_reporta_rechazados(self):
+        from pacientes.models import Paciente
+
+        resultado, rechazos = self.importar([
+            [self.ruts[0], 'María', 'Soto', '30', '+56912345678', 'casada', 'fonasa', ''],
+            [self.ruts[1], 'Ana', 'Rojas', '25', '+56912345679', 'soltera', 'isapre', ''],
+            ['12.345.678-9', 'Rosa', 'Díaz', '28', '+56912345670', 'casada', 'fonasa', ''],
+            [self.ruts[0], 'María', 'Soto', '30', '+56912345678', 'casada', 'fonasa', ''],
+        ])
+
+        self.assertEqual((resultado.leidas, resultado.personas, resultado.pacientes, resultado.rechazadas), (4, 2, 2, 2))
+        self.assertEqual(Paciente.objects.count(), 2)
+        self.assertEqual([(fila[0], fila[4]) for fila in rechazos], [
+            ('4', 'Dígito verificador inválido'), ('5', 'RUT repetido en el archivo'),
+        ])
+
+    def test_conflicto_al_escribir_no_infla_los_totales(self):
+        from pacientes.models import Paciente
+
+        existente = Paciente.objects.create(
+            persona=Persona.objects.create(
+                rut=self.ruts[2], nombre='Eva', apellido='Paz', edad=40, created_by=self.usuario
+            ),
+            edad=40, estado_civil='casada', prevision='fonasa', numero_ficha='FAM-2020-00001',
+            created_by=self.usuario,
+        )
+        # Otro proceso insertó la ficha entre la validación y el bulk_create
+        with mock.patch.object(ImportadorPersonas, '_descartar_fichas_existentes', lambda self, candidatos: candidatos):
+            resultado, rechazos = self.importar([
+                [self.ruts[0], 'María', 'Soto', '30', '+56912345678', 'casada', 'fonasa', existente.numero_ficha],
+                [self.ruts[1], 'Ana', 'Rojas', '25', '+56912345679', 'soltera', 'isapre', ''],
+            ])
+
+        self.assertEqual((resultado.personas, resultado.pacientes, resultado.rechazadas), (1, 1, 1))
+        self.assertEqual(Persona.objects.count(), 2)
+        self.assertEqual(Paciente.objects.count(), 2)
+        self.assertEqual(rechazos[0][0], '2')
+        self.assertIn('Conflicto al guardar', rechazos[0][4])
+
+
+class SinteticosTests(TestCase):
+
+    def test_ruts_validos_distintos_y_deterministas(self):
+        numeros, verificadores = ruts_sinteticos(1000)
+        ruts = [f'{numero}-{verificador}' for numero, verificador in zip(numeros, verificadores)]
+        self.assertTrue(validar_ruts(ruts).validos.all())
+        self.assertEqual(len(set(numeros.tolist())), 1000)
+        self.assertEqual(ruts_sinteticos(1000)[0].tolist(), numeros.tolist())
+
+    def test_genera_volumenes_y_borra(self):
+        from pacientes.models import ControlPrenatal, Paciente
+        from registros.models import Medicamento, Observacion
+
+        resultado = GeneradorSintetico(escala=0.00005, tamano_bloque=4).generar()
+
+        self.assertEqual(resultado.filas['personas'], 10)
+        self.assertEqual(Persona.objects.count(), 10)
+        self.assertEqual(Paciente.objects.count(), 7)
+        self.assertEqual(ControlPrenatal.objects.count(), 100)
+        self.assertEqual(Medicamento.objects.count(), 15)
+        self.assertFalse(ControlPrenatal.objects.filter(
+            fecha_control__gt=timezone.localdate()
+        ).exists())
+        # Las observaciones quedan repartidas en la gestación, no todas en "ahora"
+        momentos = list(Observacion.objects.values_list('created_at', flat=True))
+        self.assertEqual(len(momentos), resultado.filas['observaciones'])
+        self.assertGreater(len({momento.date() for momento in momentos}), 1)
+        self.assertTrue(all(8 <= timezone.localtime(momento).hour < 20 for momento in momentos))
+
+        self.assertEqual(borrar_sinteticos(), 10)
+        self.assertFalse(ControlPrenatal.objects.exists())
+
+    def test_comando_exige_debug_o_permiso_explicito(self):
+        with self.assertRaisesMessage(CommandError, '--permitir-base-real'):
+            call_command('generar_datos_sinteticos', escala=0.00005, stdout=io.StringIO())
+        self.assertFalse(Persona.objects.exists())
+
+        call_command('generar_datos_sinteticos', escala=0.00005, permitir_base_real=True, stdout=io.StringIO())
+        self.assertEqual(Persona.objects.count(), 10)
+
+
+class BenchmarkTests(TestCase):
+
+    def test_ejecuta_escenarios_y_detecta_regresion(self):
+        GeneradorSintetico(escala=0.00005).generar(reconstruir=False)
+        usuario = User.objects.get(username='sintetico')
+
+        resultado = benchmark.ejecutar(
+            usuario, ['linea_tiempo', 'api_pacientes', 'importacion_personas'], repeticiones=2
+        )
+        json.dumps(resultado)
+        self.assertEqual(resultado['volumenes']['personas'], 10)
+        linea_tiempo = resultado['escenarios']['linea_tiempo']
+        self.assertLessEqual(linea_tiempo['min_ms'], linea_tiempo['max_ms'])
+        self.assertEqual(linea_tiempo['consultas'], 6)
+        # La importación se deshace
+        self.assertEqual(Persona.objects.count(), 10)
+
+        anterior = {'escenarios': {
+            nombre: {**medicion, 'mediana_ms': medicion['mediana_ms'] / 2}
+            for nombre, medicion in resultado['escenarios'].items()
+        }}
+        regresiones = benchmark.comparar(resultado, anterior)
+        self.assertEqual(len(regresiones), 3)
+        self.assertEqual(benchmark.comparar(resultado, resultado), [])
+
+        # Una mediana anterior de 0 no es una regresión; más consultas sí
+        anterior = {'escenarios': {'linea_tiempo': {**linea_tiempo, 'mediana_ms': 0}}}
+        self.assertEqual(benchmark.comparar(resultado, anterior), [])
+        anterior['escenarios']['linea_tiempo']['consultas'] -= 1
+        self.assertEqual(
+            [(fila['escenario'], fila['razon']) for fila in benchmark.comparar(resultado, anterior)],
+            [('linea_tiempo', None)]
+        )
+
+
+class ImagenesTests(TestCase):
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        ajustes = override_settings(MEDIA_ROOT=self.media)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        cache.clear()
+
+    def subir(self, nombre, tamano=(2000, 1000)):
+        contenido = io.BytesIO()
+        Image.new('RGB', tamano, (200, 80, 80)).save(contenido, 'JPEG')
+        return default_storage.save(nombre, ContentFile(contenido.getvalue()))
+
+    def campo(self, nombre):
+        from registros.models import Observacion
+
+        return Observacion(imagen=nombre).imagen
+
+    def test_genera_variantes_con_nombre_por_contenido(self):
+        nombre = self.subir('observaciones/eco.jpg')
+
+        derivadas = imagenes.generar_derivadas(nombre)
+
+        self.assertEqual(set(derivadas), set(imagenes.VARIANTES))
+        miniatura = derivadas['miniatura']
+        self.assertEqual((miniatura.ancho, miniatura.alto), (320, 160))
+        self.assertEqual((derivadas['web'].ancho, derivadas['web'].alto), (1600, 800))
+        with default_storage.open(miniatura.archivo, 'rb') as archivo:
+            contenido = archivo.read()
+        self.assertEqual(len(contenido), miniatura.tamano)
+        self.assertIn(hashlib.blake2b(contenido, digest_size=16).hexdigest(), miniatura.archivo)
+        with Image.open(default_storage.path(miniatura.archivo)) as imagen:
+            self.assertEqual(imagen.format, imagenes.FORMATO)
+
+        # Idempotente: no vuelve a generar ni a registrar
+        with self.assertNumQueries(1):
+            imagenes.generar_derivadas(nombre)
+        self.assertEqual(ImagenDerivada.objects.count(), len(imagenes.VARIANTES))
+        self.assertEqual(imagenes.imagenes_pendientes(), [])
+
+    def test_url_del_original_mientras_no_hay_derivada(self):
+        nombre = self.subir('observaciones/nueva.jpg')
+        imagen = self.campo(nombre)
+
+        self.assertEqual(imagenes.url_derivada(imagen, 'miniatura'), imagen.url)
+        self.assertIsNone(imagenes.url_derivada(self.campo(''), 'miniatura'))
+
+        derivadas = imagenes.generar_derivadas(nombre)
+        self.assertEqual(
+            imagenes.urls_imagen(imagen),
+            {
+                'original': imagen.url,
+                'miniatura': default_storage.url(derivadas['miniatura'].archivo),
+                'web': default_storage.url(derivadas['web'].archivo),
+            },
+        )
+
+    def test_precarga_resuelve_la_pagina_en_una_consulta(self):
+        campos = [self.campo(self.subir(f'observaciones/{indice}.jpg', (400, 400))) for indice in range(5)]
+        for campo in campos[:3]:
+            imagenes.generar_derivadas(campo.name)
+        cache.clear()
+
+        with self.assertNumQueries(1):
+            imagenes.precargar_derivadas(campos)
+        with self.assertNumQueries(0):
+            urls = [imagenes.url_derivada(campo, 'miniatura') for campo in campos]
+        self.assertTrue(all(url.startswith('/media/derivadas/') for url in urls[:3]))
+        self.assertEqual(urls[3:], [campo.url for campo in campos[3:]])
+
+    def test_imagen_ilegible_no_registra_derivadas(self):
+        nombre = default_storage.save('observaciones/rota.jpg', ContentFile(b'no es una imagen'))
+
+        with self.assertLogs('core.imagenes', 'WARNING'):
+            self.assertEqual(imagenes.generar_derivadas(nombre), {})
+        self.assertFalse(ImagenDerivada.objects.exists())
+
+    def test_guardar_encola_y_el_comando_completa_pendientes(self):
+        from personal.models import Perfil
+
+        usuario = User.objects.create_user('matrona_imagen', password='x')
+        perfil = Perfil.objects.filter(usuario=usuario).first() or Perfil(usuario=usuario, rol='matrona')
+        perfil.imagen = self.subir('perfiles/foto.jpg', (800, 600))
+        with mock.patch('core.imagenes.encolar') as encolar:
+            perfil.save()
+        encolar.assert_called_once_with(perfil.imagen.name)
+        self.assertEqual(imagenes.imagenes_pendientes(), [perfil.imagen.name])
+        self.assertEqual(perfil.miniatura_url, perfil.imagen.url)
+
+        call_command('generar_derivadas', stdout=io.StringIO())
+
+        self.assertEqual(imagenes.imagenes_pendientes(), [])
+        self.assertTrue(perfil.miniatura_url.startswith('/media/derivadas/'))
+
+
+class AlmacenamientoTests(TestCase):
+
+    def setUp(self):
+        from pacientes.models import Paciente
+
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        ajustes = override_settings(MEDIA_ROOT=self.media)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        cache.clear()
+
+        self.usuario = User.objects.create_user('matrona_archivos', password='x')
+        persona = Persona.objects.create(
+            rut='12.345.678-5', nombre='María', apellido='Núñez', edad=30, created_by=self.usuario
+        )
+        self.paciente = Paciente.objects.create(
+            persona=persona, numero_ficha='FAM-2025-00001', edad=30,
+            estado_civil='casada', prevision='fonasa', created_by=self.usuario
+        )
+
+    def examen(self, color=(10, 120, 200), nombre='eco.jpg'):
+        contenido = io.BytesIO()
+        Image.new('RGB', (64, 48), color).save(contenido, 'JPEG')
+        return SimpleUploadedFile(nombre, contenido.getvalue(), content_type='image/jpeg')
+
+    def observacion(self, imagen):
+        from registros.models import Observacion
+
+        return Observacion.objects.create(
+            paciente=self.paciente, texto='Ecografía', imagen=imagen, created_by=self.usuario
+        )
+
+    def patologia(self, imagen):
+        from registros.models import Patologia
+
+        return Patologia.objects.create(
+            paciente=self.paciente, nombre='Placenta previa', nivel_riesgo='alto',
+            fecha_diagnostico=timezone.localdate(), diagnosticado_por=self.usuario,
+            created_by=self.usuario, imagen=imagen,
+        )
+
+    def referencias(self, nombre):
+        return ArchivoAlmacenado.objects.get(nombre=nombre).referencias
+
+    def recolectar(self, **kwargs):
+        return almacenamiento.recolectar_huerfanos(ahora=timezone.now() + timedelta(days=2), **kwargs)
+
+    def test_mismo_contenido_se_guarda_una_vez(self):
+        observacion = self.observacion(self.examen(nombre='eco.jpg'))
+        patologia = self.patologia(self.examen(nombre='otro_nombre.JPG'))
+
+        nombre = observacion.imagen.name
+        self.assertTrue(nombre.startswith('blobs/'))
+        self.assertEqual(os.path.splitext(nombre)[1], '.jpg')
+        self.assertEqual(patologia.imagen.name, nombre)
+        with observacion.imagen.open('rb') as archivo:
+            contenido = archivo.read()
+        self.assertIn(hashlib.sha256(contenido).hexdigest(), nombre)
+        self.assertEqual(len(list(almacenamiento._blobs_en_disco())), 1)
+        self.assertEqual(self.referencias(nombre), 2)
+        self.assertEqual(ArchivoAlmacenado.objects.get(nombre=nombre).tamano, len(contenido))
+
+    def test_referencias_y_recoleccion_de_huerfanos(self):
+        observacion = self.observacion(self.examen())
+        patologia = self.patologia(self.examen())
+        anterior = observacion.imagen.name
+
+        observacion.delete()
+        self.assertEqual(self.referencias(anterior), 1)
+        patologia.imagen = self.examen(color=(250, 0, 0))
+        patologia.save()
+        nuevo = patologia.imagen.name
+        self.assertEqual(self.referencias(anterior), 0)
+        self.assertEqual(self.referencias(nuevo), 1)
+
+        # Dentro del período de gracia no se borra nada
+        self.assertEqual(almacenamiento.recolectar_huerfanos()['borrados'], 0)
+        self.assertEqual(self.recolectar(simular=True)['borrados'], 1)
+        self.assertTrue(almacenamiento.almacenamiento.exists(anterior))
+
+        resultado = self.recolectar()
+        self.assertEqual(resultado['borrados'], 1)
+        self.assertFalse(almacenamiento.almacenamiento.exists(anterior))
+        self.assertFalse(ArchivoAlmacenado.objects.filter(nombre=anterior).exists())
+        self.assertTrue(almacenamiento.almacenamiento.exists(nuevo))
+
+    def test_operaciones_masivas_se_corrigen_antes_de_borrar(self):
+        from registros.models import Observacion, Patologia
+
+        patologia = self.patologia(self.examen())
+        nombre = patologia.imagen.name
+        # bulk_create() y update() no emiten señales: las referencias quedan desfasadas
+        Observacion.objects.bulk_create([
+            Observacion(paciente=self.paciente, texto='Copia', imagen=nombre, created_by=self.usuario)
+        ])
+        Patologia.objects.filter(pk=patologia.pk).update(imagen=None)
+        self.assertEqual(self.referencias(nombre), 1)
+        ArchivoAlmacenado.objects.filter(nombre=nombre).update(referencias=0)
+
+        resultado = self.recolectar()
+
+        self.assertEqual((resultado['borrados'], resultado['corregidos']), (0, 1))
+        self.assertEqual(self.referencias(nombre), 1)
+        self.assertTrue(almacenamiento.almacenamiento.exists(nombre))
+        self.assertEqual(almacenamiento.reconciliar_referencias(), [])
+
+    def test_archivo_sin_fila_se_borra(self):
+        nombre = almacenamiento.almacenamiento.save('eco.jpg', self.examen())
+        ArchivoAlmacenado.objects.filter(nombre=nombre).delete()
+
+        self.assertEqual(self.recolectar()['borrados'], 1)
+        self.assertFalse(almacenamiento.almacenamiento.exists(nombre))
+
+    def test_migra_imagenes_anteriores(self):
+        from registros.models import Observacion, Patologia
+
+        contenido = self.examen().read()
+        anteriores = [
+            default_storage.save(f'{carpeta}/2024/05/02/eco.jpg', ContentFile(contenido))
+            for carpeta in ('observaciones', 'patologias')
+        ]
+        Observacion.objects.bulk_create([
+            Observacion(paciente=self.paciente, texto='Antigua', imagen=anteriores[0], created_by=self.usuario)
+        ])
+        patologia = self.patologia(anteriores[1])
+
+        salida = io.StringIO()
+        call_command('recolectar_archivos', '--migrar', stdout=salida)
+
+        self.assertIn('2 archivos migrados', salida.getvalue())
+        patologia.refresh_from_db()
+        nombre = patologia.imagen.name
+        self.assertTrue(nombre.startswith('blobs/'))
+        self.assertEqual(Observacion.objects.get().imagen.name, nombre)
+        self.assertEqual(self.referencias(nombre), 2)
+        self.assertFalse(any(default_storage.exists(anterior) for anterior in anteriores))
+        self.assertEqual(almacenamiento.migrar_existentes()['migrados'], 0)
+
+
+class LogsTests(SimpleTestCase):
+
+    def setUp(self):
+        self.directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directorio, ignore_errors=True)
+
+    def manejador(self, nombre='app.log', **kwargs):
+        manejador = logs.ManejadorCola(os.path.join(self.directorio, nombre), **kwargs)
+        manejador.setFormatter(logs.FormatoJSON())
+        manejador.addFilter(logs.FiltroContexto())
+        self.addCleanup(manejador.close)
+        return manejador
+
+    def conectar(self, nombre_logger, manejador):
+        registrador = logging.getLogger(nombre_logger)
+        nivel, propagar, deshabilitado = registrador.level, registrador.propagate, registrador.disabled
+        registrador.addHandler(manejador)
+        registrador.setLevel(logging.DEBUG)
+        registrador.propagate = False
+        registrador.disabled = False
+
+        def restaurar():
+            registrador.removeHandler(manejador)
+            registrador.setLevel(nivel)
+            registrador.propagate = propagar
+            registrador.disabled = deshabilitado
+        self.addCleanup(restaurar)
+        return registrador
+
+    def leer(self, nombre='app.log'):
+        with open(os.path.join(self.directorio, nombre), encoding='utf-8') as archivo:
+            return [json.loads(linea) for linea in archivo]
+
+    def test_registros_json_con_contexto_del_request(self):
+        manejador = self.manejador()
+        registrador = self.conectar('core.tests.logs', manejador)
+        self.conectar('core.accesos', manejador)
+
+        def vista(request):
+            try:
+                1 / 0
+            except ZeroDivisionError:
+                registrador.exception('Fallo calculando %s', 'edad', extra={'paciente_id': 7})
+            return HttpResponse('ok')
+
+        respuesta = logs.ContextoLogMiddleware(vista)(RequestFactory().get('/pacientes/'))
+        registrador.info('fuera del request')
+        manejador.close()
+
+        error, acceso, fuera = self.leer()
+        id_request = respuesta[logs.CABECERA_ID]
+        self.assertEqual(error['mensaje'], 'Fallo calculando edad')
+        self.assertEqual((error['request_id'], error['paciente_id']), (id_request, 7))
+        self.assertIn('ZeroDivisionError', error['excepcion'])
+        self.assertEqual(acceso['logger'], 'core.accesos')
+        self.assertEqual((acceso['ruta'], acceso['estado'], acceso['request_id']), ('/pacientes/', 200, id_request))
+        self.assertGreaterEqual(acceso['latencia_ms'], 0)
+        self.assertIsNone(fuera['request_id'])
+
+    def test_respeta_id_recibido_y_rol_resuelto(self):
+        from authentication.roles import RolUsuario
+
+        usuario = User(pk=3, username='matrona')
+        usuario._rol_usuario = RolUsuario('MATRONA', 'matrona')
+        request = RequestFactory().get('/', HTTP_X_REQUEST_ID='abc-123')
+        request._cached_user = usuario
+        registros = []
+
+        def vista(request):
+            registro = logging.makeLogRecord({'msg': 'x'})
+            logs.FiltroContexto().filter(registro)
+            registros.append(registro)
+            return HttpResponse('ok')
+
+        respuesta = logs.ContextoLogMiddleware(vista)(request)
+
+        self.assertEqual(respuesta[logs.CABECERA_ID], 'abc-123')
+        self.assertEqual((registros[0].request_id, registros[0].usuario_id, registros[0].rol), ('abc-123', 3, 'MATRONA'))
+
+    def test_error_de_django_request_conserva_el_id(self):
+        # django.request registra el 404 cuando ContextoLogMiddleware ya terminó
+        manejador = self.manejador()
+        self.conectar('django.request', manejador)
+
+        respuesta = self.client.get('/no-existe/', HTTP_X_REQUEST_ID='id-404')
+        manejador.close()
+
+        self.assertEqual(respuesta.status_code, 404)
+        registro, = self.leer()
+        self.assertEqual((registro['logger'], registro['nivel']), ('django.request', 'WARNING'))
+        self.assertEqual(registro['request_id'], 'id-404')
+
+    def test_cola_llena_descarta_sin_bloquear(self):
+        manejador = self.manejador(capacidad=2)
+        registrador = self.conectar('core.tests.logs', manejador)
+        liberar = threading.Event()
+        emitir = manejador.destino.emit
+        manejador.destino.emit = lambda registro: (liberar.wait(5), emitir(registro))
+
+        inicio = time.monotonic()
+        for indice in range(20):
+            registrador.warning('registro %s', indice)
+        self.assertLess(time.monotonic() - inicio, 1)
+        self.assertGreater(manejador.descartados, 0)
+
+        liberar.set()
+        time.sleep(0.1)
+        registrador.warning('despues')
+        manejador.close()
+        mensajes = [linea['mensaje'] for linea in self.leer()]
+        self.assertIn('despues', mensajes)
+        self.assertTrue(any('descartados' in mensaje for mensaje in mensajes))
+
+    def test_rota_por_tamano_y_por_dia_comprimiendo(self):
+        ruta = os.path.join(self.directorio, 'rotado.log')
+        archivo = logs.ArchivoRotativoComprimido(ruta, max_bytes=300, respaldos=2)
+        archivo.setFormatter(logs.FormatoJSON())
+        self.addCleanup(archivo.close)
+
+        for indice in range(20):
+            archivo.handle(logging.makeLogRecord({'msg': f'linea {indice}', 'levelno': logging.INFO}))
+        self.assertTrue(os.path.exists(f'{ruta}.1.gz'))
+        self.assertTrue(os.path.exists(f'{ruta}.2.gz'))
+        self.assertFalse(os.path.exists(f'{ruta}.3.gz'))
+        with gzip.open(f'{ruta}.1.gz', 'rt', encoding='utf-8') as comprimido:
+            self.assertIn('linea', json.loads(comprimido.readline())['mensaje'])
+
+        with gzip.open(f'{ruta}.1.gz', 'rb') as comprimido:
+            anterior = comprimido.read()
+        archivo.proximo_corte = 0
+        archivo.handle(logging.makeLogRecord({'msg': 'nuevo dia', 'levelno': logging.INFO}))
+        with gzip.open(f'{ruta}.1.gz', 'rb') as comprimido:
+            self.assertNotEqual(comprimido.read(), anterior)
+        self.assertGreater(archivo.proximo_corte, time.time())
+
+    def test_sin_rotar_reabre_el_archivo_movido_por_logrotate(self):
+        manejador = self.manejador(rotar=False)
+        registrador = self.conectar('core.tests.logs', manejador)
+        ruta = os.path.join(self.directorio, 'app.log')
+
+        registrador.warning('antes')
+        time.sleep(0.1)
+        os.rename(ruta, f'{ruta}.1')
+        registrador.warning('despues')
+        manejador.close()
+
+        self.assertIsInstance(manejador.destino, logs.ArchivoVigilado)
+        self.assertEqual([linea['mensaje'] for linea in self.leer('app.log.1')], ['antes'])
+        self.assertEqual([linea['mensaje'] for linea in self.leer()], ['despues'])
+
+    def test_muestreo_conserva_todo_el_request(self):
+        muestreo = logs.MuestreoDebug(tasa=0.5)
+        depuracion = logging.makeLogRecord({'levelno': logging.DEBUG})
+        decisiones = set()
+        conservados = 0
+        for indice in range(200):
+            token = logs._request_actual.set((None, f'req{indice}'))
+            try:
+                decision = muestreo.filter(depuracion)
+                decisiones.add(decision == muestreo.filter(depuracion))
+                conservados += decision
+                self.assertTrue(muestreo.filter(logging.makeLogRecord({'levelno': logging.INFO})))
+            finally:
+                logs._request_actual.reset(token)
+        self.assertEqual(decisiones, {True})
+        self.assertTrue(50 < conservados < 150)
+        self.assertFalse(logs.MuestreoDebug(tasa=0).filter(depuracion))
+
+
+class AuditoriaTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        from personal.models import Perfil
+
+        cls.matrona = User.objects.create_user('matrona_auditoria', password='clave-segura-123')
+        Perfil.objects.update_or_create(usuario=cls.matrona, defaults={'rol': 'matrona'})
+        cls.tens = User.objects.create_user('tens_auditoria', password='clave-segura-123')
+
+    def crear_persona(self, **datos):
+        return Persona.objects.create(**{
+            'rut': '12.345.678-5', 'nombre': 'María', 'apellido': 'Núñez', 'edad': 30,
+            'created_by': self.matrona, **datos,
+        })
+
+    def historial(self, objeto):
+        return list(
+            RegistroAuditoria.objects.filter(modelo=objeto._meta.label, objeto_id=objeto.pk).order_by('pk')
+        )
+
+    def test_un_solo_insert_por_transaccion_con_diferencias(self):
+        from pacientes.models import Paciente
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            persona = self.crear_persona()
+            paciente = Paciente.objects.create(
+                persona=persona, numero_ficha='FAM-2025-00001', edad=30,
+                estado_civil='casada', prevision='fonasa', created_by=self.matrona
+            )
+            persona.apellido = 'Núñez Soto'
+            persona.edad = 31
+            persona.save()
+            persona.save()
+        self.assertFalse(RegistroAuditoria.objects.exists())
+
+        with CaptureQueriesContext(connection) as consultas:
+            for callback in callbacks:
+                callback()
+        inserciones = [c for c in consultas.captured_queries if 'INSERT INTO "core_registroauditoria"' in c['sql']]
+        self.assertEqual(len(inserciones), 1)
+
+        alta, cambio = self.historial(persona)
+        self.assertEqual(alta.accion, auditoria.CREADO)
+        self.assertEqual(alta.cambios['nombre'], [None, 'María'])
+        self.assertEqual(alta.usuario_id, self.matrona.pk)
+        self.assertEqual(cambio.accion, auditoria.MODIFICADO)
+        self.assertEqual(cambio.cambios, {'apellido': ['Núñez', 'Núñez Soto'], 'edad': [30, 31]})
+        self.assertEqual(self.historial(paciente)[0].cambios['persona_id'], [None, persona.pk])
+
+    def test_cambios_revertidos_no_se_auditan(self):
+        with CaptureQueriesContext(connection) as consultas, self.captureOnCommitCallbacks(execute=True):
+            persona = self.crear_persona()
+            try:
+                with transaction.atomic():
+                    persona.nombre = 'Revertido'
+                    persona.save()
+                    raise IntegrityError
+            except IntegrityError:
+                pass
+            persona.refresh_from_db()
+            persona.contacto = '+56911111111'
+            persona.save(update_fields=['contacto'])
+
+        acciones = [(registro.accion, set(registro.cambios)) for registro in self.historial(persona)]
+        self.assertEqual(acciones[1:], [(auditoria.MODIFICADO, {'contacto'})])
+        # El savepoint revertido no parte el lote: sigue siendo un solo INSERT
+        inserciones = [c for c in consultas.captured_queries if 'INSERT INTO "core_registroauditoria"' in c['sql']]
+        self.assertEqual(len(inserciones), 1)
+
+    def test_savepoint_revertido_al_final_y_transaccion_revertida(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            persona = self.crear_persona()
+            try:
+                with transaction.atomic():
+                    persona.nombre = 'Revertido'
+                    persona.save()
+                    raise IntegrityError
+            except IntegrityError:
+                pass
+        self.assertEqual([registro.accion for registro in self.historial(persona)], [auditoria.CREADO])
+
+        try:
+            with transaction.atomic():
+                persona.apellido = 'Nunca'
+                persona.save()
+                raise IntegrityError
+        except IntegrityError:
+            pass
+        with self.captureOnCommitCallbacks(execute=True):
+            persona.refresh_from_db()
+            persona.edad = 40
+            persona.save(update_fields=['edad'])
+        cambios = [registro.cambios for registro in self.historial(persona)[1:]]
+        self.assertEqual(cambios, [{'edad': [30, 40]}])
+
+    def test_diferidos_y_baja(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            persona = self.crear_persona()
+        with self.captureOnCommitCallbacks(execute=True):
+            diferida = Persona.objects.only('pk', 'rut').get(pk=persona.pk)
+            diferida.apellido = 'Rojas'
+            diferida.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            pk = persona.pk
+            Persona.objects.get(pk=pk).delete()
+
+        cambio, baja = self.historial(persona)[1:]
+        self.assertEqual(cambio.cambios, {'apellido': ['Núñez', 'Rojas']})
+        self.assertEqual(baja.accion, auditoria.ELIMINADO)
+        self.assertEqual(baja.cambios['apellido'], ['Rojas', None])
+        with self.assertRaises(TypeError):
+            RegistroAuditoria.objects.filter(objeto_id=pk).delete()
+
+    def test_api_historial_paginado(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            persona = self.crear_persona()
+        for edad in range(31, 36):
+            with self.captureOnCommitCallbacks(execute=True):
+                persona.edad = edad
+                persona.save()
+        url = reverse('core:historial_auditoria', args=['core.Persona', persona.pk])
+
+        self.client.force_login(self.tens)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.client.force_login(self.matrona)
+        primera = self.client.get(url, {'limite': 4}).json()
+        self.assertEqual([r['cambios']['edad'][1] for r in primera['registros']], [35, 34, 33, 32])
+        self.assertEqual(primera['registros'][0]['usuario'], 'matrona_auditoria')
+        segunda = self.client.get(url, {'limite': 4, 'cursor': primera['siguiente']}).json()
+        self.assertEqual([r['accion'] for r in segunda['registros']], ['modificado', 'creado'])
+        self.assertIsNone(segunda['siguiente'])
+        self.assertEqual(self.client.get(url, {'cursor': 'x'}).status_code, 400)
+        self.assertEqual(
+            self.client.get(reverse('core:historial_auditoria', args=['auth.User', 1])).status_code, 404
+        )
+
+
+class ReplicasTests(TestCase):
+
+    def atender(self, vista, request):
+        """Pasa el request por ReplicasMiddleware como lo hace el handler de Django."""
+        def get_response(request):
+            return middleware.process_view(request, vista, (), {}) or vista(request)
+        middleware = replicas.ReplicasMiddleware(get_response)
+        return middleware(request)
+
+    @override_settings(REPLICAS_LECTURA=['replica_1'])
+    def test_solo_las_lecturas_marcadas_van_a_la_replica(self):
+        usadas = []
+
+        @replicas.solo_lectura
+        def reporte(request):
+            usadas.append(router.db_for_read(Persona))
+            # La sesión se lee siempre de la primaria
+            self.assertEqual(router.db_for_read(Session), 'default')
+            return HttpResponse()
+
+        def formulario(request):
+            usadas.append(router.db_for_read(Persona))
+            return HttpResponse()
+
+        fabrica = RequestFactory()
+        self.atender(reporte, fabrica.get('/reporte/'))
+        self.atender(formulario, fabrica.get('/formulario/'))
+        self.atender(reporte, fabrica.post('/reporte/'))
+        self.assertEqual(usadas, ['replica_1', 'default', 'default'])
+        # Fuera de un request todo va a la primaria
+        self.assertEqual(router.db_for_read(Persona), 'default')
+
+        leida = Persona()
+        leida._state.db = 'replica_1'
+        self.assertEqual(router.db_for_write(Persona, instance=leida), 'default')
+
+    @override_settings(REPLICAS_LECTURA=['replica_1'], REPLICAS_VENTANA_ESCRITURA=10)
+    def test_quien_escribe_lee_de_la_primaria(self):
+        usadas = []
+
+        @replicas.solo_lectura
+        def reporte(request):
+            usadas.append(router.db_for_read(Persona))
+            if request.GET.get('escribir'):
+                router.db_for_write(Persona)
+                usadas.append(router.db_for_read(Persona))
+            return HttpResponse()
+
+        fabrica = RequestFactory()
+        respuesta = self.atender(reporte, fabrica.get('/', {'escribir': '1'}))
+        self.assertEqual(usadas, ['replica_1', 'default'])
+        cookie = respuesta.cookies[replicas.COOKIE_PRIMARIA]
+        self.assertEqual(cookie['max-age'], 10)
+
+        fijado = fabrica.get('/')
+        fijado.COOKIES[replicas.COOKIE_PRIMARIA] = cookie.value
+        vencido = fabrica.get('/')
+        vencido.COOKIES[replicas.COOKIE_PRIMARIA] = str(int(time.time()) - 1)
+        usadas.clear()
+        self.assertNotIn(replicas.COOKIE_PRIMARIA, self.atender(reporte, fijado).cookies)
+        self.atender(reporte, vencido)
+        self.assertEqual(usadas, ['default', 'replica_1'])
+
+    @override_settings(REPLICAS_LECTURA=['replica_1'])
+    def test_exportacion_en_streaming_lee_de_la_replica(self):
+        @replicas.solo_lectura
+        def exportar(request):
+            return StreamingHttpResponse(router.db_for_read(Persona) for _ in range(2))
+
+        respuesta = self.atender(exportar, RequestFactory().get('/'))
+        self.assertEqual(b''.join(respuesta.streaming_content), b'replica_1replica_1')
+
+    def test_acciones_de_lectura(self):
+        lista = resolve(reverse('paciente-list')).func
+        self.assertTrue(replicas.es_lectura(lista, 'GET'))
+        self.assertTrue(replicas.es_lectura(lista, 'HEAD'))
+        self.assertFalse(replicas.es_lectura(lista, 'POST'))
+        self.assertTrue(replicas.es_lectura(resolve(reverse('paciente-detail', args=[1])).func, 'GET'))
+        self.assertFalse(replicas.es_lectura(resolve(reverse('paciente-detail', args=[1])).func, 'PATCH'))
+        self.assertTrue(replicas.es_lectura(resolve(reverse('paciente-linea-tiempo', args=[1])).func, 'GET'))
+        self.assertFalse(replicas.es_lectura(resolve(reverse('alerta-resolver', args=[1])).func, 'POST'))
+        self.assertTrue(replicas.es_lectura(resolve(reverse('consulta-identificacion')).func, 'GET'))
+        self.assertTrue(replicas.es_lectura(resolve(reverse('core:personas_list')).func, 'GET'))
+        self.assertFalse(replicas.es_lectura(resolve(reverse('core:personas_edit', args=[1])).func, 'GET'))
+
+    def test_lecturas_puras_sin_transaccion_por_request(self):
+        from rest_framework.response import Response
+        from pacientes.views import PacienteViewSet
+
+        def bloques(*args, **kwargs):
+            return Response(len(connection.atomic_blocks))
+
+        usuario = User.objects.create_user('replicas', password='clave-segura-123')
+        self.client.force_login(usuario)
+        with mock.patch.object(PacienteViewSet, 'list', bloques), \
+                mock.patch.object(PacienteViewSet, 'create', bloques):
+            lectura = self.client.get(reverse('paciente-list')).json()
+            escritura = self.client.post(reverse('paciente-list')).json()
+        # La escritura corre dentro de la transacción de ATOMIC_REQUESTS
+        self.assertEqual(escritura, lectura + 1)
+
+
+class ReplicaAtrasadaTests(TestCase):
+    """
+    'replica_1' es una base SQLite en memoria aparte con el esquema de los
+    modelos usados: solo tiene lo que el test escribe en ella, como una
+    réplica que aún no recibió los últimos cambios.
+    """
+
+    def setUp(self):
+        from django.contrib.auth.models import Group, Permission
+        from django.contrib.contenttypes.models import ContentType
+        from pacientes.models import ControlPrenatal, Paciente
+        from personal.models import Perfil
+
+        connections.settings['replica_1'] = connections.configure_settings({
+            'default': connections.settings['default'],
+            'replica_1': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'},
+        })['replica_1']
+        self.addCleanup(connections.settings.pop, 'replica_1')
+        replica = connections['replica_1']
+        self.addCleanup(connections.__delitem__, 'replica_1')
+        self.addCleanup(replica.close)
+        # connect() directo: TestCase solo deja abrir conexiones de sus `databases`
+        replica.connect()
+        with replica.schema_editor() as editor:
+            for modelo in (ContentType, Permission, Group, User, Perfil, Persona, Paciente, ControlPrenatal):
+                editor.create_model(modelo)
+
+    @override_settings(REPLICAS_LECTURA=['replica_1'])
+    def test_cache_compartida_se_llena_desde_la_primaria(self):
+        from authentication.roles import clave_cache, resolver_rol
+        from pacientes.models import ControlPrenatal
+        from pacientes.tendencias import tendencias_paciente
+        from pacientes.tests import crear_paciente
+        from personal.models import Perfil
+
+        cache.clear()
+        usuario = User.objects.create_user('rol_cambiado', password='clave-segura-123')
+        Perfil.objects.update_or_create(usuario=usuario, defaults={'rol': 'matrona'})
+        paciente = crear_paciente(usuario, 1)
+        ControlPrenatal.objects.create(
+            paciente=paciente, fecha_control=timezone.localdate(), peso=60, created_by=usuario
+        )
+        # La réplica aún tiene el rol anterior y ningún control
+        User.objects.using('replica_1').bulk_create([User(pk=usuario.pk, username=usuario.username)])
+        Perfil.objects.using('replica_1').bulk_create([Perfil(usuario_id=usuario.pk, rol='tens')])
+
+        leido = {}
+
+        @replicas.solo_lectura
+        def ficha(request):
+            # Como request.user: cargado de la réplica
+            lector = User.objects.get(pk=usuario.pk)
+            leido['base'] = lector._state.db
+            leido['rol'] = resolver_rol(lector).rol_perfil
+            leido['controles'] = tendencias_paciente(paciente)['controles']
+            return HttpResponse()
+
+        ReplicasTests.atender(self, ficha, RequestFactory().get('/'))
+
+        self.assertEqual(leido, {'base': 'replica_1', 'rol': 'matrona', 'controles': 1})
+        self.assertEqual(cache.get(clave_cache(usuario.pk))['rol_perfil'], 'matrona')
+
+
+class PoolConexionesTests(SimpleTestCase):
+
+    def crear(self):
+        return sqlite3.connect(':memory:', check_same_thread=False)
+
+    def pool(self, **kwargs):
+        pool = PoolConexiones(verificar=lambda conexion: conexion.execute('SELECT 1'), **kwargs)
+        self.addCleanup(pool.cerrar)
+        return pool
+
+    def test_reutiliza_entre_hilos_la_ultima_devuelta(self):
+        pool = self.pool(verificar_tras=0)
+        primera, reutilizada = pool.obtener(self.crear)
+        segunda, _ = pool.obtener(self.crear)
+        self.assertFalse(reutilizada)
+        pool.devolver(primera)
+        pool.devolver(segunda)
+
+        obtenidas = []
+        hilo = threading.Thread(target=lambda: obtenidas.append(pool.obtener(self.crear)))
+        hilo.start()
+        hilo.join()
+        self.assertEqual(obtenidas, [(segunda, True)])
+        estado = pool.estadisticas()
+        self.assertEqual((estado['libres'], estado['prestadas']), (1, 1))
+        self.assertEqual((estado['creadas'], estado['reutilizadas']), (2, 1))
+
+    def test_descarta_conexiones_viejas_o_rotas(self):
+        pool = self.pool(vida_maxima=3600, verificar_tras=0)
+        conexion, _ = pool.obtener(self.crear)
+        pool.devolver(conexion)
+        conexion.close()
+        nueva, reutilizada = pool.obtener(self.crear)
+        self.assertIsNot(nueva, conexion)
+        self.assertFalse(reutilizada)
+        self.assertEqual(pool.estadisticas()['fallas_verificacion'], 1)
+
+        pool.vida_maxima = 0
+        pool.devolver(nueva)
+        self.assertEqual(pool.estadisticas()['libres'], 0)
+        with self.assertRaises(sqlite3.ProgrammingError):
+            nueva.execute('SELECT 1')
+
+    def test_cierra_inactivas_por_encima_del_minimo(self):
+        pool = self.pool(minimo=1, inactividad_maxima=0)
+        conexiones = [pool.obtener(self.crear)[0] for _ in range(3)]
+        for conexion in conexiones:
+            pool.devolver(conexion)
+        estado = pool.estadisticas()
+        self.assertEqual((estado['libres'], estado['cerradas_inactivas']), (1, 2))
+
+    def test_espera_y_se_agota_con_el_maximo_prestado(self):
+        pool = self.pool(minimo=0, maximo=1, espera=0.05)
+        conexion, _ = pool.obtener(self.crear)
+        with self.assertRaises(PoolAgotado):
+            pool.obtener(self.crear)
+
+        pool.espera = 5
+        threading.Timer(0.05, pool.devolver, [conexion]).start()
+        self.assertEqual(pool.obtener(self.crear), (conexion, True))
+        estado = pool.estadisticas()
+        self.assertEqual((estado['esperas'], estado['agotado']), (2, 1))
+        self.assertGreater(estado['espera_max_ms'], 0)
+
+    def test_transaccion_abierta_no_vuelve_al_pool(self):
+        pool = self.pool()
+        conexion, _ = pool.obtener(self.crear)
+        pool.descartar(conexion)
+        self.assertEqual(pool.estadisticas()['descartadas'], 1)
+        self.assertFalse(pool.obtener(self.crear)[1])
@@ -5,6 +5,11 @@ from .views import (
     personas_edit,
     personas_detail,
     personas_delete,
+    estadisticas_dashboard,
+    metricas_cache,
+    metricas_pool,
+    perfil_consultas,
+    historial_auditoria,
 )
 
 app_name = 'core'
@@ -15,4 +20,9 @@ urlpatterns = [
     path('personas/<int:pk>/editar/', personas_edit, name='personas_edit'),
     path('personas/<int:pk>/ver/', personas_detail, name='personas_detail'),
     path('personas/<int:pk>/eliminar/', personas_delete, name='personas_delete'),
+    path('estadisticas/', estadisticas_dashboard, name='estadisticas_dashboard'),
+    path('cache/metricas/', metricas_cache, name='metricas_cache'),
+    path('pool/metricas/', metricas_pool, name='metricas_pool'),
+    path('perfil/consultas/', perfil_consultas, name='perfil_consultas'),
+    path('auditoria/<str:modelo>/<int:objeto_id>/', historial_auditoria, name='historial_auditoria'),
 ]
\ No newline at end of file
@@ -1,25 +1,38 @@
+import os
+
 from django.shortcuts import render, redirect, get_object_or_404
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
+from django.db.models import Case, When
+from django.http import JsonResponse
+from django.utils import timezone
 from .models import Persona
+from .auditoria import LIMITE_MAXIMO, LIMITE_POR_DEFECTO, MODELOS_AUDITADOS, historial
+from .busqueda import buscar_personas
+from .cache import aobtener_o_calcular, metricas
+from .contadores import aleer_contadores
+from .perfil_consultas import estadisticas_globales
+from .pool_conexiones import estadisticas_pools
+from .replicas import solo_lectura
+
+# Segundos que el dashboard puede mostrar estadísticas ya calculadas
+TIEMPO_ESTADISTICAS = 10
 
+@solo_lectura
 @login_required(login_url='authentication:login')
 def personas_list(request):
     # Solo mostrar personas activas
-    personas = Persona.objects.filter(Activo=True).order_by('-fecha_creacion')
+    personas = Persona.objects.filter(estado='activo').order_by('-created_at')
     
     query = request.GET.get('q')
     if query:
-        personas = personas.filter(
-            Nombre__icontains=query
-        ) | personas.filter(
-            Apellido_Paterno__icontains=query
-        ) | personas.filter(
-            Rut__icontains=query
-        ) | personas.filter(
-            Email__icontains=query
-        )
+        # Búsqueda indexada (ver core.busqueda), conserva el orden por relevancia
+        ids = buscar_personas(query, estado='activo')
+        personas = Persona.objects.filter(pk__in=ids).order_by(
+            Case(*[When(pk=pk, then=posicion) for posicion, pk in enumerate(ids)])
+        ) if ids else Persona.objects.none()
     
     context = {
         'personas': personas,
@@ -173,6 +186,7 @@ def personas_edit(request, pk):
     return render(request, 'core/formularios/persona_form.html', context)
 
 
+@solo_lectura
 @login_required(login_url='authentication:login')
 def personas_detail(request, pk):
     persona = get_object_or_404(Persona, pk=pk, Activo=True)
@@ -191,4 +205,94 @@ def personas_delete(request, pk):
         messages.success(request, f'✅ Persona desactivada: {nombre}')
         return redirect('core:personas_list')
     
-    return render(request, 'core/data/persona_confirm_delete.html', {'persona': persona})
\ No newline at end of file
+    return render(request, 'core/data/persona_confirm_delete.html', {'persona': persona})
+
+
+################
+# API: Estadísticas del dashboard
+# Descripción: Contadores precalculados (core.contadores), una sola consulta.
+#              Vista async: bajo ASGI no ocupa un hilo mientras espera la caché
+# Uso: GET /app/core/estadisticas/  (consultado por static/js/dashboard-stats.js)
+################
+@solo_lectura
+@login_required(login_url='authentication:login')
+async def estadisticas_dashboard(request):
+    async def calcular():
+        return {'estadisticas': await aleer_contadores(), 'generado': timezone.now().isoformat()}
+
+    # Todos los dashboards abiertos consultan cada pocos segundos: una lectura por intervalo
+    datos = await aobtener_o_calcular(
+        f'estadisticas:dashboard:{timezone.localdate().isoformat()}',
+        calcular,
+        TIEMPO_ESTADISTICAS,
+    )
+    return JsonResponse(datos)
+
+
+################
+# API: Métricas de la caché
+# Descripción: Aciertos/fallos de la caché del worker que atiende el request
+# Uso: GET /app/core/cache/metricas/  (solo staff)
+################
+@staff_member_required(login_url='authentication:login')
+def metricas_cache(request):
+    return JsonResponse({
+        'proceso': os.getpid(),
+        'metricas': metricas.como_dict(),
+    })
+
+
+################
+# API: Métricas del pool de conexiones
+# Descripción: Conexiones libres/prestadas, reutilizadas, descartadas y
+#              esperas de los pools del worker que atiende el request
+# Uso: GET /app/core/pool/metricas/  (solo staff)
+################
+@staff_member_required(login_url='authentication:login')
+def metricas_pool(request):
+    return JsonResponse({
+        'proceso': os.getpid(),
+        'pools': estadisticas_pools(),
+    })
+
+
+################
+# API: Perfil de consultas por endpoint
+# Descripción: Consultas SQL, tiempo de base de datos y N+1 detectados por
+#              endpoint, sumando todos los workers (core.perfil_consultas)
+# Uso: GET /app/core/perfil/consultas/  (solo staff)
+################
+@staff_member_required(login_url='authentication:login')
+def perfil_consultas(request):
+    return JsonResponse({'endpoints': estadisticas_globales()})
+
+
+################
+# API: Historial de auditoría de un registro
+# Descripción: Cambios campo a campo, del más reciente al más antiguo
+#              (core.auditoria), paginados por cursor
+# Uso: GET /app/core/auditoria/pacientes.Paciente/<id>/?limite=50&cursor=...
+################
+@solo_lectura
+@login_required(login_url='authentication:login')
+def historial_auditoria(request, modelo, objeto_id):
+    if not (request.user.is_staff or request.rol_usuario.tiene_permiso('ver_ficha')):
+        return JsonResponse({'error': 'No tiene permiso para ver el historial'}, status=403)
+    if modelo not in MODELOS_AUDITADOS:
+        return JsonResponse({'error': f'Modelo no auditado: {modelo}'}, status=404)
+    try:
+        limite = min(max(int(request.GET.get('limite', LIMITE_POR_DEFECTO)), 1), LIMITE_MAXIMO)
+    except ValueError:
+        return JsonResponse({'error': 'El parámetro limite debe ser un número'}, status=400)
+    
+    try:
+        registros, siguiente = historial(modelo, objeto_id, request.GET.get('cursor'), limite)
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    
+    return JsonResponse({
+        'modelo': modelo,
+        'objeto_id': objeto_id,
+        'registros': registros,
+        'siguiente': siguiente,
+    })
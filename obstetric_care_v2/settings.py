@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+import sys
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -57,14 +58,18 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.logs.ContextoLogMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.perfil_consultas.PerfilConsultasMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'authentication.middleware.RolUsuarioMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.replicas.ReplicasMiddleware',
 ]
 
 ROOT_URLCONF = 'obstetric_care_v2.urls'
@@ -118,6 +123,51 @@ DATABASES = {
 #     }
 # }
 
+################
+# RÉPLICAS DE LECTURA (core/replicas.py)
+# Descripción: DB_REPLICAS=host1:3306,host2 agrega replica_1, replica_2...
+#              (misma base, usuario y opciones que 'default'). Sin la
+#              variable todo se lee de 'default', igual que en los tests
+#              (una réplica no ve los datos de la transacción de un TestCase).
+################
+REPLICAS_LECTURA = []
+servidores_replica = '' if sys.argv[1:2] == ['test'] else os.getenv('DB_REPLICAS', '')
+for indice, servidor in enumerate(filter(None, servidores_replica.split(',')), start=1):
+    host, _, puerto = servidor.strip().partition(':')
+    alias = f'replica_{indice}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': puerto or DATABASES['default']['PORT'],
+        'ATOMIC_REQUESTS': False,
+    }
+    REPLICAS_LECTURA.append(alias)
+
+DATABASE_ROUTERS = ['core.replicas.RouterReplicas']
+
+################
+# POOL DE CONEXIONES (core/pool_conexiones.py)
+# Descripción: Cada worker reutiliza sus conexiones a MySQL entre requests
+#              e hilos en vez de abrir una por request. CONN_MAX_AGE = 0:
+#              la conexión vuelve al pool al terminar el request.
+#              DB_POOL=0 usa el backend estándar (una conexión por request).
+#              Solo se envuelven las bases MySQL: SQLite queda como está.
+################
+if os.getenv('DB_POOL', '1') != '0':
+    for configuracion in DATABASES.values():
+        if configuracion['ENGINE'] != 'django.db.backends.mysql':
+            continue
+        configuracion['ENGINE'] = 'core.pool_mysql'
+        configuracion['POOL'] = {
+            'minimo': int(os.getenv('DB_POOL_MINIMO', '2')),
+            'maximo': int(os.getenv('DB_POOL_MAXIMO', '20')),
+            'vida_maxima': int(os.getenv('DB_POOL_VIDA_MAXIMA', '1800')),
+            'espera': float(os.getenv('DB_POOL_ESPERA', '5')),
+        }
+
+# Segundos que quien escribió lee de la primaria (lag de replicación tolerado)
+REPLICAS_VENTANA_ESCRITURA = int(os.getenv('DB_REPLICAS_VENTANA', '10'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -172,7 +222,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST FRAMEWORK
 ################
 REST_FRAMEWORK = {
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'core.paginacion.PaginacionKeyset',
     'PAGE_SIZE': 10,
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.SessionAuthentication',
@@ -209,7 +259,13 @@ LOGIN_URL = 'authentication:login'
 LOGIN_REDIRECT_URL = 'home'
 LOGOUT_REDIRECT_URL = 'authentication:login'
 
-SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+# Con Redis las sesiones se leen desde la caché y se escriben a la tabla en
+# diferido (ver authentication.sesiones); sin Redis, directo a la tabla
+SESSION_ENGINE = (
+    'authentication.sesiones' if os.getenv('CACHE_REDIS_URL')
+    else 'django.contrib.sessions.backends.db'
+)
+SESSION_CACHE_ALIAS = 'sesiones'
 SESSION_COOKIE_AGE = 86400  # 24 horas
 SESSION_COOKIE_SECURE = False  # True en producción con HTTPS
 SESSION_COOKIE_HTTPONLY = True
@@ -220,11 +276,28 @@ SESSION_COOKIE_SAMESITE = 'Lax'
 ################
 # CACHÉ
 ################
+# Dos niveles (ver core.cache): Redis compartido por todos los workers y una
+# copia local de vida corta en cada proceso. Sin CACHE_REDIS_URL cada proceso
+# usa solo su caché local (desarrollo, tests).
+# Producción: CACHE_REDIS_URL=redis://127.0.0.1:6379/1
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'unique-snowflake',
-    }
+        'BACKEND': 'core.cache.CacheDosNiveles',
+        'LOCATION': os.getenv('CACHE_REDIS_URL', ''),
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'TIEMPO_LOCAL': 5,
+            'MAX_ENTRADAS_LOCAL': 1000,
+        },
+    },
+    # Sin copia local: un logout en un worker vale de inmediato en todos
+    'sesiones': {
+        'BACKEND': 'core.cache.CacheDosNiveles',
+        'LOCATION': os.getenv('CACHE_REDIS_URL', ''),
+        'OPTIONS': {
+            'TIEMPO_LOCAL': 0,
+        },
+    },
 }
 
 
@@ -232,9 +305,24 @@ CACHES = {
 ################
 # LOGGING
 ################
+# Los archivos se escriben desde un hilo propio (core.logs): el request solo
+# encola. En producción (varios workers de gunicorn) los rota logrotate
+# (ver README_DESARROLLO.md); con LOG_ROTAR=1 (un solo proceso, runserver)
+# rotan solos por tamaño y a medianoche, comprimidos con gzip.
+LOG_ROTAR = os.getenv('LOG_ROTAR', '0') == '1'
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
+    'filters': {
+        'contexto': {
+            '()': 'core.logs.FiltroContexto',
+        },
+        # Fracción de requests que conservan sus registros DEBUG
+        'muestreo_debug': {
+            '()': 'core.logs.MuestreoDebug',
+            'tasa': float(os.getenv('LOG_MUESTREO_DEBUG', '0.01')),
+        },
+    },
     'formatters': {
         'verbose': {
             'format': '{levelname} {asctime} {module} {process:d} {thread:d} {message}',
@@ -244,6 +332,15 @@ LOGGING = {
             'format': '{levelname} {message}',
             'style': '{',
         },
+        # Una línea JSON por request (core.perfil_consultas)
+        'json': {
+            'format': '{message}',
+            'style': '{',
+        },
+        # Una línea JSON por registro con request_id, usuario_id, rol y `extra`
+        'estructurado': {
+            '()': 'core.logs.FormatoJSON',
+        },
     },
     'handlers': {
         'console': {
@@ -251,13 +348,29 @@ LOGGING = {
             'formatter': 'simple',
         },
         'file': {
-            'class': 'logging.FileHandler',
-            'filename': os.path.join(BASE_DIR, 'logs', 'django.log'),
-            'formatter': 'verbose',
+            'class': 'core.logs.ManejadorCola',
+            'archivo': os.path.join(BASE_DIR, 'logs', 'django.log'),
+            'rotar': LOG_ROTAR,
+            'formatter': 'estructurado',
+            'filters': ['contexto', 'muestreo_debug'],
+        },
+        'consultas': {
+            'class': 'core.logs.ManejadorCola',
+            'archivo': os.path.join(BASE_DIR, 'logs', 'consultas.log'),
+            'rotar': LOG_ROTAR,
+            'formatter': 'json',
+        },
+        # Un registro por request: método, ruta, estado y latencia_ms
+        'accesos': {
+            'class': 'core.logs.ManejadorCola',
+            'archivo': os.path.join(BASE_DIR, 'logs', 'accesos.log'),
+            'rotar': LOG_ROTAR,
+            'formatter': 'estructurado',
+            'filters': ['contexto'],
         },
     },
     'root': {
-        'handlers': ['console'],
+        'handlers': ['console', 'file'],
         'level': 'INFO',
     },
     'loggers': {
@@ -266,6 +379,16 @@ LOGGING = {
             'level': os.getenv('DJANGO_LOG_LEVEL', 'INFO'),
             'propagate': False,
         },
+        'perfil_consultas': {
+            'handlers': ['consultas'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+        'core.accesos': {
+            'handlers': ['accesos'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     },
 }
 
@@ -331,6 +454,22 @@ MAX_PATIENT_AGE = 60
 # Formato de RUT
 RUT_FORMAT = r'^\d{1,2}\.\d{3}\.\d{3}[-]?[0-9K]$'
 
+# Búsqueda de personas (ver core.busqueda)
+# Producción MySQL: 'core.busqueda.BackendMySQLFulltext'
+# Tests: 'core.busqueda.BackendMemoria'
+BUSQUEDA_PERSONAS = {
+    'BACKEND': os.getenv('BUSQUEDA_PERSONAS_BACKEND', 'core.busqueda.BackendTokens'),
+}
+
+# Perfil de consultas por request (ver core.perfil_consultas); los requests
+# sobre estos umbrales se registran en logs/consultas.log
+PERFIL_CONSULTAS = {
+    'ACTIVO': os.getenv('PERFIL_CONSULTAS', '1') == '1',
+    'MAX_CONSULTAS': 30,
+    'MAX_TIEMPO_MS': 300,
+    'MAX_REPETICIONES': 5,
+}
+
 # Roles de usuario disponibles
 USER_ROLES = [
     ('admin', 'Administrador'),
@@ -13,5 +13,8 @@ urlpatterns = [
     path('', include('authentication.urls')),
     path('home/', TemplateView.as_view(template_name='core/data/home.html'), name='home'),
     path('app/core/', include('core.urls')),
+    path('api/', include('pacientes.urls')),
+    path('api/', include('admision.urls')),
+    path('api/', include('registros.urls')),
     path('api-auth/', include('rest_framework.urls')),
 ]
\ No newline at end of file
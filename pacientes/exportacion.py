@@ -0,0 +1,152 @@
+################
+# EXPORTACIÓN: Historial clínico
+# Descripción: Exportación en streaming (NDJSON / CSV) de fichas completas
+# Memoria constante: cada tabla se recorre por bloques de clave primaria
+################
+
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from pacientes.models import AntecedentesClinico, ControlPrenatal, Paciente
+from registros.models import Medicamento, Observacion, Patologia, Procedimiento
+
+
+TAMANO_BLOQUE = 2000
+
+
+# ====================================================================
+# TABLAS EXPORTADAS
+# ====================================================================
+# (nombre, modelo, campo fecha, campos) — campos vía values(), sin instanciar modelos
+
+TABLA_PACIENTE = (
+    'paciente', Paciente, 'created_at', [
+        'persona__rut', 'persona__nombre', 'persona__apellido', 'numero_ficha',
+        'edad', 'estado_civil', 'prevision', 'embarazos_previos', 'partos_previos',
+        'abortos_previos', 'hipertension', 'diabetes', 'diabetes_gestacional',
+        'otras_patologias', 'estado',
+    ]
+)
+
+TABLAS_CLINICAS = [
+    ('control_prenatal', ControlPrenatal, 'fecha_control', [
+        'semanas_gestacion', 'peso', 'presion_sistolica', 'presion_diastolica',
+        'frecuencia_cardiaca', 'glucemia', 'observaciones', 'realizado_por_id',
+    ]),
+    ('antecedente', AntecedentesClinico, 'created_at', [
+        'tipo_dato', 'descripcion', 'registrado_por_id',
+    ]),
+    ('observacion', Observacion, 'created_at', [
+        'texto', 'imagen', 'created_by_id',
+    ]),
+    ('patologia', Patologia, 'fecha_diagnostico', [
+        'nombre', 'codigo_cie_10', 'descripcion', 'nivel_riesgo', 'estado',
+        'fecha_resolucion', 'protocolo_seguimiento', 'diagnosticado_por_id',
+    ]),
+    ('procedimiento', Procedimiento, 'fecha_procedimiento', [
+        'tipo_procedimiento', 'descripcion', 'estado', 'material_utilizado',
+        'observaciones', 'realizado_por_id',
+    ]),
+    ('medicamento', Medicamento, 'fecha_prescripcion', [
+        'nombre_medicamento', 'dosis', 'via_administracion', 'frecuencia',
+        'duracion_dias', 'indicacion', 'fecha_administracion', 'estado',
+        'observaciones', 'prescrito_por_id', 'administrado_por_id',
+    ]),
+]
+
+COLUMNAS_BASE = ['tabla', 'id', 'paciente_id', 'fecha']
+
+
+def columnas_csv():
+    """Encabezado CSV: columnas base + unión (en orden) de los campos de cada tabla."""
+    columnas = list(COLUMNAS_BASE)
+    for _, _, _, campos in [TABLA_PACIENTE] + TABLAS_CLINICAS:
+        for campo in campos:
+            if campo not in columnas:
+                columnas.append(campo)
+    return columnas
+
+
+# ====================================================================
+# RECORRIDO POR BLOQUES
+# ====================================================================
+
+def iterar_por_bloques(queryset, campos, tamano=TAMANO_BLOQUE):
+    """
+    Recorre un queryset en bloques ordenados por pk (paginación por clave).
+    A diferencia de OFFSET, cada bloque es una búsqueda por índice y la
+    memoria usada no depende del total de filas.
+    """
+    ultimo_pk = None
+    while True:
+        bloque = queryset.order_by('pk')
+        if ultimo_pk is not None:
+            bloque = bloque.filter(pk__gt=ultimo_pk)
+        filas = list(bloque.values('pk', *campos)[:tamano])
+        if not filas:
+            return
+        ultimo_pk = filas[-1]['pk']
+        yield from filas
+
+
+def registros_historial(pacientes, tamano=TAMANO_BLOQUE):
+    """
+    Genera un dict por fila de cada tabla clínica de los pacientes indicados.
+
+    Args:
+        pacientes (QuerySet): pacientes a exportar (se usa como subconsulta)
+        tamano (int): filas por bloque
+
+    Yields:
+        dict: {'tabla', 'id', 'paciente_id', 'fecha', ...campos}
+    """
+    nombre, _, campo_fecha, campos = TABLA_PACIENTE
+    for fila in iterar_por_bloques(pacientes, [campo_fecha] + campos, tamano):
+        pk = fila.pop('pk')
+        yield {'tabla': nombre, 'id': pk, 'paciente_id': pk, 'fecha': fila.pop(campo_fecha), **fila}
+
+    ids_pacientes = pacientes.values('pk')
+    for nombre, modelo, campo_fecha, campos in TABLAS_CLINICAS:
+        queryset = modelo.objects.filter(paciente__in=ids_pacientes)
+        for fila in iterar_por_bloques(queryset, ['paciente_id', campo_fecha] + campos, tamano):
+            yield {
+                'tabla': nombre,
+                'id': fila.pop('pk'),
+                'paciente_id': fila.pop('paciente_id'),
+                'fecha': fila.pop(campo_fecha),
+                **fila,
+            }
+
+
+# ====================================================================
+# FORMATOS
+# ====================================================================
+
+def generar_ndjson(registros):
+    """Una línea JSON por registro."""
+    for registro in registros:
+        yield json.dumps(registro, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+class _Eco:
+    """Pseudo-archivo para csv.writer: retorna la línea en vez de escribirla."""
+
+    def write(self, valor):
+        return valor
+
+
+def generar_csv(registros):
+    """CSV ancho: encabezado fijo, columnas vacías para campos de otras tablas."""
+    columnas = columnas_csv()
+    escritor = csv.DictWriter(_Eco(), fieldnames=columnas, restval='')
+    yield escritor.writeheader()
+    for registro in registros:
+        yield escritor.writerow(registro)
+
+
+FORMATOS = {
+    'ndjson': (generar_ndjson, 'application/x-ndjson', 'ndjson'),
+    'csv': (generar_csv, 'text/csv; charset=utf-8', 'csv'),
+}
@@ -0,0 +1,204 @@
+################
+# FICHAS: Asignación de números de ficha (FAM-YYYY-XXXXX)
+# Descripción: Asignación hi/lo. Cada proceso reserva en SecuenciaFicha un
+#              bloque de números y los entrega desde memoria; la fila del año
+#              se bloquea una vez por bloque, no una vez por paciente.
+#
+# Garantías:
+#   - Nunca se repite un número: cada bloque se reserva con un UPDATE atómico.
+#   - Puede haber huecos (bloques de procesos que terminan, transacciones
+#     revertidas), igual que con una secuencia de la base de datos.
+################
+
+import os
+import threading
+
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connections, transaction
+from django.utils import timezone
+
+from pacientes.models import Paciente, SecuenciaFicha
+
+
+TAMANO_BLOQUE_FICHAS = 50
+PREFIJO_FICHA = 'FAM'
+
+
+def formatear_ficha(anio, numero):
+    return f'{PREFIJO_FICHA}-{anio}-{numero:05d}'
+
+
+# ====================================================================
+# RESERVA DE BLOQUES (base de datos)
+# ====================================================================
+
+def reserva_independiente(using=DEFAULT_DB_ALIAS):
+    """
+    Indica si una reserva hecha ahora queda confirmada aunque el llamador
+    revierta su transacción.
+
+    Dentro de una transacción (ATOMIC_REQUESTS) la reserva se hace en una
+    conexión aparte que confirma de inmediato: el bloqueo de la fila dura
+    lo que el UPDATE y no lo que dura el request. SQLite no tiene bloqueo
+    por fila (una segunda conexión esperaría al request), así que ahí se
+    usa la misma conexión y la reserva sigue la suerte del llamador.
+    """
+    conexion = connections[using]
+    return not conexion.in_atomic_block or conexion.vendor != 'sqlite'
+
+
+def reservar_bloque(anio, tamano, using=DEFAULT_DB_ALIAS):
+    """
+    Reserva `tamano` números consecutivos para `anio`.
+
+    Returns:
+        tuple: (primero, ultimo)
+    """
+    if connections[using].in_atomic_block and connections[using].vendor != 'sqlite':
+        ultimo = _reservar_en_conexion_propia(anio, tamano, using)
+    else:
+        ultimo = _reservar_en_transaccion(anio, tamano, using)
+    return ultimo - tamano + 1, ultimo
+
+
+def _reservar_en_transaccion(anio, tamano, using):
+    for intento in range(2):
+        try:
+            with transaction.atomic(using=using):
+                return _reservar(connections[using], anio, tamano)
+        except IntegrityError:
+            # Otro proceso creó la fila del año primero: el UPDATE ahora sí la encuentra
+            if intento:
+                raise
+
+
+def _reservar_en_conexion_propia(anio, tamano, using):
+    conexion = connections.create_connection(using)
+    try:
+        for intento in range(2):
+            conexion.set_autocommit(False)
+            try:
+                ultimo = _reservar(conexion, anio, tamano)
+                conexion.commit()
+                return ultimo
+            except IntegrityError:
+                conexion.rollback()
+                if intento:
+                    raise
+            except Exception:
+                conexion.rollback()
+                raise
+            finally:
+                conexion.set_autocommit(True)
+    finally:
+        conexion.close()
+
+
+def _reservar(conexion, anio, tamano):
+    """UPDATE atómico de la fila del año; la crea si es la primera reserva."""
+    nombre = conexion.ops.quote_name
+    tabla = nombre(SecuenciaFicha._meta.db_table)
+
+    with conexion.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {tabla} SET {nombre("ultimo")} = {nombre("ultimo")} + %s WHERE {nombre("anio")} = %s',
+            [tamano, anio]
+        )
+        if cursor.rowcount == 0:
+            # Partir después de las fichas que ya existan (cargadas a mano o importadas)
+            cursor.execute(
+                f'INSERT INTO {tabla} ({nombre("anio")}, {nombre("ultimo")}) VALUES (%s, %s)',
+                [anio, _ultimo_existente(cursor, conexion, anio) + tamano]
+            )
+        cursor.execute(f'SELECT {nombre("ultimo")} FROM {tabla} WHERE {nombre("anio")} = %s', [anio])
+        return cursor.fetchone()[0]
+
+
+def _ultimo_existente(cursor, conexion, anio):
+    """
+    Mayor número de ficha del año ya usado. El máximo se toma sobre el número
+    (no sobre el texto: 'FAM-2025-100000' > 'FAM-2025-99999') y solo entre
+    fichas con sufijo numérico, para que un valor heredado mal formado no
+    haga partir la secuencia desde 1. REGEXP existe en MySQL y en SQLite
+    (función registrada por Django).
+    """
+    nombre = conexion.ops.quote_name
+    prefijo = f'{PREFIJO_FICHA}-{anio}-'
+    columna = nombre('numero_ficha')
+    cursor.execute(
+        f'SELECT MAX(CAST(SUBSTR({columna}, %s) AS SIGNED INTEGER)) '
+        f'FROM {nombre(Paciente._meta.db_table)} '
+        f'WHERE {columna} LIKE %s AND {columna} REGEXP %s',
+        [len(prefijo) + 1, prefijo + '%', f'^{prefijo}[0-9]+$']
+    )
+    return cursor.fetchone()[0] or 0
+
+
+# ====================================================================
+# ASIGNADOR (por proceso)
+# ====================================================================
+
+class AsignadorFichas:
+    """
+    Entrega números de ficha desde el bloque reservado por este proceso.
+
+    Args:
+        tamano_bloque (int): números reservados por cada viaje a la base
+        using (str): alias de la base de datos
+    """
+
+    def __init__(self, tamano_bloque=TAMANO_BLOQUE_FICHAS, using=DEFAULT_DB_ALIAS):
+        self.tamano_bloque = tamano_bloque
+        self.using = using
+        self._candado = threading.Lock()
+        self._bloques = {}
+        self._pid = os.getpid()
+
+    def siguiente(self, anio=None):
+        return self.siguientes(1, anio)[0]
+
+    def siguientes(self, cantidad, anio=None):
+        """
+        Returns:
+            list: `cantidad` números de ficha distintos, en orden
+        """
+        anio = anio or timezone.localdate().year
+        numeros = []
+
+        with self._candado:
+            # Un worker creado con fork no puede heredar el bloque del padre
+            if self._pid != os.getpid():
+                self._bloques.clear()
+                self._pid = os.getpid()
+
+            while len(numeros) < cantidad:
+                faltan = cantidad - len(numeros)
+                siguiente, ultimo = self._bloques.pop(anio, (1, 0))
+
+                if siguiente > ultimo:
+                    # Si la reserva se revierte junto con el llamador, un resto
+                    # guardado en memoria podría entregarse también en otro proceso
+                    if reserva_independiente(self.using):
+                        tamano = max(self.tamano_bloque, faltan)
+                    else:
+                        tamano = faltan
+                    siguiente, ultimo = reservar_bloque(anio, tamano, self.using)
+
+                tomar = min(ultimo - siguiente + 1, faltan)
+                numeros.extend(range(siguiente, siguiente + tomar))
+                if siguiente + tomar <= ultimo:
+                    self._bloques[anio] = (siguiente + tomar, ultimo)
+
+        return [formatear_ficha(anio, numero) for numero in numeros]
+
+
+asignador = AsignadorFichas()
+
+
+def siguiente_numero_ficha(anio=None):
+    """Próximo número de ficha de este proceso (FAM-YYYY-XXXXX)."""
+    return asignador.siguiente(anio)
+
+
+def siguientes_numeros_ficha(cantidad, anio=None):
+    """`cantidad` números de ficha distintos (importación masiva)."""
+    return asignador.siguientes(cantidad, anio)
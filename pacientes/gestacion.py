@@ -0,0 +1,299 @@
+################
+# GESTACIÓN: Cálculo de edad gestacional
+# Descripción: La edad gestacional se mide desde el "inicio de gestación"
+#              (FUR operacional) guardado en Paciente.fecha_inicio_gestacion.
+#              Prioridad de las anclas:
+#                1. Ecografía de datación (fecha + semanas/días medidos)
+#                2. FUR (fecha de última regla)
+#                3. Primer control prenatal con semanas registradas
+#              Con la fecha guardada, ordenar o filtrar por semana actual es
+#              un rango sobre un índice y no un cálculo por paciente.
+################
+
+import datetime
+
+import numpy as np
+from django.db.models import DateField, F, FloatField, Func, IntegerField, Value
+from django.db.models.functions import Cast, Floor
+from django.utils import timezone
+
+
+DIAS_POR_SEMANA = 7
+# Sobre esta edad la ficha ya no corresponde a un embarazo en curso
+GESTACION_MAXIMA_DIAS = 44 * DIAS_POR_SEMANA
+# Rango de semanas que se completa automáticamente en ControlPrenatal
+SEMANAS_VALIDAS = (1, 42)
+
+TAMANO_BLOQUE = 5000
+
+
+# ====================================================================
+# EDAD GESTACIONAL
+# ====================================================================
+
+class EdadGestacional:
+    """
+    Edad gestacional expresada en días.
+
+    Atributos:
+        dias_totales (int): días desde el inicio de gestación
+        semanas (int): semanas completas
+        dias (int): días sobre la última semana completa (0-6)
+    """
+
+    __slots__ = ('dias_totales',)
+
+    def __init__(self, dias_totales):
+        self.dias_totales = int(dias_totales)
+
+    @property
+    def semanas(self):
+        return self.dias_totales // DIAS_POR_SEMANA
+
+    @property
+    def dias(self):
+        return self.dias_totales % DIAS_POR_SEMANA
+
+    @property
+    def trimestre(self):
+        if self.semanas < 14:
+            return 1
+        if self.semanas < 28:
+            return 2
+        return 3
+
+    def __eq__(self, otra):
+        return isinstance(otra, EdadGestacional) and otra.dias_totales == self.dias_totales
+
+    def __str__(self):
+        return f'{self.semanas}+{self.dias}'
+
+    def __repr__(self):
+        return f'EdadGestacional({self})'
+
+
+def edad_en(inicio, fecha=None):
+    """
+    Edad gestacional en `fecha` (hoy por defecto).
+
+    Returns:
+        EdadGestacional o None si no hay inicio o la fecha es anterior
+    """
+    if inicio is None:
+        return None
+    dias = ((fecha or timezone.localdate()) - inicio).days
+    if dias < 0:
+        return None
+    return EdadGestacional(dias)
+
+
+def inicio_por_anclas(fur=None, fecha_ecografia=None, semanas_ecografia=None, dias_ecografia=0,
+                      fecha_control=None, semanas_control=None):
+    """
+    Inicio de gestación según la ancla disponible de mayor prioridad.
+
+    Returns:
+        date o None
+    """
+    if fecha_ecografia is not None and semanas_ecografia is not None:
+        return fecha_ecografia - datetime.timedelta(
+            days=semanas_ecografia * DIAS_POR_SEMANA + (dias_ecografia or 0)
+        )
+    if fur is not None:
+        return fur
+    if fecha_control is not None and semanas_control is not None:
+        return fecha_control - datetime.timedelta(days=semanas_control * DIAS_POR_SEMANA)
+    return None
+
+
+# ====================================================================
+# CÁLCULO POR COHORTE (NumPy)
+# ====================================================================
+
+def _fechas(valores):
+    return np.array(valores, dtype='datetime64[D]')
+
+
+def _dias(valores):
+    return np.array(valores, dtype='timedelta64[D]')
+
+
+def calcular_inicios(fur, fecha_ecografia, semanas_ecografia, dias_ecografia, fecha_control, semanas_control):
+    """
+    Versión vectorizada de inicio_por_anclas: cada argumento es una
+    secuencia con un valor por paciente (None cuando falta).
+
+    Returns:
+        np.ndarray: datetime64[D], NaT donde no hay ninguna ancla
+    """
+    semanas_eco = _dias(semanas_ecografia) * DIAS_POR_SEMANA
+    dias_eco = _dias([dias or 0 for dias in dias_ecografia])
+    por_ecografia = _fechas(fecha_ecografia) - (semanas_eco + dias_eco)
+    por_control = _fechas(fecha_control) - _dias(semanas_control) * DIAS_POR_SEMANA
+    fur = _fechas(fur)
+
+    return np.where(
+        ~np.isnat(por_ecografia), por_ecografia,
+        np.where(~np.isnat(fur), fur, por_control)
+    )
+
+
+def primeros_controles(pacientes_ids):
+    """
+    Primer control con semanas registradas de cada paciente (una consulta).
+
+    Returns:
+        dict: paciente_id -> (fecha_control, semanas_gestacion)
+    """
+    from pacientes.models import ControlPrenatal
+
+    filas = np.array(
+        list(
+            ControlPrenatal.objects
+            .filter(paciente_id__in=pacientes_ids, semanas_gestacion__isnull=False)
+            .order_by('paciente_id', 'fecha_control', 'pk')
+            .values_list('paciente_id', 'fecha_control', 'semanas_gestacion')
+        ),
+        dtype=object
+    ).reshape(-1, 3)
+    # Las filas vienen ordenadas por paciente: el primer índice de cada id es su primer control
+    _, primeros = np.unique(filas[:, 0].astype(np.int64), return_index=True)
+    return {filas[i, 0]: (filas[i, 1], filas[i, 2]) for i in primeros}
+
+
+def recalcular_inicios(pacientes=None, tamano_bloque=TAMANO_BLOQUE):
+    """
+    Recalcula fecha_inicio_gestacion de una cohorte completa, por bloques
+    de `tamano_bloque` pacientes (dos consultas de lectura por bloque y
+    un UPDATE solo para las fichas que cambian).
+
+    Args:
+        pacientes (QuerySet): por defecto, todos los pacientes
+
+    Returns:
+        int: fichas actualizadas
+    """
+    from pacientes.models import Paciente
+
+    pacientes = Paciente.objects.all() if pacientes is None else pacientes
+    campos = ('pk', 'fecha_ultima_regla', 'fecha_ecografia', 'semanas_ecografia',
+              'dias_ecografia', 'fecha_inicio_gestacion')
+    actualizados = 0
+    ultimo_pk = 0
+
+    while True:
+        bloque = list(pacientes.filter(pk__gt=ultimo_pk).order_by('pk').values_list(*campos)[:tamano_bloque])
+        if not bloque:
+            return actualizados
+        ultimo_pk = bloque[-1][0]
+
+        ids, fur, fecha_eco, semanas_eco, dias_eco, actuales = zip(*bloque)
+        controles = primeros_controles(ids)
+        sin_control = (None, None)
+        fecha_control, semanas_control = zip(*(controles.get(pk, sin_control) for pk in ids))
+
+        nuevos = calcular_inicios(fur, fecha_eco, semanas_eco, dias_eco, fecha_control, semanas_control)
+        cambiados = np.flatnonzero(nuevos != _fechas(actuales))
+        # NaT != NaT: pacientes sin ancla antes y después no cuentan como cambio
+        cambiados = cambiados[~(np.isnat(nuevos[cambiados]) & np.isnat(_fechas(actuales)[cambiados]))]
+
+        cambios = [
+            Paciente(pk=ids[i], fecha_inicio_gestacion=None if np.isnat(nuevos[i]) else nuevos[i].item())
+            for i in cambiados
+        ]
+        Paciente.objects.bulk_update(cambios, ['fecha_inicio_gestacion'], batch_size=1000)
+        actualizados += len(cambios)
+        if len(bloque) < tamano_bloque:
+            return actualizados
+
+
+def edades_gestacionales(pacientes, fecha=None):
+    """
+    Edad gestacional actual de una cohorte, sin recorrer pacientes en Python.
+
+    Returns:
+        tuple: (ids: np.ndarray, dias: np.ndarray) solo de los pacientes con inicio
+    """
+    filas = list(pacientes.filter(fecha_inicio_gestacion__isnull=False).values_list('pk', 'fecha_inicio_gestacion'))
+    if not filas:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+    ids, inicios = zip(*filas)
+    hoy = np.datetime64(fecha or timezone.localdate(), 'D')
+    return np.array(ids, dtype=np.int64), (hoy - _fechas(inicios)).astype(np.int64)
+
+
+def actualizar_inicio_paciente(paciente_id):
+    """
+    Recalcula el inicio de un paciente tras agregar o borrar controles.
+    Solo cambia algo si el paciente no tiene FUR ni ecografía.
+    """
+    from pacientes.models import Paciente
+
+    anclas = Paciente.objects.filter(pk=paciente_id).values_list(
+        'fecha_ultima_regla', 'fecha_ecografia', 'semanas_ecografia', 'fecha_inicio_gestacion'
+    ).first()
+    if anclas is None:
+        return
+    fur, fecha_eco, semanas_eco, actual = anclas
+    if fur is not None or (fecha_eco is not None and semanas_eco is not None):
+        return
+
+    fecha_control, semanas_control = primeros_controles([paciente_id]).get(paciente_id, (None, None))
+    inicio = inicio_por_anclas(fecha_control=fecha_control, semanas_control=semanas_control)
+    if inicio != actual:
+        Paciente.objects.filter(pk=paciente_id).update(fecha_inicio_gestacion=inicio)
+
+
+# ====================================================================
+# EXPRESIONES SQL
+# ====================================================================
+
+class DiasEntre(Func):
+    """Días enteros entre dos fechas (fin - inicio), calculados en la base de datos."""
+
+    arity = 2
+    output_field = IntegerField()
+
+    def as_sql(self, compiler, connection, **extra_context):
+        # PostgreSQL: date - date ya es un entero de días
+        return super().as_sql(compiler, connection, template='(%(expressions)s)', arg_joiner=' - ', **extra_context)
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection, function='DATEDIFF', **extra_context)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler, connection,
+            template='CAST(julianday(%(expressions)s) AS INTEGER)', arg_joiner=') - julianday(',
+            **extra_context
+        )
+
+
+def anotar_edad_gestacional(queryset, fecha=None):
+    """
+    Agrega `dias_gestacion` y `semanas_gestacion_actual` (NULL sin inicio).
+    """
+    fecha = fecha or timezone.localdate()
+    dias = DiasEntre(Value(fecha, output_field=DateField()), F('fecha_inicio_gestacion'))
+    return queryset.annotate(
+        dias_gestacion=dias,
+        semanas_gestacion_actual=Cast(Floor(Cast(dias, FloatField()) / DIAS_POR_SEMANA), IntegerField()),
+    )
+
+
+def rango_inicio(semana_desde=None, semana_hasta=None, fecha=None):
+    """
+    Traduce un rango de semanas actuales a un rango de fecha_inicio_gestacion.
+
+    Returns:
+        dict: lookups para filter()
+    """
+    fecha = fecha or timezone.localdate()
+    filtros = {}
+    if semana_desde is not None:
+        filtros['fecha_inicio_gestacion__lte'] = fecha - datetime.timedelta(days=semana_desde * DIAS_POR_SEMANA)
+    if semana_hasta is not None:
+        filtros['fecha_inicio_gestacion__gte'] = fecha - datetime.timedelta(
+            days=semana_hasta * DIAS_POR_SEMANA + DIAS_POR_SEMANA - 1
+        )
+    return filtros
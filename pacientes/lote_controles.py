@@ -0,0 +1,144 @@
+################
+# LOTE DE CONTROLES: Registro de los controles de una ronda de sala
+# Descripción: Recibe los controles de muchos pacientes en un solo request.
+#              Valida todo el lote de una vez: tipos por item
+#              (ControlLoteSerializer), rangos de las mediciones vectorizados
+#              (validar_mediciones) y pacientes con una sola consulta.
+#              Inserta los válidos con un bulk_create y hace a mano lo que
+#              las señales de post_save harían por cada control: contadores
+#              (controles_hoy, controles_pendientes), datación, tendencias,
+#              alertas y auditoría. Los items inválidos se informan y no
+#              impiden registrar el resto.
+# Uso: POST /api/controles/lote/  (ControlPrenatalViewSet.lote)
+################
+
+from collections import Counter
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from core.auditoria import registrar_creados
+from core.contadores import VENTANA_CONTROL_DIAS, ajustar
+from pacientes.gestacion import recalcular_inicios
+from pacientes.models import ControlPrenatal, Paciente
+from pacientes.serializers import ControlLoteSerializer
+from pacientes.tendencias import invalidar_tendencias
+from registros.alertas import evaluar_creados
+from utilidades.validadores import validar_mediciones
+
+
+LIMITE_LOTE = 200
+
+CAMPOS_MEDICIONES = ('peso', 'presion_sistolica', 'presion_diastolica', 'glucemia', 'semanas_gestacion')
+
+
+def registrar_lote(items, usuario):
+    """
+    Valida y registra los controles de `items` (dicts con los campos de
+    ControlLoteSerializer) como realizados por `usuario`, en una transacción.
+
+    Returns:
+        list: un dict por item, en el mismo orden: {'indice', 'id'} si se
+              registró o {'indice', 'errores'} (campo -> [mensajes]) si no
+    """
+    resultados = [None] * len(items)
+    candidatos = []
+    for indice, item in enumerate(items):
+        serializer = ControlLoteSerializer(data=item)
+        if serializer.is_valid():
+            candidatos.append((indice, serializer.validated_data))
+        else:
+            resultados[indice] = {'indice': indice, 'errores': serializer.errors}
+
+    mediciones = validar_mediciones(*(
+        [datos.get(campo) for _, datos in candidatos] for campo in CAMPOS_MEDICIONES
+    ))
+    pacientes = Paciente.objects.in_bulk({datos['paciente'] for _, datos in candidatos})
+
+    aceptados = []
+    for posicion, (indice, datos) in enumerate(candidatos):
+        errores = {
+            campo: [str(mensajes[posicion])]
+            for campo, mensajes in mediciones.items() if mensajes[posicion]
+        }
+        paciente = pacientes.get(datos['paciente'])
+        if paciente is None:
+            errores['paciente'] = ['Paciente no encontrado']
+        if errores:
+            resultados[indice] = {'indice': indice, 'errores': errores}
+            continue
+        control = ControlPrenatal(
+            **{**datos, 'paciente': paciente}, realizado_por=usuario, created_by=usuario
+        )
+        # Lo que haría ControlPrenatal.save()
+        if control.semanas_gestacion is None:
+            control.semanas_gestacion = control.calcular_semanas_gestacion()
+        aceptados.append((indice, control))
+
+    if aceptados:
+        controles = [control for _, control in aceptados]
+        with transaction.atomic():
+            _guardar(controles)
+        for indice, control in aceptados:
+            resultados[indice] = {'indice': indice, 'id': control.pk}
+    return resultados
+
+
+def _guardar(controles):
+    # bulk_create no llama a save() ni emite señales: lo que hacen
+    # pacientes.signals, registros.signals y core.contadores se hace aquí
+    inicio_ventana = timezone.localdate() - timedelta(days=VENTANA_CONTROL_DIAS)
+    pacientes_ids = {control.paciente_id for control in controles}
+    # Antes de insertar: quienes ya tenían un control reciente
+    con_control_reciente = set(
+        ControlPrenatal.objects.filter(paciente_id__in=pacientes_ids, fecha_control__gte=inicio_ventana)
+        .values_list('paciente_id', flat=True)
+    )
+
+    ControlPrenatal.objects.bulk_create(controles)
+    if controles[0].pk is None:
+        _leer_pks(controles)
+
+    for fecha, cantidad in Counter(control.fecha_control for control in controles).items():
+        ajustar('controles_hoy', cantidad, fecha.isoformat())
+    atendidos = {
+        control.paciente_id for control in controles
+        if control.fecha_control >= inicio_ventana and control.paciente.estado == 'activo'
+    }
+    ajustar('controles_pendientes', -len(atendidos - con_control_reciente))
+
+    recalcular_inicios(Paciente.objects.filter(pk__in=pacientes_ids))
+    # Ahora y al confirmar, como pacientes.signals.control_tendencias
+    _invalidar_tendencias(pacientes_ids)
+    transaction.on_commit(lambda: _invalidar_tendencias(pacientes_ids))
+
+    evaluar_creados('control', controles)
+    registrar_creados(controles)
+
+
+def _invalidar_tendencias(pacientes_ids):
+    for paciente_id in pacientes_ids:
+        invalidar_tendencias(paciente_id)
+
+
+def _leer_pks(controles):
+    # MySQL no retorna las pk de bulk_create: cada control se reconoce por
+    # paciente y created_at (asignado al insertar, con microsegundos)
+    pendientes = {}
+    for control in controles:
+        pendientes.setdefault((control.paciente_id, control.created_at), []).append(control)
+    filas = (
+        ControlPrenatal.objects
+        .filter(
+            created_by_id=controles[0].created_by_id,
+            paciente_id__in={control.paciente_id for control in controles},
+            created_at__gte=min(control.created_at for control in controles),
+        )
+        .order_by('pk')
+        .values_list('paciente_id', 'created_at', 'pk')
+    )
+    for paciente_id, creado, pk in filas:
+        iguales = pendientes.get((paciente_id, creado))
+        if iguales:
+            iguales.pop(0).pk = pk
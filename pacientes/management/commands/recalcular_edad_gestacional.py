@@ -0,0 +1,40 @@
+################
+# COMANDO: recalcular_edad_gestacional
+# Descripción: Recalcula fecha_inicio_gestacion de todas las fichas desde la
+#              ecografía, la FUR o el primer control (cálculo vectorizado por
+#              bloques). Necesario tras cargas masivas o cambios de reglas.
+# Uso: python manage.py recalcular_edad_gestacional [--bloque 5000] [--solo-activos]
+################
+
+from django.core.management.base import BaseCommand
+
+from pacientes.gestacion import TAMANO_BLOQUE, recalcular_inicios
+from pacientes.models import Paciente
+
+
+class Command(BaseCommand):
+    help = 'Recalcula el inicio de gestación (edad gestacional) de las fichas'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--bloque',
+            type=int,
+            default=TAMANO_BLOQUE,
+            help=f'Pacientes por bloque (por defecto {TAMANO_BLOQUE})'
+        )
+        parser.add_argument(
+            '--solo-activos',
+            action='store_true',
+            help='Procesa solo pacientes en estado activo'
+        )
+
+    def handle(self, *args, **options):
+        pacientes = Paciente.objects.all()
+        if options['solo_activos']:
+            pacientes = pacientes.filter(estado='activo')
+
+        actualizados = recalcular_inicios(pacientes, tamano_bloque=options['bloque'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Edad gestacional recalculada ({actualizados} fichas actualizadas)'
+        ))
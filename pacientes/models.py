@@ -4,9 +4,36 @@
 # v0.2: Agregados campos de auditoría y estado
 ################
 
+import datetime
+
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 from core.models import Persona
+from pacientes import gestacion
+
+
+class PacienteQuerySet(models.QuerySet):
+    """QuerySet de Paciente con edad gestacional calculada en la base de datos."""
+    
+    def con_edad_gestacional(self, fecha=None):
+        """Anota dias_gestacion y semanas_gestacion_actual (ver pacientes.gestacion)"""
+        return gestacion.anotar_edad_gestacional(self, fecha)
+    
+    def gestando(self, fecha=None):
+        """Pacientes con inicio de gestación dentro del máximo de un embarazo en curso"""
+        fecha = fecha or timezone.localdate()
+        return self.filter(
+            fecha_inicio_gestacion__gt=fecha - datetime.timedelta(days=gestacion.GESTACION_MAXIMA_DIAS),
+            fecha_inicio_gestacion__lte=fecha,
+        )
+    
+    def en_semanas(self, desde=None, hasta=None, fecha=None):
+        """
+        Filtra por semana gestacional actual (ambos extremos incluidos).
+        Se traduce a un rango sobre el índice de fecha_inicio_gestacion.
+        """
+        return self.filter(**gestacion.rango_inicio(desde, hasta, fecha))
 
 
 class Paciente(models.Model):
@@ -49,6 +76,7 @@ class Paciente(models.Model):
     numero_ficha = models.CharField(
         max_length=20,
         unique=True,
+        blank=True,
         verbose_name="Número de Ficha",
         help_text="Se genera automáticamente. Formato: FAM-YYYY-XXXXX"
     )
@@ -109,6 +137,40 @@ class Paciente(models.Model):
         verbose_name="Otras Patologías"
     )
     
+    # DATACIÓN DEL EMBARAZO (Nuevo en v0.3)
+    fecha_ultima_regla = models.DateField(
+        blank=True,
+        null=True,
+        verbose_name="Fecha de Última Regla (FUR)"
+    )
+    
+    fecha_ecografia = models.DateField(
+        blank=True,
+        null=True,
+        verbose_name="Fecha Ecografía de Datación"
+    )
+    
+    semanas_ecografia = models.PositiveSmallIntegerField(
+        blank=True,
+        null=True,
+        verbose_name="Semanas según Ecografía"
+    )
+    
+    dias_ecografia = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name="Días según Ecografía",
+        help_text="Días sobre las semanas completas (0-6)"
+    )
+    
+    # Se calcula en save() y desde los controles (ver pacientes.gestacion)
+    fecha_inicio_gestacion = models.DateField(
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name="Inicio de Gestación",
+        help_text="FUR operacional: ecografía, FUR o primer control con semanas"
+    )
+    
     # AUDITORÍA (Nuevo en v0.2)
     created_by = models.ForeignKey(
         User,
@@ -144,6 +206,11 @@ class Paciente(models.Model):
         verbose_name="Estado del Paciente"
     )
     
+    # Campos que definen fecha_inicio_gestacion
+    CAMPOS_DATACION = ('fecha_ultima_regla', 'fecha_ecografia', 'semanas_ecografia', 'dias_ecografia')
+    
+    objects = PacienteQuerySet.as_manager()
+    
     class Meta:
         verbose_name = "Paciente"
         verbose_name_plural = "Pacientes"
@@ -152,15 +219,46 @@ class Paciente(models.Model):
             models.Index(fields=['numero_ficha']),
             models.Index(fields=['estado']),
             models.Index(fields=['created_at']),
+            models.Index(fields=['fecha_inicio_gestacion']),
         ]
     
     def __str__(self):
         return f"Ficha {self.numero_ficha} - {self.persona.get_full_name()}"
     
-    def get_edad_gestacional(self):
-        """Calcula edad gestacional aproximada (requiere datos de controles)"""
-        # Implementar después con modelo ControlPrenatal
-        pass
+    def save(self, *args, **kwargs):
+        if not self.numero_ficha:
+            # Importación diferida: pacientes.fichas importa SecuenciaFicha de este módulo
+            from pacientes.fichas import siguiente_numero_ficha
+            self.numero_ficha = siguiente_numero_ficha()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            self.sincronizar_inicio_gestacion()
+        elif set(update_fields) & set(self.CAMPOS_DATACION):
+            self.sincronizar_inicio_gestacion()
+            kwargs['update_fields'] = set(update_fields) | {'fecha_inicio_gestacion'}
+        super().save(*args, **kwargs)
+    
+    def sincronizar_inicio_gestacion(self):
+        """Completa fecha_inicio_gestacion desde la ecografía, la FUR o el primer control"""
+        primer_control = (None, None)
+        sin_anclas = self.fecha_ultima_regla is None and (
+            self.fecha_ecografia is None or self.semanas_ecografia is None
+        )
+        if sin_anclas and self.pk:
+            primer_control = gestacion.primeros_controles([self.pk]).get(self.pk, primer_control)
+        self.fecha_inicio_gestacion = gestacion.inicio_por_anclas(
+            self.fecha_ultima_regla, self.fecha_ecografia, self.semanas_ecografia, self.dias_ecografia,
+            *primer_control
+        )
+    
+    def get_edad_gestacional(self, fecha=None):
+        """
+        Edad gestacional en `fecha` (hoy por defecto).
+        
+        Returns:
+            EdadGestacional (semanas, dias, trimestre) o None sin datación
+        """
+        return gestacion.edad_en(self.fecha_inicio_gestacion, fecha)
     
     def get_patologias_activas(self):
         """Retorna patologías activas del paciente"""
@@ -281,6 +379,19 @@ class ControlPrenatal(models.Model):
     def __str__(self):
         return f"Control {self.fecha_control} - {self.paciente.numero_ficha}"
     
+    def save(self, *args, **kwargs):
+        if self.semanas_gestacion is None:
+            self.semanas_gestacion = self.calcular_semanas_gestacion()
+        super().save(*args, **kwargs)
+    
+    def calcular_semanas_gestacion(self):
+        """Semanas a la fecha del control según la datación del paciente (None si no hay)"""
+        edad = self.paciente.get_edad_gestacional(self.fecha_control)
+        if edad is None:
+            return None
+        minimo, maximo = gestacion.SEMANAS_VALIDAS
+        return edad.semanas if minimo <= edad.semanas <= maximo else None
+    
     def get_presion(self):
         """Retorna presión formateada"""
         if self.presion_sistolica and self.presion_diastolica:
@@ -363,4 +474,35 @@ class AntecedentesClinico(models.Model):
         ]
     
     def __str__(self):
-        return f"{self.get_tipo_dato_display()} - {self.paciente.numero_ficha}"
\ No newline at end of file
+        return f"{self.get_tipo_dato_display()} - {self.paciente.numero_ficha}"
+
+
+################
+# MODELO: SecuenciaFicha
+# Descripción: Último número de ficha reservado por año (FAM-YYYY-XXXXX).
+#              Cada proceso reserva bloques de números (ver pacientes.fichas),
+#              así la fila se toca una vez por bloque y no por paciente.
+################
+
+class SecuenciaFicha(models.Model):
+    """
+    Contador por año de los números de ficha.
+    Se modifica solo desde pacientes.fichas.reservar_bloque.
+    """
+    
+    anio = models.PositiveSmallIntegerField(
+        primary_key=True,
+        verbose_name="Año"
+    )
+    
+    ultimo = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Último número reservado"
+    )
+    
+    class Meta:
+        verbose_name = "Secuencia de Fichas"
+        verbose_name_plural = "Secuencias de Fichas"
+    
+    def __str__(self):
+        return f"FAM-{self.anio}: {self.ultimo}"
\ No newline at end of file
@@ -1,6 +1,8 @@
+from django.utils import timezone
 from rest_framework import serializers
 from .models import Paciente, ControlPrenatal
 from core.serializers import PersonaSerializer
+from utilidades.validadores import validar_semanas_gestacion
 
 ################
 # Serializer: PacienteSerializer
@@ -9,6 +11,7 @@ from core.serializers import PersonaSerializer
 class PacienteSerializer(serializers.ModelSerializer):
     persona = PersonaSerializer(read_only=True)
     persona_id = serializers.IntegerField(write_only=True)
+    edad_gestacional = serializers.SerializerMethodField()
     
     class Meta:
         model = Paciente
@@ -17,6 +20,9 @@ class PacienteSerializer(serializers.ModelSerializer):
             'persona',
             'persona_id',
             'numero_ficha',
+            'edad',
+            'estado_civil',
+            'prevision',
             'embarazos_previos',
             'partos_previos',
             'abortos_previos',
@@ -24,10 +30,34 @@ class PacienteSerializer(serializers.ModelSerializer):
             'diabetes',
             'diabetes_gestacional',
             'otras_patologias',
-            'fecha_creacion',
-            'fecha_actualizacion',
+            'fecha_ultima_regla',
+            'fecha_ecografia',
+            'semanas_ecografia',
+            'dias_ecografia',
+            'fecha_inicio_gestacion',
+            'edad_gestacional',
+            'estado',
+            'created_at',
+            'modified_at',
         ]
-        read_only_fields = ['fecha_creacion', 'fecha_actualizacion']
+        read_only_fields = ['created_at', 'modified_at']
+    
+    def get_edad_gestacional(self, obj):
+        """Edad gestacional actual como 'semanas+días' (ej: '32+4') o None"""
+        edad = obj.get_edad_gestacional()
+        return str(edad) if edad is not None else None
+    
+    def validate_semanas_ecografia(self, value):
+        if value is not None:
+            es_valido, mensaje = validar_semanas_gestacion(value)
+            if not es_valido:
+                raise serializers.ValidationError(mensaje)
+        return value
+    
+    def validate_dias_ecografia(self, value):
+        if value > 6:
+            raise serializers.ValidationError('Los días deben estar entre 0-6')
+        return value
 
 
 ################
@@ -43,8 +73,42 @@ class ControlPrenatalSerializer(serializers.ModelSerializer):
             'fecha_control',
             'semanas_gestacion',
             'peso',
-            'presion',
+            'presion_sistolica',
+            'presion_diastolica',
+            'frecuencia_cardiaca',
+            'glucemia',
+            'observaciones',
+            'realizado_por',
+            'created_at',
+        ]
+        read_only_fields = ['created_at']
+
+
+################
+# Serializer: ControlLoteSerializer
+# Descripción: Un control de un lote (ControlPrenatalViewSet.lote). Solo
+#              revisa tipos y fecha: el paciente y los rangos de las
+#              mediciones se validan para todo el lote a la vez
+#              (ver pacientes.lote_controles)
+################
+class ControlLoteSerializer(ControlPrenatalSerializer):
+    # Sin PrimaryKeyRelatedField: una consulta por item
+    paciente = serializers.IntegerField()
+    
+    class Meta(ControlPrenatalSerializer.Meta):
+        fields = [
+            'paciente',
+            'fecha_control',
+            'semanas_gestacion',
+            'peso',
+            'presion_sistolica',
+            'presion_diastolica',
+            'frecuencia_cardiaca',
+            'glucemia',
             'observaciones',
-            'fecha_registro',
         ]
-        read_only_fields = ['fecha_registro']
\ No newline at end of file
+    
+    def validate_fecha_control(self, value):
+        if value > timezone.localdate():
+            raise serializers.ValidationError('La fecha del control no puede ser futura')
+        return value
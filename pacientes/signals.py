@@ -0,0 +1,83 @@
+################
+# SEÑALES: Pacientes
+# Descripción: Mantiene el contador controles_pendientes (pacientes activos
+#              sin control en la ventana de core.contadores). El paso del
+#              tiempo y los cambios de estado del paciente se corrigen con
+#              reconciliar_contadores.
+#              También recalcula el inicio de gestación de los pacientes que
+#              se datan por su primer control (ver pacientes.gestacion) e
+#              invalida las tendencias en caché (ver pacientes.tendencias).
+################
+
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.contadores import VENTANA_CONTROL_DIAS, ajustar
+from pacientes.gestacion import actualizar_inicio_paciente
+from pacientes.models import ControlPrenatal, Paciente
+from pacientes.tendencias import invalidar_tendencias
+
+
+def _inicio_ventana():
+    return timezone.localdate() - timedelta(days=VENTANA_CONTROL_DIAS)
+
+
+def _tiene_control_reciente(paciente_id, excluir_pk=None):
+    """Una búsqueda por el índice (paciente, -fecha_control)."""
+    controles = ControlPrenatal.objects.filter(paciente_id=paciente_id, fecha_control__gte=_inicio_ventana())
+    if excluir_pk is not None:
+        controles = controles.exclude(pk=excluir_pk)
+    return controles.exists()
+
+
+def _paciente_activo(paciente_id):
+    return Paciente.objects.filter(pk=paciente_id, estado='activo').exists()
+
+
+@receiver(post_save, sender=Paciente)
+def paciente_creado(sender, instance, created, raw=False, **kwargs):
+    # Un paciente nuevo aún no tiene controles
+    if created and not raw and instance.estado == 'activo':
+        ajustar('controles_pendientes', 1)
+
+
+@receiver(post_delete, sender=Paciente)
+def paciente_eliminado(sender, instance, **kwargs):
+    # Sus controles ya se borraron en cascada (y cada uno lo dejó pendiente)
+    if instance.estado == 'activo' and not _tiene_control_reciente(instance.pk):
+        ajustar('controles_pendientes', -1)
+
+
+@receiver(post_save, sender=ControlPrenatal)
+def control_registrado(sender, instance, created, raw=False, **kwargs):
+    if not created or raw or instance.fecha_control < _inicio_ventana():
+        return
+    if _paciente_activo(instance.paciente_id) and not _tiene_control_reciente(instance.paciente_id, instance.pk):
+        ajustar('controles_pendientes', -1)
+
+
+@receiver(post_delete, sender=ControlPrenatal)
+def control_eliminado(sender, instance, **kwargs):
+    if instance.fecha_control < _inicio_ventana():
+        return
+    if _paciente_activo(instance.paciente_id) and not _tiene_control_reciente(instance.paciente_id):
+        ajustar('controles_pendientes', 1)
+
+
+@receiver(post_save, sender=ControlPrenatal)
+@receiver(post_delete, sender=ControlPrenatal)
+def control_datacion(sender, instance, raw=False, **kwargs):
+    if not raw:
+        actualizar_inicio_paciente(instance.paciente_id)
+
+
+@receiver(post_save, sender=ControlPrenatal)
+@receiver(post_delete, sender=ControlPrenatal)
+def control_tendencias(sender, instance, **kwargs):
+    # Ahora y al confirmar: una lectura concurrente podría guardar la versión anterior
+    invalidar_tendencias(instance.paciente_id)
+    transaction.on_commit(lambda: invalidar_tendencias(instance.paciente_id))
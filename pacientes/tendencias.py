@@ -0,0 +1,352 @@
+################
+# TENDENCIAS: Signos vitales a lo largo de los controles prenatales
+# Descripción: Carga los controles en arreglos columnares de NumPy (una sola
+#              consulta) y calcula por paciente, sin recorrer pacientes en
+#              Python: pendiente semanal, media móvil y salidas de rango de
+#              peso, presión, glucemia y frecuencia cardíaca.
+#              Los resultados se guardan en caché; las señales de pacientes
+#              los invalidan al agregar, editar o borrar un control.
+################
+
+import hashlib
+import time
+
+import numpy as np
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+
+from core.cache import obtener_o_calcular
+from core.replicas import en_primaria
+from pacientes.models import ControlPrenatal, Paciente
+from utilidades.validadores import (
+    RANGO_DIASTOLICA,
+    RANGO_GLUCEMIA_NORMAL,
+    RANGO_PESO,
+    RANGO_SISTOLICA,
+)
+
+
+# Variable -> rango (mínimo, máximo) fuera del cual se cuenta una salida de rango
+VARIABLES = {
+    'peso': RANGO_PESO,
+    'presion_sistolica': RANGO_SISTOLICA,
+    'presion_diastolica': RANGO_DIASTOLICA,
+    'glucemia': RANGO_GLUCEMIA_NORMAL,
+    'frecuencia_cardiaca': None,
+}
+
+VENTANA_MEDIA_MOVIL = 3
+# Pacientes por cohorte: sobre esto se piden filtros más acotados
+MAXIMO_COHORTE = 5000
+# Filas de detalle por página en la API de cohortes
+LIMITE_DETALLE_COHORTE = 100
+TIEMPO_CACHE = 60 * 60
+VERSION_CLAVE = 1
+CLAVE_GENERACION = 'tendencias:generacion'
+
+
+# ====================================================================
+# CARGA COLUMNAR
+# ====================================================================
+
+class ControlesColumnares:
+    """
+    Controles de varios pacientes como columnas, ordenados por (paciente, fecha).
+
+    Atributos:
+        pacientes: id de paciente de cada fila (int64)
+        fechas: fecha de cada control (datetime64[D])
+        semanas: semanas de gestación registradas (float64, NaN si falta)
+        valores: dict variable -> float64 (NaN si no se midió)
+        ids: ids de paciente distintos, en orden
+        grupo: índice en `ids` de cada fila
+        inicios: primera fila de cada paciente
+    """
+
+    __slots__ = ('pacientes', 'fechas', 'semanas', 'valores', 'ids', 'grupo', 'inicios')
+
+    def __init__(self, filas):
+        columnas = list(zip(*filas)) if filas else [()] * (3 + len(VARIABLES))
+        self.pacientes = np.array(columnas[0], dtype=np.int64)
+        self.fechas = np.array(columnas[1], dtype='datetime64[D]')
+        self.semanas = _flotantes(columnas[2])
+        self.valores = {
+            variable: _flotantes(columna)
+            for variable, columna in zip(VARIABLES, columnas[3:])
+        }
+        self.ids, self.inicios, self.grupo = np.unique(self.pacientes, return_index=True, return_inverse=True)
+
+    def __len__(self):
+        return len(self.pacientes)
+
+
+def _flotantes(columna):
+    return np.array([np.nan if valor is None else valor for valor in columna], dtype=np.float64)
+
+
+def cargar_controles(pacientes):
+    """
+    Lee los controles de `pacientes` (QuerySet, usado como subconsulta) en una consulta.
+
+    Returns:
+        ControlesColumnares
+    """
+    filas = list(
+        ControlPrenatal.objects
+        .filter(paciente_id__in=pacientes.values('pk'))
+        .order_by('paciente_id', 'fecha_control', 'pk')
+        .values_list('paciente_id', 'fecha_control', 'semanas_gestacion', *VARIABLES)
+    )
+    return ControlesColumnares(filas)
+
+
+def _cargar_de_primaria(pacientes):
+    # Lo que va a la caché compartida no se lee de una réplica atrasada
+    with en_primaria():
+        return cargar_controles(pacientes)
+
+
+# ====================================================================
+# CÁLCULOS VECTORIZADOS (por paciente)
+# ====================================================================
+
+def _semanas_desde_primer_control(datos):
+    """Eje x de las pendientes: semanas transcurridas desde el primer control del paciente."""
+    primera = datos.fechas[datos.inicios][datos.grupo]
+    return (datos.fechas - primera).astype(np.float64) / 7
+
+
+def pendientes(datos, y, x):
+    """
+    Pendiente de mínimos cuadrados de `y` sobre `x` por paciente (unidades por semana).
+    NaN si el paciente tiene menos de dos mediciones en fechas distintas.
+    """
+    medido = ~np.isnan(y)
+    grupos = len(datos.ids)
+    x = np.where(medido, x, 0.0)
+    y = np.where(medido, y, 0.0)
+
+    def suma(pesos):
+        return np.bincount(datos.grupo, weights=pesos, minlength=grupos)
+
+    n, sx, sy = suma(medido.astype(np.float64)), suma(x), suma(y)
+    sxx, sxy = suma(x * x), suma(x * y)
+    denominador = n * sxx - sx * sx
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(denominador > 1e-9, (n * sxy - sx * sy) / denominador, np.nan)
+
+
+def medias_moviles(datos, y, ventana=VENTANA_MEDIA_MOVIL):
+    """
+    Media de las últimas `ventana` filas de cada control (sin cruzar de paciente,
+    ignorando controles donde la variable no se midió).
+    """
+    medido = ~np.isnan(y)
+    acumulado = np.concatenate(([0.0], np.cumsum(np.where(medido, y, 0.0))))
+    cantidad = np.concatenate(([0], np.cumsum(medido)))
+
+    fila = np.arange(len(y))
+    desde = np.maximum(fila + 1 - ventana, datos.inicios[datos.grupo])
+    total = acumulado[fila + 1] - acumulado[desde]
+    medidos = cantidad[fila + 1] - cantidad[desde]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(medidos > 0, total / np.maximum(medidos, 1), np.nan)
+
+
+def salidas_de_rango(datos, y, rango):
+    """
+    Returns:
+        tuple: (fuera, cruces) por paciente: mediciones fuera de `rango` y
+        veces que una medición sale del rango estando la anterior dentro
+    """
+    grupos = len(datos.ids)
+    medidos = np.flatnonzero(~np.isnan(y))
+    fuera = (y[medidos] < rango[0]) | (y[medidos] > rango[1])
+    grupo = datos.grupo[medidos]
+
+    sale = fuera[1:] & ~fuera[:-1] & (grupo[1:] == grupo[:-1])
+    return (
+        np.bincount(grupo[fuera], minlength=grupos),
+        np.bincount(grupo[1:][sale], minlength=grupos),
+    )
+
+
+def ultimos_valores(datos, y):
+    """Última medición de cada paciente (NaN si nunca se midió)."""
+    resultado = np.full(len(datos.ids), np.nan)
+    medidos = np.flatnonzero(~np.isnan(y))
+    # Las filas están ordenadas por fecha: la última asignación de cada grupo gana
+    resultado[datos.grupo[medidos]] = y[medidos]
+    return resultado
+
+
+def calcular_tendencias(datos):
+    """
+    Métricas por paciente y variable.
+
+    Returns:
+        dict: variable -> dict de arreglos alineados con `datos.ids`
+              (pendiente_semanal, ultimo, media_movil, fuera_de_rango, cruces)
+    """
+    x = _semanas_desde_primer_control(datos)
+    ultima_fila = np.r_[datos.inicios[1:], len(datos)] - 1 if len(datos) else np.array([], dtype=np.int64)
+
+    resultado = {}
+    for variable, rango in VARIABLES.items():
+        y = datos.valores[variable]
+        metricas = {
+            'pendiente_semanal': pendientes(datos, y, x),
+            'ultimo': ultimos_valores(datos, y),
+            'media_movil': medias_moviles(datos, y)[ultima_fila],
+        }
+        if rango is not None:
+            metricas['fuera_de_rango'], metricas['cruces'] = salidas_de_rango(datos, y, rango)
+        resultado[variable] = metricas
+    return resultado
+
+
+# ====================================================================
+# RESULTADOS (serializables a JSON)
+# ====================================================================
+
+def _valor(numero, decimales=2):
+    if isinstance(numero, (np.integer, int)):
+        return int(numero)
+    return None if np.isnan(numero) else round(float(numero), decimales)
+
+
+def _lista(arreglo, decimales=2):
+    return [None if np.isnan(valor) else round(float(valor), decimales) for valor in arreglo]
+
+
+def tendencias_paciente(paciente):
+    """
+    Curvas y métricas de un paciente (desde caché si está disponible).
+
+    Returns:
+        dict: {'paciente_id', 'controles', 'serie': {...}, 'variables': {...}}
+    """
+    return obtener_o_calcular(
+        clave_paciente(paciente.pk),
+        lambda: _tendencias_paciente(paciente.pk, _cargar_de_primaria(Paciente.objects.filter(pk=paciente.pk))),
+        TIEMPO_CACHE,
+    )
+
+
+def _tendencias_paciente(paciente_id, datos):
+    metricas = calcular_tendencias(datos)
+    serie = {
+        'fechas': [str(fecha) for fecha in datos.fechas],
+        'semanas_gestacion': _lista(datos.semanas, 0),
+    }
+    for variable in VARIABLES:
+        serie[variable] = _lista(datos.valores[variable])
+        serie[f'{variable}_media_movil'] = _lista(medias_moviles(datos, datos.valores[variable]))
+
+    return {
+        'paciente_id': paciente_id,
+        'controles': len(datos),
+        'serie': serie,
+        'variables': {
+            variable: {nombre: _valor(arreglo[0]) for nombre, arreglo in valores.items()} if len(datos) else {}
+            for variable, valores in metricas.items()
+        },
+    }
+
+
+def tendencias_cohorte(pacientes, maximo=None):
+    """
+    Métricas por paciente de una cohorte y un resumen del servicio.
+    Se guarda en caché por consulta; cualquier cambio en controles invalida
+    todas las cohortes (ver invalidar_tendencias).
+
+    Args:
+        maximo (int): con más pacientes que esto no se calcula (ValueError);
+                      se verifica con un COUNT acotado antes de cargar
+
+    Returns:
+        dict: {'pacientes': int, 'controles': int, 'resumen': {...}, 'detalle': [...]}
+    """
+    clave = clave_cohorte(pacientes)
+    if clave is None:
+        return _tendencias_cohorte(cargar_controles(pacientes))
+
+    def calcular():
+        if maximo is not None and pacientes.order_by()[:maximo + 1].count() > maximo:
+            raise ValueError(f'La cohorte supera {maximo} pacientes; use filtros más acotados')
+        return _tendencias_cohorte(_cargar_de_primaria(pacientes))
+
+    return obtener_o_calcular(clave, calcular, TIEMPO_CACHE)
+
+
+def _tendencias_cohorte(datos):
+    metricas = calcular_tendencias(datos)
+    controles_por_paciente = np.bincount(datos.grupo, minlength=len(datos.ids))
+
+    resumen = {}
+    for variable, valores in metricas.items():
+        pendiente = valores['pendiente_semanal']
+        con_pendiente = pendiente[~np.isnan(pendiente)]
+        resumen[variable] = {
+            'pacientes_con_tendencia': int(len(con_pendiente)),
+            'pendiente_mediana': _valor(np.median(con_pendiente)) if len(con_pendiente) else None,
+            'pendiente_p90': _valor(np.percentile(con_pendiente, 90)) if len(con_pendiente) else None,
+        }
+        if 'cruces' in valores:
+            resumen[variable]['pacientes_con_cruces'] = int(np.count_nonzero(valores['cruces']))
+
+    columnas = {
+        variable: {nombre: arreglo.tolist() for nombre, arreglo in valores.items()}
+        for variable, valores in metricas.items()
+    }
+    detalle = [
+        {
+            'paciente_id': int(paciente_id),
+            'controles': int(controles_por_paciente[i]),
+            'variables': {
+                variable: {nombre: _valor(columna[i]) for nombre, columna in valores.items()}
+                for variable, valores in columnas.items()
+            },
+        }
+        for i, paciente_id in enumerate(datos.ids)
+    ]
+
+    return {
+        'pacientes': len(datos.ids),
+        'controles': len(datos),
+        'resumen': resumen,
+        'detalle': detalle,
+    }
+
+
+# ====================================================================
+# CACHÉ
+# ====================================================================
+
+def clave_paciente(paciente_id):
+    return f'tendencias:paciente:{paciente_id}:v{VERSION_CLAVE}'
+
+
+def clave_cohorte(pacientes):
+    """Clave por texto SQL de la cohorte + generación (None si la consulta es vacía)."""
+    try:
+        sql = str(pacientes.values('pk').query)
+    except EmptyResultSet:
+        return None
+    generacion = cache.get_or_set(CLAVE_GENERACION, _nueva_generacion, None)
+    resumen = hashlib.md5(sql.encode()).hexdigest()
+    return f'tendencias:cohorte:{resumen}:g{generacion}:v{VERSION_CLAVE}'
+
+
+def invalidar_tendencias(paciente_id):
+    """Borra las tendencias del paciente y deja obsoletas las de todas las cohortes."""
+    cache.delete(clave_paciente(paciente_id))
+    try:
+        cache.incr(CLAVE_GENERACION)
+    except ValueError:
+        cache.set(CLAVE_GENERACION, _nueva_generacion(), None)
+
+
+def _nueva_generacion():
+    # Si la caché perdió el contador no se puede volver a un número ya usado
+    return int(time.time() * 1000)
@@ -1,3 +1,563 @@
-from django.test import TestCase
+import contextlib
+import datetime
+import json
+import threading
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import close_old_connections, connection, transaction
+from django.test import AsyncClient, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.contadores import leer_contadores, reconciliar
+from core.models import Persona, RegistroAuditoria
+from pacientes import fichas
+from pacientes.fichas import AsignadorFichas, formatear_ficha
+from pacientes.gestacion import calcular_inicios, inicio_por_anclas, recalcular_inicios
+from pacientes.models import ControlPrenatal, Paciente, SecuenciaFicha
+from pacientes.tendencias import tendencias_cohorte, tendencias_paciente
+from registros.models import Alerta
+from utilidades.validadores import (
+    validar_glucemia, validar_mediciones, validar_peso, validar_presion, validar_semanas_gestacion,
+)
+
+
+def crear_paciente(usuario, indice, **extra):
+    persona = Persona.objects.create(
+        rut=f'{10000000 + indice}-0', nombre='María', apellido=f'Prueba {indice}', edad=30,
+        direccion='Los Aromos 123', contacto='+56912345678', created_by=usuario
+    )
+    return Paciente.objects.create(
+        persona=persona, edad=30, estado_civil='casada', prevision='fonasa',
+        created_by=usuario, **extra
+    )
+
+
+################
+# Tests: Número de ficha
+# Descripción: Generación automática en Paciente.save y reserva por bloques
+################
+class NumeroFichaTests(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_user(username='admision', password='clave-segura-123')
+        self.anio = timezone.localdate().year
+
+    def test_paciente_sin_ficha_recibe_numero(self):
+        paciente = crear_paciente(self.usuario, 1)
+        self.assertEqual(paciente.numero_ficha, formatear_ficha(self.anio, 1))
+
+    def test_ficha_indicada_no_se_reemplaza(self):
+        paciente = crear_paciente(self.usuario, 1, numero_ficha='FAM-2020-00007')
+        self.assertEqual(paciente.numero_ficha, 'FAM-2020-00007')
+
+    def test_continua_despues_de_fichas_existentes(self):
+        crear_paciente(self.usuario, 1, numero_ficha=formatear_ficha(self.anio, 41))
+        paciente = crear_paciente(self.usuario, 2)
+        self.assertEqual(paciente.numero_ficha, formatear_ficha(self.anio, 42))
+
+    def test_ultimo_existente_es_numerico_e_ignora_mal_formados(self):
+        # Como texto 'FAM-AAAA-9X' y 'FAM-AAAA-9' serían mayores que 'FAM-AAAA-00041'
+        for indice, ficha in enumerate(['00041', '9X', '9', '00012'], start=1):
+            crear_paciente(self.usuario, indice, numero_ficha=f'FAM-{self.anio}-{ficha}')
+        paciente = crear_paciente(self.usuario, 5)
+        self.assertEqual(paciente.numero_ficha, formatear_ficha(self.anio, 42))
+
+    def test_en_transaccion_sqlite_no_guarda_resto_del_bloque(self):
+        # En SQLite la reserva se revierte con el llamador: solo se reserva lo pedido
+        if connection.vendor != 'sqlite':
+            self.skipTest('Solo aplica a SQLite')
+        asignador = AsignadorFichas(tamano_bloque=50)
+        asignador.siguientes(3, self.anio)
+        self.assertEqual(SecuenciaFicha.objects.get(anio=self.anio).ultimo, 3)
+        self.assertEqual(asignador._bloques, {})
+
+
+################
+# Tests: Asignación hi/lo
+# Descripción: Una consulta por bloque y sin números repetidos entre procesos
+################
+class AsignadorFichasTests(TransactionTestCase):
+
+    PROCESOS = 8
+    PACIENTES_POR_PROCESO = 25
+
+    def setUp(self):
+        self.usuario = User.objects.create_user(username='admision', password='clave-segura-123')
+        self.anio = timezone.localdate().year
+
+    def test_reserva_una_vez_por_bloque(self):
+        asignador = AsignadorFichas(tamano_bloque=10)
+        with mock.patch.object(fichas, 'reservar_bloque', wraps=fichas.reservar_bloque) as reservar:
+            numeros = [asignador.siguiente(self.anio) for _ in range(25)]
+        self.assertEqual(reservar.call_count, 3)
+        self.assertEqual(numeros, [formatear_ficha(self.anio, n) for n in range(1, 26)])
+        self.assertEqual(SecuenciaFicha.objects.get(anio=self.anio).ultimo, 30)
+
+    def test_procesos_no_comparten_numeros(self):
+        procesos = [AsignadorFichas(tamano_bloque=10) for _ in range(3)]
+        numeros = []
+        for _ in range(12):
+            for asignador in procesos:
+                numeros.append(asignador.siguiente(self.anio))
+        self.assertEqual(len(set(numeros)), len(numeros))
+
+    def test_creacion_concurrente_sin_colisiones(self):
+        """Varios "procesos" (hilos con su propio asignador) crean pacientes a la vez."""
+        errores = []
+        barrera = threading.Barrier(self.PROCESOS)
+        # SQLite admite un solo escritor: ahí las transacciones se turnan
+        # (igual se intercalan los asignadores); MySQL las corre en paralelo
+        if connection.features.test_db_allows_multiple_connections:
+            turno = contextlib.nullcontext()
+        else:
+            turno = threading.Lock()
+
+        def crear(proceso):
+            asignador = AsignadorFichas(tamano_bloque=7)
+            try:
+                barrera.wait()
+                for i in range(self.PACIENTES_POR_PROCESO):
+                    with turno, transaction.atomic():
+                        ficha = asignador.siguiente()
+                        crear_paciente(self.usuario, proceso * 1000 + i, numero_ficha=ficha)
+            except Exception as error:
+                errores.append(error)
+            finally:
+                close_old_connections()
+
+        hilos = [threading.Thread(target=crear, args=(proceso,)) for proceso in range(self.PROCESOS)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(errores, [])
+        fichas_creadas = list(Paciente.objects.values_list('numero_ficha', flat=True))
+        self.assertEqual(len(fichas_creadas), self.PROCESOS * self.PACIENTES_POR_PROCESO)
+        self.assertEqual(len(set(fichas_creadas)), len(fichas_creadas))
+
+
+################
+# Tests: Edad gestacional
+# Descripción: Anclas de datación, cálculo por cohorte y consultas por semana
+################
+class EdadGestacionalTests(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_user(username='matrona', password='clave-segura-123')
+        self.hoy = timezone.localdate()
+
+    def hace(self, semanas, dias=0):
+        return self.hoy - datetime.timedelta(weeks=semanas, days=dias)
+
+    def test_fur(self):
+        paciente = crear_paciente(self.usuario, 1, fecha_ultima_regla=self.hace(32, 4))
+        edad = paciente.get_edad_gestacional()
+        self.assertEqual((edad.semanas, edad.dias, edad.trimestre), (32, 4, 3))
+        self.assertEqual(str(edad), '32+4')
+
+    def test_ecografia_tiene_prioridad_sobre_fur(self):
+        paciente = crear_paciente(
+            self.usuario, 1, fecha_ultima_regla=self.hace(20),
+            fecha_ecografia=self.hace(2), semanas_ecografia=12, dias_ecografia=3
+        )
+        self.assertEqual(str(paciente.get_edad_gestacional()), '14+3')
+
+    def test_sin_datacion(self):
+        self.assertIsNone(crear_paciente(self.usuario, 1).get_edad_gestacional())
+
+    def test_primer_control_data_al_paciente(self):
+        paciente = crear_paciente(self.usuario, 1)
+        ControlPrenatal.objects.create(
+            paciente=paciente, fecha_control=self.hace(10), semanas_gestacion=8, created_by=self.usuario
+        )
+        paciente.refresh_from_db()
+        self.assertEqual(paciente.get_edad_gestacional().semanas, 18)
+
+        # Controles siguientes sin semanas se completan desde la datación
+        control = ControlPrenatal.objects.create(
+            paciente=paciente, fecha_control=self.hace(2), created_by=self.usuario
+        )
+        self.assertEqual(control.semanas_gestacion, 16)
+
+    def test_calculo_vectorizado_coincide_con_el_individual(self):
+        casos = [
+            (None, None, None, 0, None, None),
+            (self.hace(10), None, None, 0, None, None),
+            (self.hace(10), self.hace(1), 8, 2, None, None),
+            (None, self.hace(1), None, 0, self.hace(3), 12),
+            (None, None, None, 0, self.hace(3), 12),
+        ]
+        vectorizado = calcular_inicios(*zip(*casos))
+        for caso, inicio in zip(casos, vectorizado):
+            esperado = inicio_por_anclas(*caso)
+            self.assertEqual(None if np.isnat(inicio) else inicio.item(), esperado)
+
+    def test_recalcular_cohorte(self):
+        for i in range(5):
+            crear_paciente(self.usuario, i, fecha_ultima_regla=self.hace(10 + i))
+        sin_datacion = crear_paciente(self.usuario, 99)
+        Paciente.objects.update(fecha_inicio_gestacion=None)
+
+        # Por bloque: pacientes, primeros controles y un UPDATE
+        with self.assertNumQueries(3):
+            self.assertEqual(recalcular_inicios(), 5)
+        self.assertEqual(Paciente.objects.filter(fecha_inicio_gestacion__isnull=True).get(), sin_datacion)
+        self.assertEqual(recalcular_inicios(tamano_bloque=2), 0)
+
+    def test_filtra_y_anota_por_semana_en_la_base(self):
+        for i, semanas in enumerate([8, 20, 36, 38, 50]):
+            crear_paciente(self.usuario, i, fecha_ultima_regla=self.hace(semanas, 3))
+
+        pacientes = Paciente.objects.gestando().en_semanas(36, 38).con_edad_gestacional()
+        self.assertEqual(
+            list(pacientes.order_by('fecha_inicio_gestacion').values_list('semanas_gestacion_actual', 'dias_gestacion')),
+            [(38, 38 * 7 + 3), (36, 36 * 7 + 3)]
+        )
+        self.assertEqual(Paciente.objects.gestando().count(), 4)
+
+    def test_api_en_gestacion(self):
+        for i, semanas in enumerate([12, 37, 39]):
+            crear_paciente(self.usuario, i, fecha_ultima_regla=self.hace(semanas))
+        cliente = APIClient()
+        cliente.force_authenticate(self.usuario)
+
+        respuesta = cliente.get(reverse('paciente-en-gestacion'), {'semana_min': 37})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual([fila['edad_gestacional'] for fila in respuesta.data['results']], ['39+0', '37+0'])
+        self.assertEqual(cliente.get(reverse('paciente-en-gestacion'), {'semana_min': 'x'}).status_code, 400)
+
+
+################
+# Tests: Tendencias de signos vitales
+# Descripción: Métricas por paciente en una consulta y caché invalidada por controles
+################
+class TendenciasTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.usuario = User.objects.create_user(username='matrona', password='clave-segura-123')
+        self.inicio = datetime.date(2025, 3, 3)
+        self.ana = crear_paciente(self.usuario, 1)
+        self.berta = crear_paciente(self.usuario, 2)
+        # Ana: +0,5 kg/semana; la glucemia sale del rango normal en el tercer control
+        for semana, peso, glucemia in [(0, 60, 90), (2, 61, 100), (4, 62, 160), (6, 63, 95)]:
+            self.control(self.ana, semana, peso=peso, glucemia=glucemia, presion_sistolica=110)
+        # Berta: un solo control, sin pendiente
+        self.control(self.berta, 0, peso=70)
+
+    def control(self, paciente, semana, **valores):
+        return ControlPrenatal.objects.create(
+            paciente=paciente, fecha_control=self.inicio + datetime.timedelta(weeks=semana),
+            created_by=self.usuario, **valores
+        )
+
+    def test_metricas_por_paciente(self):
+        resultado = tendencias_paciente(self.ana)
+        peso, glucemia = resultado['variables']['peso'], resultado['variables']['glucemia']
+
+        self.assertEqual(resultado['controles'], 4)
+        self.assertEqual(peso['pendiente_semanal'], 0.5)
+        self.assertEqual(peso['ultimo'], 63)
+        self.assertEqual(peso['media_movil'], 62)
+        self.assertEqual((glucemia['fuera_de_rango'], glucemia['cruces']), (1, 1))
+        self.assertEqual(resultado['serie']['peso_media_movil'], [60, 60.5, 61, 62])
+        self.assertEqual(resultado['serie']['presion_diastolica'], [None] * 4)
+        self.assertIsNone(resultado['variables']['presion_diastolica']['pendiente_semanal'])
+
+    def test_cohorte_en_una_consulta(self):
+        with self.assertNumQueries(1):
+            resultado = tendencias_cohorte(Paciente.objects.all())
+
+        self.assertEqual((resultado['pacientes'], resultado['controles']), (2, 5))
+        por_paciente = {fila['paciente_id']: fila for fila in resultado['detalle']}
+        self.assertEqual(por_paciente[self.ana.pk]['variables']['peso']['pendiente_semanal'], 0.5)
+        self.assertIsNone(por_paciente[self.berta.pk]['variables']['peso']['pendiente_semanal'])
+        self.assertEqual(resultado['resumen']['glucemia']['pacientes_con_cruces'], 1)
+
+    def test_cache_se_invalida_al_agregar_control(self):
+        tendencias_paciente(self.ana)
+        tendencias_cohorte(Paciente.objects.all())
+        with self.assertNumQueries(0):
+            tendencias_paciente(self.ana)
+            tendencias_cohorte(Paciente.objects.all())
+
+        self.control(self.ana, 8, peso=64)
+        self.assertEqual(tendencias_paciente(self.ana)['controles'], 5)
+        self.assertEqual(tendencias_cohorte(Paciente.objects.all())['controles'], 6)
+
+    def test_api(self):
+        cliente = APIClient()
+        cliente.force_authenticate(self.usuario)
+
+        respuesta = cliente.get(reverse('paciente-tendencias', args=[self.ana.pk]))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.data['variables']['peso']['pendiente_semanal'], 0.5)
+
+        respuesta = cliente.get(reverse('paciente-tendencias-cohorte'), {'estado': 'activo'})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.data['pacientes'], 2)
+
+    def test_api_cohorte_acotada(self):
+        cliente = APIClient()
+        cliente.force_authenticate(self.usuario)
+        url = reverse('paciente-tendencias-cohorte')
+
+        # Sin filtros no se carga todo el registro
+        with transaction.atomic():
+            self.assertEqual(cliente.get(url).status_code, 400)
+
+        # El detalle por paciente viene por páginas
+        respuesta = cliente.get(url, {'estado': 'activo', 'limite': 1})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual((respuesta.data['pacientes'], len(respuesta.data['detalle'])), (2, 1))
+        self.assertEqual(respuesta.data['detalle_siguiente'], 1)
+        respuesta = cliente.get(url, {'estado': 'activo', 'limite': 1, 'desde': 1})
+        self.assertEqual(len(respuesta.data['detalle']), 1)
+        self.assertIsNone(respuesta.data['detalle_siguiente'])
+
+        # Una cohorte sobre el máximo se rechaza antes de cargar sus controles
+        cache.clear()
+        with mock.patch('pacientes.views.MAXIMO_COHORTE', 1), transaction.atomic():
+            respuesta = cliente.get(url, {'estado': 'activo'})
+        self.assertEqual(respuesta.status_code, 400)
+
+
+################
+# Tests: Consultas async
+# Descripción: Identificación por RUT/ficha y línea de tiempo con el ORM async,
+#              por WSGI (Client) y por ASGI (AsyncClient)
+################
+class ConsultasAsyncTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user(username='matrona', password='clave-segura-123')
+        cls.paciente = crear_paciente(cls.usuario, 1)
+        Persona.objects.filter(pk=cls.paciente.persona_id).update(rut='123456785')
+        Persona.objects.get(pk=cls.paciente.persona_id).save()
+        cls.sin_ficha = Persona.objects.create(
+            rut='11.111.111-1', nombre='Rosa', apellido='Sin Ficha', edad=40,
+            contacto='+56911111111', created_by=cls.usuario
+        )
+        for dia in range(3):
+            ControlPrenatal.objects.create(
+                paciente=cls.paciente, fecha_control=datetime.date(2025, 5, 1 + dia), created_by=cls.usuario
+            )
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def test_identifica_por_rut_y_por_ficha(self):
+        url = reverse('consulta-identificacion')
+
+        por_rut = self.client.get(url, {'rut': '12.345.678-5'}).json()
+        por_ficha = self.client.get(url, {'ficha': self.paciente.numero_ficha}).json()
+
+        self.assertEqual(por_rut['paciente']['id'], self.paciente.pk)
+        self.assertEqual(por_ficha, por_rut)
+        self.assertEqual(por_ficha['persona']['rut'], '123456785')
+
+    def test_persona_sin_ficha_y_errores(self):
+        url = reverse('consulta-identificacion')
+
+        respuesta = self.client.get(url, {'rut': '11111111-1'}).json()
+        self.assertEqual(respuesta['persona']['id'], self.sin_ficha.pk)
+        self.assertIsNone(respuesta['paciente'])
+        self.assertEqual(self.client.get(url, {'rut': '12.345.678-9'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'ficha': 'no-existe'}).status_code, 404)
+        self.assertEqual(self.client.get(url).status_code, 400)
+
+    def test_requiere_sesion(self):
+        self.client.logout()
+        respuesta = self.client.get(reverse('consulta-identificacion'), {'ficha': 'x'})
+        self.assertEqual(respuesta.status_code, 403)
+
+    def test_linea_tiempo_igual_a_la_de_drf(self):
+        drf = APIClient()
+        drf.force_authenticate(self.usuario)
+        esperada = drf.get(reverse('paciente-linea-tiempo', args=[self.paciente.pk]), {'limite': 2}).json()
+
+        respuesta = self.client.get(reverse('consulta-linea-tiempo', args=[self.paciente.pk]), {'limite': 2})
+
+        self.assertEqual(respuesta.json()['resultados'], esperada['resultados'])
+        self.assertIn('cursor=', respuesta.json()['siguiente'])
+        self.assertEqual(
+            self.client.get(reverse('consulta-linea-tiempo', args=[0])).status_code, 404
+        )
+
+    async def test_por_asgi(self):
+        cliente = AsyncClient()
+        await cliente.aforce_login(self.usuario)
+
+        linea = await cliente.get(reverse('consulta-linea-tiempo', args=[self.paciente.pk]))
+        identificacion = await cliente.get(reverse('consulta-identificacion'), {'rut': '123456785'})
+        estadisticas = await cliente.get(reverse('core:estadisticas_dashboard'))
+
+        self.assertEqual(len(linea.json()['resultados']), 3)
+        self.assertEqual(identificacion.json()['paciente']['numero_ficha'], self.paciente.numero_ficha)
+        self.assertIn('pacientes_activos', estadisticas.json()['estadisticas'])
+
+
+################
+# Tests: Exportación de cohorte
+# Descripción: Permiso ver_ficha y filtros de fecha validados
+################
+class ExportacionCohorteTests(TestCase):
+
+    def setUp(self):
+        from personal.models import Perfil
+
+        self.matrona = User.objects.create_user(username='matrona', password='clave-segura-123')
+        Perfil.objects.update_or_create(usuario=self.matrona, defaults={'rol': 'matrona'})
+        self.tens = User.objects.create_user(username='tens', password='clave-segura-123')
+        Perfil.objects.update_or_create(usuario=self.tens, defaults={'rol': 'tens'})
+        self.paciente = crear_paciente(self.matrona, 1)
+        crear_paciente(self.matrona, 2, estado='inactivo')
+        self.cliente = APIClient()
+
+    def exportar(self, usuario, **filtros):
+        self.cliente.force_authenticate(usuario)
+        return self.cliente.get(reverse('paciente-exportar-cohorte'), filtros)
+
+    def test_exporta_cohorte_filtrada(self):
+        hoy = timezone.localdate().isoformat()
+        respuesta = self.exportar(self.matrona, estado='activo', creado_desde=hoy, creado_hasta=hoy)
+        self.assertEqual(respuesta.status_code, 200)
+        registros = [json.loads(linea) for linea in b''.join(respuesta.streaming_content).decode().splitlines()]
+        self.assertEqual(len([registro for registro in registros if registro['tabla'] == 'paciente']), 1)
+
+    def test_fecha_mal_formada_es_400(self):
+        for valor in ('ayer', '2025-02-30', '2025-13-01'):
+            respuesta = self.exportar(self.matrona, creado_desde=valor)
+            self.assertEqual(respuesta.status_code, 400, valor)
+            self.assertIn('creado_desde', respuesta.data['error'])
+
+    def test_requiere_permiso_ver_ficha(self):
+        self.assertEqual(self.exportar(self.tens).status_code, 403)
+
+    def test_ficha_individual_requiere_permiso_ver_ficha(self):
+        url = reverse('paciente-exportar', args=[self.paciente.pk])
+        self.cliente.force_authenticate(self.tens)
+        with transaction.atomic():
+            self.assertEqual(self.cliente.get(url).status_code, 403)
+
+        self.cliente.force_authenticate(self.matrona)
+        respuesta = self.cliente.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        registros = [json.loads(linea) for linea in b''.join(respuesta.streaming_content).decode().splitlines()]
+        self.assertEqual([registro['tabla'] for registro in registros if registro['tabla'] == 'paciente'], ['paciente'])
+
+
+################
+# Tests: Lote de controles
+# Descripción: Ronda de sala con ControlPrenatalViewSet.lote: validación del
+#              lote completo, un solo INSERT y los mismos efectos que save()
+################
+class LoteControlesTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.usuario = User.objects.create_user(username='matrona', password='clave-segura-123')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ana = crear_paciente(self.usuario, 1)
+            self.berta = crear_paciente(self.usuario, 2)
+        self.hoy = timezone.localdate().isoformat()
+        self.cliente = APIClient()
+        self.cliente.force_authenticate(self.usuario)
+
+    def enviar(self, items):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.cliente.post(reverse('control-prenatal-lote'), items, format='json')
+
+    def test_un_insert_con_los_efectos_de_save(self):
+        items = [
+            {'paciente': self.ana.pk, 'fecha_control': self.hoy, 'peso': 65,
+             'presion_sistolica': 150, 'presion_diastolica': 95},
+            {'paciente': self.berta.pk, 'fecha_control': self.hoy, 'glucemia': 90},
+        ]
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.enviar(items)
+
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertEqual(respuesta.data['registrados'], 2)
+        ids = [resultado['id'] for resultado in respuesta.data['resultados']]
+        inserciones = [
+            c for c in consultas.captured_queries if 'INSERT INTO "pacientes_controlprenatal"' in c['sql']
+        ]
+        self.assertEqual(len(inserciones), 1)
+        self.assertEqual(ControlPrenatal.objects.get(pk=ids[0]).realizado_por, self.usuario)
+        self.assertEqual(list(Alerta.objects.values_list('control_id', 'regla')), [(ids[0], 'hipertension')])
+        self.assertEqual(
+            RegistroAuditoria.objects.filter(modelo='pacientes.ControlPrenatal', objeto_id__in=ids).count(), 2
+        )
+
+        # Contadores exactos, como si cada control se hubiera guardado con save()
+        self.assertEqual(reconciliar(), [])
+        contadores = leer_contadores()
+        self.assertEqual(
+            (contadores['controles_hoy'], contadores['controles_pendientes'], contadores['alertas_activas']),
+            (2, 0, 1)
+        )
+
+    def test_errores_por_item(self):
+        items = [
+            {'paciente': self.ana.pk, 'fecha_control': self.hoy, 'presion_sistolica': 120, 'presion_diastolica': 80},
+            {'paciente': self.ana.pk, 'fecha_control': self.hoy, 'peso': 250,
+             'presion_sistolica': 90, 'presion_diastolica': 95},
+            {'paciente': 0, 'fecha_control': self.hoy},
+            {'paciente': self.berta.pk, 'fecha_control': '2999-01-01'},
+            {'paciente': self.berta.pk, 'peso': 'x'},
+        ]
+        respuesta = self.enviar(items)
+
+        self.assertEqual(respuesta.status_code, 207)
+        self.assertEqual((respuesta.data['registrados'], respuesta.data['rechazados']), (1, 4))
+        resultados = respuesta.data['resultados']
+        self.assertIn('id', resultados[0])
+        self.assertEqual(resultados[1]['errores'], {
+            'peso': ['Peso debe estar entre 30-200 kg'],
+            'presion_diastolica': ['Presión diastólica debe ser menor que sistólica'],
+        })
+        self.assertEqual(resultados[2]['errores'], {'paciente': ['Paciente no encontrado']})
+        self.assertEqual(resultados[3]['errores'], {'fecha_control': ['La fecha del control no puede ser futura']})
+        self.assertEqual(set(resultados[4]['errores']), {'fecha_control', 'peso'})
+        self.assertEqual(ControlPrenatal.objects.count(), 1)
+
+        self.assertEqual(self.enviar(items[1:]).status_code, 400)
+        self.assertEqual(self.enviar([]).status_code, 400)
+        self.assertEqual(self.enviar({'paciente': self.ana.pk}).status_code, 400)
+
+    def test_validacion_vectorizada_coincide_con_la_individual(self):
+        rng = np.random.default_rng(7)
+        n = 500
+        peso = rng.uniform(20, 210, n).round(1).tolist()
+        sistolica = rng.integers(40, 240, n).tolist()
+        diastolica = rng.integers(20, 160, n).tolist()
+        glucemia = rng.uniform(-10, 520, n).round(1).tolist()
+        semanas = rng.integers(-1, 45, n).tolist()
+
+        errores = validar_mediciones(peso, sistolica, diastolica, glucemia, semanas)
+
+        for i in range(n):
+            individuales = {
+                'peso': validar_peso(peso[i]),
+                'presion': validar_presion(sistolica[i], diastolica[i]),
+                'glucemia': validar_glucemia(glucemia[i])[:2],
+                'semanas_gestacion': validar_semanas_gestacion(semanas[i]),
+            }
+            vectorizados = {
+                'peso': errores['peso'][i],
+                'presion': errores['presion_sistolica'][i] or errores['presion_diastolica'][i],
+                'glucemia': errores['glucemia'][i],
+                'semanas_gestacion': errores['semanas_gestacion'][i],
+            }
+            for campo, (es_valido, mensaje) in individuales.items():
+                self.assertEqual(vectorizados[campo], '' if es_valido else mensaje, (campo, i))
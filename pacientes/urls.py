@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import PacienteViewSet, ControlPrenatalViewSet
+from .views import PacienteViewSet, ControlPrenatalViewSet, consulta_identificacion, consulta_linea_tiempo
 
 ################
 # Router: pacientes
@@ -11,5 +11,8 @@ router.register(r'pacientes', PacienteViewSet, basename='paciente')
 router.register(r'controles', ControlPrenatalViewSet, basename='control-prenatal')
 
 urlpatterns = [
+    # Consultas async de solo lectura (ver pacientes.views)
+    path('consulta/identificar/', consulta_identificacion, name='consulta-identificacion'),
+    path('consulta/pacientes/<int:pk>/linea_tiempo/', consulta_linea_tiempo, name='consulta-linea-tiempo'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
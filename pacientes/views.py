@@ -1,35 +1,252 @@
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from .models import Paciente, ControlPrenatal
 from .serializers import PacienteSerializer, ControlPrenatalSerializer
+from .exportacion import FORMATOS, registros_historial
+from .lote_controles import LIMITE_LOTE, registrar_lote
+from .tendencias import LIMITE_DETALLE_COHORTE, MAXIMO_COHORTE, tendencias_cohorte, tendencias_paciente
+from authentication.decoradores import api_autenticada
+from core.models import Persona
+from core.replicas import solo_lectura
+from core.serializers import PersonaSerializer
+from registros.linea_tiempo import LIMITE_POR_DEFECTO, alinea_tiempo_paciente, linea_tiempo_paciente
+from utilidades.validadores import descomponer_rut
 
 ################
 # ViewSet: PacienteViewSet
 # Descripción: API para gestionar Pacientes
 ################
 class PacienteViewSet(viewsets.ModelViewSet):
-    queryset = Paciente.objects.all()
+    queryset = Paciente.objects.select_related('persona')
     serializer_class = PacienteSerializer
     permission_classes = [IsAuthenticated]
     search_fields = ['numero_ficha', 'persona__rut', 'persona__nombre']
-    ordering_fields = ['fecha_creacion']
+    ordering_fields = ['created_at']
+    orden_keyset = '-created_at'
     
     ################
     # Acción: historial_completo
     # Descripción: Obtiene el historial completo del paciente
     ################
     @action(detail=True, methods=['get'])
+    @solo_lectura
     def historial_completo(self, request, pk=None):
         paciente = self.get_object()
-        controles = paciente.controles.all()
+        controles = paciente.controles_prenatales.all()
         
         data = {
             'paciente': PacienteSerializer(paciente).data,
             'controles': ControlPrenatalSerializer(controles, many=True).data,
         }
         return Response(data)
+    
+    ################
+    # Acción: linea_tiempo
+    # Descripción: Historial clínico unificado, ordenado por fecha (paginado por cursor)
+    # Uso: GET /pacientes/<id>/linea_tiempo/?limite=50&cursor=...
+    ################
+    @action(detail=True, methods=['get'])
+    @solo_lectura
+    def linea_tiempo(self, request, pk=None):
+        paciente = self.get_object()
+        
+        try:
+            limite = int(request.query_params.get('limite', LIMITE_POR_DEFECTO))
+        except ValueError:
+            return Response(
+                {'error': 'El parámetro limite debe ser un número'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            entradas, siguiente = linea_tiempo_paciente(
+                paciente.pk,
+                cursor=request.query_params.get('cursor'),
+                limite=limite
+            )
+        except ValueError as error:
+            return Response({'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        siguiente_url = None
+        if siguiente:
+            parametros = request.query_params.copy()
+            parametros['cursor'] = siguiente
+            siguiente_url = request.build_absolute_uri(f'{request.path}?{parametros.urlencode()}')
+        
+        return Response({
+            'resultados': entradas,
+            'siguiente': siguiente_url,
+        })
+    
+    ################
+    # Acción: tendencias
+    # Descripción: Curvas de peso, presión, glucemia y frecuencia cardíaca del
+    #              paciente con pendiente semanal, media móvil y salidas de rango
+    ################
+    @action(detail=True, methods=['get'])
+    @solo_lectura
+    def tendencias(self, request, pk=None):
+        return Response(tendencias_paciente(self.get_object()))
+    
+    ################
+    # Acción: tendencias_cohorte
+    # Descripción: Las mismas métricas por paciente para una cohorte, con resumen
+    # Filtros: estado, prevision, search (al menos uno; hasta MAXIMO_COHORTE pacientes)
+    # Detalle por paciente paginado: desde, limite (máx LIMITE_DETALLE_COHORTE)
+    ################
+    @action(detail=False, methods=['get'])
+    @solo_lectura
+    def tendencias_cohorte(self, request):
+        params = request.query_params
+        if not any(params.get(parametro) for parametro in ('estado', 'prevision', 'search')):
+            return Response(
+                {'error': 'Indique al menos un filtro: estado, prevision o search'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            desde = max(int(params.get('desde', 0)), 0)
+            limite = min(max(int(params.get('limite', LIMITE_DETALLE_COHORTE)), 1), LIMITE_DETALLE_COHORTE)
+        except ValueError:
+            return Response(
+                {'error': 'Los parámetros desde y limite deben ser números'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        pacientes = self.filter_queryset(self.get_queryset())
+        for parametro in ('estado', 'prevision'):
+            valor = params.get(parametro)
+            if valor:
+                pacientes = pacientes.filter(**{parametro: valor})
+        try:
+            resultado = tendencias_cohorte(pacientes, maximo=MAXIMO_COHORTE)
+        except ValueError as error:
+            return Response({'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        detalle = resultado['detalle']
+        return Response({
+            **resultado,
+            'detalle': detalle[desde:desde + limite],
+            'detalle_siguiente': desde + limite if desde + limite < len(detalle) else None,
+        })
+    
+    ################
+    # Acción: en_gestacion
+    # Descripción: Lista de sala de embarazos en curso, de mayor a menor edad gestacional
+    # Filtros: semana_min, semana_max (semana gestacional actual, inclusive)
+    # Uso: GET /pacientes/en_gestacion/?semana_min=37
+    ################
+    @action(detail=False, methods=['get'])
+    @solo_lectura
+    def en_gestacion(self, request):
+        semanas = {}
+        for parametro in ('semana_min', 'semana_max'):
+            valor = request.query_params.get(parametro)
+            if valor:
+                try:
+                    semanas[parametro] = int(valor)
+                except ValueError:
+                    return Response(
+                        {'error': f'El parámetro {parametro} debe ser un número'},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+        
+        pacientes = (
+            self.filter_queryset(self.get_queryset())
+            .gestando()
+            .en_semanas(semanas.get('semana_min'), semanas.get('semana_max'))
+            .con_edad_gestacional()
+        )
+        # Inicio más antiguo primero = más semanas; recorre el índice de fecha_inicio_gestacion
+        self.orden_keyset = 'fecha_inicio_gestacion'
+        pagina = self.paginate_queryset(pacientes)
+        return self.get_paginated_response(self.get_serializer(pagina, many=True).data)
+    
+    ################
+    # Acción: exportar
+    # Descripción: Exporta en streaming la ficha completa (todas las tablas clínicas)
+    # Uso: GET /pacientes/<id>/exportar/?formato=ndjson|csv
+    # Permiso: ver_ficha (o staff)
+    ################
+    @action(detail=True, methods=['get'])
+    @solo_lectura
+    def exportar(self, request, pk=None):
+        denegado = self._verificar_ver_ficha(request)
+        if denegado is not None:
+            return denegado
+        
+        paciente = self.get_object()
+        return self._respuesta_exportacion(
+            Paciente.objects.filter(pk=paciente.pk),
+            f'ficha_{paciente.numero_ficha}'
+        )
+    
+    ################
+    # Acción: exportar_cohorte
+    # Descripción: Exporta en streaming las fichas de una cohorte filtrada
+    # Filtros: estado, prevision, creado_desde, creado_hasta (YYYY-MM-DD), search
+    # Permiso: ver_ficha (o staff)
+    ################
+    @action(detail=False, methods=['get'])
+    @solo_lectura
+    def exportar_cohorte(self, request):
+        denegado = self._verificar_ver_ficha(request)
+        if denegado is not None:
+            return denegado
+        
+        pacientes = self.filter_queryset(self.get_queryset())
+        for parametro, lookup in (('estado', 'estado'), ('prevision', 'prevision')):
+            valor = request.query_params.get(parametro)
+            if valor:
+                pacientes = pacientes.filter(**{lookup: valor})
+        for parametro, lookup in (('creado_desde', 'created_at__date__gte'), ('creado_hasta', 'created_at__date__lte')):
+            valor = request.query_params.get(parametro)
+            if not valor:
+                continue
+            try:
+                fecha = parse_date(valor)
+            except ValueError:
+                fecha = None
+            if fecha is None:
+                return Response(
+                    {'error': f'{parametro} debe ser una fecha válida (YYYY-MM-DD)'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            pacientes = pacientes.filter(**{lookup: fecha})
+        
+        return self._respuesta_exportacion(
+            pacientes,
+            f'cohorte_{timezone.now():%Y%m%d_%H%M}'
+        )
+    
+    def _verificar_ver_ficha(self, request):
+        """403 si el usuario no es staff ni tiene el permiso ver_ficha; None si puede exportar."""
+        if request.user.is_staff or request.rol_usuario.tiene_permiso('ver_ficha'):
+            return None
+        return Response(
+            {'error': 'No tiene permiso para exportar fichas'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    
+    def _respuesta_exportacion(self, pacientes, nombre_archivo):
+        formato = self.request.query_params.get('formato', 'ndjson')
+        if formato not in FORMATOS:
+            return Response(
+                {'error': f'Formato no soportado. Use: {", ".join(FORMATOS)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        generar, content_type, extension = FORMATOS[formato]
+        respuesta = StreamingHttpResponse(
+            generar(registros_historial(pacientes)),
+            content_type=content_type
+        )
+        respuesta['Content-Disposition'] = f'attachment; filename="{nombre_archivo}.{extension}"'
+        return respuesta
 
 
 ################
@@ -42,6 +259,7 @@ class ControlPrenatalViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     search_fields = ['paciente__numero_ficha']
     ordering_fields = ['fecha_control']
+    orden_keyset = '-fecha_control'
     
     ################
     # Filtrado por paciente
@@ -54,4 +272,118 @@ class ControlPrenatalViewSet(viewsets.ModelViewSet):
         if paciente_id:
             queryset = queryset.filter(paciente_id=paciente_id)
         
-        return queryset
\ No newline at end of file
+        return queryset
+    
+    ################
+    # Acción: lote
+    # Descripción: Registra los controles de una ronda de sala (varios
+    #              pacientes) en un request: validación del lote completo y
+    #              un solo INSERT (ver pacientes.lote_controles). Los items
+    #              inválidos no impiden registrar los demás.
+    # Uso: POST /controles/lote/  con una lista de controles
+    # Respuesta: 201 si se registraron todos, 207 si algunos, 400 si ninguno;
+    #            'resultados' trae {'indice', 'id'} o {'indice', 'errores'} por item
+    ################
+    @action(detail=False, methods=['post'])
+    def lote(self, request):
+        items = request.data
+        if not isinstance(items, list) or not items:
+            return Response(
+                {'error': 'Envíe una lista de controles'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(items) > LIMITE_LOTE:
+            return Response(
+                {'error': f'Máximo {LIMITE_LOTE} controles por lote'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        resultados = registrar_lote(items, request.user)
+        registrados = sum(1 for resultado in resultados if 'id' in resultado)
+        if registrados == len(resultados):
+            estado = status.HTTP_201_CREATED
+        elif registrados:
+            estado = status.HTTP_207_MULTI_STATUS
+        else:
+            estado = status.HTTP_400_BAD_REQUEST
+        
+        return Response({
+            'registrados': registrados,
+            'rechazados': len(resultados) - registrados,
+            'resultados': resultados,
+        }, status=estado)
+
+
+# ====================================================================
+# CONSULTAS ASYNC
+# Vistas de solo lectura con el ORM async: bajo ASGI un worker atiende
+# muchas a la vez sin dejar un hilo bloqueado por cada consulta lenta.
+# ATOMIC_REQUESTS no se aplica a vistas async (@solo_lectura incluye
+# non_atomic_requests) y leen de una réplica si hay (core.replicas).
+# ====================================================================
+
+################
+# API async: consulta_identificacion
+# Descripción: Persona por RUT o ficha por número, con su ficha/persona
+# Uso: GET /api/consulta/identificar/?rut=12.345.678-5  ó  ?ficha=2024-000123
+################
+@solo_lectura
+@api_autenticada
+async def consulta_identificacion(request):
+    rut = request.GET.get('rut', '').strip()
+    ficha = request.GET.get('ficha', '').strip()
+
+    if rut:
+        partes = descomponer_rut(rut)
+        if partes is None:
+            return JsonResponse({'error': 'RUT inválido'}, status=400)
+        persona = await Persona.objects.select_related('paciente').filter(rut_numero=partes[0]).afirst()
+        if persona is None:
+            return JsonResponse({'error': 'Persona no encontrada'}, status=404)
+        # Ya cargada por select_related (sin ficha: RelatedObjectDoesNotExist es AttributeError)
+        paciente = getattr(persona, 'paciente', None)
+    elif ficha:
+        paciente = await Paciente.objects.select_related('persona').filter(numero_ficha=ficha).afirst()
+        if paciente is None:
+            return JsonResponse({'error': 'Ficha no encontrada'}, status=404)
+        persona = paciente.persona
+    else:
+        return JsonResponse({'error': 'Indique rut o ficha'}, status=400)
+
+    return JsonResponse({
+        'persona': PersonaSerializer(persona).data,
+        'paciente': PacienteSerializer(paciente).data if paciente else None,
+    })
+
+
+################
+# API async: consulta_linea_tiempo
+# Descripción: Igual que PacienteViewSet.linea_tiempo, con el ORM async
+# Uso: GET /api/consulta/pacientes/<id>/linea_tiempo/?limite=50&cursor=...
+################
+@solo_lectura
+@api_autenticada
+async def consulta_linea_tiempo(request, pk):
+    try:
+        limite = int(request.GET.get('limite', LIMITE_POR_DEFECTO))
+    except ValueError:
+        return JsonResponse({'error': 'El parámetro limite debe ser un número'}, status=400)
+
+    if not await Paciente.objects.filter(pk=pk).aexists():
+        return JsonResponse({'error': 'Paciente no encontrado'}, status=404)
+
+    try:
+        entradas, siguiente = await alinea_tiempo_paciente(pk, cursor=request.GET.get('cursor'), limite=limite)
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+
+    siguiente_url = None
+    if siguiente:
+        parametros = request.GET.copy()
+        parametros['cursor'] = siguiente
+        siguiente_url = request.build_absolute_uri(f'{request.path}?{parametros.urlencode()}')
+
+    return JsonResponse({
+        'resultados': entradas,
+        'siguiente': siguiente_url,
+    })
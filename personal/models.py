@@ -8,6 +8,18 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import FileExtensionValidator
+from core.almacenamiento import almacenamiento_clinico
+
+
+# Acción -> roles de Perfil autorizados
+PERMISOS_POR_ACCION = {
+    'crear_paciente': ('administrativo', 'matrona', 'medico'),
+    'ver_ficha': ('administrativo', 'matrona', 'medico'),
+    'editar_antecedentes': ('administrativo', 'matrona', 'medico'),
+    'diagnosticar': ('administrativo', 'matrona', 'medico'),
+    'registrar_procedimiento': ('administrativo', 'matrona', 'medico', 'tens'),
+    'aplicar_medicamento': ('administrativo', 'matrona', 'medico', 'tens'),
+}
 
 
 class Perfil(models.Model):
@@ -52,6 +64,7 @@ class Perfil(models.Model):
     # NUEVO EN V0.2: Imagen de perfil
     imagen = models.ImageField(
         upload_to='perfiles/%Y/%m/%d/',
+        storage=almacenamiento_clinico,
         blank=True,
         null=True,
         verbose_name="Foto de Perfil",
@@ -134,17 +147,7 @@ class Perfil(models.Model):
         
         Retorna: Boolean
         """
-        permisos = {
-            'crear_paciente': ['administrativo', 'matrona', 'medico'],
-            'ver_ficha': ['administrativo', 'matrona', 'medico'],
-            'editar_antecedentes': ['administrativo', 'matrona', 'medico'],
-            'diagnosticar': ['administrativo', 'matrona', 'medico'],
-            'registrar_procedimiento': ['administrativo', 'matrona', 'medico', 'tens'],
-            'aplicar_medicamento': ['administrativo', 'matrona', 'medico', 'tens'],
-        }
-        
-        acciones_permitidas = permisos.get(accion, [])
-        return self.rol in acciones_permitidas
+        return self.rol in PERMISOS_POR_ACCION.get(accion, ())
     
     @property
     def imagen_url(self):
@@ -159,4 +162,12 @@ class Perfil(models.Model):
                 'medico': '/static/img/default_medico.png',
                 'tens': '/static/img/default_tens.png',
             }
-            return imagenes_default.get(self.rol, '/static/img/default_user.png')
\ No newline at end of file
+            return imagenes_default.get(self.rol, '/static/img/default_user.png')
+    
+    @property
+    def miniatura_url(self):
+        """Retorna URL de la miniatura (ver core.imagenes) o imagen por defecto"""
+        if self.imagen:
+            from core.imagenes import url_derivada
+            return url_derivada(self.imagen, 'miniatura')
+        return self.imagen_url
\ No newline at end of file
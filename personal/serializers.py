@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from .models import Perfil
+from core.serializers import ImagenesField, ListaConImagenes
 
 ################
 # Serializer: UsuarioSerializer
@@ -25,9 +26,11 @@ class UsuarioSerializer(serializers.ModelSerializer):
 class PerfilSerializer(serializers.ModelSerializer):
     usuario = UsuarioSerializer(read_only=True)
     usuario_id = serializers.IntegerField(write_only=True)
+    imagenes = ImagenesField(source='imagen')
     
     class Meta:
         model = Perfil
+        list_serializer_class = ListaConImagenes
         fields = [
             'id',
             'usuario',
@@ -35,6 +38,7 @@ class PerfilSerializer(serializers.ModelSerializer):
             'rol',
             'numero_colegio',
             'especialidad',
+            'imagenes',
             'activo',
             'fecha_creacion',
             'fecha_actualizacion',
@@ -0,0 +1,327 @@
+################
+# ALERTAS: Motor de reglas clínicas
+# Descripción: Evalúa cada ControlPrenatal y Patologia al guardarse y
+#              materializa el resultado en registros.Alerta. El listado de
+#              alertas activas es una lectura por el índice
+#              (estado, severidad, created_at), sin recorrer controles.
+# Reevaluación: python manage.py reevaluar_alertas (al cambiar las reglas,
+#               subir VERSION_REGLAS)
+################
+
+import operator
+
+from django.db import transaction
+from django.utils import timezone
+
+from core.auditoria import registrar_creados
+from core.contadores import ajustar
+from pacientes.models import ControlPrenatal
+from registros.models import Alerta, Patologia
+from utilidades.validadores import RANGO_GLUCEMIA_NORMAL
+
+
+VERSION_REGLAS = 1
+TAMANO_BLOQUE = 2000
+
+OPERADORES = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+    '==': operator.eq,
+}
+
+
+class Regla:
+    """
+    Regla de alerta.
+
+    Args:
+        codigo (str): identificador guardado en Alerta.regla
+        familia (str): reglas de la misma familia se excluyen entre sí; gana
+                       la primera que se cumple (ordenar de más a menos grave)
+        severidad (int): Alerta.SEVERIDAD_*
+        mensaje (str): texto de la alerta
+        condiciones (list): (campo, operador, umbral); basta que se cumpla una
+        requisitos (dict): campo -> valor que deben cumplirse todos
+    """
+
+    __slots__ = ('codigo', 'familia', 'severidad', 'mensaje', 'condiciones', 'requisitos')
+
+    def __init__(self, codigo, familia, severidad, mensaje, condiciones, requisitos=None):
+        self.codigo = codigo
+        self.familia = familia
+        self.severidad = severidad
+        self.mensaje = mensaje
+        self.condiciones = condiciones
+        self.requisitos = requisitos or {}
+
+    @property
+    def campos(self):
+        return {campo for campo, _, _ in self.condiciones} | set(self.requisitos)
+
+    def cumple(self, valores):
+        """
+        Args:
+            valores (dict): campo -> valor de la fila evaluada
+        """
+        if any(valores.get(campo) != esperado for campo, esperado in self.requisitos.items()):
+            return False
+        return any(
+            valores.get(campo) is not None and OPERADORES[operador](valores[campo], umbral)
+            for campo, operador, umbral in self.condiciones
+        )
+
+    def valor(self, valores):
+        """Texto con los valores medidos que usa la regla (ej: '165/112')."""
+        medidos = [str(valores[campo]) for campo, _, _ in self.condiciones if valores.get(campo) is not None]
+        return '/'.join(medidos)[:50]
+
+
+# Umbrales de hipertensión en el embarazo (mmHg) y de frecuencia cardíaca materna (lpm)
+REGLAS_CONTROL = [
+    Regla('hipertension_severa', 'presion', Alerta.SEVERIDAD_CRITICA, 'Hipertensión severa (≥160/110)',
+          [('presion_sistolica', '>=', 160), ('presion_diastolica', '>=', 110)]),
+    Regla('hipertension', 'presion', Alerta.SEVERIDAD_ALTA, 'Hipertensión (≥140/90)',
+          [('presion_sistolica', '>=', 140), ('presion_diastolica', '>=', 90)]),
+    Regla('hiperglucemia_severa', 'glucemia', Alerta.SEVERIDAD_ALTA, 'Hiperglucemia severa (≥200 mg/dL)',
+          [('glucemia', '>=', 200)]),
+    Regla('hiperglucemia', 'glucemia', Alerta.SEVERIDAD_MEDIA,
+          f'Glucemia sobre el rango normal (>{RANGO_GLUCEMIA_NORMAL[1]} mg/dL)',
+          [('glucemia', '>', RANGO_GLUCEMIA_NORMAL[1])]),
+    Regla('hipoglucemia', 'glucemia', Alerta.SEVERIDAD_ALTA,
+          f'Hipoglucemia (<{RANGO_GLUCEMIA_NORMAL[0]} mg/dL)',
+          [('glucemia', '<', RANGO_GLUCEMIA_NORMAL[0])]),
+    Regla('taquicardia', 'frecuencia', Alerta.SEVERIDAD_MEDIA, 'Taquicardia materna (>120 lpm)',
+          [('frecuencia_cardiaca', '>', 120)]),
+    Regla('bradicardia', 'frecuencia', Alerta.SEVERIDAD_MEDIA, 'Bradicardia materna (<50 lpm)',
+          [('frecuencia_cardiaca', '<', 50)]),
+]
+
+REGLAS_PATOLOGIA = [
+    Regla('patologia_critica', 'patologia', Alerta.SEVERIDAD_CRITICA, 'Patología activa de riesgo crítico',
+          [('nivel_riesgo', '==', 'critico')], requisitos={'estado': 'activa'}),
+    Regla('patologia_riesgo_alto', 'patologia', Alerta.SEVERIDAD_ALTA, 'Patología activa de riesgo alto',
+          [('nivel_riesgo', '==', 'alto')], requisitos={'estado': 'activa'}),
+]
+
+
+class Origen:
+    """Modelo evaluado, sus reglas y el campo de Alerta que apunta a él."""
+
+    __slots__ = ('modelo', 'reglas', 'campo')
+
+    def __init__(self, modelo, reglas, campo):
+        self.modelo = modelo
+        self.reglas = reglas
+        self.campo = campo
+
+    @property
+    def campos(self):
+        return sorted(set().union(*(regla.campos for regla in self.reglas)))
+
+    def valores(self, instancia):
+        return {campo: getattr(instancia, campo) for campo in self.campos}
+
+
+ORIGENES = {
+    'control': Origen(ControlPrenatal, REGLAS_CONTROL, 'control'),
+    'patologia': Origen(Patologia, REGLAS_PATOLOGIA, 'patologia'),
+}
+
+
+def reglas_cumplidas(reglas, valores):
+    """Primera regla cumplida de cada familia."""
+    cumplidas = {}
+    for regla in reglas:
+        if regla.familia not in cumplidas and regla.cumple(valores):
+            cumplidas[regla.familia] = regla
+    return list(cumplidas.values())
+
+
+# ====================================================================
+# EVALUACIÓN INCREMENTAL (al guardar)
+# ====================================================================
+
+def evaluar(nombre_origen, instancia, creada=False):
+    """
+    Sincroniza las alertas de un control o patología recién guardado.
+    Usa save()/create() para que el contador alertas_activas se ajuste solo.
+    Un registro nuevo no tiene alertas previas: no se consultan.
+    """
+    origen = ORIGENES[nombre_origen]
+    valores = origen.valores(instancia)
+    cumplidas = {regla.codigo: regla for regla in reglas_cumplidas(origen.reglas, valores)}
+    existentes = [] if creada else list(Alerta.objects.filter(**{origen.campo: instancia}))
+
+    for alerta in existentes:
+        regla = cumplidas.pop(alerta.regla, None)
+        if regla is None and alerta.estado == 'activa':
+            alerta.estado = 'descartada'
+            alerta.save(update_fields=['estado'])
+        elif regla is not None and alerta.estado == 'descartada':
+            _reactivar(alerta, regla, valores)
+            alerta.save(update_fields=['estado', 'severidad', 'mensaje', 'valor', 'version_reglas'])
+        elif regla is not None and alerta.estado == 'activa' and alerta.valor != regla.valor(valores):
+            alerta.valor = regla.valor(valores)
+            alerta.save(update_fields=['valor'])
+
+    for regla in cumplidas.values():
+        Alerta.objects.create(**_datos_alerta(origen, instancia.pk, instancia.paciente_id, regla, valores))
+
+
+def evaluar_creados(nombre_origen, instancias):
+    """
+    evaluar() para registros nuevos insertados con bulk_create (que no
+    emite post_save): las alertas de todos en un bulk_create, con el
+    contador alertas_activas y la auditoría ajustados a mano.
+
+    Returns:
+        list: alertas creadas
+    """
+    origen = ORIGENES[nombre_origen]
+    nuevas = []
+    for instancia in instancias:
+        valores = origen.valores(instancia)
+        for regla in reglas_cumplidas(origen.reglas, valores):
+            nuevas.append(Alerta(**_datos_alerta(origen, instancia.pk, instancia.paciente_id, regla, valores)))
+    if not nuevas:
+        return nuevas
+
+    Alerta.objects.bulk_create(nuevas, batch_size=1000)
+    if nuevas[0].pk is None:
+        # MySQL no retorna las pk de bulk_create; (regla, origen) es único
+        campo = f'{origen.campo}_id'
+        pks = {
+            (origen_id, regla): pk
+            for origen_id, regla, pk in Alerta.objects.filter(
+                **{f'{campo}__in': [getattr(alerta, campo) for alerta in nuevas]}
+            ).values_list(campo, 'regla', 'pk')
+        }
+        for alerta in nuevas:
+            alerta.pk = pks[(getattr(alerta, campo), alerta.regla)]
+
+    ajustar('alertas_activas', len(nuevas))
+    registrar_creados(nuevas)
+    return nuevas
+
+
+def _datos_alerta(origen, origen_id, paciente_id, regla, valores):
+    return {
+        'paciente_id': paciente_id,
+        f'{origen.campo}_id': origen_id,
+        'regla': regla.codigo,
+        'severidad': regla.severidad,
+        'mensaje': regla.mensaje,
+        'valor': regla.valor(valores),
+        'version_reglas': VERSION_REGLAS,
+    }
+
+
+def _reactivar(alerta, regla, valores):
+    alerta.estado = 'activa'
+    alerta.severidad = regla.severidad
+    alerta.mensaje = regla.mensaje
+    alerta.valor = regla.valor(valores)
+    alerta.version_reglas = VERSION_REGLAS
+
+
+def resolver(alerta, usuario):
+    """Marca una alerta como resuelta por el equipo clínico."""
+    alerta.estado = 'resuelta'
+    alerta.resuelta_por = usuario
+    alerta.resuelta_at = timezone.now()
+    alerta.save(update_fields=['estado', 'resuelta_por', 'resuelta_at'])
+
+
+# ====================================================================
+# REEVALUACIÓN POR LOTES (al cambiar las reglas)
+# ====================================================================
+
+class ResultadoReevaluacion:
+    """Totales de una reevaluación."""
+
+    __slots__ = ('evaluados', 'creadas', 'reactivadas', 'descartadas')
+
+    def __init__(self):
+        self.evaluados = self.creadas = self.reactivadas = self.descartadas = 0
+
+    def __str__(self):
+        return (
+            f'{self.evaluados} registros evaluados: {self.creadas} alertas creadas, '
+            f'{self.reactivadas} reactivadas, {self.descartadas} descartadas'
+        )
+
+
+def reevaluar(origenes=None, tamano_bloque=TAMANO_BLOQUE, resultado=None):
+    """
+    Reevalúa todo el historial, por bloques de `tamano_bloque` registros.
+    Cada bloque es una transacción: dos lecturas (registros y sus alertas) y
+    escrituras masivas; los contadores se ajustan a mano porque bulk_create
+    y update() no emiten señales.
+
+    Args:
+        origenes (list): claves de ORIGENES (por defecto todas)
+
+    Returns:
+        ResultadoReevaluacion
+    """
+    resultado = resultado or ResultadoReevaluacion()
+    for nombre in origenes or ORIGENES:
+        origen = ORIGENES[nombre]
+        ultimo_pk = 0
+        while True:
+            with transaction.atomic():
+                filas = list(
+                    origen.modelo.objects.filter(pk__gt=ultimo_pk).order_by('pk')
+                    .values('pk', 'paciente_id', *origen.campos)[:tamano_bloque]
+                )
+                if not filas:
+                    break
+                ultimo_pk = filas[-1]['pk']
+                _reevaluar_bloque(origen, filas, resultado)
+            if len(filas) < tamano_bloque:
+                break
+    return resultado
+
+
+def _reevaluar_bloque(origen, filas, resultado):
+    existentes = {}
+    for alerta in Alerta.objects.filter(**{f'{origen.campo}_id__in': [fila['pk'] for fila in filas]}):
+        existentes[(getattr(alerta, f'{origen.campo}_id'), alerta.regla)] = alerta
+
+    nuevas, actualizadas, vigentes = [], [], set()
+    reactivadas = 0
+    for fila in filas:
+        for regla in reglas_cumplidas(origen.reglas, fila):
+            clave = (fila['pk'], regla.codigo)
+            vigentes.add(clave)
+            alerta = existentes.get(clave)
+            if alerta is None:
+                nuevas.append(Alerta(**_datos_alerta(origen, fila['pk'], fila['paciente_id'], regla, fila)))
+            elif alerta.estado == 'descartada':
+                _reactivar(alerta, regla, fila)
+                actualizadas.append(alerta)
+                reactivadas += 1
+            elif alerta.estado == 'activa' and alerta.version_reglas != VERSION_REGLAS:
+                # Sigue activa; se actualizan severidad y mensaje a las reglas nuevas
+                _reactivar(alerta, regla, fila)
+                actualizadas.append(alerta)
+            # Las resueltas por el equipo clínico no se tocan
+
+    descartar = [
+        alerta.pk for clave, alerta in existentes.items()
+        if clave not in vigentes and alerta.estado == 'activa'
+    ]
+
+    Alerta.objects.bulk_create(nuevas, batch_size=1000)
+    Alerta.objects.bulk_update(
+        actualizadas, ['estado', 'severidad', 'mensaje', 'valor', 'version_reglas'], batch_size=1000
+    )
+    Alerta.objects.filter(pk__in=descartar).update(estado='descartada')
+
+    ajustar('alertas_activas', len(nuevas) + reactivadas - len(descartar))
+    resultado.evaluados += len(filas)
+    resultado.creadas += len(nuevas)
+    resultado.reactivadas += reactivadas
+    resultado.descartadas += len(descartar)
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class RegistrosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'registros'
+
+    def ready(self):
+        from core.contadores import DefinicionContador, registrar_contador
+        from registros import signals  # noqa: F401
+
+        registrar_contador(DefinicionContador('alertas_activas', 'registros.Alerta', {'estado': 'activa'}))
@@ -0,0 +1,270 @@
+################
+# LÍNEA DE TIEMPO: Ficha del paciente
+# Descripción: Controles, antecedentes, observaciones, patologías, procedimientos
+#              y medicamentos de un paciente, mezclados por fecha (más reciente primero)
+# Costo fijo: una consulta por tabla, independiente del largo del historial
+################
+
+import base64
+import heapq
+import json
+from datetime import datetime, time
+
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+from pacientes.models import AntecedentesClinico, ControlPrenatal
+from registros.models import Medicamento, Observacion, Patologia, Procedimiento
+
+
+LIMITE_POR_DEFECTO = 50
+LIMITE_MAXIMO = 200
+
+
+# ====================================================================
+# SERIALIZACIÓN DE CADA TIPO DE ENTRADA
+# ====================================================================
+
+def _nombre_usuario(usuario):
+    """Nombre del usuario ya cargado vía select_related (sin consultas extra)."""
+    if usuario is None:
+        return None
+    return usuario.get_full_name() or usuario.username
+
+
+def _control(control):
+    return {
+        'titulo': f'Control prenatal ({control.semanas_gestacion or "?"} sem)',
+        'responsable': _nombre_usuario(control.realizado_por),
+        'datos': {
+            'semanas_gestacion': control.semanas_gestacion,
+            'peso': control.peso,
+            'presion': control.get_presion(),
+            'frecuencia_cardiaca': control.frecuencia_cardiaca,
+            'glucemia': control.glucemia,
+            'observaciones': control.observaciones,
+        },
+    }
+
+
+def _antecedente(antecedente):
+    return {
+        'titulo': antecedente.get_tipo_dato_display(),
+        'responsable': _nombre_usuario(antecedente.registrado_por),
+        'datos': {
+            'tipo_dato': antecedente.tipo_dato,
+            'descripcion': antecedente.descripcion,
+        },
+    }
+
+
+def _observacion(observacion):
+    return {
+        'titulo': 'Observación',
+        'responsable': _nombre_usuario(observacion.created_by),
+        'datos': {
+            'texto': observacion.texto,
+            'imagen': observacion.imagen.url if observacion.imagen else None,
+        },
+    }
+
+
+def _patologia(patologia):
+    return {
+        'titulo': patologia.nombre,
+        'responsable': _nombre_usuario(patologia.diagnosticado_por),
+        'datos': {
+            'codigo_cie_10': patologia.codigo_cie_10,
+            'nivel_riesgo': patologia.nivel_riesgo,
+            'estado': patologia.estado,
+            'fecha_resolucion': patologia.fecha_resolucion,
+        },
+    }
+
+
+def _procedimiento(procedimiento):
+    return {
+        'titulo': procedimiento.get_tipo_procedimiento_display(),
+        'responsable': _nombre_usuario(procedimiento.realizado_por),
+        'datos': {
+            'estado': procedimiento.estado,
+            'descripcion': procedimiento.descripcion,
+            'observaciones': procedimiento.observaciones,
+        },
+    }
+
+
+def _medicamento(medicamento):
+    return {
+        'titulo': f'{medicamento.nombre_medicamento} {medicamento.dosis}',
+        'responsable': _nombre_usuario(medicamento.prescrito_por),
+        'datos': {
+            'via_administracion': medicamento.via_administracion,
+            'frecuencia': medicamento.frecuencia,
+            'estado': medicamento.estado,
+            'administrado_por': _nombre_usuario(medicamento.administrado_por),
+            'fecha_administracion': medicamento.fecha_administracion,
+        },
+    }
+
+
+# (tipo, modelo, campo fecha, select_related, serializador)
+# El tipo forma parte de la clave de orden: desempata entradas con la misma fecha
+FUENTES = [
+    ('antecedente', AntecedentesClinico, 'created_at', ['registrado_por'], _antecedente),
+    ('control_prenatal', ControlPrenatal, 'fecha_control', ['realizado_por'], _control),
+    ('medicamento', Medicamento, 'fecha_prescripcion', ['prescrito_por', 'administrado_por'], _medicamento),
+    ('observacion', Observacion, 'created_at', ['created_by'], _observacion),
+    ('patologia', Patologia, 'fecha_diagnostico', ['diagnosticado_por'], _patologia),
+    ('procedimiento', Procedimiento, 'fecha_procedimiento', ['realizado_por'], _procedimiento),
+]
+
+
+# ====================================================================
+# CURSOR
+# ====================================================================
+
+def _como_datetime(valor):
+    """Fechas (DateField) se ubican a medianoche local para compararlas con DateTimeField."""
+    if isinstance(valor, datetime):
+        return valor
+    return timezone.make_aware(datetime.combine(valor, time.min))
+
+
+def codificar_cursor(clave):
+    momento, tipo, pk = clave
+    texto = json.dumps([momento.isoformat(), tipo, pk])
+    return base64.urlsafe_b64encode(texto.encode()).decode()
+
+
+def decodificar_cursor(cursor):
+    """
+    Returns:
+        tuple: (datetime, tipo, pk) o None si el cursor es inválido
+    """
+    try:
+        momento, tipo, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        momento, pk = datetime.fromisoformat(momento), int(pk)
+    except (ValueError, TypeError, json.JSONDecodeError):
+        return None
+    # Los cursores emitidos llevan zona horaria; uno sin ella fue alterado
+    if timezone.is_naive(momento) or not 0 <= pk < 2 ** 63:
+        return None
+    return momento, str(tipo), pk
+
+
+def _filtro_anteriores(campo, es_fecha, tipo, cursor):
+    """
+    Q para las filas de una fuente cuya clave (momento, tipo, pk) es
+    estrictamente menor que la del cursor. Usa el índice (paciente, -campo).
+    """
+    momento, tipo_cursor, pk_cursor = cursor
+
+    if es_fecha:
+        local = timezone.localtime(momento)
+        valor = local.date()
+        exacto = local.time() == time.min
+        if not exacto:
+            # Medianoche de ese día es anterior al cursor
+            return Q(**{f'{campo}__lte': valor})
+    else:
+        valor = momento
+
+    if tipo < tipo_cursor:
+        empate = Q(**{campo: valor})
+    elif tipo == tipo_cursor:
+        empate = Q(**{campo: valor, 'pk__lt': pk_cursor})
+    else:
+        empate = Q(pk__in=[])
+    return Q(**{f'{campo}__lt': valor}) | empate
+
+
+# ====================================================================
+# API
+# ====================================================================
+
+def linea_tiempo_paciente(paciente_id, cursor=None, limite=LIMITE_POR_DEFECTO):
+    """
+    Línea de tiempo de un paciente, más reciente primero.
+
+    Hace exactamente una consulta por fuente (6), cada una limitada a
+    `limite + 1` filas con sus usuarios vía select_related, y mezcla los
+    resultados con heapq.merge (k-way merge por clave (momento, tipo, pk)).
+
+    Args:
+        paciente_id (int): ID del paciente
+        cursor (str): cursor opaco retornado por una llamada anterior
+        limite (int): entradas por página (máx LIMITE_MAXIMO)
+
+    Returns:
+        tuple: (entradas: list[dict], siguiente_cursor: str | None)
+
+    Raises:
+        ValueError: si el cursor es inválido o fue alterado (volver a la
+                    primera página haría que un cliente paginando no termine)
+    """
+    limite = max(1, min(int(limite), LIMITE_MAXIMO))
+    posicion = _posicion(cursor)
+    flujos = [
+        _flujo(filas, tipo, campo, serializar)
+        for tipo, campo, serializar, filas in _consultas(paciente_id, posicion, limite)
+    ]
+    return _mezclar(flujos, limite)
+
+
+async def alinea_tiempo_paciente(paciente_id, cursor=None, limite=LIMITE_POR_DEFECTO):
+    """linea_tiempo_paciente para vistas async (ORM async, las mismas 6 consultas)."""
+    limite = max(1, min(int(limite), LIMITE_MAXIMO))
+    posicion = _posicion(cursor)
+    flujos = []
+    for tipo, campo, serializar, filas in _consultas(paciente_id, posicion, limite):
+        filas = [fila async for fila in filas]
+        flujos.append(_flujo(filas, tipo, campo, serializar))
+    return _mezclar(flujos, limite)
+
+
+def _posicion(cursor):
+    if not cursor:
+        return None
+    posicion = decodificar_cursor(cursor)
+    if posicion is None:
+        raise ValueError('Cursor inválido')
+    return posicion
+
+
+def _consultas(paciente_id, posicion, limite):
+    """(tipo, campo, serializador, queryset sin evaluar) de cada fuente."""
+    for tipo, modelo, campo, relacionados, serializar in FUENTES:
+        es_fecha = not isinstance(modelo._meta.get_field(campo), models.DateTimeField)
+        queryset = modelo.objects.filter(paciente_id=paciente_id).select_related(*relacionados)
+        if posicion:
+            queryset = queryset.filter(_filtro_anteriores(campo, es_fecha, tipo, posicion))
+        yield tipo, campo, serializar, queryset.order_by(f'-{campo}', '-pk')[:limite + 1]
+
+
+def _mezclar(flujos, limite):
+    mezcla = heapq.merge(*flujos, key=lambda elemento: elemento[0], reverse=True)
+
+    entradas = []
+    ultima_clave = None
+    for clave, entrada in mezcla:
+        if len(entradas) == limite:
+            return entradas, codificar_cursor(ultima_clave)
+        entradas.append(entrada)
+        ultima_clave = clave
+
+    return entradas, None
+
+
+def _flujo(filas, tipo, campo, serializar):
+    """Entradas de una fuente, ya ordenadas por clave descendente."""
+    for fila in filas:
+        fecha = getattr(fila, campo)
+        clave = (_como_datetime(fecha), tipo, fila.pk)
+        yield clave, {
+            'tipo': tipo,
+            'id': fila.pk,
+            'fecha': fecha.isoformat(),
+            **serializar(fila),
+        }
@@ -0,0 +1,33 @@
+################
+# COMANDO: reevaluar_alertas
+# Descripción: Reevalúa todo el historial de controles y patologías con las
+#              reglas actuales de registros.alertas, por bloques. Ejecutar
+#              después de cambiar las reglas (y subir VERSION_REGLAS).
+# Uso: python manage.py reevaluar_alertas [--origen control|patologia] [--bloque 2000]
+################
+
+from django.core.management.base import BaseCommand
+
+from registros.alertas import ORIGENES, TAMANO_BLOQUE, reevaluar
+
+
+class Command(BaseCommand):
+    help = 'Reevalúa las reglas de alerta sobre todo el historial clínico'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--origen',
+            choices=sorted(ORIGENES),
+            action='append',
+            help='Registros a evaluar (por defecto todos; se puede repetir)'
+        )
+        parser.add_argument(
+            '--bloque',
+            type=int,
+            default=TAMANO_BLOQUE,
+            help=f'Registros por bloque/transacción (por defecto {TAMANO_BLOQUE})'
+        )
+
+    def handle(self, *args, **options):
+        resultado = reevaluar(options['origen'], tamano_bloque=options['bloque'])
+        self.stdout.write(self.style.SUCCESS(f'✅ Alertas reevaluadas: {resultado}'))
@@ -7,7 +7,8 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import FileExtensionValidator
-from pacientes.models import Paciente
+from core.almacenamiento import almacenamiento_clinico
+from pacientes.models import ControlPrenatal, Paciente
 
 
 class Observacion(models.Model):
@@ -30,6 +31,7 @@ class Observacion(models.Model):
     # NUEVO EN V0.2: Imagen anexa
     imagen = models.ImageField(
         upload_to='observaciones/%Y/%m/%d/',
+        storage=almacenamiento_clinico,
         blank=True,
         null=True,
         verbose_name="Imagen Anexa",
@@ -130,6 +132,7 @@ class Patologia(models.Model):
     # NUEVO EN V0.2: Imagen de referencia
     imagen = models.ImageField(
         upload_to='patologias/%Y/%m/%d/',
+        storage=almacenamiento_clinico,
         blank=True,
         null=True,
         verbose_name="Imagen de Referencia",
@@ -213,6 +216,7 @@ class Patologia(models.Model):
         ordering = ['-fecha_diagnostico']
         indexes = [
             models.Index(fields=['paciente', 'estado']),
+            models.Index(fields=['paciente', '-fecha_diagnostico']),
             models.Index(fields=['nivel_riesgo']),
         ]
     
@@ -282,6 +286,7 @@ class Procedimiento(models.Model):
     # NUEVO EN V0.2: Imagen de evidencia
     imagen = models.ImageField(
         upload_to='procedimientos/%Y/%m/%d/',
+        storage=almacenamiento_clinico,
         blank=True,
         null=True,
         verbose_name="Foto de Evidencia",
@@ -509,6 +514,7 @@ class Medicamento(models.Model):
         ordering = ['-fecha_prescripcion']
         indexes = [
             models.Index(fields=['paciente', 'estado']),
+            models.Index(fields=['paciente', '-fecha_prescripcion']),
             models.Index(fields=['fecha_administracion']),
         ]
     
@@ -519,4 +525,132 @@ class Medicamento(models.Model):
         """Retorna la duración formateada"""
         if self.duracion_dias:
             return f"{self.duracion_dias} días"
-        return "Indefinida"
\ No newline at end of file
+        return "Indefinida"
+
+
+################
+# MODELO: Alerta (Registros)
+# Descripción: Alertas clínicas materializadas (ver registros.alertas)
+# Nuevo en v0.3: se generan al guardar controles y patologías; el listado
+#                de alertas activas es una lectura por índice
+################
+
+class Alerta(models.Model):
+    """
+    Alerta clínica generada por una regla sobre un ControlPrenatal o una Patologia.
+    Una alerta por (regla, origen): reevaluar no la duplica.
+    """
+    
+    SEVERIDAD_MEDIA = 1
+    SEVERIDAD_ALTA = 2
+    SEVERIDAD_CRITICA = 3
+    
+    SEVERIDAD_CHOICES = [
+        (SEVERIDAD_MEDIA, 'Media'),
+        (SEVERIDAD_ALTA, 'Alta'),
+        (SEVERIDAD_CRITICA, 'Crítica'),
+    ]
+    
+    ESTADO_CHOICES = [
+        ('activa', 'Activa'),
+        ('resuelta', 'Resuelta'),
+        ('descartada', 'Descartada'),
+    ]
+    
+    paciente = models.ForeignKey(
+        Paciente,
+        on_delete=models.CASCADE,
+        related_name='alertas',
+        verbose_name="Paciente"
+    )
+    
+    regla = models.CharField(
+        max_length=50,
+        verbose_name="Regla"
+    )
+    
+    severidad = models.PositiveSmallIntegerField(
+        choices=SEVERIDAD_CHOICES,
+        verbose_name="Severidad"
+    )
+    
+    estado = models.CharField(
+        max_length=20,
+        choices=ESTADO_CHOICES,
+        default='activa',
+        verbose_name="Estado"
+    )
+    
+    mensaje = models.CharField(
+        max_length=255,
+        verbose_name="Mensaje"
+    )
+    
+    valor = models.CharField(
+        max_length=50,
+        blank=True,
+        verbose_name="Valor que gatilló la alerta"
+    )
+    
+    # Origen (uno de los dos)
+    control = models.ForeignKey(
+        ControlPrenatal,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='alertas',
+        verbose_name="Control Prenatal"
+    )
+    
+    patologia = models.ForeignKey(
+        Patologia,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='alertas',
+        verbose_name="Patología"
+    )
+    
+    version_reglas = models.PositiveSmallIntegerField(
+        default=1,
+        verbose_name="Versión de las reglas"
+    )
+    
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Fecha de Creación"
+    )
+    
+    resuelta_por = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='alertas_resueltas',
+        verbose_name="Resuelta por"
+    )
+    
+    resuelta_at = models.DateTimeField(
+        blank=True,
+        null=True,
+        verbose_name="Fecha de Resolución"
+    )
+    
+    class Meta:
+        verbose_name = "Alerta"
+        verbose_name_plural = "Alertas"
+        ordering = ['-created_at']
+        indexes = [
+            # Listado por defecto (keyset): filtra por estado y ordena por (fecha, pk)
+            models.Index(fields=['estado', '-created_at', '-id']),
+            # Filtro por severidad dentro del estado
+            models.Index(fields=['estado', '-severidad', '-created_at']),
+            models.Index(fields=['paciente', 'estado']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['regla', 'control'], name='alerta_unica_por_control'),
+            models.UniqueConstraint(fields=['regla', 'patologia'], name='alerta_unica_por_patologia'),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_severidad_display()}: {self.mensaje} - {self.paciente.numero_ficha}"
\ No newline at end of file
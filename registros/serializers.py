@@ -1,25 +1,30 @@
 from rest_framework import serializers
-from .models import Observacion, Patologia, Procedimiento, Medicamento
+from core.serializers import ImagenesField, ListaConImagenes
+from .models import Observacion, Patologia, Procedimiento, Medicamento, Alerta
 
 ################
 # Serializer: ObservacionSerializer
 # Descripción: Serializa el modelo Observacion para la API
 ################
 class ObservacionSerializer(serializers.ModelSerializer):
-    medico_nombre = serializers.CharField(source='medico.get_full_name', read_only=True)
+    created_by_nombre = serializers.CharField(source='created_by.get_full_name', read_only=True)
+    imagenes = ImagenesField(source='imagen')
     
     class Meta:
         model = Observacion
+        list_serializer_class = ListaConImagenes
         fields = [
             'id',
             'paciente',
-            'medico',
-            'medico_nombre',
             'texto',
-            'fecha_creacion',
-            'fecha_actualizacion',
+            'imagen',
+            'imagenes',
+            'created_by',
+            'created_by_nombre',
+            'created_at',
+            'modified_at',
         ]
-        read_only_fields = ['fecha_creacion', 'fecha_actualizacion']
+        read_only_fields = ['created_by', 'created_at', 'modified_at']
 
 
 ################
@@ -27,20 +32,29 @@ class ObservacionSerializer(serializers.ModelSerializer):
 # Descripción: Serializa el modelo Patologia para la API
 ################
 class PatologiaSerializer(serializers.ModelSerializer):
-    medico_nombre = serializers.CharField(source='medico.get_full_name', read_only=True)
+    diagnosticado_por_nombre = serializers.CharField(source='diagnosticado_por.get_full_name', read_only=True)
+    imagenes = ImagenesField(source='imagen')
     
     class Meta:
         model = Patologia
+        list_serializer_class = ListaConImagenes
         fields = [
             'id',
             'paciente',
             'nombre',
+            'codigo_cie_10',
             'descripcion',
-            'medico',
-            'medico_nombre',
-            'fecha_registro',
+            'imagenes',
+            'nivel_riesgo',
+            'protocolo_seguimiento',
+            'estado',
+            'fecha_diagnostico',
+            'fecha_resolucion',
+            'diagnosticado_por',
+            'diagnosticado_por_nombre',
+            'created_at',
         ]
-        read_only_fields = ['fecha_registro']
+        read_only_fields = ['created_at']
 
 
 ################
@@ -49,19 +63,26 @@ class PatologiaSerializer(serializers.ModelSerializer):
 ################
 class ProcedimientoSerializer(serializers.ModelSerializer):
     realizado_por_nombre = serializers.CharField(source='realizado_por.get_full_name', read_only=True)
+    imagenes = ImagenesField(source='imagen')
     
     class Meta:
         model = Procedimiento
+        list_serializer_class = ListaConImagenes
         fields = [
             'id',
             'paciente',
-            'nombre',
+            'tipo_procedimiento',
             'descripcion',
+            'imagenes',
+            'estado',
+            'material_utilizado',
+            'observaciones',
             'realizado_por',
             'realizado_por_nombre',
             'fecha_procedimiento',
+            'created_at',
         ]
-        read_only_fields = ['fecha_procedimiento']
+        read_only_fields = ['created_at']
 
 
 ################
@@ -69,6 +90,7 @@ class ProcedimientoSerializer(serializers.ModelSerializer):
 # Descripción: Serializa el modelo Medicamento para la API
 ################
 class MedicamentoSerializer(serializers.ModelSerializer):
+    prescrito_por_nombre = serializers.CharField(source='prescrito_por.get_full_name', read_only=True)
     administrado_por_nombre = serializers.CharField(source='administrado_por.get_full_name', read_only=True)
     
     class Meta:
@@ -76,11 +98,47 @@ class MedicamentoSerializer(serializers.ModelSerializer):
         fields = [
             'id',
             'paciente',
-            'nombre',
+            'nombre_medicamento',
             'dosis',
             'via_administracion',
+            'frecuencia',
+            'duracion_dias',
+            'indicacion',
+            'estado',
+            'fecha_prescripcion',
+            'fecha_administracion',
+            'prescrito_por',
+            'prescrito_por_nombre',
             'administrado_por',
             'administrado_por_nombre',
-            'fecha_administracion',
         ]
-        read_only_fields = ['fecha_administracion']
\ No newline at end of file
+        read_only_fields = ['fecha_administracion']
+
+
+################
+# Serializer: AlertaSerializer
+# Descripción: Serializa el modelo Alerta para la API (solo lectura)
+################
+class AlertaSerializer(serializers.ModelSerializer):
+    severidad_display = serializers.CharField(source='get_severidad_display', read_only=True)
+    numero_ficha = serializers.CharField(source='paciente.numero_ficha', read_only=True)
+    
+    class Meta:
+        model = Alerta
+        fields = [
+            'id',
+            'paciente',
+            'numero_ficha',
+            'regla',
+            'severidad',
+            'severidad_display',
+            'estado',
+            'mensaje',
+            'valor',
+            'control',
+            'patologia',
+            'created_at',
+            'resuelta_por',
+            'resuelta_at',
+        ]
+        read_only_fields = fields
@@ -0,0 +1,24 @@
+################
+# SEÑALES: Registros
+# Descripción: Evalúa las reglas de alerta (registros.alertas) al guardar
+#              un ControlPrenatal o una Patologia
+################
+
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from pacientes.models import ControlPrenatal
+from registros.alertas import evaluar
+from registros.models import Patologia
+
+
+@receiver(post_save, sender=ControlPrenatal)
+def control_guardado(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        evaluar('control', instance, creada=created)
+
+
+@receiver(post_save, sender=Patologia)
+def patologia_guardada(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        evaluar('patologia', instance, creada=created)
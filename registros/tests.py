@@ -1,3 +1,257 @@
+import base64
+import datetime
+import json
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.contadores import leer_contadores
+from core.models import Persona
+from pacientes.models import AntecedentesClinico, ControlPrenatal, Paciente
+from registros.alertas import reevaluar
+from registros.linea_tiempo import decodificar_cursor, linea_tiempo_paciente
+from registros.models import Alerta, Medicamento, Observacion, Patologia, Procedimiento
+
+
+################
+# Tests: Línea de tiempo del paciente
+# Descripción: Costo fijo en consultas y paginación por cursor sin duplicados
+################
+class LineaTiempoPacienteTests(TestCase):
+
+    CONSULTAS_POR_PAGINA = 6
+
+    def setUp(self):
+        self.usuario = User.objects.create_user(username='matrona', password='clave-segura-123')
+        persona = Persona.objects.create(
+            rut='12.345.678-5', nombre='María', apellido='Núñez', edad=30,
+            direccion='Los Aromos 123', contacto='+56912345678', created_by=self.usuario
+        )
+        self.paciente = Paciente.objects.create(
+            persona=persona, numero_ficha='FAM-2025-00001', edad=30,
+            estado_civil='casada', prevision='fonasa', created_by=self.usuario
+        )
+
+    def poblar(self, cantidad):
+        """Crea `cantidad` entradas de cada tipo con fechas que se cruzan entre tablas."""
+        inicio = datetime.date(2025, 1, 1)
+        for i in range(cantidad):
+            dia = inicio + datetime.timedelta(days=i)
+            momento = timezone.make_aware(datetime.datetime.combine(dia, datetime.time(10, 30)))
+            ControlPrenatal.objects.create(
+                paciente=self.paciente, fecha_control=dia, semanas_gestacion=8 + i % 30,
+                peso=60, realizado_por=self.usuario, created_by=self.usuario
+            )
+            Patologia.objects.create(
+                paciente=self.paciente, nombre=f'Patología {i}', nivel_riesgo='bajo',
+                fecha_diagnostico=dia, diagnosticado_por=self.usuario, created_by=self.usuario
+            )
+            Medicamento.objects.create(
+                paciente=self.paciente, nombre_medicamento='Paracetamol', dosis='500mg',
+                via_administracion='oral', frecuencia='8h', fecha_prescripcion=dia,
+                prescrito_por=self.usuario, administrado_por=self.usuario, created_by=self.usuario
+            )
+            Procedimiento.objects.create(
+                paciente=self.paciente, tipo_procedimiento='extraccion', fecha_procedimiento=momento,
+                realizado_por=self.usuario, created_by=self.usuario
+            )
+            AntecedentesClinico.objects.create(
+                paciente=self.paciente, tipo_dato='alergia', descripcion=f'Alergia {i}',
+                registrado_por=self.usuario
+            )
+            Observacion.objects.create(paciente=self.paciente, texto=f'Nota {i}', created_by=self.usuario)
+
+    def recorrer(self, limite):
+        """Recorre todas las páginas y retorna (entradas, cantidad de páginas)."""
+        entradas, cursor, paginas = [], None, 0
+        while True:
+            pagina, cursor = linea_tiempo_paciente(self.paciente.pk, cursor=cursor, limite=limite)
+            entradas.extend(pagina)
+            paginas += 1
+            if cursor is None:
+                return entradas, paginas
+
+    def test_consultas_fijas_sin_importar_largo_del_historial(self):
+        for cantidad in (1, 40):
+            self.poblar(cantidad)
+            with self.assertNumQueries(self.CONSULTAS_POR_PAGINA):
+                entradas, _ = linea_tiempo_paciente(self.paciente.pk, limite=200)
+                # Serializar debe usar solo datos ya cargados
+                [entrada['responsable'] for entrada in entradas]
+
+    def test_endpoint_con_consultas_fijas(self):
+        cliente = APIClient()
+        cliente.force_authenticate(self.usuario)
+        url = reverse('paciente-linea-tiempo', args=[self.paciente.pk])
+
+        self.poblar(2)
+        with CaptureQueriesContext(connection) as consultas_corta:
+            corta = cliente.get(url, {'limite': 100})
+
+        self.poblar(30)
+        with CaptureQueriesContext(connection) as consultas_larga:
+            larga = cliente.get(url, {'limite': 100})
+
+        # Paciente + una consulta por fuente (+ savepoints si ATOMIC_REQUESTS)
+        self.assertEqual(len(consultas_corta), len(consultas_larga))
+        self.assertLessEqual(len(consultas_larga), self.CONSULTAS_POR_PAGINA + 3)
+        self.assertEqual(corta.status_code, 200)
+        self.assertEqual(len(corta.data['resultados']), 12)
+        self.assertEqual(len(larga.data['resultados']), 100)
+        self.assertIn('cursor=', larga.data['siguiente'])
+
+    def test_paginacion_por_cursor_sin_duplicados(self):
+        self.poblar(15)
+        completa, _ = linea_tiempo_paciente(self.paciente.pk, limite=200)
+        paginada, paginas = self.recorrer(limite=7)
+
+        claves = [(entrada['tipo'], entrada['id']) for entrada in paginada]
+        self.assertEqual(len(claves), 90)
+        self.assertEqual(len(set(claves)), 90)
+        self.assertEqual(claves, [(entrada['tipo'], entrada['id']) for entrada in completa])
+        self.assertEqual(paginas, 13)
+
+    def test_orden_mas_reciente_primero(self):
+        self.poblar(5)
+        entradas, _ = linea_tiempo_paciente(self.paciente.pk, limite=200)
+        fechas = [entrada['fecha'][:10] for entrada in entradas]
+        self.assertEqual(fechas, sorted(fechas, reverse=True))
+
+    def test_cursor_invalido_es_error(self):
+        # Volver a la primera página haría que un cliente paginando no termine
+        self.poblar(1)
+        with self.assertRaisesMessage(ValueError, 'Cursor inválido'):
+            linea_tiempo_paciente(self.paciente.pk, cursor='no-es-un-cursor')
+
+        cliente = APIClient()
+        cliente.force_authenticate(self.usuario)
+        with transaction.atomic():
+            respuesta = cliente.get(reverse('paciente-linea-tiempo', args=[self.paciente.pk]), {'cursor': 'x'})
+        self.assertEqual(respuesta.status_code, 400)
+        self.client.force_login(self.usuario)
+        respuesta = self.client.get(reverse('consulta-linea-tiempo', args=[self.paciente.pk]), {'cursor': 'x'})
+        self.assertEqual(respuesta.status_code, 400)
+
+    def test_cursor_sin_zona_horaria_es_invalido(self):
+        self.poblar(1)
+        sin_zona = base64.urlsafe_b64encode(json.dumps(['2025-05-01T10:00:00', 'control', 1]).encode()).decode()
+        self.assertIsNone(decodificar_cursor(sin_zona))
+        with self.assertRaises(ValueError):
+            linea_tiempo_paciente(self.paciente.pk, cursor=sin_zona)
+
+
+################
+# Tests: Alertas clínicas
+# Descripción: Evaluación al guardar, reevaluación por lotes y contador
+################
+class AlertasTests(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_user(username='matrona', password='clave-segura-123')
+        persona = Persona.objects.create(
+            rut='12.345.678-5', nombre='María', apellido='Núñez', edad=30,
+            direccion='Los Aromos 123', contacto='+56912345678', created_by=self.usuario
+        )
+        self.paciente = Paciente.objects.create(
+            persona=persona, numero_ficha='FAM-2025-00001', edad=30,
+            estado_civil='casada', prevision='fonasa', created_by=self.usuario
+        )
+
+    def control(self, **valores):
+        with self.captureOnCommitCallbacks(execute=True):
+            return ControlPrenatal.objects.create(
+                paciente=self.paciente, fecha_control=datetime.date(2025, 5, 1),
+                created_by=self.usuario, **valores
+            )
+
+    def activas(self):
+        return sorted(Alerta.objects.filter(estado='activa').values_list('regla', flat=True))
+
+    def test_control_genera_alertas_por_familia(self):
+        self.control(presion_sistolica=150, presion_diastolica=95, glucemia=160, frecuencia_cardiaca=80)
+        self.assertEqual(self.activas(), ['hiperglucemia', 'hipertension'])
+        self.assertEqual(Alerta.objects.get(regla='hipertension').valor, '150/95')
+        self.assertEqual(leer_contadores()['alertas_activas'], 2)
+
+    def test_control_normal_no_genera_alertas(self):
+        self.control(presion_sistolica=110, presion_diastolica=70, glucemia=90)
+        self.assertEqual(self.activas(), [])
+
+    def test_editar_control_reemplaza_alerta(self):
+        control = self.control(presion_sistolica=150, presion_diastolica=95)
+        control.presion_sistolica, control.presion_diastolica = 165, 112
+        with self.captureOnCommitCallbacks(execute=True):
+            control.save()
+
+        self.assertEqual(self.activas(), ['hipertension_severa'])
+        self.assertEqual(Alerta.objects.get(regla='hipertension').estado, 'descartada')
+        self.assertEqual(leer_contadores()['alertas_activas'], 1)
+
+    def test_patologia_de_riesgo(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            patologia = Patologia.objects.create(
+                paciente=self.paciente, nombre='Preeclampsia', nivel_riesgo='critico',
+                fecha_diagnostico=datetime.date(2025, 5, 1), diagnosticado_por=self.usuario,
+                created_by=self.usuario
+            )
+        self.assertEqual(self.activas(), ['patologia_critica'])
+
+        patologia.estado = 'resuelta'
+        with self.captureOnCommitCallbacks(execute=True):
+            patologia.save()
+        self.assertEqual(self.activas(), [])
+        self.assertEqual(leer_contadores()['alertas_activas'], 0)
+
+    def test_reevaluar_historial(self):
+        # bulk_create no emite señales: simula historial previo a las reglas
+        ControlPrenatal.objects.bulk_create([
+            ControlPrenatal(
+                paciente=self.paciente, fecha_control=datetime.date(2025, 1, 1) + datetime.timedelta(days=i),
+                presion_sistolica=170 if i % 2 else 120, presion_diastolica=80, created_by=self.usuario
+            )
+            for i in range(10)
+        ])
+        with self.captureOnCommitCallbacks(execute=True):
+            resultado = reevaluar(tamano_bloque=3)
+        self.assertEqual((resultado.evaluados, resultado.creadas), (10, 5))
+        self.assertEqual(leer_contadores()['alertas_activas'], 5)
+
+        # Idempotente: una segunda pasada no cambia nada
+        resultado = reevaluar(tamano_bloque=3)
+        self.assertEqual((resultado.creadas, resultado.reactivadas, resultado.descartadas), (0, 0, 0))
+
+    def test_api_listar_y_resolver(self):
+        self.control(presion_sistolica=150, presion_diastolica=95)
+        cliente = APIClient()
+        cliente.force_authenticate(self.usuario)
+
+        respuesta = cliente.get(reverse('alerta-list'), {'severidad': Alerta.SEVERIDAD_ALTA})
+        self.assertEqual([fila['regla'] for fila in respuesta.data['results']], ['hipertension'])
+
+        alerta_id = respuesta.data['results'][0]['id']
+        with self.captureOnCommitCallbacks(execute=True):
+            respuesta = cliente.post(reverse('alerta-resolver', args=[alerta_id]))
+        self.assertEqual(respuesta.data['estado'], 'resuelta')
+        self.assertEqual(cliente.get(reverse('alerta-list')).data['results'], [])
+        self.assertEqual(leer_contadores()['alertas_activas'], 0)
+
+    def test_listado_activas_ordenado_por_indice(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Plan de consulta de SQLite')
+        self.control(presion_sistolica=150, presion_diastolica=95)
+        cliente = APIClient()
+        cliente.force_authenticate(self.usuario)
+        with CaptureQueriesContext(connection) as consultas:
+            cliente.get(reverse('alerta-list'))
 
-# Create your tests here.
+        sql = next(consulta['sql'] for consulta in consultas if 'FROM "registros_alerta"' in consulta['sql'])
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            plan = ' '.join(str(fila[-1]) for fila in cursor.fetchall())
+        self.assertIn('USING INDEX', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
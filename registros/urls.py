@@ -4,7 +4,8 @@ from .views import (
     ObservacionViewSet,
     PatologiaViewSet,
     ProcedimientoViewSet,
-    MedicamentoViewSet
+    MedicamentoViewSet,
+    AlertaViewSet
 )
 
 ################
@@ -16,6 +17,7 @@ router.register(r'observaciones', ObservacionViewSet, basename='observacion')
 router.register(r'patologias', PatologiaViewSet, basename='patologia')
 router.register(r'procedimientos', ProcedimientoViewSet, basename='procedimiento')
 router.register(r'medicamentos', MedicamentoViewSet, basename='medicamento')
+router.register(r'alertas', AlertaViewSet, basename='alerta')
 
 urlpatterns = [
     path('', include(router.urls)),
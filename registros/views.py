@@ -6,13 +6,17 @@
 
 from django.shortcuts import render, redirect, get_object_or_404
 from django.views.generic import (
-    ListView, DetailView, CreateView, UpdateView
+    ListView, DetailView, CreateView, UpdateView, TemplateView
 )
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib import messages
 from django.urls import reverse_lazy
 from django.db.models import Q
 from django.utils import timezone
+from rest_framework import mixins, viewsets
+from rest_framework.decorators import action
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
 
 # ====================================================================
 # IMPORTANTE: Importar formularios desde las carpetas individuales
@@ -29,8 +33,19 @@ from django.utils import timezone
 # from registros.Forms.Form_administrar_medicamento import Form_administrar_medicamento
 # from registros.Forms.Form_editar_medicamento import Form_editar_medicamento
 
-from registros.models import Observacion, Patologia, Procedimiento, Medicamento
+from registros.models import Observacion, Patologia, Procedimiento, Medicamento, Alerta
+from registros.serializers import (
+    ObservacionSerializer,
+    PatologiaSerializer,
+    ProcedimientoSerializer,
+    MedicamentoSerializer,
+    AlertaSerializer
+)
+from registros.alertas import resolver as resolver_alerta
 from pacientes.models import Paciente
+from authentication.roles import resolver_rol
+from core.contadores import leer_contadores
+from core.replicas import solo_lectura
 
 
 # ====================================================================
@@ -42,9 +57,8 @@ class RolRequiredMixin(UserPassesTestMixin):
     roles_permitidos = []
     
     def test_func(self):
-        if not hasattr(self.request.user, 'profile'):
-            return False
-        return self.request.user.profile.rol in self.roles_permitidos
+        rol = getattr(self.request, 'rol_usuario', None) or resolver_rol(self.request.user)
+        return rol.rol_perfil in self.roles_permitidos
     
     def handle_no_permission(self):
         messages.error(self.request, 'No tiene permiso para esta acción.')
@@ -194,6 +208,7 @@ class EditarPatologiaView(LoginRequiredMixin, RolRequiredMixin, UpdateView):
         )
 
 
+@solo_lectura
 class ListarPatologiasView(LoginRequiredMixin, RolRequiredMixin, ListView):
     """
     Vista para listar patologías de un paciente.
@@ -210,12 +225,12 @@ class ListarPatologiasView(LoginRequiredMixin, RolRequiredMixin, ListView):
         paciente_id = self.kwargs.get('paciente_id')
         return Patologia.objects.filter(
             paciente_id=paciente_id
-        ).order_by('-fecha_diagnostico')
+        ).select_related('diagnosticado_por').order_by('-fecha_diagnostico')
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         paciente_id = self.kwargs.get('paciente_id')
-        context['paciente'] = get_object_or_404(Paciente, pk=paciente_id)
+        context['paciente'] = get_object_or_404(Paciente.objects.select_related('persona'), pk=paciente_id)
         context['titulo'] = f"Patologías - {context['paciente'].persona.get_full_name()}"
         return context
 
@@ -292,6 +307,7 @@ class EditarProcedimientoView(LoginRequiredMixin, RolRequiredMixin, UpdateView):
         )
 
 
+@solo_lectura
 class ListarProcedimientosView(LoginRequiredMixin, RolRequiredMixin, ListView):
     """
     Vista para listar procedimientos de un paciente.
@@ -308,12 +324,12 @@ class ListarProcedimientosView(LoginRequiredMixin, RolRequiredMixin, ListView):
         paciente_id = self.kwargs.get('paciente_id')
         return Procedimiento.objects.filter(
             paciente_id=paciente_id
-        ).order_by('-fecha_procedimiento')
+        ).select_related('realizado_por').order_by('-fecha_procedimiento')
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         paciente_id = self.kwargs.get('paciente_id')
-        context['paciente'] = get_object_or_404(Paciente, pk=paciente_id)
+        context['paciente'] = get_object_or_404(Paciente.objects.select_related('persona'), pk=paciente_id)
         context['titulo'] = f"Procedimientos - {context['paciente'].persona.get_full_name()}"
         return context
 
@@ -425,6 +441,7 @@ class EditarMedicamentoView(LoginRequiredMixin, RolRequiredMixin, UpdateView):
         )
 
 
+@solo_lectura
 class ListarMedicamentosView(LoginRequiredMixin, RolRequiredMixin, ListView):
     """
     Vista para listar medicamentos de un paciente.
@@ -442,7 +459,9 @@ class ListarMedicamentosView(LoginRequiredMixin, RolRequiredMixin, ListView):
         
         # Filtrar por estado si se especifica
         estado = self.request.GET.get('estado')
-        queryset = Medicamento.objects.filter(paciente_id=paciente_id)
+        queryset = Medicamento.objects.filter(
+            paciente_id=paciente_id
+        ).select_related('prescrito_por', 'administrado_por')
         
         if estado:
             queryset = queryset.filter(estado=estado)
@@ -452,7 +471,7 @@ class ListarMedicamentosView(LoginRequiredMixin, RolRequiredMixin, ListView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         paciente_id = self.kwargs.get('paciente_id')
-        context['paciente'] = get_object_or_404(Paciente, pk=paciente_id)
+        context['paciente'] = get_object_or_404(Paciente.objects.select_related('persona'), pk=paciente_id)
         context['titulo'] = f"Medicamentos - {context['paciente'].persona.get_full_name()}"
         context['estado_choices'] = Medicamento._meta.get_field('estado').choices
         return context
@@ -462,33 +481,145 @@ class ListarMedicamentosView(LoginRequiredMixin, RolRequiredMixin, ListView):
 # DASHBOARD DE REGISTROS
 # ====================================================================
 
-class DashboardRegistrosView(LoginRequiredMixin, RolRequiredMixin):
+@solo_lectura
+class DashboardRegistrosView(LoginRequiredMixin, RolRequiredMixin, TemplateView):
     """
     Vista para ver resumen de registros pendientes.
     Usado por: Matrona, Médico, TENS
+    Los totales vienen de core.contadores (una consulta, sin COUNT).
     """
     roles_permitidos = ['matrona', 'medico', 'tens']
     template_name = 'registros/dashboard_registros.html'
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        usuario = self.request.user
+        contadores = leer_contadores()
         
         # Medicamentos pendientes de administrar
-        context['medicamentos_pendientes'] = Medicamento.objects.filter(
-            estado='prescrito'
-        ).count()
+        context['medicamentos_pendientes'] = contadores['medicamentos_pendientes']
         
         # Procedimientos registrados hoy
-        from django.utils import timezone
-        hoy = timezone.now().date()
-        context['procedimientos_hoy'] = Procedimiento.objects.filter(
-            fecha_procedimiento__date=hoy
-        ).count()
+        context['procedimientos_hoy'] = contadores['procedimientos_hoy']
         
         # Patologías activas sin resolver
-        context['patologias_activas'] = Patologia.objects.filter(
-            estado='activa'
-        ).count()
+        context['patologias_activas'] = contadores['patologias_activas']
+        
+        return context
+
+
+# ====================================================================
+# API REST
+# ====================================================================
+# Listados paginados por cursor (core.paginacion.PaginacionKeyset): el orden
+# de cada ViewSet coincide con el índice (paciente, -fecha) de su modelo.
+
+class RegistroClinicoViewSet(viewsets.ModelViewSet):
+    """
+    Base de los ViewSets de registros: filtra por ?paciente_id= y
+    registra al usuario creador.
+    """
+    permission_classes = [IsAuthenticated]
+    search_fields = ['paciente__numero_ficha']
+    relacionados = []
+    
+    def get_queryset(self):
+        queryset = self.queryset.select_related(*self.relacionados)
+        paciente_id = self.request.query_params.get('paciente_id')
+        
+        if paciente_id:
+            queryset = queryset.filter(paciente_id=paciente_id)
+        
+        return queryset
+    
+    def perform_create(self, serializer):
+        serializer.save(created_by=self.request.user)
+    
+    def perform_update(self, serializer):
+        serializer.save(modified_by=self.request.user)
+
+
+################
+# ViewSet: ObservacionViewSet
+# Descripción: API para gestionar Observaciones
+################
+class ObservacionViewSet(RegistroClinicoViewSet):
+    queryset = Observacion.objects.all()
+    serializer_class = ObservacionSerializer
+    relacionados = ['created_by']
+    ordering_fields = ['created_at']
+    orden_keyset = '-created_at'
+
+
+################
+# ViewSet: PatologiaViewSet
+# Descripción: API para gestionar Patologías
+################
+class PatologiaViewSet(RegistroClinicoViewSet):
+    queryset = Patologia.objects.all()
+    serializer_class = PatologiaSerializer
+    relacionados = ['diagnosticado_por']
+    ordering_fields = ['fecha_diagnostico']
+    orden_keyset = '-fecha_diagnostico'
+
+
+################
+# ViewSet: ProcedimientoViewSet
+# Descripción: API para gestionar Procedimientos
+################
+class ProcedimientoViewSet(RegistroClinicoViewSet):
+    queryset = Procedimiento.objects.all()
+    serializer_class = ProcedimientoSerializer
+    relacionados = ['realizado_por']
+    ordering_fields = ['fecha_procedimiento']
+    orden_keyset = '-fecha_procedimiento'
+
+
+################
+# ViewSet: MedicamentoViewSet
+# Descripción: API para gestionar Medicamentos
+################
+class MedicamentoViewSet(RegistroClinicoViewSet):
+    queryset = Medicamento.objects.all()
+    serializer_class = MedicamentoSerializer
+    relacionados = ['prescrito_por', 'administrado_por']
+    ordering_fields = ['fecha_prescripcion']
+    orden_keyset = '-fecha_prescripcion'
+
+
+################
+# ViewSet: AlertaViewSet
+# Descripción: Alertas clínicas (generadas por registros.alertas; solo lectura)
+# Filtros: estado (por defecto activa), severidad, paciente_id
+# Orden: más recientes primero; usa el índice (estado, severidad, created_at)
+################
+class AlertaViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    queryset = Alerta.objects.select_related('paciente')
+    serializer_class = AlertaSerializer
+    permission_classes = [IsAuthenticated]
+    search_fields = ['paciente__numero_ficha']
+    ordering_fields = ['created_at']
+    orden_keyset = '-created_at'
+    
+    def get_queryset(self):
+        queryset = self.queryset
+        if self.action != 'list':
+            return queryset
         
-        return context
\ No newline at end of file
+        params = self.request.query_params
+        queryset = queryset.filter(estado=params.get('estado', 'activa'))
+        if params.get('severidad'):
+            queryset = queryset.filter(severidad=params['severidad'])
+        if params.get('paciente_id'):
+            queryset = queryset.filter(paciente_id=params['paciente_id'])
+        return queryset
+    
+    ################
+    # Acción: resolver
+    # Descripción: Marca la alerta como resuelta por el usuario actual
+    # Uso: POST /alertas/<id>/resolver/
+    ################
+    @action(detail=True, methods=['post'])
+    def resolver(self, request, pk=None):
+        alerta = self.get_object()
+        resolver_alerta(alerta, request.user)
+        return Response(self.get_serializer(alerta).data)
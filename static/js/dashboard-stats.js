@@ -53,9 +53,16 @@ const ROLES_CONFIG = {
  * Clase para gestionar estadísticas por rol
  */
 class DashboardStats {
-    constructor(containerId = 'dashboard-container') {
+    /**
+     * @param {string} containerId - Contenedor del dashboard
+     * @param {Object} options - { url: endpoint de estadísticas, interval: ms entre consultas }
+     */
+    constructor(containerId = 'dashboard-container', options = {}) {
         this.container = document.getElementById(containerId);
         this.data = {};
+        this.url = options.url || this.container?.dataset.statsUrl || '/app/core/estadisticas/';
+        this.interval = options.interval || 30000;
+        this.timer = null;
         this.init();
     }
 
@@ -158,7 +165,53 @@ class DashboardStats {
      * Adjunta event listeners
      */
     attachEventListeners() {
-        // Aquí irían listeners para eventos de actualización en tiempo real
+        // Pausar la consulta periódica cuando la pestaña no está visible
+        document.addEventListener('visibilitychange', () => {
+            if (document.hidden) {
+                this.stopPolling();
+            } else {
+                this.startPolling();
+            }
+        });
+    }
+
+    /**
+     * Obtiene las estadísticas precalculadas del servidor
+     */
+    async fetchStats() {
+        try {
+            const response = await fetch(this.url, {
+                credentials: 'same-origin',
+                headers: { 'Accept': 'application/json' }
+            });
+            if (!response.ok) {
+                return;
+            }
+            const payload = await response.json();
+            this.data = payload.estadisticas;
+            this.updateStats(this.data);
+        } catch (error) {
+            console.warn('No se pudieron obtener las estadísticas:', error);
+        }
+    }
+
+    /**
+     * Consulta el endpoint ahora y luego cada `interval` ms
+     */
+    startPolling() {
+        this.stopPolling();
+        this.fetchStats();
+        this.timer = setInterval(() => this.fetchStats(), this.interval);
+    }
+
+    /**
+     * Detiene la consulta periódica
+     */
+    stopPolling() {
+        if (this.timer) {
+            clearInterval(this.timer);
+            this.timer = null;
+        }
     }
 
     /**
@@ -184,16 +237,6 @@ class DashboardStats {
 document.addEventListener('DOMContentLoaded', () => {
     const dashboard = new DashboardStats('dashboard-container');
 
-    // Ejemplo: Actualizar estadísticas después de obtener datos
-    // (Simularía una llamada a API)
-    setTimeout(() => {
-        dashboard.updateStats({
-            'ingresos_hoy': 5,
-            'registros_pendientes': 3,
-            'pacientes_activos': 12,
-            'controles_pendientes': 8,
-            'admisiones_hoy': 2,
-            'alertas_activas': 1
-        });
-    }, 500);
+    // Estadísticas precalculadas (core.contadores), actualizadas periódicamente
+    dashboard.startPolling();
 });
@@ -9,7 +9,7 @@
 // Retorna: boolean
 ///////////////////////////////////
 function validarRut(rut) {
-    rut = rut.replace(/\./g, '').replace(/-/g, '').toUpperCase();
+    rut = rut.replace(/[.\- \t]/g, '').toUpperCase();
     
     if (!/^\d{7,8}[0-9K]$/.test(rut)) {
         return false;
@@ -48,7 +48,7 @@ function validarRut(rut) {
 // Retorna: string formateado o null
 ///////////////////////////////////
 function formatearRut(rut) {
-    rut = rut.replace(/\./g, '').replace(/-/g, '').toUpperCase();
+    rut = rut.replace(/[.\- \t]/g, '').toUpperCase();
     
     if (rut.length < 8) {
         return null;
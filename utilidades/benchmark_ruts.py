@@ -0,0 +1,64 @@
+################
+# BENCHMARK: Validación de RUT
+# Descripción: Compara validar_rut_chileno (uno a uno) con validar_ruts (masivo)
+# Uso: python -m utilidades.benchmark_ruts [cantidad]
+################
+
+import random
+import sys
+import time
+
+from utilidades.validadores import (
+    calcular_digito_verificador,
+    validar_rut_chileno,
+    validar_ruts,
+)
+
+
+def generar_ruts(cantidad, semilla=2025):
+    """
+    Genera RUT con formatos mixtos: ~90% válidos, ~10% con dígito incorrecto.
+    Determinista para que las mediciones sean comparables entre versiones.
+    """
+    azar = random.Random(semilla)
+    ruts = []
+    for _ in range(cantidad):
+        numero = azar.randint(1_000_000, 29_999_999)
+        verificador = calcular_digito_verificador(numero)
+        if azar.random() < 0.1:
+            verificador = '0' if verificador != '0' else '1'
+        cuerpo = str(numero)
+        if azar.random() < 0.5:
+            cuerpo = f'{numero:,}'.replace(',', '.')
+        ruts.append(f'{cuerpo}-{verificador}')
+    return ruts
+
+
+def medir(funcion, datos, repeticiones=3):
+    """Mejor tiempo de varias repeticiones (descarta el calentamiento de memoria)."""
+    mejor = None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion(datos)
+        duracion = time.perf_counter() - inicio
+        mejor = duracion if mejor is None else min(mejor, duracion)
+    return resultado, mejor
+
+
+def main(cantidad=1_000_000):
+    ruts = generar_ruts(cantidad)
+
+    escalar, t_escalar = medir(lambda datos: [validar_rut_chileno(r)[0] for r in datos], ruts)
+    masivo, t_masivo = medir(validar_ruts, ruts)
+
+    if masivo.validos.tolist() != escalar:
+        raise SystemExit('❌ validar_ruts difiere de validar_rut_chileno')
+
+    print(f'RUT procesados:       {cantidad:,}')
+    print(f'validar_rut_chileno:  {t_escalar:.3f} s ({cantidad / t_escalar:,.0f} RUT/s)')
+    print(f'validar_ruts:         {t_masivo:.3f} s ({cantidad / t_masivo:,.0f} RUT/s)')
+    print(f'Aceleración:          {t_escalar / t_masivo:.1f}x')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -31,11 +31,11 @@ def validar_rut_chileno(rut):
         (False, 'Dígito verificador incorrecto')
     """
     
-    # Limpiar RUT: remover puntos y guiones, convertir a mayúsculas
-    rut_limpio = rut.replace('.', '').replace('-', '').upper()
+    # Limpiar RUT: remover puntos, guiones y espacios, convertir a mayúsculas
+    rut_limpio = rut.translate(_TABLA_LIMPIEZA_RUT).upper()
     
     # Validar formato básico: 7-8 dígitos + K o dígito
-    if not re.match(r'^\d{7,8}[0-9K]$', rut_limpio):
+    if not re.fullmatch(r'[0-9]{7,8}[0-9K]', rut_limpio):
         return False, 'Formato de RUT inválido. Use: XX.XXX.XXX-K'
     
     # Extraer número y verificador
@@ -90,7 +90,7 @@ def formatear_rut(rut):
     """
     
     # Limpiar
-    rut_limpio = rut.replace('.', '').replace('-', '').upper()
+    rut_limpio = rut.translate(_TABLA_LIMPIEZA_RUT).upper()
     
     # Validar longitud
     if len(rut_limpio) < 8:
@@ -106,15 +106,227 @@ def formatear_rut(rut):
 
 def normalizar_rut(rut):
     """
-    Normaliza un RUT quitando puntos y guiones.
+    Normaliza un RUT quitando puntos, guiones y espacios.
     
     Args:
         rut (str): RUT a normalizar
     
     Returns:
-        str: RUT normalizado (sin puntos ni guiones)
+        str: RUT normalizado (sin puntos, guiones ni espacios)
     """
-    return rut.replace('.', '').replace('-', '').upper()
+    return rut.translate(_TABLA_LIMPIEZA_RUT).upper()
+
+
+def calcular_digito_verificador(numero):
+    """
+    Calcula el dígito verificador (módulo 11) de un cuerpo de RUT.
+
+    Args:
+        numero (int): Cuerpo del RUT sin dígito verificador
+
+    Returns:
+        str: Dígito verificador ('0'-'9' o 'K')
+
+    Ejemplos:
+        >>> calcular_digito_verificador(12345678)
+        '5'
+    """
+
+    suma = 0
+    multiplicador = 2
+    while numero > 0:
+        suma += (numero % 10) * multiplicador
+        numero //= 10
+        multiplicador = 2 if multiplicador == 7 else multiplicador + 1
+
+    resto = 11 - (suma % 11)
+    if resto == 11:
+        return '0'
+    if resto == 10:
+        return 'K'
+    return str(resto)
+
+
+def descomponer_rut(rut):
+    """
+    Separa un RUT (cualquier formato) en cuerpo numérico y dígito verificador.
+
+    Args:
+        rut (str): RUT con o sin puntos/guion/espacios
+
+    Returns:
+        tuple: (numero: int, verificador: str) o None si es inválido
+
+    Ejemplos:
+        >>> descomponer_rut('12.345.678-5')
+        (12345678, '5')
+
+        >>> descomponer_rut('12.345.678-9') is None
+        True
+    """
+
+    if not rut:
+        return None
+
+    rut_limpio = normalizar_rut(str(rut))
+    if not re.fullmatch(r'[0-9]{7,8}[0-9K]', rut_limpio):
+        return None
+
+    numero = int(rut_limpio[:-1])
+    verificador = rut_limpio[-1]
+    if calcular_digito_verificador(numero) != verificador:
+        return None
+
+    return numero, verificador
+
+
+# ====================================================================
+# VALIDACIÓN MASIVA DE RUT (vectorizada con NumPy)
+# ====================================================================
+
+# Códigos de error de validar_ruts
+RUT_OK = 0
+RUT_ERROR_FORMATO = 1
+RUT_ERROR_DIGITO = 2
+
+# Pesos módulo 11 para un cuerpo de 8 dígitos (izquierda a derecha)
+_PESOS_RUT = (3, 2, 7, 6, 5, 4, 3, 2)
+
+# Caracteres que se eliminan antes de validar (puntos, guiones y espacios)
+_CARACTERES_LIMPIEZA_RUT = b'.- \t'
+_TABLA_LIMPIEZA_RUT = str.maketrans('', '', _CARACTERES_LIMPIEZA_RUT.decode())
+
+
+class ResultadoRuts:
+    """
+    Resultado compacto de validar_ruts.
+
+    Atributos (arreglos NumPy alineados con la entrada):
+        validos: bool, máscara de RUT válidos
+        errores: int8, RUT_OK / RUT_ERROR_FORMATO / RUT_ERROR_DIGITO
+        numeros: int64, cuerpo del RUT (0 si el formato es inválido)
+        verificadores: str, dígito verificador ingresado ('' si inválido)
+    """
+
+    __slots__ = ('validos', 'errores', 'numeros', 'verificadores')
+
+    def __init__(self, validos, errores, numeros, verificadores):
+        self.validos = validos
+        self.errores = errores
+        self.numeros = numeros
+        self.verificadores = verificadores
+
+    def __len__(self):
+        return len(self.validos)
+
+    def normalizados(self):
+        """RUT sin puntos ni guion ('123456785'); '' para los inválidos."""
+        import numpy as np
+
+        cuerpo = self.numeros.astype('U8')
+        return np.where(self.validos, np.char.add(cuerpo, self.verificadores), '')
+
+    def formateados(self):
+        """RUT con formato XX.XXX.XXX-K; '' para los inválidos."""
+        import numpy as np
+
+        potencias = 10 ** np.arange(7, -1, -1, dtype=np.int64)
+        digitos = ((self.numeros[:, None] // potencias) % 10 + ord('0')).astype(np.uint32).view('U1')
+        caracteres = np.empty((len(digitos), 12), dtype='U1')
+        caracteres[:, [0, 1, 3, 4, 5, 7, 8, 9]] = digitos
+        caracteres[:, [2, 6]] = '.'
+        caracteres[:, 10] = '-'
+        caracteres[:, 11] = self.verificadores
+        texto = caracteres.view('U12').ravel()
+        return np.where(self.validos, texto, '')
+
+
+def validar_ruts(ruts):
+    """
+    Valida, normaliza y descompone muchos RUT en una sola pasada vectorizada.
+    Mismas reglas que validar_rut_chileno (7-8 dígitos + verificador).
+
+    Args:
+        ruts (iterable): RUT en cualquier formato (str; None se trata como inválido)
+
+    Returns:
+        ResultadoRuts: máscara de válidos, códigos de error, cuerpos y verificadores
+
+    Ejemplos:
+        >>> r = validar_ruts(['12.345.678-5', '12.345.678-9', 'abc'])
+        >>> r.validos.tolist(), r.errores.tolist()
+        ([True, False, False], [0, 2, 1])
+    """
+    import numpy as np
+
+    # Limpieza en una sola operación sobre el texto concatenado (separador \x00)
+    textos = ['' if rut is None else str(rut) for rut in ruts]
+    if not textos:
+        vacio = np.zeros(0, dtype=np.int64)
+        return ResultadoRuts(vacio.astype(bool), vacio.astype(np.int8), vacio, vacio.astype('U1'))
+
+    unido = '\x00'.join(textos).encode('ascii', 'replace')
+    limpio = np.frombuffer(unido.translate(None, _CARACTERES_LIMPIEZA_RUT).upper(), dtype=np.uint8)
+
+    # 9 ceros al inicio: así cada RUT puede leerse como sus últimos 9 caracteres
+    buffer = np.concatenate((np.full(9, ord('0'), dtype=np.uint8), limpio))
+    separadores = np.flatnonzero(buffer == 0)
+    inicios = np.concatenate(([9], separadores + 1))
+    finales = np.concatenate((separadores, [len(buffer)]))
+    largo = finales - inicios
+
+    # Matriz (n, 9) de bytes alineada a la derecha: 8 de cuerpo + verificador
+    codigos = buffer[(finales - 9)[:, None] + np.arange(9)]
+    codigos[np.arange(9) < (9 - largo)[:, None]] = ord('0')
+    verificador = codigos[:, 8]
+
+    formato_ok = (
+        (largo >= 8) & (largo <= 9)
+        & np.all((codigos[:, :8] >= ord('0')) & (codigos[:, :8] <= ord('9')), axis=1)
+        & (((verificador >= ord('0')) & (verificador <= ord('9'))) | (verificador == ord('K')))
+    )
+
+    cuerpo = (codigos[:, :8] - ord('0')).astype(np.int64)
+    cuerpo[~formato_ok] = 0
+    esperado = _codigos_verificador(cuerpo)
+
+    validos = formato_ok & (esperado == verificador)
+    errores = np.where(
+        ~formato_ok, RUT_ERROR_FORMATO, np.where(validos, RUT_OK, RUT_ERROR_DIGITO)
+    ).astype(np.int8)
+    numeros = cuerpo @ (10 ** np.arange(7, -1, -1, dtype=np.int64))
+    verificadores = np.where(formato_ok, verificador.astype(np.uint32).view('U1'), '')
+
+    return ResultadoRuts(validos, errores, numeros, verificadores)
+
+
+def _codigos_verificador(digitos):
+    """Código ASCII del verificador de cada fila de una matriz (n, 8) de dígitos del cuerpo."""
+    import numpy as np
+
+    resto = 11 - (digitos @ np.array(_PESOS_RUT, dtype=np.int64)) % 11
+    return np.where(resto == 11, ord('0'), np.where(resto == 10, ord('K'), resto + ord('0')))
+
+
+def calcular_digitos_verificadores(numeros):
+    """
+    Versión vectorizada de calcular_digito_verificador.
+
+    Args:
+        numeros (iterable): cuerpos de RUT (hasta 8 dígitos)
+
+    Returns:
+        np.ndarray: dígitos verificadores ('0'-'9' o 'K'), dtype U1
+
+    Ejemplos:
+        >>> calcular_digitos_verificadores([12345678, 11111111]).tolist()
+        ['5', '1']
+    """
+    import numpy as np
+
+    numeros = np.asarray(numeros, dtype=np.int64).reshape(-1)
+    digitos = (numeros[:, None] // 10 ** np.arange(7, -1, -1, dtype=np.int64)) % 10
+    return _codigos_verificador(digitos).astype(np.uint32).view('U1')
 
 
 # ====================================================================
@@ -251,6 +463,19 @@ def validar_email(email):
         return False, 'Email inválido'
 
 
+# ====================================================================
+# RANGOS DE SIGNOS VITALES
+# ====================================================================
+# Usados por los validadores de abajo y por pacientes.tendencias
+# (mínimo, máximo) inclusive
+
+RANGO_SISTOLICA = (60, 220)
+RANGO_DIASTOLICA = (40, 140)
+RANGO_GLUCEMIA = (0, 500)
+RANGO_GLUCEMIA_NORMAL = (70, 150)
+RANGO_PESO = (30, 200)
+
+
 # ====================================================================
 # VALIDADOR DE PRESIÓN ARTERIAL
 # ====================================================================
@@ -277,11 +502,11 @@ def validar_presion(sistolica, diastolica):
     except (ValueError, TypeError):
         return False, 'La presión debe ser números'
     
-    if sistolica < 60 or sistolica > 220:
-        return False, 'Presión sistólica debe estar entre 60-220 mmHg'
+    if sistolica < RANGO_SISTOLICA[0] or sistolica > RANGO_SISTOLICA[1]:
+        return False, 'Presión sistólica debe estar entre {}-{} mmHg'.format(*RANGO_SISTOLICA)
     
-    if diastolica < 40 or diastolica > 140:
-        return False, 'Presión diastólica debe estar entre 40-140 mmHg'
+    if diastolica < RANGO_DIASTOLICA[0] or diastolica > RANGO_DIASTOLICA[1]:
+        return False, 'Presión diastólica debe estar entre {}-{} mmHg'.format(*RANGO_DIASTOLICA)
     
     if diastolica >= sistolica:
         return False, 'Presión diastólica debe ser menor que sistólica'
@@ -310,10 +535,10 @@ def validar_glucemia(glucemia):
     except (ValueError, TypeError):
         return False, 'La glucemia debe ser un número', False
     
-    if glucemia < 0 or glucemia > 500:
-        return False, 'Glucemia fuera de rango (0-500 mg/dL)', False
+    if glucemia < RANGO_GLUCEMIA[0] or glucemia > RANGO_GLUCEMIA[1]:
+        return False, 'Glucemia fuera de rango ({}-{} mg/dL)'.format(*RANGO_GLUCEMIA), False
     
-    if glucemia < 70 or glucemia > 150:
+    if glucemia < RANGO_GLUCEMIA_NORMAL[0] or glucemia > RANGO_GLUCEMIA_NORMAL[1]:
         return True, 'Glucemia dentro de rango válido', True  # Advertencia
     
     return True, 'Glucemia normal', False
@@ -340,8 +565,8 @@ def validar_peso(peso):
     except (ValueError, TypeError):
         return False, 'El peso debe ser un número'
     
-    if peso < 30 or peso > 200:
-        return False, 'Peso debe estar entre 30-200 kg'
+    if peso < RANGO_PESO[0] or peso > RANGO_PESO[1]:
+        return False, 'Peso debe estar entre {}-{} kg'.format(*RANGO_PESO)
     
     return True, 'Peso válido'
 
@@ -373,6 +598,72 @@ def validar_semanas_gestacion(semanas):
     return True, 'Semanas válidas'
 
 
+# ====================================================================
+# VALIDACIÓN MASIVA DE MEDICIONES (vectorizada con NumPy)
+# ====================================================================
+
+def validar_mediciones(peso, presion_sistolica, presion_diastolica, glucemia, semanas_gestacion):
+    """
+    Valida las mediciones de muchos controles en una sola pasada vectorizada.
+    Mismas reglas y mensajes que validar_peso, validar_presion,
+    validar_glucemia y validar_semanas_gestacion. Un valor None (no medido)
+    no se valida; la presión, si se informa, requiere ambos valores.
+
+    Args:
+        peso, presion_sistolica, presion_diastolica, glucemia, semanas_gestacion
+            (iterable): un número o None por control, alineados entre sí
+
+    Returns:
+        dict: campo -> arreglo NumPy de mensajes de error ('' si es válido)
+
+    Ejemplos:
+        >>> errores = validar_mediciones([65, 250], [120, 90], [80, 95], [None, 90], [30, 30])
+        >>> errores['peso'].tolist(), errores['presion_diastolica'].tolist()
+        (['', 'Peso debe estar entre 30-200 kg'], ['', 'Presión diastólica debe ser menor que sistólica'])
+    """
+    import numpy as np
+
+    def columna(valores):
+        return np.array([np.nan if valor is None else valor for valor in valores], dtype=float)
+
+    def fuera(valores, rango):
+        # NaN (no medido) no cumple ninguna comparación: nunca queda fuera de rango
+        return (valores < rango[0]) | (valores > rango[1])
+
+    peso = columna(peso)
+    sistolica = columna(presion_sistolica)
+    diastolica = columna(presion_diastolica)
+    glucemia = columna(glucemia)
+    semanas = columna(semanas_gestacion)
+
+    sin_sistolica = np.isnan(sistolica) & ~np.isnan(diastolica)
+    sin_diastolica = np.isnan(diastolica) & ~np.isnan(sistolica)
+    sistolica_fuera = fuera(sistolica, RANGO_SISTOLICA)
+    diastolica_fuera = fuera(diastolica, RANGO_DIASTOLICA)
+    invertida = ~sistolica_fuera & ~diastolica_fuera & (diastolica >= sistolica)
+
+    return {
+        'peso': np.where(fuera(peso, RANGO_PESO), 'Peso debe estar entre {}-{} kg'.format(*RANGO_PESO), ''),
+        'presion_sistolica': np.select(
+            [sin_sistolica, sistolica_fuera],
+            ['La presión debe ser números',
+             'Presión sistólica debe estar entre {}-{} mmHg'.format(*RANGO_SISTOLICA)],
+            '',
+        ),
+        'presion_diastolica': np.select(
+            [sin_diastolica, diastolica_fuera, invertida],
+            ['La presión debe ser números',
+             'Presión diastólica debe estar entre {}-{} mmHg'.format(*RANGO_DIASTOLICA),
+             'Presión diastólica debe ser menor que sistólica'],
+            '',
+        ),
+        'glucemia': np.where(
+            fuera(glucemia, RANGO_GLUCEMIA), 'Glucemia fuera de rango ({}-{} mg/dL)'.format(*RANGO_GLUCEMIA), ''
+        ),
+        'semanas_gestacion': np.where(fuera(semanas, (1, 42)), 'Las semanas deben estar entre 1-42', ''),
+    }
+
+
 # ====================================================================
 # VALIDADOR GENÉRICO DE RANGO
 # ====================================================================